@@ -2,7 +2,8 @@ from django.contrib import admin
 from django.utils.html import format_html
 from unfold.admin import ModelAdmin
 from unfold.decorators import display
-from .models import Local
+from apps.tickets.models import Ticket
+from .models import CalendarioLaboral, DiaFeriado, HorarioLaboral, Local
 
 @admin.register(Local)
 class LocalAdmin(ModelAdmin):
@@ -15,7 +16,7 @@ class LocalAdmin(ModelAdmin):
     
     fieldsets = (
         ('Información del Local', {
-            'fields': (('codigo', 'nombre'), 'direccion', 'activo')
+            'fields': (('codigo', 'nombre'), 'direccion', 'activo', 'calendario')
         }),
     )
     
@@ -41,7 +42,7 @@ class LocalAdmin(ModelAdmin):
     @display(description='Tickets')
     def tickets_count(self, obj):
         total = obj.tickets.count()
-        abiertos = obj.tickets.filter(estado__in=['PENDIENTE', 'EN_PROCESO']).count()
+        abiertos = obj.tickets.filter(estado__in=Ticket.ESTADOS_ABIERTOS).count()
         
         if abiertos > 0:
             return format_html(
@@ -59,3 +60,30 @@ class LocalAdmin(ModelAdmin):
     def desactivar_locales(self, request, queryset):
         updated = queryset.update(activo=False)
         self.message_user(request, f'{updated} local(es) desactivado(s).')
+
+
+class HorarioLaboralInline(admin.TabularInline):
+    model = HorarioLaboral
+    extra = 0
+    fields = ('dia_semana', 'hora_inicio', 'hora_fin')
+
+
+class DiaFeriadoInline(admin.TabularInline):
+    model = DiaFeriado
+    extra = 0
+    fields = ('fecha', 'descripcion')
+
+
+@admin.register(CalendarioLaboral)
+class CalendarioLaboralAdmin(ModelAdmin):
+    list_display = ('nombre', 'provincia', 'por_defecto')
+    list_filter = ('por_defecto',)
+    search_fields = ('nombre', 'provincia')
+    inlines = [HorarioLaboralInline, DiaFeriadoInline]
+
+
+@admin.register(DiaFeriado)
+class DiaFeriadoAdmin(ModelAdmin):
+    list_display = ('fecha', 'descripcion', 'calendario')
+    list_filter = ('calendario',)
+    date_hierarchy = 'fecha'
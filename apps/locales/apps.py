@@ -5,3 +5,6 @@ class LocalesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.locales'
     verbose_name = 'Locales'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
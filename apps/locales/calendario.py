@@ -0,0 +1,283 @@
+# apps/locales/calendario.py
+"""
+Motor de calendario laboral para el SLA.
+
+Un Calendario precalcula los intervalos laborables (horario semanal menos
+feriados) de un horizonte de fechas como listas ordenadas de segundos epoch,
+junto con los segundos laborables acumulados al inicio de cada intervalo.
+Con eso:
+
+- laborables(a, b): segundos de trabajo entre a y b  -> 2 bisect
+- sumar(a, s):      instante en que se cumplen s segundos de trabajo -> 2 bisect
+
+O(log n) por ticket en vez de avanzar hora a hora. Si una fecha cae fuera del
+horizonte, el índice se reconstruye ampliándolo.
+
+Los locales sin calendario (ni propio, ni de su provincia, ni por defecto)
+usan CALENDARIO_24X7: horas de reloj, como antes.
+"""
+import bisect
+import time as reloj
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+CACHE_VERSION_KEY = "calendario:version"
+
+# Horizonte inicial del índice alrededor de hoy (días)
+DIAS_ATRAS = 400
+DIAS_ADELANTE = 800
+# Tope al ampliar el horizonte buscando tiempo laborable (calendario sin horas)
+MAX_DIAS_HORIZONTE = 366 * 20
+
+
+class Calendario24x7:
+    """Sin horario: todo el tiempo cuenta (SLA en horas de reloj)."""
+
+    nombre = "24x7"
+
+    def laborables(self, inicio, fin):
+        return max(0.0, (fin - inicio).total_seconds())
+
+    def sumar(self, inicio, segundos):
+        return inicio + timedelta(seconds=segundos)
+
+    def restar(self, fin, segundos):
+        return fin - timedelta(seconds=segundos)
+
+    def es_laborable(self, instante):
+        return True
+
+
+CALENDARIO_24X7 = Calendario24x7()
+
+
+class Calendario:
+    """
+    `horario`: {dia_semana (0=lunes): [(hora_inicio, hora_fin), ...]}; una
+    hora_fin 00:00 significa medianoche. `feriados`: fechas sin servicio.
+    """
+
+    def __init__(self, horario, feriados=(), zona=None, nombre="", hoy=None):
+        self.nombre = nombre
+        self.horario = {
+            dia: sorted(tramos) for dia, tramos in horario.items() if tramos
+        }
+        if not self.horario:
+            raise ValueError("Un calendario laboral necesita al menos un tramo horario.")
+        self.feriados = frozenset(feriados)
+        self.zona = zona or timezone.get_default_timezone()
+
+        hoy = hoy or timezone.localdate()
+        self._construir(hoy - timedelta(days=DIAS_ATRAS), hoy + timedelta(days=DIAS_ADELANTE))
+
+    # --- índice -------------------------------------------------------------
+
+    def _construir(self, desde, hasta):
+        inicios, fines, acumulado = [], [], []
+        total = 0.0
+        dia = desde
+        un_dia = timedelta(days=1)
+        while dia <= hasta:
+            if dia not in self.feriados:
+                for hora_inicio, hora_fin in self.horario.get(dia.weekday(), ()):
+                    a = datetime.combine(dia, hora_inicio, tzinfo=self.zona).timestamp()
+                    dia_fin = dia + un_dia if hora_fin == time(0) else dia
+                    b = datetime.combine(dia_fin, hora_fin, tzinfo=self.zona).timestamp()
+                    if b <= a:
+                        continue
+                    if fines and a <= fines[-1]:
+                        # Tramos solapados o contiguos: se funden
+                        if b > fines[-1]:
+                            total += b - fines[-1]
+                            fines[-1] = b
+                        continue
+                    inicios.append(a)
+                    fines.append(b)
+                    acumulado.append(total)
+                    total += b - a
+            dia += un_dia
+
+        self._desde, self._hasta = desde, hasta
+        self._t0 = datetime.combine(desde, time(0), tzinfo=self.zona).timestamp()
+        self._t1 = datetime.combine(hasta + un_dia, time(0), tzinfo=self.zona).timestamp()
+        self._inicios = inicios
+        self._fines = fines
+        self._acumulado = acumulado
+        self._acumulado_fin = [s + (f - i) for s, i, f in zip(acumulado, inicios, fines)]
+
+    def _ampliar(self, ts):
+        """Reconstruye el índice para que cubra `ts` (con un año de margen)."""
+        fecha = datetime.fromtimestamp(ts, tz=self.zona).date()
+        desde = min(self._desde, fecha - timedelta(days=366))
+        hasta = max(self._hasta, fecha + timedelta(days=366))
+        if (hasta - desde).days > MAX_DIAS_HORIZONTE:
+            raise ValueError(f"Calendario {self.nombre!r}: fecha fuera del horizonte ({fecha}).")
+        self._construir(desde, hasta)
+
+    def _acumulado_en(self, ts):
+        """Segundos laborables desde el inicio del horizonte hasta `ts`."""
+        if not self._t0 <= ts <= self._t1:
+            self._ampliar(ts)
+        i = bisect.bisect_right(self._inicios, ts) - 1
+        if i < 0:
+            return 0.0
+        return self._acumulado[i] + min(ts - self._inicios[i], self._fines[i] - self._inicios[i])
+
+    def _instante_de(self, segundos):
+        """Primer instante en que el acumulado laborable alcanza `segundos`."""
+        while True:
+            j = bisect.bisect_left(self._acumulado_fin, segundos)
+            if j < len(self._acumulado_fin):
+                return self._inicios[j] + (segundos - self._acumulado[j])
+            # Más allá del horizonte: se amplía solo hacia delante, así el
+            # acumulado ya calculado (mismo inicio) sigue siendo válido
+            if (self._hasta - self._desde).days > MAX_DIAS_HORIZONTE:
+                raise ValueError(f"Calendario {self.nombre!r} sin tiempo laborable suficiente.")
+            self._construir(self._desde, self._hasta + timedelta(days=366))
+
+    @staticmethod
+    def _fecha(ts):
+        return datetime.fromtimestamp(ts, tz=dt_timezone.utc)
+
+    # --- API ----------------------------------------------------------------
+
+    def laborables(self, inicio, fin):
+        """Segundos laborables entre `inicio` y `fin` (0 si fin <= inicio)."""
+        if fin <= inicio:
+            return 0.0
+        a, b = inicio.timestamp(), fin.timestamp()
+        # Ampliar primero para que ambos acumulados salgan del mismo índice
+        for ts in (a, b):
+            if not self._t0 <= ts <= self._t1:
+                self._ampliar(ts)
+        return self._acumulado_en(b) - self._acumulado_en(a)
+
+    def sumar(self, inicio, segundos):
+        """Instante en que se completan `segundos` laborables a partir de `inicio`."""
+        base = self._acumulado_en(inicio.timestamp())
+        return self._fecha(self._instante_de(base + max(0.0, segundos)))
+
+    def restar(self, fin, segundos):
+        """Instante desde el que quedan exactamente `segundos` laborables hasta `fin`."""
+        ts = fin.timestamp()
+        objetivo = self._acumulado_en(ts) - max(0.0, segundos)
+        while objetivo < 0:
+            self._ampliar(self._t0 - 1)
+            objetivo = self._acumulado_en(ts) - max(0.0, segundos)
+        return self._fecha(self._instante_de(objetivo))
+
+    def es_laborable(self, instante):
+        ts = instante.timestamp()
+        if not self._t0 <= ts <= self._t1:
+            self._ampliar(ts)
+        i = bisect.bisect_right(self._inicios, ts) - 1
+        return i >= 0 and ts < self._fines[i]
+
+
+# =====================================================================
+# Calendarios de la BD (caché por proceso, invalidada por versión)
+# =====================================================================
+# Las señales de locales suben la versión en la caché de Django: con una caché
+# compartida el cambio llega al instante a todos los procesos. Con LocMem cada
+# worker y el sla_daemon tienen su propia versión, así que además el índice
+# caduca a los CALENDARIO_CACHE_SEGUNDOS y se vuelve a leer de la BD.
+
+_memo = {"version": None, "indice": None, "caduca": 0.0}
+
+
+def segundos_memo():
+    return getattr(settings, 'CALENDARIO_CACHE_SEGUNDOS', 60)
+
+
+def cache_compartida():
+    """False si la caché por defecto es local al proceso (LocMem o Dummy)."""
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    return not backend.endswith(('.LocMemCache', '.DummyCache'))
+
+
+def invalidar_calendarios():
+    """Deja obsoletos los calendarios precalculados de todos los procesos."""
+    try:
+        cache.incr(CACHE_VERSION_KEY)
+    except ValueError:
+        cache.set(CACHE_VERSION_KEY, timezone.now().timestamp(), None)
+
+
+def _version():
+    version = cache.get(CACHE_VERSION_KEY)
+    if version is None:
+        cache.add(CACHE_VERSION_KEY, 1, None)
+        version = cache.get(CACHE_VERSION_KEY, 1)
+    return version
+
+
+def _cargar_indice():
+    """Todos los calendarios en 3 consultas: calendarios, horarios y feriados."""
+    from .models import CalendarioLaboral, DiaFeriado, HorarioLaboral
+
+    horarios = {}
+    for calendario_id, dia, hora_inicio, hora_fin in HorarioLaboral.objects.values_list(
+        "calendario_id", "dia_semana", "hora_inicio", "hora_fin"
+    ):
+        horarios.setdefault(calendario_id, {}).setdefault(dia, []).append((hora_inicio, hora_fin))
+
+    feriados_comunes = set()
+    feriados = {}
+    for calendario_id, fecha in DiaFeriado.objects.values_list("calendario_id", "fecha"):
+        if calendario_id is None:
+            feriados_comunes.add(fecha)
+        else:
+            feriados.setdefault(calendario_id, set()).add(fecha)
+
+    indice = {"por_id": {}, "por_provincia": {}, "defecto": None}
+    for calendario_id, nombre, provincia, por_defecto in CalendarioLaboral.objects.order_by("id").values_list(
+        "id", "nombre", "provincia", "por_defecto"
+    ):
+        if calendario_id in horarios:
+            calendario = Calendario(
+                horarios[calendario_id],
+                feriados_comunes | feriados.get(calendario_id, set()),
+                nombre=nombre,
+            )
+        else:
+            calendario = CALENDARIO_24X7
+        indice["por_id"][calendario_id] = calendario
+        if provincia:
+            indice["por_provincia"].setdefault(provincia.strip().lower(), calendario)
+        if por_defecto and indice["defecto"] is None:
+            indice["defecto"] = calendario
+    return indice
+
+
+def _indice():
+    version = _version()
+    ahora = reloj.monotonic()
+    if _memo["version"] != version or ahora >= _memo["caduca"]:
+        _memo["indice"] = _cargar_indice()
+        _memo["version"] = version
+        _memo["caduca"] = ahora + segundos_memo()
+    return _memo["indice"]
+
+
+def calendario_para(calendario_id=None, provincia=""):
+    """
+    Calendario propio (`calendario_id`), si no el de la provincia, si no el
+    calendario por defecto, y si no hay ninguno 24x7. Sin consultas con la caché caliente.
+    """
+    indice = _indice()
+    if calendario_id in indice["por_id"]:
+        return indice["por_id"][calendario_id]
+    provincia = (provincia or "").strip().lower()
+    if provincia in indice["por_provincia"]:
+        return indice["por_provincia"][provincia]
+    return indice["defecto"] or CALENDARIO_24X7
+
+
+def calendario_para_local(local):
+    """Calendario laboral de un Local (None = el calendario por defecto)."""
+    if local is None:
+        return calendario_para()
+    return calendario_para(getattr(local, "calendario_id", None), getattr(local, "provincia", ""))
@@ -0,0 +1,24 @@
+# apps/locales/checks.py
+"""
+Comprobaciones de sistema de locales (`manage.py check`).
+"""
+from django.core.checks import Tags, Warning, register
+
+from .calendario import cache_compartida, segundos_memo
+
+
+@register(Tags.caches)
+def calendarios_con_cache_local(app_configs, **kwargs):
+    """Con una caché por proceso los cambios de calendario no se avisan entre workers."""
+    if cache_compartida():
+        return []
+    return [
+        Warning(
+            'La caché por defecto no se comparte entre procesos: los cambios de '
+            f'calendarios laborales tardan hasta {segundos_memo()} s en llegar '
+            'a los demás workers y al sla_daemon.',
+            hint='Configura CACHE_BACKEND con una caché compartida (FileBasedCache, '
+                 'Redis...) o baja CALENDARIO_CACHE_SEGUNDOS.',
+            id='locales.W001',
+        )
+    ]
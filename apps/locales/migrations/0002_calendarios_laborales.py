@@ -0,0 +1,62 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locales', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CalendarioLaboral',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100, unique=True, verbose_name='Nombre')),
+                ('provincia', models.CharField(blank=True, help_text='Se aplica a los locales de esta provincia sin calendario propio', max_length=100, verbose_name='Provincia')),
+                ('por_defecto', models.BooleanField(default=False, help_text='Para los locales sin calendario propio ni de su provincia', verbose_name='Por defecto')),
+            ],
+            options={
+                'verbose_name': 'Calendario laboral',
+                'verbose_name_plural': 'Calendarios laborales',
+                'ordering': ['nombre'],
+            },
+        ),
+        migrations.CreateModel(
+            name='HorarioLaboral',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia_semana', models.PositiveSmallIntegerField(choices=[(0, 'Lunes'), (1, 'Martes'), (2, 'Miércoles'), (3, 'Jueves'), (4, 'Viernes'), (5, 'Sábado'), (6, 'Domingo')], verbose_name='Día')),
+                ('hora_inicio', models.TimeField(verbose_name='Desde')),
+                ('hora_fin', models.TimeField(help_text='00:00 = medianoche', verbose_name='Hasta')),
+                ('calendario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='horarios', to='locales.calendariolaboral', verbose_name='Calendario')),
+            ],
+            options={
+                'verbose_name': 'Horario laboral',
+                'verbose_name_plural': 'Horarios laborales',
+                'ordering': ['calendario', 'dia_semana', 'hora_inicio'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DiaFeriado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(verbose_name='Fecha')),
+                ('descripcion', models.CharField(blank=True, max_length=200, verbose_name='Descripción')),
+                ('calendario', models.ForeignKey(blank=True, help_text='Vacío = feriado para todos los calendarios', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='feriados', to='locales.calendariolaboral', verbose_name='Calendario')),
+            ],
+            options={
+                'verbose_name': 'Día feriado',
+                'verbose_name_plural': 'Días feriados',
+                'ordering': ['fecha'],
+            },
+        ),
+        migrations.AddField(
+            model_name='local',
+            name='calendario',
+            field=models.ForeignKey(blank=True, help_text='Vacío = el de su provincia o el calendario por defecto', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='locales', to='locales.calendariolaboral', verbose_name='Calendario laboral'),
+        ),
+    ]
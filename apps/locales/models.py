@@ -4,6 +4,113 @@ Modelos para la gestión de locales
 from django.db import models
 
 
+class CalendarioLaboral(models.Model):
+    """
+    Horario de atención para calcular el SLA en horas laborables.
+    Se aplica a un local concreto, a los de una provincia o, si es el
+    calendario por defecto, a todos los demás.
+    """
+    nombre = models.CharField(
+        max_length=100,
+        unique=True,
+        verbose_name='Nombre'
+    )
+
+    provincia = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name='Provincia',
+        help_text='Se aplica a los locales de esta provincia sin calendario propio'
+    )
+
+    por_defecto = models.BooleanField(
+        default=False,
+        verbose_name='Por defecto',
+        help_text='Para los locales sin calendario propio ni de su provincia'
+    )
+
+    class Meta:
+        verbose_name = 'Calendario laboral'
+        verbose_name_plural = 'Calendarios laborales'
+        ordering = ['nombre']
+
+    def __str__(self):
+        return self.nombre
+
+
+class HorarioLaboral(models.Model):
+    """Tramo de atención de un día de la semana (puede haber varios por día)."""
+    DIAS = [
+        (0, 'Lunes'),
+        (1, 'Martes'),
+        (2, 'Miércoles'),
+        (3, 'Jueves'),
+        (4, 'Viernes'),
+        (5, 'Sábado'),
+        (6, 'Domingo'),
+    ]
+
+    calendario = models.ForeignKey(
+        CalendarioLaboral,
+        on_delete=models.CASCADE,
+        related_name='horarios',
+        verbose_name='Calendario'
+    )
+
+    dia_semana = models.PositiveSmallIntegerField(
+        choices=DIAS,
+        verbose_name='Día'
+    )
+
+    hora_inicio = models.TimeField(
+        verbose_name='Desde'
+    )
+
+    hora_fin = models.TimeField(
+        verbose_name='Hasta',
+        help_text='00:00 = medianoche'
+    )
+
+    class Meta:
+        verbose_name = 'Horario laboral'
+        verbose_name_plural = 'Horarios laborales'
+        ordering = ['calendario', 'dia_semana', 'hora_inicio']
+
+    def __str__(self):
+        return f"{self.get_dia_semana_display()} {self.hora_inicio:%H:%M}-{self.hora_fin:%H:%M}"
+
+
+class DiaFeriado(models.Model):
+    """Día sin servicio: de un calendario, o de todos si no se indica calendario."""
+    calendario = models.ForeignKey(
+        CalendarioLaboral,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='feriados',
+        verbose_name='Calendario',
+        help_text='Vacío = feriado para todos los calendarios'
+    )
+
+    fecha = models.DateField(
+        verbose_name='Fecha'
+    )
+
+    descripcion = models.CharField(
+        max_length=200,
+        blank=True,
+        verbose_name='Descripción'
+    )
+
+    class Meta:
+        verbose_name = 'Día feriado'
+        verbose_name_plural = 'Días feriados'
+        ordering = ['fecha']
+
+    def __str__(self):
+        return f"{self.fecha:%d/%m/%Y} {self.descripcion}".strip()
+
+
 class Local(models.Model):
     """
     Modelo para representar cada banca/local del consorcio
@@ -60,6 +167,16 @@ class Local(models.Model):
         verbose_name='Activo'
     )
 
+    calendario = models.ForeignKey(
+        CalendarioLaboral,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='locales',
+        verbose_name='Calendario laboral',
+        help_text='Vacío = el de su provincia o el calendario por defecto'
+    )
+
     notas = models.TextField(
         blank=True,
         null=True,
@@ -86,7 +203,8 @@ class Local(models.Model):
 
     def tickets_abiertos(self):
         """Retorna el número de tickets abiertos para este local"""
-        return self.tickets.filter(estado__in=['PENDIENTE', 'EN_PROCESO']).count()
+        from apps.tickets.models import Ticket
+        return self.tickets.filter(estado__in=Ticket.ESTADOS_ABIERTOS).count()
 
     def tickets_mes_actual(self):
         """Retorna el número de tickets del mes actual"""
@@ -0,0 +1,21 @@
+# apps/locales/signals.py
+"""
+Invalidación de los calendarios laborales precalculados (ver calendario.py).
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .calendario import invalidar_calendarios
+from .models import CalendarioLaboral, DiaFeriado, HorarioLaboral
+
+
+@receiver(post_save, sender=CalendarioLaboral)
+@receiver(post_delete, sender=CalendarioLaboral)
+@receiver(post_save, sender=HorarioLaboral)
+@receiver(post_delete, sender=HorarioLaboral)
+@receiver(post_save, sender=DiaFeriado)
+@receiver(post_delete, sender=DiaFeriado)
+def calendario_modificado(sender, **kwargs):
+    invalidar_calendarios()
+    transaction.on_commit(invalidar_calendarios)
@@ -1,9 +1,22 @@
 """
 Tests para el módulo de locales
 """
-from django.test import TestCase
+import random
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
 
-from apps.locales.models import Local
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+
+from apps.locales.calendario import CALENDARIO_24X7, Calendario, calendario_para_local
+from apps.locales.models import CalendarioLaboral, DiaFeriado, HorarioLaboral, Local
+
+TZ = ZoneInfo("America/Santo_Domingo")
+
+# Lunes a viernes 8-12 y 14-18, sábado 8-12
+HORARIO = {dia: [(time(8), time(12)), (time(14), time(18))] for dia in range(5)}
+HORARIO[5] = [(time(8), time(12))]
+NAVIDAD = date(2026, 12, 25)
 
 
 class LocalModelTest(TestCase):
@@ -86,3 +99,136 @@ class LocalModelTest(TestCase):
         
         locales_activos = Local.objects.filter(activo=True)
         self.assertEqual(locales_activos.count(), 2)
+
+
+class CalendarioMotorTest(SimpleTestCase):
+    """Motor de horas laborables: índice de intervalos + bisect"""
+
+    def setUp(self):
+        self.calendario = Calendario(HORARIO, {NAVIDAD}, zona=TZ, hoy=date(2026, 10, 1))
+
+    def _local(self, *args):
+        return datetime(*args, tzinfo=TZ)
+
+    def test_viernes_noche_no_vence_antes_de_trabajar(self):
+        viernes = self._local(2026, 10, 16, 20, 0)
+        self.assertEqual(self.calendario.sumar(viernes, 4 * 3600), self._local(2026, 10, 17, 12, 0))
+        self.assertEqual(self.calendario.sumar(viernes, 5 * 3600), self._local(2026, 10, 19, 9, 0))
+
+    def test_feriado_no_cuenta(self):
+        nochebuena = self._local(2026, 12, 24, 17, 0)
+        self.assertEqual(self.calendario.sumar(nochebuena, 2 * 3600), self._local(2026, 12, 26, 9, 0))
+
+    def test_laborables_y_restar_son_inversas(self):
+        inicio = self._local(2026, 10, 14, 11, 30)
+        fin = self.calendario.sumar(inicio, 7 * 3600)
+        self.assertEqual(self.calendario.laborables(inicio, fin), 7 * 3600)
+        self.assertEqual(self.calendario.restar(fin, 7 * 3600), self._local(2026, 10, 14, 11, 30))
+        self.assertEqual(self.calendario.laborables(fin, inicio), 0)
+
+    def test_fuera_del_horizonte_amplia_el_indice(self):
+        lejos = self._local(2031, 3, 3, 17, 0)  # lunes
+        self.assertEqual(self.calendario.sumar(lejos, 2 * 3600), self._local(2031, 3, 4, 9, 0))
+        antiguo = self._local(2022, 1, 3, 8, 0)  # lunes
+        self.assertEqual(self.calendario.laborables(antiguo, antiguo + timedelta(days=1)), 8 * 3600)
+
+    def test_coincide_con_recorrer_minuto_a_minuto(self):
+        """Propiedad: sumar() == avanzar minuto a minuto contando solo los laborables"""
+        rnd = random.Random(17)
+        for _ in range(40):
+            inicio = self._local(2026, 12, 20) + timedelta(minutes=rnd.randrange(0, 12 * 24 * 60))
+            minutos = rnd.randrange(1, 30 * 60)
+
+            t, restantes = inicio, minutos
+            while restantes:
+                if self.calendario.es_laborable(t):
+                    restantes -= 1
+                t += timedelta(minutes=1)
+            # El último minuto contado termina en t, salvo que caiga justo al cerrar
+            esperado = t
+            while not self.calendario.es_laborable(esperado - timedelta(minutes=1)):
+                esperado -= timedelta(minutes=1)
+
+            self.assertEqual(self.calendario.sumar(inicio, minutos * 60), esperado, (inicio, minutos))
+
+    def test_24x7_son_horas_de_reloj(self):
+        inicio = self._local(2026, 10, 16, 20, 0)
+        self.assertEqual(CALENDARIO_24X7.sumar(inicio, 3600), inicio + timedelta(hours=1))
+
+
+class CalendarioLocalTest(TestCase):
+    """Resolución del calendario de un local: propio > provincia > por defecto > 24x7"""
+
+    def setUp(self):
+        cache.clear()
+
+    def _calendario(self, nombre, **kwargs):
+        calendario = CalendarioLaboral.objects.create(nombre=nombre, **kwargs)
+        HorarioLaboral.objects.create(calendario=calendario, dia_semana=0, hora_inicio=time(8), hora_fin=time(16))
+        return calendario
+
+    def test_sin_calendarios_es_24x7(self):
+        local = Local.objects.create(codigo="CAL1", nombre="Sin calendario", provincia="Santiago")
+        self.assertIs(calendario_para_local(local), CALENDARIO_24X7)
+
+    def test_prioridad_propio_provincia_defecto(self):
+        self._calendario("General", por_defecto=True)
+        self._calendario("Santiago", provincia="Santiago")
+        propio = self._calendario("Turno largo")
+
+        santiago = Local.objects.create(codigo="CAL2", nombre="S", provincia=" santiago ")
+        otro = Local.objects.create(codigo="CAL3", nombre="O", provincia="La Vega")
+        con_propio = Local.objects.create(codigo="CAL4", nombre="P", provincia="Santiago", calendario=propio)
+
+        self.assertEqual(calendario_para_local(santiago).nombre, "Santiago")
+        self.assertEqual(calendario_para_local(otro).nombre, "General")
+        self.assertEqual(calendario_para_local(con_propio).nombre, "Turno largo")
+
+    def test_cambios_invalidan_el_indice(self):
+        general = self._calendario("General", por_defecto=True)
+        local = Local.objects.create(codigo="CAL5", nombre="L")
+        lunes = datetime(2026, 10, 19, 15, 0, tzinfo=TZ)
+        self.assertEqual(calendario_para_local(local).sumar(lunes, 2 * 3600), datetime(2026, 10, 26, 9, 0, tzinfo=TZ))
+
+        DiaFeriado.objects.create(fecha=date(2026, 10, 26), descripcion="Feriado")
+        HorarioLaboral.objects.create(calendario=general, dia_semana=1, hora_inicio=time(8), hora_fin=time(16))
+        self.assertEqual(calendario_para_local(local).sumar(lunes, 2 * 3600), datetime(2026, 10, 20, 9, 0, tzinfo=TZ))
+
+    def test_cambio_en_otro_proceso_llega_al_caducar(self):
+        from unittest import mock
+
+        from apps.locales import calendario
+
+        general = self._calendario("General", por_defecto=True)
+        local = Local.objects.create(codigo="CAL7", nombre="L")
+        lunes = datetime(2026, 10, 19, 15, 0, tzinfo=TZ)
+        calendario._indice()
+
+        # Otro proceso cambia el horario: sin señales ni versión en esta caché
+        HorarioLaboral.objects.filter(calendario=general).update(dia_semana=1)
+        self.assertEqual(calendario_para_local(local).sumar(lunes, 2 * 3600), datetime(2026, 10, 26, 9, 0, tzinfo=TZ))
+
+        despues = calendario._memo["caduca"] + 1
+        with mock.patch("apps.locales.calendario.reloj.monotonic", return_value=despues):
+            self.assertEqual(
+                calendario_para_local(local).sumar(lunes, 2 * 3600), datetime(2026, 10, 20, 10, 0, tzinfo=TZ)
+            )
+
+    def test_aviso_si_la_cache_no_es_compartida(self):
+        from django.test import override_settings
+
+        from apps.locales.checks import calendarios_con_cache_local
+
+        locmem = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+        fichero = {"default": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": "/tmp"}}
+        with override_settings(CACHES=locmem):
+            self.assertEqual([aviso.id for aviso in calendarios_con_cache_local(None)], ["locales.W001"])
+        with override_settings(CACHES=fichero):
+            self.assertEqual(calendarios_con_cache_local(None), [])
+
+    def test_consultas_con_cache_caliente(self):
+        self._calendario("General", por_defecto=True)
+        local = Local.objects.create(codigo="CAL6", nombre="L")
+        calendario_para_local(local)
+        with self.assertNumQueries(0):
+            calendario_para_local(local)
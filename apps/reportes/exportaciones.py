@@ -0,0 +1,274 @@
+# apps/reportes/exportaciones.py
+"""
+Exportaciones en segundo plano (ExportJob).
+
+La vista llama a `solicitar_exportacion`: si ya hay un trabajo con los mismos
+parámetros (misma `clave`) y los datos no han cambiado desde entonces (misma
+`huella`), se reutiliza -en cola, en curso o ya generado-; si no, se encola
+uno nuevo. El comando `procesar_exportaciones` reclama los trabajos con un
+UPDATE condicional (como la bandeja de salida de envíos), los genera por
+bloques de BLOQUE tickets actualizando el progreso, y guarda el fichero en
+MEDIA_ROOT/exportaciones/.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from apps.tickets.filtros import VALORES_VER, filtrar_por_ver, filtros_lista
+from apps.tickets.models import ComentarioTicket, Ticket
+
+from .exportar import CAMPOS_TICKETS, COLUMNAS_TICKETS, escribir_xlsx, fila_ticket, lineas_csv
+from .models import ExportJob
+
+# Tickets por consulta (y por actualización del progreso)
+BLOQUE = 2000
+
+# Cuánto reserva un worker un trabajo sin dar señales antes de que otro lo retome
+RESERVA_SEGUNDOS = 600
+
+# Límite de caracteres de una celda de Excel
+MAX_CELDA = 32_000
+
+ESTADOS_REUTILIZABLES = ['PENDIENTE', 'PROCESANDO', 'LISTO']
+
+
+def _retencion():
+    return timedelta(days=getattr(settings, 'EXPORTACIONES_RETENCION_DIAS', 7))
+
+
+# =====================================================================
+# Parámetros, clave y huella
+# =====================================================================
+
+def parametros_tickets(params):
+    """Parámetros normalizados de una exportación de tickets (mismos filtros que la lista)."""
+    _, normalizados = filtros_lista(params)
+    ver = params.get('ver', 'abiertos')
+    normalizados['ver'] = ver if ver in VALORES_VER else 'abiertos'
+    normalizados['comentarios'] = str(params.get('comentarios', '')).lower() in ('1', 'true', 'on', 'si')
+    return normalizados
+
+
+def calcular_clave(tipo, formato, parametros):
+    crudo = json.dumps([tipo, formato, parametros], sort_keys=True)
+    return hashlib.sha256(crudo.encode()).hexdigest()
+
+
+def tickets_exportacion(parametros):
+    filtros, _ = filtros_lista(parametros)
+    return filtrar_por_ver(Ticket.objects.all(), parametros.get('ver', 'abiertos')).filter(**filtros)
+
+
+def huella_tickets(parametros):
+    """
+    Estado de los datos de la exportación: número de tickets y su última
+    modificación (QuerySet.update también la avanza), y lo mismo de los
+    comentarios si se incluyen. 1-2 agregados sobre índices.
+    """
+    qs = tickets_exportacion(parametros)
+    datos = qs.aggregate(n=Count('id'), ultima=Max('fecha_actualizacion'))
+    partes = [datos['n'], datos['ultima'] and datos['ultima'].isoformat()]
+    if parametros.get('comentarios'):
+        comentarios = ComentarioTicket.objects.filter(ticket__in=qs).aggregate(n=Count('id'), ultimo=Max('id'))
+        partes += [comentarios['n'], comentarios['ultimo']]
+    return hashlib.sha256(json.dumps(partes).encode()).hexdigest()
+
+
+HUELLAS = {
+    'TICKETS': huella_tickets,
+}
+
+
+def solicitar_exportacion(usuario, formato, parametros, tipo='TICKETS'):
+    """
+    Devuelve (trabajo, creado). Reutiliza un trabajo igual mientras los datos
+    no hayan cambiado; si no, encola uno nuevo.
+    """
+    clave = calcular_clave(tipo, formato, parametros)
+    huella = HUELLAS[tipo](parametros)
+    with transaction.atomic():
+        existente = (
+            ExportJob.objects
+            .filter(clave=clave, huella=huella, estado__in=ESTADOS_REUTILIZABLES)
+            .order_by('-id')
+            .first()
+        )
+        if existente is not None:
+            return existente, False
+        trabajo = ExportJob.objects.create(
+            tipo=tipo, formato=formato, parametros=parametros,
+            clave=clave, huella=huella, solicitado_por=usuario,
+        )
+    return trabajo, True
+
+
+# =====================================================================
+# Worker
+# =====================================================================
+
+def reclamar_exportacion(ahora=None):
+    """
+    Reserva el trabajo libre más antiguo para este worker (UPDATE condicional:
+    dos workers nunca toman el mismo). Recupera también los PROCESANDO cuya
+    reserva expiró (worker caído). Devuelve el trabajo o None.
+    """
+    ahora = ahora or timezone.now()
+    libres = dict(estado__in=['PENDIENTE', 'PROCESANDO'], reservado_hasta__lte=ahora)
+    for pk in ExportJob.objects.filter(**libres).order_by('id').values_list('id', flat=True)[:5]:
+        lote = uuid.uuid4().hex
+        reservados = ExportJob.objects.filter(pk=pk, **libres).update(
+            estado='PROCESANDO',
+            lote=lote,
+            progreso=0,
+            reservado_hasta=ahora + timedelta(seconds=RESERVA_SEGUNDOS),
+        )
+        if reservados:
+            return ExportJob.objects.get(pk=pk)
+    return None
+
+
+def _comentarios_por_ticket(ids):
+    """{ticket_id: texto} con los comentarios de los tickets `ids` (1 consulta)."""
+    textos = {}
+    filas = (
+        ComentarioTicket.objects
+        .filter(ticket_id__in=ids)
+        .order_by('ticket_id', 'fecha_creacion', 'id')
+        .values_list('ticket_id', 'fecha_creacion', 'usuario__username', 'comentario', 'es_interno')
+    )
+    for ticket_id, fecha, usuario, comentario, interno in filas:
+        marca = ' (interno)' if interno else ''
+        linea = f"{timezone.localtime(fecha):%d/%m/%Y %H:%M} {usuario}{marca}: {comentario}"
+        textos.setdefault(ticket_id, []).append(linea)
+    return {ticket_id: '\n'.join(lineas)[:MAX_CELDA] for ticket_id, lineas in textos.items()}
+
+
+def _filas_por_bloques(trabajo, qs, comentarios):
+    """
+    Filas de la exportación por bloques de BLOQUE tickets, en el mismo orden
+    (-fecha_creacion, -id) que la exportación directa y la lista, con el mismo
+    keyset que paginacion.consulta_keyset (sin OFFSET). Tras cada bloque se
+    guarda el progreso y se renueva la reserva.
+    """
+    convertir = fila_ticket()
+    i_fecha = 1 + CAMPOS_TICKETS.index('fecha_creacion')
+    ultimo = None
+    procesadas = 0
+    while True:
+        bloque = qs
+        if ultimo is not None:
+            fecha, pk = ultimo
+            bloque = (
+                bloque.filter(fecha_creacion__lte=fecha)
+                .filter(Q(fecha_creacion__lt=fecha) | Q(id__lt=pk))
+            )
+        bloque = bloque.order_by('-fecha_creacion', '-id')
+        valores = list(bloque.values_list('id', *CAMPOS_TICKETS)[:BLOQUE])
+        if not valores:
+            return
+
+        ids = [v[0] for v in valores]
+        textos = _comentarios_por_ticket(ids) if comentarios else None
+        for v in valores:
+            fila = convertir(v[1:])
+            if textos is not None:
+                fila.append(textos.get(v[0], ''))
+            yield fila
+
+        ultimo = (valores[-1][i_fecha], ids[-1])
+        procesadas += len(valores)
+        trabajo.progreso = procesadas
+        ExportJob.objects.filter(pk=trabajo.pk, lote=trabajo.lote).update(
+            progreso=procesadas,
+            reservado_hasta=timezone.now() + timedelta(seconds=RESERVA_SEGUNDOS),
+        )
+
+
+def generar_exportacion(trabajo):
+    """
+    Genera el fichero del trabajo (ya reservado) y lo marca LISTO. Si mientras
+    tanto otro worker lo retomó (reserva expirada) descarta el fichero y
+    devuelve None: el trabajo ya no es de este `lote`.
+    """
+    parametros = trabajo.parametros
+    comentarios = bool(parametros.get('comentarios'))
+    qs = tickets_exportacion(parametros)
+
+    total = qs.count()
+    ExportJob.objects.filter(pk=trabajo.pk, lote=trabajo.lote).update(total=total)
+
+    cabecera = [titulo for titulo, _ in COLUMNAS_TICKETS] + (['Comentarios'] if comentarios else [])
+    filas = _filas_por_bloques(trabajo, qs, comentarios)
+    nombre = f"tickets_{parametros.get('ver', 'abiertos')}_{timezone.localdate():%Y%m%d}_{trabajo.pk}.{trabajo.formato}"
+
+    with tempfile.TemporaryFile() as fichero:
+        if trabajo.formato == 'xlsx':
+            escribir_xlsx(fichero, [('tickets', cabecera, filas)])
+        else:
+            for linea in lineas_csv(cabecera, filas):
+                fichero.write(linea.encode('utf-8'))
+        fichero.seek(0)
+        trabajo.archivo.save(nombre, File(fichero), save=False)
+
+    fecha_fin = timezone.now()
+    actualizados = ExportJob.objects.filter(pk=trabajo.pk, lote=trabajo.lote, estado='PROCESANDO').update(
+        estado='LISTO',
+        archivo=trabajo.archivo.name,
+        progreso=trabajo.progreso,
+        total=trabajo.progreso,
+        fecha_fin=fecha_fin,
+        ultimo_error='',
+    )
+    if not actualizados:
+        print(f"[EXPORT] Exportación {trabajo.pk} retomada por otro worker: se descarta el fichero")
+        trabajo.archivo.delete(save=False)
+        return None
+    trabajo.estado = 'LISTO'
+    trabajo.fecha_fin = fecha_fin
+    return trabajo
+
+
+def procesar_exportacion(ahora=None):
+    """
+    Reclama y genera un trabajo. Devuelve el trabajo procesado (LISTO, ERROR, o
+    aún PROCESANDO si otro worker lo retomó mientras tanto) o None si no había.
+    """
+    trabajo = reclamar_exportacion(ahora)
+    if trabajo is None:
+        return None
+    try:
+        generar_exportacion(trabajo)
+    except Exception as e:
+        print(f"[EXPORT] Exportación {trabajo.pk} falló: {e}")
+        trabajo.estado = 'ERROR'
+        trabajo.ultimo_error = str(e)[:2000]
+        ExportJob.objects.filter(pk=trabajo.pk, lote=trabajo.lote, estado='PROCESANDO').update(
+            estado='ERROR', ultimo_error=trabajo.ultimo_error, fecha_fin=timezone.now(),
+        )
+    return trabajo
+
+
+def purgar_exportaciones(ahora=None):
+    """Borra los trabajos (y sus ficheros) más antiguos que EXPORTACIONES_RETENCION_DIAS."""
+    ahora = ahora or timezone.now()
+    viejos = ExportJob.objects.filter(fecha_creacion__lt=ahora - _retencion()).exclude(estado='PROCESANDO')
+    borrados = 0
+    for trabajo in viejos.iterator():
+        if trabajo.archivo:
+            trabajo.archivo.delete(save=False)
+        trabajo.delete()
+        borrados += 1
+    return borrados
+
+
+def nombre_descarga(trabajo):
+    return os.path.basename(trabajo.archivo.name) if trabajo.archivo else ''
@@ -0,0 +1,279 @@
+# apps/reportes/exportar.py
+"""
+Exportación de listados de tickets y tablas de reportes a CSV / XLSX / PDF.
+
+- CSV: StreamingHttpResponse; las filas salen de un generador (normalmente
+  un .iterator(chunk_size=...) de la BD) y se escriben a medida que el
+  cliente las lee. Memoria constante aunque sean 500k filas.
+- XLSX: openpyxl en modo write-only (cada hoja se vuelca a un fichero
+  temporal según se escribe) y el .xlsx final se sirve desde disco con
+  FileResponse, por bloques.
+- PDF: resumen de SLA con reportlab (tablas pequeñas: se genera en memoria).
+"""
+import csv
+import io
+import tempfile
+from datetime import date, datetime, timedelta
+
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+
+FORMATOS = ('csv', 'xlsx')
+
+# Filas que pide cada ida a la BD al exportar tickets
+CHUNK_SIZE = 2000
+
+TIPO_XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+class _Eco:
+    """Pseudo-fichero para csv.writer: devuelve la línea en vez de guardarla."""
+
+    def write(self, valor):
+        return valor
+
+
+def _texto(valor):
+    """Valor de celda para CSV: fechas en hora local, duraciones como 1d 2h 3m."""
+    if valor is None:
+        return ''
+    if isinstance(valor, datetime):
+        return timezone.localtime(valor).strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(valor, date):
+        return valor.isoformat()
+    if isinstance(valor, timedelta):
+        return _celda(valor)
+    return valor
+
+
+def _celda(valor):
+    """Valor de celda para XLSX (openpyxl no admite datetimes con zona horaria)."""
+    if isinstance(valor, datetime):
+        return timezone.localtime(valor).replace(tzinfo=None)
+    if isinstance(valor, timedelta):
+        total = int(valor.total_seconds())
+        dias, resto = divmod(max(total, 0), 86400)
+        horas, resto = divmod(resto, 3600)
+        return f"{dias}d {horas}h {resto // 60}m" if dias else f"{horas}h {resto // 60}m"
+    return valor
+
+
+def lineas_csv(cabecera, filas):
+    """Líneas CSV de `cabecera` + `filas` (iterable de secuencias), de una en una."""
+    escritor = csv.writer(_Eco())
+    # BOM: Excel abre el CSV como UTF-8 (tildes y ñ)
+    yield '\ufeff' + escritor.writerow(cabecera)
+    for fila in filas:
+        yield escritor.writerow([_texto(valor) for valor in fila])
+
+
+def respuesta_csv(nombre, cabecera, filas):
+    """StreamingHttpResponse con `cabecera` + `filas` (iterable de secuencias)."""
+    respuesta = StreamingHttpResponse(lineas_csv(cabecera, filas), content_type='text/csv; charset=utf-8')
+    respuesta['Content-Disposition'] = f'attachment; filename="{nombre}.csv"'
+    return respuesta
+
+
+def escribir_xlsx(fichero, hojas):
+    """
+    Escribe en `fichero` un .xlsx con una hoja por elemento de `hojas`:
+    [(titulo, cabecera, filas), ...]. Write-only: las filas no se acumulan en memoria.
+    """
+    from openpyxl import Workbook
+
+    libro = Workbook(write_only=True)
+    for titulo, cabecera, filas in hojas:
+        hoja = libro.create_sheet(title=titulo[:31])
+        hoja.append(list(cabecera))
+        for fila in filas:
+            hoja.append([_celda(valor) for valor in fila])
+    libro.save(fichero)
+
+
+def respuesta_xlsx(nombre, hojas):
+    """.xlsx generado en un temporal y servido por bloques."""
+    fichero = tempfile.TemporaryFile()
+    escribir_xlsx(fichero, hojas)
+    fichero.seek(0)
+    # FileResponse lee y envía por bloques, y cierra (borra) el temporal al terminar
+    return FileResponse(fichero, as_attachment=True, filename=f"{nombre}.xlsx", content_type=TIPO_XLSX)
+
+
+def exportar(formato, nombre, cabecera, filas):
+    """Una sola tabla en `formato` ('csv' o 'xlsx')."""
+    if formato == 'xlsx':
+        return respuesta_xlsx(nombre, [(nombre, cabecera, filas)])
+    return respuesta_csv(nombre, cabecera, filas)
+
+
+# =====================================================================
+# Tickets
+# =====================================================================
+
+COLUMNAS_TICKETS = (
+    ('Número', 'numero_ticket'),
+    ('Creado', 'fecha_creacion'),
+    ('Banca', 'local__codigo'),
+    ('Nombre banca', 'local__nombre'),
+    ('Categoría', 'categoria__nombre'),
+    ('Prioridad', 'prioridad'),
+    ('Estado', 'estado'),
+    ('Técnico', 'asignado_a__username'),
+    ('Límite SLA', 'fecha_limite_sla'),
+    ('Asignado', 'fecha_asignacion'),
+    ('Resuelto', 'fecha_resolucion'),
+    ('Cerrado', 'fecha_cierre'),
+    ('Título', 'titulo'),
+)
+
+
+CAMPOS_TICKETS = tuple(campo for _, campo in COLUMNAS_TICKETS)
+
+
+def fila_ticket():
+    """Función que pasa una tupla de values_list(*CAMPOS_TICKETS) a fila exportable."""
+    from apps.tickets.models import Ticket
+
+    prioridades = dict(Ticket.PRIORIDADES)
+    estados = dict(Ticket.ESTADOS)
+    i_prioridad = CAMPOS_TICKETS.index('prioridad')
+    i_estado = CAMPOS_TICKETS.index('estado')
+
+    def _fila(valores):
+        fila = list(valores)
+        fila[i_prioridad] = prioridades.get(fila[i_prioridad], fila[i_prioridad])
+        fila[i_estado] = estados.get(fila[i_estado], fila[i_estado])
+        return fila
+    return _fila
+
+
+def filas_tickets(qs, chunk_size=CHUNK_SIZE):
+    """
+    Filas de exportación de `qs` por bloques de `chunk_size` (values_list +
+    iterator: ni instancias de modelo ni caché del queryset).
+    """
+    convertir = fila_ticket()
+    filas = (
+        qs.order_by('-fecha_creacion', '-id')
+        .values_list(*CAMPOS_TICKETS)
+        .iterator(chunk_size=chunk_size)
+    )
+    for valores in filas:
+        yield convertir(valores)
+
+
+def exportar_tickets(formato, qs, nombre='tickets'):
+    return exportar(formato, nombre, [titulo for titulo, _ in COLUMNAS_TICKETS], filas_tickets(qs))
+
+
+# =====================================================================
+# Tablas de reportes (salen de ReportQuery: ya agregadas y pequeñas)
+# =====================================================================
+
+def tabla_sla_por_local(reporte):
+    cabecera = [
+        'Banca', 'Nombre', 'Cerrados', 'Cumplen SLA', '% SLA',
+        'Prom. respuesta', 'Prom. solución', 'Abiertos', 'Abiertos vencidos',
+    ]
+    filas = (
+        [
+            f['codigo'], f['nombre'], f['total'], f['on_time'], f['pct_on_time'],
+            f['avg_respuesta'], f['avg_solucion'], f['abiertos'], f['abiertos_vencidos'],
+        ]
+        for f in reporte.sla_por_local()
+    )
+    return cabecera, filas
+
+
+def tabla_reincidencias(reporte):
+    cabecera = ['Banca', 'Nombre', 'Categoría', 'Tickets']
+    filas = (
+        [r['local__codigo'], r['local__nombre'], r['categoria__nombre'], r['total']]
+        for r in reporte.reincidencias()
+    )
+    return cabecera, filas
+
+
+def tabla_tecnicos_top(reporte):
+    cabecera = ['Usuario', 'Nombre', 'Apellidos', 'Cerrados']
+    filas = (
+        [t['tecnico__username'], t['tecnico__first_name'], t['tecnico__last_name'], t['total_cerrados']]
+        for t in reporte.tecnicos_top()
+    )
+    return cabecera, filas
+
+
+TABLAS = {
+    'sla_por_local': tabla_sla_por_local,
+    'reincidencias': tabla_reincidencias,
+    'tecnicos_top': tabla_tecnicos_top,
+}
+
+
+def _sufijo(reporte):
+    hasta = reporte.hasta or timezone.localdate(reporte.ahora)
+    return f"{reporte.desde:%Y%m%d}-{hasta:%Y%m%d}"
+
+
+def exportar_reporte(formato, tabla, reporte):
+    """Una tabla del reporte, o todas ('todas', solo xlsx) como hojas de un mismo libro."""
+    sufijo = _sufijo(reporte)
+    if tabla == 'todas':
+        hojas = [(nombre, *TABLAS[nombre](reporte)) for nombre in TABLAS]
+        return respuesta_xlsx(f"reportes_{sufijo}", hojas)
+    cabecera, filas = TABLAS[tabla](reporte)
+    return exportar(formato, f"{tabla}_{sufijo}", cabecera, filas)
+
+
+def pdf_resumen_sla(reporte, titulo='Resumen de SLA'):
+    """PDF con los totales del período y la tabla de SLA por banca."""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import cm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    estilos = getSampleStyleSheet()
+    totales = reporte.totales()
+    buffer = io.BytesIO()
+    documento = SimpleDocTemplate(
+        buffer, pagesize=landscape(A4), title=titulo,
+        leftMargin=1.5 * cm, rightMargin=1.5 * cm, topMargin=1.5 * cm, bottomMargin=1.5 * cm,
+    )
+
+    resumen = [
+        ['Cerrados', 'Cumplen SLA', '% SLA', 'Prom. respuesta', 'Prom. solución', 'Abiertos', 'Abiertos vencidos'],
+        [
+            totales['cerrados'], totales['on_time'], f"{totales['pct_on_time']}%",
+            _celda(totales['avg_respuesta']) or '-', _celda(totales['avg_solucion']) or '-',
+            totales['abiertos'], totales['abiertos_vencidos'],
+        ],
+    ]
+    cabecera, filas = tabla_sla_por_local(reporte)
+    detalle = [cabecera] + [[_celda(valor) if valor is not None else '-' for valor in fila] for fila in filas]
+
+    estilo_tabla = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f5f5f4')),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('GRID', (0, 0), (-1, -1), 0.25, colors.HexColor('#d6d3d1')),
+        ('ALIGN', (2, 1), (-1, -1), 'RIGHT'),
+    ])
+    historias = [
+        Paragraph(titulo, estilos['Title']),
+        Paragraph(
+            f"Período: {reporte.desde:%d/%m/%Y} → {reporte.hasta or timezone.localdate():%d/%m/%Y} · "
+            f"generado {timezone.localtime():%d/%m/%Y %H:%M} · duraciones en horas laborables",
+            estilos['Normal'],
+        ),
+        Spacer(1, 0.5 * cm),
+        Table(resumen, style=estilo_tabla, hAlign='LEFT'),
+        Spacer(1, 0.5 * cm),
+        Paragraph('SLA por banca', estilos['Heading2']),
+        Table(detalle, style=estilo_tabla, repeatRows=1, hAlign='LEFT'),
+    ]
+    documento.build(historias)
+
+    respuesta = HttpResponse(buffer.getvalue(), content_type='application/pdf')
+    respuesta['Content-Disposition'] = f'attachment; filename="sla_{_sufijo(reporte)}.pdf"'
+    return respuesta
@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+from django import forms
+from django.utils import timezone
+
+from apps.locales.models import Local
+from apps.tickets.models import CategoriaAveria
+from apps.usuarios.models import Usuario
+
+# Ventana por defecto: “últimos 3 meses” -> 90 días
+DIAS_POR_DEFECTO = 90
+
+
+class FiltroReporteForm(forms.Form):
+    """
+    Filtros del dashboard de reportes (?desde&hasta&local&categoria&tecnico).
+    Todos son opcionales; sin fechas se usan los últimos 90 días.
+    """
+
+    desde = forms.DateField(required=False, widget=forms.DateInput(attrs={"type": "date"}))
+    hasta = forms.DateField(required=False, widget=forms.DateInput(attrs={"type": "date"}))
+    local = forms.ModelChoiceField(
+        queryset=Local.objects.order_by("codigo"), required=False, empty_label="Todas las bancas"
+    )
+    categoria = forms.ModelChoiceField(
+        queryset=CategoriaAveria.objects.order_by("nombre"), required=False, empty_label="Todas las categorías"
+    )
+    tecnico = forms.ModelChoiceField(
+        queryset=Usuario.objects.filter(rol="TECNICO").order_by("username"),
+        required=False,
+        empty_label="Todos los técnicos",
+    )
+
+    def clean(self):
+        datos = super().clean()
+        hoy = timezone.localdate()
+        hasta = datos.get("hasta") or hoy
+        desde = datos.get("desde") or hasta - timedelta(days=DIAS_POR_DEFECTO)
+        if desde > hasta:
+            raise forms.ValidationError("La fecha 'desde' no puede ser posterior a 'hasta'.")
+        datos["desde"], datos["hasta"] = desde, hasta
+        return datos
+
+    def filtros(self):
+        """
+        Parámetros normalizados para ReportQuery: fechas siempre presentes y
+        ids (o None). Si el formulario no es válido, la ventana por defecto.
+        """
+        if self.is_valid():
+            datos = self.cleaned_data
+        else:
+            hoy = timezone.localdate()
+            datos = {"desde": hoy - timedelta(days=DIAS_POR_DEFECTO), "hasta": hoy}
+        return {
+            "desde": datos["desde"],
+            "hasta": datos["hasta"],
+            "local_id": datos["local"].pk if datos.get("local") else None,
+            "categoria_id": datos["categoria"].pk if datos.get("categoria") else None,
+            "tecnico_id": datos["tecnico"].pk if datos.get("tecnico") else None,
+        }
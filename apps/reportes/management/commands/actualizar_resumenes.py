@@ -0,0 +1,51 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.reportes.resumenes import actualizar_resumenes, recalcular_dias
+
+
+class Command(BaseCommand):
+    help = (
+        "Actualiza los resúmenes diarios de reportes recalculando solo los días "
+        "con tickets modificados (programar cada pocos minutos)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--desde",
+            help="Reconstruir desde este día (YYYY-MM-DD), p. ej. tras borrar tickets.",
+        )
+        parser.add_argument(
+            "--hasta",
+            help="Último día a reconstruir (YYYY-MM-DD). Por defecto, hoy.",
+        )
+
+    def handle(self, *args, **options):
+        if options["desde"] or options["hasta"]:
+            try:
+                hasta = date.fromisoformat(options["hasta"]) if options["hasta"] else date.today()
+                desde = date.fromisoformat(options["desde"]) if options["desde"] else hasta
+            except ValueError as e:
+                raise CommandError(f"Fecha inválida: {e}")
+            if desde > hasta:
+                raise CommandError("--desde no puede ser posterior a --hasta.")
+
+            dias = [desde + timedelta(days=i) for i in range((hasta - desde).days + 1)]
+            filas = recalcular_dias(dias)
+            self.stdout.write(self.style.SUCCESS(
+                f"Reconstruidos {len(dias)} día(s) ({desde} → {hasta}): {filas} fila(s)."
+            ))
+            return
+
+        resultado = actualizar_resumenes()
+        if resultado is None:
+            self.stdout.write("Otro proceso está actualizando los resúmenes.")
+            return
+        dias, filas = resultado
+        if not dias:
+            self.stdout.write("Sin cambios desde la última actualización.")
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Recalculados {len(dias)} día(s) ({dias[0]} → {dias[-1]}): {filas} fila(s)."
+        ))
@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.reportes.exportaciones import procesar_exportacion, purgar_exportaciones
+
+
+class Command(BaseCommand):
+    help = "Genera las exportaciones en segundo plano (ExportJob) y purga las caducadas."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Vacía la cola una vez y termina (útil para cron / tareas programadas).",
+        )
+        parser.add_argument(
+            "--intervalo",
+            type=float,
+            default=2.0,
+            help="Segundos de espera cuando la cola está vacía.",
+        )
+
+    def handle(self, *args, **options):
+        once = options["once"]
+        intervalo = options["intervalo"]
+
+        borrados = purgar_exportaciones()
+        if borrados:
+            self.stdout.write(f"Exportaciones caducadas borradas: {borrados}.")
+
+        listos = errores = 0
+        try:
+            while True:
+                trabajo = procesar_exportacion()
+                if trabajo is not None:
+                    if trabajo.estado == "LISTO":
+                        listos += 1
+                        self.stdout.write(f"Exportación {trabajo.pk}: {trabajo.progreso} fila(s) -> {trabajo.archivo.name}")
+                    elif trabajo.estado == "ERROR":
+                        errores += 1
+                        self.stdout.write(self.style.ERROR(f"Exportación {trabajo.pk}: {trabajo.ultimo_error}"))
+                    else:
+                        self.stdout.write(f"Exportación {trabajo.pk}: retomada por otro worker.")
+                    continue
+
+                if once:
+                    break
+                time.sleep(intervalo)
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f"Exportaciones generadas: {listos}. Con error: {errores}."))
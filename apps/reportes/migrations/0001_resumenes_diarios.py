@@ -0,0 +1,53 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:44
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tickets', '0013_pausa_sla'),
+        ('locales', '0002_calendarios_laborales'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarcaResumen',
+            fields=[
+                ('nombre', models.CharField(max_length=50, primary_key=True, serialize=False, verbose_name='Nombre')),
+                ('procesado_hasta', models.DateTimeField(verbose_name='Procesado hasta')),
+            ],
+            options={
+                'verbose_name': 'Marca de resúmenes',
+                'verbose_name_plural': 'Marcas de resúmenes',
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField(verbose_name='Día')),
+                ('creados', models.PositiveIntegerField(default=0, verbose_name='Tickets creados')),
+                ('cerrados', models.PositiveIntegerField(default=0, help_text='Estado RESUELTO/CERRADO con fecha de resolución o cierre', verbose_name='Resueltos o cerrados')),
+                ('a_tiempo', models.PositiveIntegerField(default=0, verbose_name='Resueltos dentro del SLA')),
+                ('cerrados_definitivos', models.PositiveIntegerField(default=0, verbose_name='En estado CERRADO')),
+                ('segundos_solucion', models.FloatField(default=0, verbose_name='Suma de tiempos de solución (s)')),
+                ('con_respuesta', models.PositiveIntegerField(default=0, verbose_name='Resueltos con fecha de asignación')),
+                ('segundos_respuesta', models.FloatField(default=0, verbose_name='Suma de tiempos de respuesta (s)')),
+                ('categoria', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tickets.categoriaaveria', verbose_name='Categoría')),
+                ('local', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='locales.local', verbose_name='Local')),
+                ('tecnico', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Técnico asignado')),
+            ],
+            options={
+                'verbose_name': 'Resumen diario',
+                'verbose_name_plural': 'Resúmenes diarios',
+                'ordering': ['dia'],
+                'indexes': [models.Index(fields=['dia', 'local'], name='resumen_dia_local_idx')],
+            },
+        ),
+    ]
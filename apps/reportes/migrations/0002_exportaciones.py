@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:11
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('reportes', '0001_resumenes_diarios'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('TICKETS', 'Tickets')], default='TICKETS', max_length=20, verbose_name='Tipo')),
+                ('formato', models.CharField(choices=[('csv', 'CSV'), ('xlsx', 'Excel (XLSX)')], max_length=10, verbose_name='Formato')),
+                ('parametros', models.JSONField(blank=True, default=dict, verbose_name='Parámetros')),
+                ('clave', models.CharField(help_text='Hash de tipo + formato + parámetros normalizados.', max_length=64, verbose_name='Clave')),
+                ('huella', models.CharField(blank=True, help_text='Estado de los datos al solicitarla; si cambia, el fichero ya no se reutiliza.', max_length=64, verbose_name='Huella de los datos')),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('PROCESANDO', 'Procesando'), ('LISTO', 'Listo'), ('ERROR', 'Error')], default='PENDIENTE', max_length=20, verbose_name='Estado')),
+                ('progreso', models.PositiveIntegerField(default=0, verbose_name='Filas procesadas')),
+                ('total', models.PositiveIntegerField(blank=True, null=True, verbose_name='Filas totales')),
+                ('archivo', models.FileField(blank=True, upload_to='exportaciones/%Y/%m/', verbose_name='Archivo')),
+                ('reservado_hasta', models.DateTimeField(default=django.utils.timezone.now, help_text='Mientras está PROCESANDO, cuándo expira la reserva del worker.', verbose_name='Reservado hasta')),
+                ('lote', models.CharField(blank=True, max_length=32, verbose_name='Lote')),
+                ('ultimo_error', models.TextField(blank=True, verbose_name='Último error')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de finalización')),
+                ('solicitado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Solicitado por')),
+            ],
+            options={
+                'verbose_name': 'Exportación',
+                'verbose_name_plural': 'Exportaciones',
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['clave', 'estado'], name='export_clave_estado_idx'), models.Index(fields=['estado', 'reservado_hasta'], name='export_estado_reserva_idx')],
+            },
+        ),
+    ]
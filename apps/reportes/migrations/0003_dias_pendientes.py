@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:47
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reportes', '0002_exportaciones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiaPendienteResumen',
+            fields=[
+                ('dia', models.DateField(primary_key=True, serialize=False, verbose_name='Día')),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Marcado')),
+            ],
+            options={
+                'verbose_name': 'Día pendiente de resumen',
+                'verbose_name_plural': 'Días pendientes de resumen',
+            },
+        ),
+    ]
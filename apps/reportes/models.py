@@ -0,0 +1,275 @@
+"""
+Resúmenes materializados para el dashboard de reportes.
+
+Una fila por (día, local, categoría, técnico) con los contadores y sumas de
+duración de los tickets creados ese día. Los mantiene el comando
+`actualizar_resumenes`, que solo recalcula los días con tickets modificados.
+
+ExportJob: exportaciones grandes generadas en segundo plano (comando
+`procesar_exportaciones`) y guardadas en MEDIA_ROOT.
+"""
+from django.db import models
+from django.utils import timezone
+
+from apps.locales.models import Local
+from apps.tickets.models import CategoriaAveria
+from apps.usuarios.models import Usuario
+
+
+class ResumenDiario(models.Model):
+    """
+    Tickets creados un día (fecha local) para un local / categoría / técnico.
+    Las duraciones son segundos laborables (mismo calendario que el SLA).
+    """
+    dia = models.DateField(
+        verbose_name='Día'
+    )
+
+    local = models.ForeignKey(
+        Local,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Local'
+    )
+
+    categoria = models.ForeignKey(
+        CategoriaAveria,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Categoría'
+    )
+
+    tecnico = models.ForeignKey(
+        Usuario,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Técnico asignado'
+    )
+
+    creados = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Tickets creados'
+    )
+
+    cerrados = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Resueltos o cerrados',
+        help_text='Estado RESUELTO/CERRADO con fecha de resolución o cierre'
+    )
+
+    a_tiempo = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Resueltos dentro del SLA'
+    )
+
+    cerrados_definitivos = models.PositiveIntegerField(
+        default=0,
+        verbose_name='En estado CERRADO'
+    )
+
+    segundos_solucion = models.FloatField(
+        default=0,
+        verbose_name='Suma de tiempos de solución (s)'
+    )
+
+    con_respuesta = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Resueltos con fecha de asignación'
+    )
+
+    segundos_respuesta = models.FloatField(
+        default=0,
+        verbose_name='Suma de tiempos de respuesta (s)'
+    )
+
+    class Meta:
+        verbose_name = 'Resumen diario'
+        verbose_name_plural = 'Resúmenes diarios'
+        ordering = ['dia']
+        indexes = [
+            models.Index(fields=['dia', 'local'], name='resumen_dia_local_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.dia} {self.local_id}/{self.categoria_id}/{self.tecnico_id}: {self.creados}"
+
+
+class MarcaResumen(models.Model):
+    """Hasta qué `fecha_actualizacion` de Ticket están procesados los resúmenes."""
+    nombre = models.CharField(
+        max_length=50,
+        primary_key=True,
+        verbose_name='Nombre'
+    )
+
+    procesado_hasta = models.DateTimeField(
+        verbose_name='Procesado hasta'
+    )
+
+    class Meta:
+        verbose_name = 'Marca de resúmenes'
+        verbose_name_plural = 'Marcas de resúmenes'
+
+    def __str__(self):
+        return f"{self.nombre}: {self.procesado_hasta}"
+
+
+class DiaPendienteResumen(models.Model):
+    """
+    Día que hay que recalcular aunque ya no tenga tickets modificados: al
+    borrar un ticket no queda fila con `fecha_actualizacion` que lo delate.
+    """
+    dia = models.DateField(
+        primary_key=True,
+        verbose_name='Día'
+    )
+
+    fecha = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Marcado'
+    )
+
+    class Meta:
+        verbose_name = 'Día pendiente de resumen'
+        verbose_name_plural = 'Días pendientes de resumen'
+
+    def __str__(self):
+        return f"{self.dia} ({self.fecha})"
+
+
+class ExportJob(models.Model):
+    """
+    Exportación en segundo plano. La vista solo crea la fila (o reutiliza una
+    igual: misma `clave` y misma `huella` de los datos); el worker la genera
+    por bloques actualizando `progreso` y deja el fichero en `archivo`.
+    """
+    TIPOS = [
+        ('TICKETS', 'Tickets'),
+    ]
+
+    FORMATOS = [
+        ('csv', 'CSV'),
+        ('xlsx', 'Excel (XLSX)'),
+    ]
+
+    ESTADOS = [
+        ('PENDIENTE', 'Pendiente'),
+        ('PROCESANDO', 'Procesando'),
+        ('LISTO', 'Listo'),
+        ('ERROR', 'Error'),
+    ]
+
+    tipo = models.CharField(
+        max_length=20,
+        choices=TIPOS,
+        default='TICKETS',
+        verbose_name='Tipo'
+    )
+
+    formato = models.CharField(
+        max_length=10,
+        choices=FORMATOS,
+        verbose_name='Formato'
+    )
+
+    parametros = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name='Parámetros'
+    )
+
+    clave = models.CharField(
+        max_length=64,
+        verbose_name='Clave',
+        help_text='Hash de tipo + formato + parámetros normalizados.'
+    )
+
+    huella = models.CharField(
+        max_length=64,
+        blank=True,
+        verbose_name='Huella de los datos',
+        help_text='Estado de los datos al solicitarla; si cambia, el fichero ya no se reutiliza.'
+    )
+
+    estado = models.CharField(
+        max_length=20,
+        choices=ESTADOS,
+        default='PENDIENTE',
+        verbose_name='Estado'
+    )
+
+    progreso = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Filas procesadas'
+    )
+
+    total = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name='Filas totales'
+    )
+
+    archivo = models.FileField(
+        upload_to='exportaciones/%Y/%m/',
+        blank=True,
+        verbose_name='Archivo'
+    )
+
+    solicitado_por = models.ForeignKey(
+        Usuario,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Solicitado por'
+    )
+
+    reservado_hasta = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Reservado hasta',
+        help_text='Mientras está PROCESANDO, cuándo expira la reserva del worker.'
+    )
+
+    lote = models.CharField(
+        max_length=32,
+        blank=True,
+        verbose_name='Lote'
+    )
+
+    ultimo_error = models.TextField(
+        blank=True,
+        verbose_name='Último error'
+    )
+
+    fecha_creacion = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Fecha de creación'
+    )
+
+    fecha_fin = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Fecha de finalización'
+    )
+
+    class Meta:
+        verbose_name = 'Exportación'
+        verbose_name_plural = 'Exportaciones'
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['clave', 'estado'], name='export_clave_estado_idx'),
+            models.Index(fields=['estado', 'reservado_hasta'], name='export_estado_reserva_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.formato} ({self.get_estado_display()}) #{self.pk}"
+
+    @property
+    def porcentaje(self):
+        if self.estado == 'LISTO':
+            return 100
+        if not self.total:
+            return 0
+        return min(99, int(self.progreso * 100 / self.total))
@@ -0,0 +1,244 @@
+# apps/reportes/reporte.py
+"""
+Consulta reutilizable de métricas de reportes.
+
+ReportQuery hace una sola pasada agrupada por local sobre ResumenDiario y otra
+sobre los tickets abiertos; los totales globales (cerrados, % SLA, medias) se
+derivan en Python de esas filas en vez de lanzar un COUNT/aggregate por métrica.
+Los resultados se memorizan en la instancia: pedir varias veces la misma
+métrica no repite consultas.
+
+Lo histórico (todo lo que sale de ResumenDiario) se guarda además en la caché
+con clave = parámetros normalizados + versión de cada mes de la ventana.
+recalcular_dias() sube la versión de los meses que toca, así que solo se
+invalidan los reportes cuya ventana incluye días con tickets modificados.
+Los abiertos son estado actual y se cuentan siempre en vivo.
+"""
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from apps.tickets.models import Ticket
+
+from .models import ResumenDiario
+
+SUMAS = ('cerrados', 'a_tiempo', 'segundos_solucion', 'con_respuesta', 'segundos_respuesta')
+
+
+def _clave_mes(anio, mes):
+    return f"reportes:mes:{anio:04d}-{mes:02d}"
+
+
+def _meses(desde, hasta):
+    anio, mes = desde.year, desde.month
+    while (anio, mes) <= (hasta.year, hasta.month):
+        yield anio, mes
+        anio, mes = (anio + 1, 1) if mes == 12 else (anio, mes + 1)
+
+
+def invalidar_meses(dias):
+    """Deja obsoletos los reportes cacheados cuya ventana toca alguno de `dias`."""
+    claves = {_clave_mes(dia.year, dia.month) for dia in dias}
+    if claves:
+        cache.set_many(dict.fromkeys(claves, timezone.now().timestamp()), None)
+
+
+def _versiones(desde, hasta):
+    """Versión de cada mes de la ventana; los que no están se crean (nunca se reutiliza una versión)."""
+    claves = [_clave_mes(anio, mes) for anio, mes in _meses(desde, hasta)]
+    versiones = cache.get_many(claves)
+    faltan = [clave for clave in claves if clave not in versiones]
+    if faltan:
+        ahora = timezone.now().timestamp()
+        for clave in faltan:
+            cache.add(clave, ahora, None)
+        versiones.update(cache.get_many(faltan))
+    return [versiones.get(clave) for clave in claves]
+
+
+def media(segundos, n):
+    """Media como timedelta (None si no hay muestras)."""
+    return timedelta(seconds=segundos / n) if n else None
+
+
+def porcentaje(parte, total):
+    return round((parte / total) * 100, 1) if total else 0.0
+
+
+class ReportQuery:
+    """
+    Métricas de tickets creados entre `desde` y `hasta` (fechas locales,
+    ambas incluidas; `hasta` None = hasta hoy), opcionalmente de un solo
+    local / categoría / técnico. Los abiertos son siempre el estado actual
+    (con los mismos filtros), con vencidos respecto a `ahora`.
+    """
+
+    def __init__(self, desde, hasta=None, ahora=None, local_id=None, categoria_id=None, tecnico_id=None):
+        self.desde = desde
+        self.hasta = hasta
+        self.ahora = ahora or timezone.now()
+        self.local_id = local_id
+        self.categoria_id = categoria_id
+        self.tecnico_id = tecnico_id
+        self._por_local = None
+        self._abiertos = None
+        self._reincidencias = None
+        self._tecnicos_top = None
+
+    def _filtros(self, tecnico='tecnico_id'):
+        filtros = {}
+        if self.local_id:
+            filtros['local_id'] = self.local_id
+        if self.categoria_id:
+            filtros['categoria_id'] = self.categoria_id
+        if self.tecnico_id:
+            filtros[tecnico] = self.tecnico_id
+        return filtros
+
+    def resumenes(self):
+        qs = ResumenDiario.objects.filter(dia__gte=self.desde, **self._filtros())
+        if self.hasta is not None:
+            qs = qs.filter(dia__lte=self.hasta)
+        return qs
+
+    def abiertos(self):
+        return Ticket.objects.filter(estado__in=Ticket.ESTADOS_ABIERTOS, **self._filtros('asignado_a_id'))
+
+    # --- caché -------------------------------------------------------------
+
+    def clave_cache(self):
+        """Parámetros normalizados + versiones de los meses de la ventana."""
+        hasta = self.hasta or timezone.localdate(self.ahora)
+        parametros = (
+            self.desde.isoformat(), hasta.isoformat(),
+            self.local_id or 0, self.categoria_id or 0, self.tecnico_id or 0,
+        )
+        # Un año son 13 versiones: se resumen en un hash para no pasar el límite de clave de memcached
+        versiones = hashlib.md5(repr(_versiones(self.desde, hasta)).encode()).hexdigest()
+        return "reportes:" + ":".join(map(str, parametros + (versiones,)))
+
+    def cargar_cache(self):
+        """
+        Toma de la caché las filas históricas (por local, reincidencias y
+        técnicos) o las calcula y las guarda. Devuelve True si venían de la caché.
+        """
+        clave = self.clave_cache()
+        datos = cache.get(clave)
+        if datos is not None:
+            self._por_local, self._reincidencias, self._tecnicos_top = datos
+            return True
+        datos = (self.filas_por_local(), self.reincidencias(), self.tecnicos_top())
+        cache.set(clave, datos, getattr(settings, 'REPORTES_CACHE_TTL', 24 * 3600))
+        return False
+
+    # --- pasadas agrupadas (1 consulta cada una) ---------------------------
+
+    def filas_por_local(self):
+        """Sumas del período por local, incluidos los locales sin cerrados."""
+        if self._por_local is None:
+            self._por_local = list(
+                self.resumenes()
+                .values('local_id', 'local__codigo', 'local__nombre')
+                .annotate(
+                    creados=Sum('creados'),
+                    **{campo: Sum(campo) for campo in SUMAS},
+                )
+                .order_by()
+            )
+        return self._por_local
+
+    def abiertos_por_local(self):
+        """{local_id: {'abiertos': n, 'vencidos': n}}"""
+        if self._abiertos is None:
+            self._abiertos = {
+                row['local_id']: row
+                for row in (
+                    self.abiertos()
+                    .values('local_id')
+                    .annotate(
+                        abiertos=Count('id'),
+                        # EN_ESPERA: abierto, pero con el SLA en pausa no vence
+                        vencidos=Count('id', filter=Q(
+                            estado__in=Ticket.ESTADOS_SLA_ACTIVO, fecha_limite_sla__lt=self.ahora,
+                        )),
+                    )
+                    .order_by()
+                )
+            }
+        return self._abiertos
+
+    # --- métricas derivadas (sin consultas extra) --------------------------
+
+    def sla_por_local(self):
+        """Filas del período con al menos un cerrado, de más a menos cerrados."""
+        abiertos = self.abiertos_por_local()
+        filas = []
+        for row in self.filas_por_local():
+            total = row['cerrados'] or 0
+            if not total:
+                continue
+            ab = abiertos.get(row['local_id'], {})
+            filas.append({
+                'local_id': row['local_id'],
+                'codigo': row['local__codigo'],
+                'nombre': row['local__nombre'],
+                'total': total,
+                'on_time': row['a_tiempo'] or 0,
+                'pct_on_time': porcentaje(row['a_tiempo'] or 0, total),
+                # Duraciones en horas laborables (mismo calendario que el SLA)
+                'avg_solucion': media(row['segundos_solucion'] or 0, total),
+                'avg_respuesta': media(row['segundos_respuesta'] or 0, row['con_respuesta'] or 0),
+                'abiertos': ab.get('abiertos', 0),
+                'abiertos_vencidos': ab.get('vencidos', 0),
+            })
+        filas.sort(key=lambda f: (-f['total'], f['codigo']))
+        return filas
+
+    def totales(self):
+        """Totales globales del período, sumando las filas por local."""
+        sumas = dict.fromkeys(('creados',) + SUMAS, 0)
+        for row in self.filas_por_local():
+            for campo in sumas:
+                sumas[campo] += row[campo] or 0
+
+        abiertos = self.abiertos_por_local().values()
+        return {
+            'creados': sumas['creados'],
+            'cerrados': sumas['cerrados'],
+            'on_time': sumas['a_tiempo'],
+            'pct_on_time': porcentaje(sumas['a_tiempo'], sumas['cerrados']),
+            'avg_solucion': media(sumas['segundos_solucion'], sumas['cerrados']),
+            'avg_respuesta': media(sumas['segundos_respuesta'], sumas['con_respuesta']),
+            'abiertos': sum(row['abiertos'] for row in abiertos),
+            'abiertos_vencidos': sum(row['vencidos'] for row in abiertos),
+        }
+
+    # --- otras agrupaciones ------------------------------------------------
+
+    def reincidencias(self, minimo=2, limite=50):
+        """Pares local + categoría con `minimo` tickets o más en el período."""
+        if self._reincidencias is None:
+            self._reincidencias = list(
+                self.resumenes()
+                .values('local_id', 'local__codigo', 'local__nombre', 'categoria_id', 'categoria__nombre')
+                .annotate(total=Sum('creados'))
+                .filter(total__gte=minimo)
+                .order_by('-total', 'local__codigo', 'categoria__nombre')[:limite]
+            )
+        return self._reincidencias
+
+    def tecnicos_top(self, limite=10):
+        """Técnicos con más tickets cerrados en el período."""
+        if self._tecnicos_top is None:
+            self._tecnicos_top = list(
+                self.resumenes()
+                .filter(tecnico__rol='TECNICO', cerrados_definitivos__gt=0)
+                .values('tecnico__id', 'tecnico__first_name', 'tecnico__last_name', 'tecnico__username')
+                .annotate(total_cerrados=Sum('cerrados_definitivos'))
+                .order_by('-total_cerrados')[:limite]
+            )
+        return self._tecnicos_top
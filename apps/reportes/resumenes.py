@@ -0,0 +1,183 @@
+# apps/reportes/resumenes.py
+"""
+Mantenimiento incremental de ResumenDiario.
+
+Cada ticket cuenta en el día (fecha local) de su creación. Cuando un ticket
+cambia, su `fecha_actualizacion` avanza (también en QuerySet.update), así que
+los días "sucios" son los días de creación de los tickets modificados desde la
+última marca. Solo esos días se borran y se vuelven a agregar.
+
+Los tickets borrados no tienen fila que mirar: su señal post_delete deja el
+día en DiaPendienteResumen (`marcar_dia_borrado`).
+
+Quien actualiza reclama antes la marca con un UPDATE condicional, así dos
+procesos (cron y una petición) nunca recalculan a la vez. En las peticiones
+solo se actualiza si hay pocos días sucios (`resumenes_al_dia`); una
+reconstrucción grande es cosa del comando.
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from apps.locales.calendario import calendario_para
+from apps.tickets.filtros import ESTADOS_RESUELTOS
+from apps.tickets.models import Ticket
+
+from .models import DiaPendienteResumen, MarcaResumen, ResumenDiario
+from .reporte import invalidar_meses
+
+MARCA = 'resumen_diario'
+
+# Solape con la marca anterior: transacciones que confirman con un auto_now anterior
+MARGEN = timedelta(minutes=5)
+
+
+def _inicio_dia(dia):
+    return datetime.combine(dia, time(0), tzinfo=timezone.get_current_timezone())
+
+
+def _rangos_consecutivos(dias):
+    """[d1, d2, d3, d7] -> [(d1, d3), (d7, d7)]"""
+    rangos = []
+    for dia in sorted(set(dias)):
+        if rangos and dia == rangos[-1][1] + timedelta(days=1):
+            rangos[-1][1] = dia
+        else:
+            rangos.append([dia, dia])
+    return [tuple(r) for r in rangos]
+
+
+def dias_modificados(desde):
+    """Días de creación de los tickets modificados desde `desde`."""
+    fechas = (
+        Ticket.objects
+        .filter(fecha_actualizacion__gte=desde)
+        .order_by()
+        .values_list('fecha_creacion', flat=True)
+    )
+    return {timezone.localdate(fecha) for fecha in fechas.iterator()}
+
+
+def marcar_dia_borrado(fecha_creacion):
+    """Deja sucio el día de un ticket borrado (se llama desde su post_delete)."""
+    DiaPendienteResumen.objects.update_or_create(
+        dia=timezone.localdate(fecha_creacion), defaults={'fecha': timezone.now()},
+    )
+
+
+def _agregar(filas):
+    """Agrupa las filas de tickets por (día, local, categoría, técnico)."""
+    grupos = {}
+    for (creado, local_id, categoria_id, tecnico_id, calendario_id, provincia,
+         estado, asignado, resuelto, cerrado, limite) in filas:
+        clave = (timezone.localdate(creado), local_id, categoria_id, tecnico_id)
+        grupo = grupos.get(clave)
+        if grupo is None:
+            grupo = grupos[clave] = ResumenDiario(
+                dia=clave[0], local_id=local_id, categoria_id=categoria_id, tecnico_id=tecnico_id,
+            )
+        grupo.creados += 1
+        if estado == 'CERRADO':
+            grupo.cerrados_definitivos += 1
+
+        # Mismo criterio que ?ver=resueltos en la lista (drill-down)
+        fin = resuelto or cerrado
+        if estado in ESTADOS_RESUELTOS and fin:
+            calendario = calendario_para(calendario_id, provincia)
+            grupo.cerrados += 1
+            grupo.a_tiempo += fin <= limite
+            grupo.segundos_solucion += calendario.laborables(creado, fin)
+            if asignado:
+                grupo.con_respuesta += 1
+                grupo.segundos_respuesta += calendario.laborables(creado, asignado)
+    return list(grupos.values())
+
+
+def recalcular_dias(dias):
+    """
+    Rehace los resúmenes de `dias`: por cada tramo de días consecutivos, un
+    SELECT de sus tickets, un DELETE y un INSERT en bloque. Devuelve las filas escritas.
+    """
+    escritas = 0
+    for primero, ultimo in _rangos_consecutivos(dias):
+        inicio, fin = _inicio_dia(primero), _inicio_dia(ultimo + timedelta(days=1))
+        filas = (
+            Ticket.objects
+            .filter(fecha_creacion__gte=inicio, fecha_creacion__lt=fin)
+            .order_by()
+            .values_list(
+                'fecha_creacion', 'local_id', 'categoria_id', 'asignado_a_id',
+                'local__calendario_id', 'local__provincia',
+                'estado', 'fecha_asignacion', 'fecha_resolucion', 'fecha_cierre', 'fecha_limite_sla',
+            )
+        )
+        resumenes = _agregar(filas.iterator())
+        with transaction.atomic():
+            ResumenDiario.objects.filter(dia__gte=primero, dia__lte=ultimo).delete()
+            ResumenDiario.objects.bulk_create(resumenes, batch_size=1000)
+        escritas += len(resumenes)
+    # Ahora, y otra vez al confirmar: una lectura entre medias cachearía lo anterior
+    invalidar_meses(dias)
+    transaction.on_commit(lambda: invalidar_meses(dias))
+    return escritas
+
+
+def _reclamar(marca, ahora):
+    """Avanza la marca solo si sigue en `marca`: si otro proceso se adelantó, False."""
+    if marca is None:
+        return MarcaResumen.objects.get_or_create(nombre=MARCA, defaults={'procesado_hasta': ahora})[1]
+    return bool(
+        MarcaResumen.objects.filter(nombre=MARCA, procesado_hasta=marca).update(procesado_hasta=ahora)
+    )
+
+
+def actualizar_resumenes(ahora=None, max_dias=None):
+    """
+    Recalcula los días con tickets modificados o borrados desde la última
+    ejecución (la primera vez, todos). Devuelve (dias_recalculados,
+    filas_escritas), o None sin hacer nada si hay más de `max_dias` días
+    sucios o si otro proceso ya está actualizando.
+    """
+    ahora = ahora or timezone.now()
+    marca = MarcaResumen.objects.filter(nombre=MARCA).values_list('procesado_hasta', flat=True).first()
+    if marca is None:
+        primero = Ticket.objects.order_by('fecha_creacion').values_list('fecha_creacion', flat=True).first()
+        dias = set()
+        if primero:
+            dia, hoy = timezone.localdate(primero), timezone.localdate(ahora)
+            while dia <= hoy:
+                dias.add(dia)
+                dia += timedelta(days=1)
+    else:
+        dias = dias_modificados(marca - MARGEN)
+    dias |= set(DiaPendienteResumen.objects.filter(fecha__lte=ahora).values_list('dia', flat=True))
+
+    if max_dias is not None and len(dias) > max_dias:
+        return None
+    # La marca se reclama dentro de la transacción: si el recálculo falla, no avanza
+    with transaction.atomic():
+        if not _reclamar(marca, ahora):
+            return None
+        escritas = recalcular_dias(dias)
+        DiaPendienteResumen.objects.filter(dia__in=dias, fecha__lte=ahora).delete()
+    return sorted(dias), escritas
+
+
+def resumenes_al_dia(max_edad=None, max_dias=None):
+    """
+    Marca de los resúmenes (None si aún no se han generado). Si tiene más de
+    `max_edad` segundos (REPORTES_RESUMEN_MAX_EDAD) se actualizan en la propia
+    petición, pero solo con hasta `max_dias` días sucios
+    (REPORTES_RESUMEN_MAX_DIAS) y si ningún otro proceso lo está haciendo ya;
+    si no, se sirve lo que hay y el trabajo queda para el comando (cron).
+    """
+    max_edad = getattr(settings, 'REPORTES_RESUMEN_MAX_EDAD', 300) if max_edad is None else max_edad
+    max_dias = getattr(settings, 'REPORTES_RESUMEN_MAX_DIAS', 31) if max_dias is None else max_dias
+    ahora = timezone.now()
+    marca = MarcaResumen.objects.filter(nombre=MARCA).values_list('procesado_hasta', flat=True).first()
+    if marca is None or (ahora - marca).total_seconds() > max_edad:
+        if actualizar_resumenes(ahora, max_dias=max_dias) is not None:
+            return ahora
+    return marca
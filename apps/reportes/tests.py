@@ -0,0 +1,674 @@
+"""
+Tests de los resúmenes diarios de reportes
+"""
+import random
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.locales.models import Local
+from apps.reportes.models import ResumenDiario
+from apps.reportes.reporte import ReportQuery, invalidar_meses
+from apps.reportes.resumenes import actualizar_resumenes
+from apps.tickets.models import CategoriaAveria, Ticket
+
+User = get_user_model()
+
+
+class ResumenDiarioTest(TestCase):
+    """ResumenDiario reproduce lo que calcula la consulta directa sobre Ticket"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username="jefe_rep", rol="ADMIN")
+        cls.tecnicos = [User.objects.create(username=f"tec_rep{i}", rol="TECNICO") for i in range(2)]
+        cls.locales = [Local.objects.create(codigo=f"REP{i}", nombre=f"Banca {i}") for i in range(3)]
+        cls.categorias = [CategoriaAveria.objects.create(nombre=f"Rep {i}", tiempo_sla_horas=4) for i in range(2)]
+
+        rnd = random.Random(7)
+        ahora = timezone.now()
+        for i in range(60):
+            ticket = Ticket.objects.create(
+                local=rnd.choice(cls.locales), categoria=rnd.choice(cls.categorias),
+                titulo="R", descripcion="R", creado_por=cls.admin,
+            )
+            creado = ahora - timedelta(days=rnd.randrange(0, 30), hours=rnd.randrange(0, 24))
+            estado = rnd.choice(["PENDIENTE", "EN_PROCESO", "RESUELTO", "CERRADO", "CANCELADO"])
+            asignado = rnd.choice([None] + cls.tecnicos)
+            cambios = dict(
+                fecha_creacion=creado,
+                fecha_limite_sla=creado + timedelta(hours=4),
+                estado=estado,
+                asignado_a=asignado,
+                fecha_asignacion=creado + timedelta(minutes=rnd.randrange(5, 120)) if asignado else None,
+            )
+            if estado in ("RESUELTO", "CERRADO"):
+                cambios["fecha_resolucion"] = creado + timedelta(hours=rnd.choice([1, 3, 6, 30]))
+            Ticket.objects.filter(pk=ticket.pk).update(**cambios)
+
+    def _esperado(self):
+        """Cálculo directo (horas de reloj: sin calendarios configurados es 24x7)."""
+        total = a_tiempo = 0
+        solucion = 0.0
+        for t in Ticket.objects.filter(estado__in=["RESUELTO", "CERRADO"]):
+            fin = t.fecha_resolucion or t.fecha_cierre
+            if fin:
+                total += 1
+                a_tiempo += fin <= t.fecha_limite_sla
+                solucion += (fin - t.fecha_creacion).total_seconds()
+        return total, a_tiempo, solucion
+
+    def _resumen(self):
+        from django.db.models import Sum
+
+        r = ResumenDiario.objects.aggregate(
+            creados=Sum("creados"), cerrados=Sum("cerrados"), a_tiempo=Sum("a_tiempo"), s=Sum("segundos_solucion")
+        )
+        return r["creados"], r["cerrados"], r["a_tiempo"], r["s"]
+
+    def test_primera_ejecucion_reconstruye_todo(self):
+        dias, filas = actualizar_resumenes()
+        self.assertGreater(filas, 0)
+        creados, cerrados, a_tiempo, segundos = self._resumen()
+        total, esperado_a_tiempo, esperado_segundos = self._esperado()
+        self.assertEqual(creados, Ticket.objects.count())
+        self.assertEqual(cerrados, total)
+        self.assertEqual(a_tiempo, esperado_a_tiempo)
+        self.assertAlmostEqual(segundos, esperado_segundos, places=3)
+
+    def _procesar_todo(self):
+        """Primera pasada, y los tickets sembrados quedan fuera del margen de la marca."""
+        actualizar_resumenes()
+        Ticket.objects.update(fecha_actualizacion=timezone.now() - timedelta(hours=1))
+
+    def test_incremental_solo_dias_modificados(self):
+        self._procesar_todo()
+        self.assertEqual(actualizar_resumenes()[0], [])
+
+        ticket = Ticket.objects.filter(estado="PENDIENTE").first()
+        ticket.estado = "RESUELTO"
+        ticket.fecha_resolucion = ticket.fecha_creacion + timedelta(hours=1)
+        ticket.save()
+
+        dias, _ = actualizar_resumenes()
+        self.assertEqual(dias, [timezone.localdate(ticket.fecha_creacion)])
+        creados, cerrados, a_tiempo, _ = self._resumen()
+        total, esperado_a_tiempo, _ = self._esperado()
+        self.assertEqual((cerrados, a_tiempo), (total, esperado_a_tiempo))
+
+    def test_update_en_bloque_tambien_marca_el_dia(self):
+        self._procesar_todo()
+        ticket = Ticket.objects.filter(estado="EN_PROCESO").first()
+        Ticket.objects.filter(pk=ticket.pk).update(estado="CERRADO", fecha_cierre=ticket.fecha_creacion)
+
+        dias, _ = actualizar_resumenes()
+        self.assertEqual(dias, [timezone.localdate(ticket.fecha_creacion)])
+
+    def test_comando_reconstruye_rango_tras_borrar(self):
+        actualizar_resumenes()
+        ticket = Ticket.objects.first()
+        dia = timezone.localdate(ticket.fecha_creacion)
+        ticket.delete()
+
+        out = StringIO()
+        call_command("actualizar_resumenes", desde=str(dia), hasta=str(dia), stdout=out)
+        self.assertIn("Reconstruidos 1 día(s)", out.getvalue())
+        self.assertEqual(self._resumen()[0], Ticket.objects.count())
+
+    def test_borrar_ticket_marca_su_dia(self):
+        from apps.reportes.models import DiaPendienteResumen
+
+        self._procesar_todo()
+        ticket = Ticket.objects.first()
+        ticket.delete()
+
+        dias, _ = actualizar_resumenes()
+        self.assertEqual(dias, [timezone.localdate(ticket.fecha_creacion)])
+        self.assertEqual(self._resumen()[0], Ticket.objects.count())
+        self.assertFalse(DiaPendienteResumen.objects.exists())
+
+    def test_peticion_no_reconstruye_muchos_dias(self):
+        """resumenes_al_dia deja al comando una reconstrucción de más de max_dias"""
+        from apps.reportes.models import MarcaResumen
+        from apps.reportes.resumenes import resumenes_al_dia
+
+        self.assertIsNone(resumenes_al_dia(max_dias=5))
+        self.assertFalse(ResumenDiario.objects.exists())
+        self.assertFalse(MarcaResumen.objects.exists())
+
+        self.assertIsNotNone(resumenes_al_dia(max_dias=31))
+        self.assertEqual(self._resumen()[0], Ticket.objects.count())
+
+    def test_marca_reclamada_por_otro_proceso(self):
+        """Si otro proceso avanzó la marca, no se recalcula dos veces"""
+        from unittest import mock
+        from apps.reportes import resumenes
+        from apps.reportes.models import MarcaResumen
+
+        self._procesar_todo()
+        vieja = MarcaResumen.objects.get().procesado_hasta
+        ticket = Ticket.objects.first()
+        ticket.save()
+
+        self.assertTrue(resumenes._reclamar(vieja, vieja + timedelta(seconds=1)))
+        self.assertFalse(resumenes._reclamar(vieja, vieja + timedelta(seconds=2)))
+
+        with mock.patch.object(resumenes, "_reclamar", return_value=False), \
+                mock.patch.object(resumenes, "recalcular_dias") as recalcular:
+            self.assertIsNone(actualizar_resumenes())
+        recalcular.assert_not_called()
+
+
+class ReportQueryTest(TestCase):
+    """Los totales derivados de las filas por local coinciden con las consultas por métrica"""
+
+    @classmethod
+    def setUpTestData(cls):
+        admin = User.objects.create(username="jefe_rq", rol="ADMIN")
+        locales = [Local.objects.create(codigo=f"RQ{i}", nombre=f"Banca {i}") for i in range(4)]
+        categorias = [CategoriaAveria.objects.create(nombre=f"RQ {i}", tiempo_sla_horas=4) for i in range(2)]
+
+        rnd = random.Random(19)
+        ahora = timezone.now()
+        for _ in range(80):
+            ticket = Ticket.objects.create(
+                local=rnd.choice(locales), categoria=rnd.choice(categorias),
+                titulo="Q", descripcion="Q", creado_por=admin,
+            )
+            creado = ahora - timedelta(days=rnd.randrange(0, 120), hours=rnd.randrange(0, 24))
+            estado = rnd.choice(["PENDIENTE", "EN_PROCESO", "RESUELTO", "CERRADO", "CANCELADO"])
+            cambios = dict(
+                fecha_creacion=creado,
+                fecha_limite_sla=creado + timedelta(hours=4),
+                estado=estado,
+                fecha_asignacion=creado + timedelta(minutes=rnd.randrange(5, 120)) if rnd.random() < 0.7 else None,
+            )
+            if estado in ("RESUELTO", "CERRADO"):
+                cambios["fecha_resolucion"] = creado + timedelta(hours=rnd.choice([1, 3, 6, 30]))
+            Ticket.objects.filter(pk=ticket.pk).update(**cambios)
+        actualizar_resumenes()
+        cls.desde = timezone.localdate() - timedelta(days=90)
+
+    def _por_metrica(self, ahora):
+        """Lo que hacía el dashboard: un aggregate/COUNT por métrica."""
+        from django.db.models import Sum
+
+        resumenes = ResumenDiario.objects.filter(dia__gte=self.desde)
+        abiertos = Ticket.objects.filter(estado__in=["PENDIENTE", "EN_PROCESO"])
+        return {
+            "cerrados": resumenes.aggregate(n=Sum("cerrados"))["n"],
+            "on_time": resumenes.aggregate(n=Sum("a_tiempo"))["n"],
+            "segundos_solucion": resumenes.aggregate(n=Sum("segundos_solucion"))["n"],
+            "segundos_respuesta": resumenes.aggregate(n=Sum("segundos_respuesta"))["n"],
+            "con_respuesta": resumenes.aggregate(n=Sum("con_respuesta"))["n"],
+            "abiertos": abiertos.count(),
+            "abiertos_vencidos": abiertos.filter(fecha_limite_sla__lt=ahora).count(),
+        }
+
+    def test_totales_identicos_con_menos_consultas(self):
+        ahora = timezone.now()
+        with self.assertNumQueries(7):
+            esperado = self._por_metrica(ahora)
+
+        reporte = ReportQuery(self.desde, ahora=ahora)
+        with self.assertNumQueries(2):
+            totales = reporte.totales()
+            filas = reporte.sla_por_local()
+
+        self.assertGreater(esperado["cerrados"], 0)
+        for clave in ("cerrados", "on_time", "abiertos", "abiertos_vencidos"):
+            self.assertEqual(totales[clave], esperado[clave], clave)
+        self.assertAlmostEqual(
+            totales["avg_solucion"].total_seconds(),
+            esperado["segundos_solucion"] / esperado["cerrados"], places=3,
+        )
+        self.assertAlmostEqual(
+            totales["avg_respuesta"].total_seconds(),
+            esperado["segundos_respuesta"] / esperado["con_respuesta"], places=3,
+        )
+        self.assertEqual(sum(f["total"] for f in filas), esperado["cerrados"])
+
+    def test_filas_por_local_coinciden_con_agrupacion_directa(self):
+        from django.db.models import Sum
+
+        directo = {
+            row["local_id"]: (row["total"], row["on_time"])
+            for row in (
+                ResumenDiario.objects.filter(dia__gte=self.desde)
+                .values("local_id")
+                .annotate(total=Sum("cerrados"), on_time=Sum("a_tiempo"))
+                .filter(total__gt=0)
+            )
+        }
+        filas = ReportQuery(self.desde).sla_por_local()
+        self.assertEqual({f["local_id"]: (f["total"], f["on_time"]) for f in filas}, directo)
+        self.assertEqual([f["total"] for f in filas], sorted((f["total"] for f in filas), reverse=True))
+
+    def test_hasta_limita_el_periodo(self):
+        hoy = timezone.localdate()
+        todo = ReportQuery(self.desde).totales()["creados"]
+        partes = (
+            ReportQuery(self.desde, hoy - timedelta(days=30)).totales()["creados"]
+            + ReportQuery(hoy - timedelta(days=29), hoy).totales()["creados"]
+        )
+        self.assertEqual(partes, todo)
+
+
+class ReportQueryFiltrosCacheTest(TestCase):
+    """Filtros de ReportQuery y caché invalidada por los meses de la ventana"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username="jefe_rf", rol="ADMIN")
+        cls.tecnico = User.objects.create(username="tec_rf", rol="TECNICO")
+        cls.locales = [Local.objects.create(codigo=f"RF{i}", nombre=f"Banca {i}") for i in range(2)]
+        cls.categorias = [CategoriaAveria.objects.create(nombre=f"RF {i}", tiempo_sla_horas=4) for i in range(2)]
+        ahora = timezone.now()
+        for i in range(12):
+            ticket = Ticket.objects.create(
+                local=cls.locales[i % 2], categoria=cls.categorias[i % 3 == 0],
+                titulo="F", descripcion="F", creado_por=cls.admin,
+            )
+            creado = ahora - timedelta(days=i)
+            Ticket.objects.filter(pk=ticket.pk).update(
+                fecha_creacion=creado, fecha_limite_sla=creado + timedelta(hours=4),
+                estado="CERRADO", fecha_resolucion=creado + timedelta(hours=1),
+                asignado_a=cls.tecnico if i < 4 else None,
+            )
+
+    def setUp(self):
+        cache.clear()
+        actualizar_resumenes()
+        self.hoy = timezone.localdate()
+        self.desde = self.hoy - timedelta(days=30)
+
+    def test_filtros(self):
+        todo = ReportQuery(self.desde).totales()["cerrados"]
+        por_local = sum(ReportQuery(self.desde, local_id=local.pk).totales()["cerrados"] for local in self.locales)
+        por_categoria = sum(
+            ReportQuery(self.desde, categoria_id=categoria.pk).totales()["cerrados"] for categoria in self.categorias
+        )
+        self.assertEqual((todo, por_local, por_categoria), (12, 12, 12))
+        self.assertEqual(ReportQuery(self.desde, tecnico_id=self.tecnico.pk).totales()["cerrados"], 4)
+        self.assertEqual(ReportQuery(self.hoy - timedelta(days=2), self.hoy).totales()["cerrados"], 3)
+
+    def test_cache_por_parametros(self):
+        self.assertFalse(ReportQuery(self.desde, self.hoy).cargar_cache())
+
+        reporte = ReportQuery(self.desde, self.hoy)
+        with self.assertNumQueries(0):
+            self.assertTrue(reporte.cargar_cache())
+            filas = reporte.filas_por_local()
+        self.assertEqual(sum(f["cerrados"] for f in filas), 12)
+
+        # Otros parámetros, otra entrada
+        self.assertFalse(ReportQuery(self.desde, self.hoy, local_id=self.locales[0].pk).cargar_cache())
+
+    def test_invalidacion_solo_de_los_meses_de_la_ventana(self):
+        desde = self.hoy - timedelta(days=10)
+        ReportQuery(desde, self.hoy).cargar_cache()
+
+        invalidar_meses([desde - timedelta(days=400)])
+        self.assertTrue(ReportQuery(desde, self.hoy).cargar_cache())
+
+        invalidar_meses([self.hoy - timedelta(days=5)])
+        self.assertFalse(ReportQuery(desde, self.hoy).cargar_cache())
+
+    def test_ticket_modificado_en_la_ventana_invalida(self):
+        ReportQuery(self.desde, self.hoy).cargar_cache()
+        ticket = Ticket.objects.order_by("-fecha_creacion").first()
+        Ticket.objects.filter(pk=ticket.pk).update(estado="EN_PROCESO", fecha_resolucion=None)
+        actualizar_resumenes()
+
+        reporte = ReportQuery(self.desde, self.hoy)
+        self.assertFalse(reporte.cargar_cache())
+        self.assertEqual(reporte.totales()["cerrados"], 11)
+
+
+class ReportesDashboardTest(TestCase):
+    """El dashboard lee de los resúmenes"""
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(username="jefe_dash", password="x", rol="ADMIN")
+        tecnico = User.objects.create(username="tec_dash", rol="TECNICO", first_name="Ana")
+        local = Local.objects.create(codigo="DSH1", nombre="Banca Dash")
+        categoria = CategoriaAveria.objects.create(nombre="Dash", tiempo_sla_horas=4)
+        ahora = timezone.now()
+        for horas, estado in [(1, "CERRADO"), (2, "RESUELTO"), (8, "CERRADO"), (None, "PENDIENTE")]:
+            ticket = Ticket.objects.create(
+                local=local, categoria=categoria, titulo="D", descripcion="D", creado_por=self.admin
+            )
+            creado = ahora - timedelta(days=3)
+            Ticket.objects.filter(pk=ticket.pk).update(
+                fecha_creacion=creado,
+                fecha_limite_sla=creado + timedelta(hours=4),
+                estado=estado,
+                asignado_a=tecnico,
+                fecha_asignacion=creado + timedelta(minutes=30),
+                fecha_resolucion=creado + timedelta(hours=horas) if horas else None,
+            )
+        self.client.force_login(self.admin)
+
+    def test_metricas(self):
+        respuesta = self.client.get(reverse("reportes_dashboard"))
+        self.assertEqual(respuesta.status_code, 200)
+        ctx = respuesta.context
+        self.assertEqual(ctx["total_cerrados"], 3)
+        self.assertEqual(ctx["pct_on_time"], 66.7)
+        self.assertEqual(ctx["avg_solucion_global"], "3h 40m")
+        self.assertEqual(ctx["avg_respuesta_global"], "30m")
+        fila = ctx["sla_por_local"][0]
+        self.assertEqual((fila["codigo"], fila["total"], fila["on_time"], fila["abiertos"]), ("DSH1", 3, 2, 1))
+        self.assertEqual(list(ctx["reincidencias"])[0]["total"], 4)
+        self.assertEqual(list(ctx["tecnicos_top"])[0]["total_cerrados"], 2)
+
+    def test_filtros_en_la_url(self):
+        hoy = timezone.localdate()
+        url = reverse("reportes_dashboard")
+        respuesta = self.client.get(url, {"desde": str(hoy - timedelta(days=1)), "hasta": str(hoy)})
+        self.assertEqual(respuesta.context["total_cerrados"], 0)
+
+        respuesta = self.client.get(url, {"desde": str(hoy), "hasta": str(hoy - timedelta(days=5))})
+        self.assertTrue(respuesta.context["form"].errors)
+        self.assertEqual(respuesta.context["total_cerrados"], 3)  # ventana por defecto
+
+    def test_drill_down_a_tickets(self):
+        fila = self.client.get(reverse("reportes_dashboard")).context["sla_por_local"][0]
+        self.assertIn(f"local={fila['local_id']}", fila["url_cerrados"])
+
+        respuesta = self.client.get(fila["url_cerrados"])
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(len(respuesta.context["tickets"]), 3)
+        self.assertIn("desde=", respuesta.context["filtros_qs"])
+
+        respuesta = self.client.get(fila["url_abiertos"])
+        self.assertEqual(len(respuesta.context["tickets"]), 1)
+
+    def test_drill_down_cuenta_lo_mismo_que_la_columna(self):
+        """Los cancelados no están en la columna de cerrados ni en su drill-down"""
+        original = Ticket.objects.filter(estado="CERRADO").first()
+        cancelado = Ticket.objects.create(
+            local=original.local, categoria=original.categoria, titulo="C", descripcion="C", creado_por=self.admin
+        )
+        Ticket.objects.filter(pk=cancelado.pk).update(
+            fecha_creacion=original.fecha_creacion, estado="CANCELADO", fecha_cierre=timezone.now(),
+        )
+
+        fila = self.client.get(reverse("reportes_dashboard")).context["sla_por_local"][0]
+        self.assertIn("ver=resueltos", fila["url_cerrados"])
+        respuesta = self.client.get(fila["url_cerrados"])
+        self.assertEqual(len(respuesta.context["tickets"]), fila["total"])
+        self.assertNotIn(cancelado, respuesta.context["tickets"])
+
+        # Fuera de la ventana no hay tickets
+        hoy = timezone.localdate()
+        respuesta = self.client.get(
+            reverse("tickets_lista"), {"ver": "todos", "local": fila["local_id"], "desde": str(hoy)}
+        )
+        self.assertEqual(len(respuesta.context["tickets"]), 0)
+
+
+class ExportarTest(TestCase):
+    """Exportación de tickets y tablas de reportes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username="jefe_exp", password="x", rol="ADMIN")
+        cls.tecnico = User.objects.create_user(username="tec_exp", password="x", rol="TECNICO")
+        cls.locales = [Local.objects.create(codigo=f"EXP{i}", nombre=f"Banca Ñ {i}") for i in range(2)]
+        categoria = CategoriaAveria.objects.create(nombre="Exportación", tiempo_sla_horas=4)
+        ahora = timezone.now()
+        for i in range(25):
+            ticket = Ticket.objects.create(
+                local=cls.locales[i % 2], categoria=categoria, titulo=f"T{i}", descripcion="E", creado_por=cls.admin
+            )
+            creado = ahora - timedelta(days=i)
+            Ticket.objects.filter(pk=ticket.pk).update(
+                fecha_creacion=creado, fecha_limite_sla=creado + timedelta(hours=4),
+                estado="CERRADO" if i % 5 else "PENDIENTE", fecha_resolucion=creado + timedelta(hours=i % 7),
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def _contenido(self, respuesta):
+        return b"".join(respuesta.streaming_content)
+
+    def _csv(self, respuesta):
+        import csv
+
+        self.assertTrue(respuesta.streaming)
+        texto = self._contenido(respuesta).decode("utf-8")
+        self.assertTrue(texto.startswith("\ufeff"))
+        return list(csv.reader(StringIO(texto.lstrip("\ufeff"))))
+
+    def _xlsx(self, respuesta):
+        from io import BytesIO
+
+        from openpyxl import load_workbook
+
+        return load_workbook(BytesIO(self._contenido(respuesta)), read_only=True)
+
+    def test_tickets_csv_con_filtros_de_la_lista(self):
+        url = reverse("tickets_exportar", args=["csv"])
+        filas = self._csv(self.client.get(url, {"ver": "todos"}))
+        self.assertEqual(filas[0][0], "Número")
+        self.assertEqual(len(filas) - 1, 25)
+
+        filas = self._csv(self.client.get(url, {"ver": "cerrados", "local": self.locales[0].pk}))
+        self.assertEqual(len(filas) - 1, Ticket.objects.filter(local=self.locales[0], estado="CERRADO").count())
+        self.assertEqual({fila[6] for fila in filas[1:]}, {"Cerrado"})
+        self.assertEqual({fila[3] for fila in filas[1:]}, {"Banca Ñ 0"})
+
+    def test_tickets_xlsx(self):
+        libro = self._xlsx(self.client.get(reverse("tickets_exportar", args=["xlsx"]), {"ver": "todos"}))
+        filas = list(libro.active.iter_rows(values_only=True))
+        self.assertEqual(len(filas), 26)
+        self.assertEqual(filas[1][0], Ticket.objects.order_by("-fecha_creacion").first().numero_ticket)
+
+    def test_tablas_de_reportes(self):
+        contexto = self.client.get(reverse("reportes_dashboard")).context
+        filas = self._csv(self.client.get(reverse("reportes_exportar", args=["sla_por_local", "csv"])))
+        self.assertEqual(
+            [(f[0], int(f[2]), int(f[3])) for f in filas[1:]],
+            [(r["codigo"], r["total"], r["on_time"]) for r in contexto["sla_por_local"]],
+        )
+
+        libro = self._xlsx(self.client.get(reverse("reportes_exportar", args=["todas", "xlsx"])))
+        self.assertEqual(libro.sheetnames, ["sla_por_local", "reincidencias", "tecnicos_top"])
+
+        self.assertEqual(self.client.get(reverse("reportes_exportar", args=["todas", "csv"])).status_code, 404)
+        self.assertEqual(self.client.get(reverse("reportes_exportar", args=["otra", "xlsx"])).status_code, 404)
+
+    def test_pdf_sla(self):
+        respuesta = self.client.get(reverse("reportes_exportar_pdf"), {"local": self.locales[1].pk})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta["Content-Type"], "application/pdf")
+        self.assertTrue(respuesta.content.startswith(b"%PDF"))
+
+    def test_solo_admin(self):
+        self.client.force_login(self.tecnico)
+        self.assertEqual(self.client.get(reverse("tickets_exportar", args=["csv"])).status_code, 403)
+        self.assertEqual(self.client.get(reverse("reportes_exportar_pdf")).status_code, 403)
+
+
+class ExportJobTest(TestCase):
+    """Exportaciones en segundo plano: deduplicación, generación por bloques y descarga"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username="jefe_job", password="x", rol="ADMIN")
+        cls.local = Local.objects.create(codigo="JOB1", nombre="Banca Job")
+        categoria = CategoriaAveria.objects.create(nombre="Job", tiempo_sla_horas=4)
+        cls.tickets = [
+            Ticket.objects.create(local=cls.local, categoria=categoria, titulo=f"J{i}", descripcion="J", creado_por=cls.admin)
+            for i in range(7)
+        ]
+        from apps.tickets.models import ComentarioTicket
+
+        ComentarioTicket.objects.create(ticket=cls.tickets[0], usuario=cls.admin, comentario="Primero")
+        ComentarioTicket.objects.create(ticket=cls.tickets[0], usuario=cls.admin, comentario="Nota", es_interno=True)
+
+    def setUp(self):
+        import shutil
+        import tempfile
+
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        ajustes = self.settings(MEDIA_ROOT=media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.parametros = {"ver": "todos", "local": str(self.local.pk), "comentarios": True}
+
+    def _procesar(self):
+        from unittest import mock
+
+        from apps.reportes.exportaciones import procesar_exportacion
+
+        with mock.patch("apps.reportes.exportaciones.BLOQUE", 3):
+            return procesar_exportacion()
+
+    def test_parametros_iguales_reutilizan_el_trabajo(self):
+        from apps.reportes.exportaciones import parametros_tickets, solicitar_exportacion
+
+        parametros = parametros_tickets({"local": str(self.local.pk), "ver": "todos", "comentarios": "1", "otro": "x"})
+        self.assertEqual(parametros, self.parametros)
+
+        trabajo, creado = solicitar_exportacion(self.admin, "csv", parametros)
+        self.assertTrue(creado)
+        self.assertEqual(solicitar_exportacion(self.admin, "csv", dict(parametros))[0].pk, trabajo.pk)
+        # Otro formato u otros filtros: otro trabajo
+        self.assertTrue(solicitar_exportacion(self.admin, "xlsx", parametros)[1])
+
+        self._procesar()
+        mismo, creado = solicitar_exportacion(self.admin, "csv", parametros)
+        self.assertEqual((mismo.pk, mismo.estado, creado), (trabajo.pk, "LISTO", False))
+
+        # Cambian los datos: el fichero ya no sirve
+        Ticket.objects.filter(pk=self.tickets[1].pk).update(titulo="Cambiado")
+        self.assertTrue(solicitar_exportacion(self.admin, "csv", parametros)[1])
+
+    def test_generacion_por_bloques_con_comentarios(self):
+        import csv
+
+        from apps.reportes.exportaciones import solicitar_exportacion
+
+        trabajo, _ = solicitar_exportacion(self.admin, "csv", self.parametros)
+        self.assertEqual(self._procesar().pk, trabajo.pk)
+
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.progreso, trabajo.total, trabajo.porcentaje), ("LISTO", 7, 7, 100))
+        with trabajo.archivo.open("rb") as f:
+            filas = list(csv.reader(StringIO(f.read().decode("utf-8").lstrip("\ufeff"))))
+        self.assertEqual(filas[0][-1], "Comentarios")
+        self.assertEqual(len(filas), 8)
+        comentarios = {fila[0]: fila[-1] for fila in filas[1:]}
+        texto = comentarios[self.tickets[0].numero_ticket]
+        self.assertIn("Primero", texto)
+        self.assertIn("(interno): Nota", texto)
+
+    def test_bloques_en_el_orden_de_la_exportacion_directa(self):
+        import csv
+
+        from apps.reportes.exportaciones import solicitar_exportacion, tickets_exportacion
+
+        # Fechas repetidas y desordenadas respecto al id, cruzando bloques de 3
+        base = timezone.now() - timedelta(days=1)
+        for i, ticket in enumerate(self.tickets):
+            Ticket.objects.filter(pk=ticket.pk).update(fecha_creacion=base + timedelta(hours=(i * 5) % 3))
+        esperado = list(
+            tickets_exportacion(self.parametros).order_by("-fecha_creacion", "-id").values_list("numero_ticket", flat=True)
+        )
+
+        trabajo, _ = solicitar_exportacion(self.admin, "csv", self.parametros)
+        self._procesar()
+        trabajo.refresh_from_db()
+        with trabajo.archivo.open("rb") as f:
+            filas = list(csv.reader(StringIO(f.read().decode("utf-8").lstrip("\ufeff"))))
+        self.assertEqual([fila[0] for fila in filas[1:]], esperado)
+
+    def test_no_pisa_un_trabajo_retomado_por_otro_worker(self):
+        from apps.reportes.exportaciones import generar_exportacion, reclamar_exportacion, solicitar_exportacion
+        from apps.reportes.models import ExportJob
+
+        solicitar_exportacion(self.admin, "csv", self.parametros)
+        primero = reclamar_exportacion()
+        # La reserva del primero expira y otro worker lo retoma
+        segundo = reclamar_exportacion(timezone.now() + timedelta(hours=1))
+
+        self.assertIsNone(generar_exportacion(primero))
+        trabajo = ExportJob.objects.get()
+        self.assertEqual((trabajo.estado, trabajo.lote, trabajo.archivo.name), ("PROCESANDO", segundo.lote, ""))
+
+        self.assertEqual(generar_exportacion(segundo).estado, "LISTO")
+
+    def test_xlsx(self):
+        from openpyxl import load_workbook
+
+        from apps.reportes.exportaciones import solicitar_exportacion
+
+        trabajo, _ = solicitar_exportacion(self.admin, "xlsx", self.parametros)
+        self._procesar()
+        trabajo.refresh_from_db()
+        with trabajo.archivo.open("rb") as f:
+            filas = list(load_workbook(f, read_only=True).active.iter_rows(values_only=True))
+        self.assertEqual(len(filas), 8)
+
+    def test_reserva_y_recuperacion(self):
+        from apps.reportes.exportaciones import reclamar_exportacion, solicitar_exportacion
+
+        trabajo, _ = solicitar_exportacion(self.admin, "csv", self.parametros)
+        self.assertEqual(reclamar_exportacion().pk, trabajo.pk)
+        self.assertIsNone(reclamar_exportacion())
+        # Worker caído: al expirar la reserva otro lo retoma
+        self.assertEqual(reclamar_exportacion(timezone.now() + timedelta(hours=1)).pk, trabajo.pk)
+
+    def test_vistas(self):
+        self.client.force_login(self.admin)
+        respuesta = self.client.post(
+            reverse("exportacion_solicitar"), {"ver": "todos", "local": self.local.pk, "formato": "csv"}
+        )
+        from apps.reportes.models import ExportJob
+
+        trabajo = ExportJob.objects.get()
+        self.assertRedirects(respuesta, reverse("exportacion_detalle", args=[trabajo.pk]))
+        self.assertEqual(self.client.get(reverse("exportacion_estado", args=[trabajo.pk])).json()["estado"], "PENDIENTE")
+        self.assertEqual(self.client.get(reverse("exportacion_descargar", args=[trabajo.pk])).status_code, 404)
+
+        out = StringIO()
+        call_command("procesar_exportaciones", once=True, stdout=out)
+        self.assertIn("Exportaciones generadas: 1", out.getvalue())
+
+        datos = self.client.get(reverse("exportacion_estado", args=[trabajo.pk])).json()
+        self.assertEqual((datos["estado"], datos["porcentaje"]), ("LISTO", 100))
+        descarga = self.client.get(datos["url_descarga"])
+        self.assertEqual(descarga.status_code, 200)
+        self.assertEqual(b"".join(descarga.streaming_content).count(b"\n"), 8)
+
+        tecnico = User.objects.create(username="tec_job", rol="TECNICO")
+        self.client.force_login(tecnico)
+        self.assertEqual(self.client.get(reverse("exportacion_estado", args=[trabajo.pk])).status_code, 403)
+
+    def test_purga(self):
+        import os
+
+        from apps.reportes.exportaciones import purgar_exportaciones, solicitar_exportacion
+        from apps.reportes.models import ExportJob
+
+        solicitar_exportacion(self.admin, "csv", self.parametros)
+        trabajo = self._procesar()
+        ruta = trabajo.archivo.path
+        self.assertTrue(os.path.exists(ruta))
+
+        self.assertEqual(purgar_exportaciones(), 0)
+        self.assertEqual(purgar_exportaciones(timezone.now() + timedelta(days=8)), 1)
+        self.assertFalse(os.path.exists(ruta))
+        self.assertFalse(ExportJob.objects.exists())
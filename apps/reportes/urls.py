@@ -4,4 +4,10 @@ from . import views
 
 urlpatterns = [
     path('', views.reportes_dashboard, name='reportes_dashboard'),
+    path('exportar/sla/pdf/', views.reportes_exportar_pdf, name='reportes_exportar_pdf'),
+    path('exportar/<slug:tabla>/<str:formato>/', views.reportes_exportar, name='reportes_exportar'),
+    path('exportaciones/nueva/', views.exportacion_solicitar, name='exportacion_solicitar'),
+    path('exportaciones/<int:pk>/', views.exportacion_detalle, name='exportacion_detalle'),
+    path('exportaciones/<int:pk>/estado/', views.exportacion_estado, name='exportacion_estado'),
+    path('exportaciones/<int:pk>/descargar/', views.exportacion_descargar, name='exportacion_descargar'),
 ]
@@ -1,19 +1,21 @@
 # apps/reportes/views.py
 from __future__ import annotations
 
-from datetime import timedelta
+from urllib.parse import urlencode
 
 from django.contrib.auth.decorators import login_required
-from django.shortcuts import render
-from django.http import HttpResponseForbidden
+from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
+from django.http import FileResponse, Http404, HttpResponseForbidden, JsonResponse
+from django.views.decorators.http import require_GET, require_POST
 from django.utils import timezone
-from django.db.models import (
-    Avg, Count, Sum, Q, F,
-    DurationField, IntegerField, ExpressionWrapper, Case, When,
-)
-from django.db.models.functions import Coalesce
 
-from apps.tickets.models import Ticket
+from .exportaciones import nombre_descarga, parametros_tickets, solicitar_exportacion
+from .exportar import FORMATOS, TABLAS, exportar_reporte, pdf_resumen_sla
+from .forms import FiltroReporteForm
+from .models import ExportJob
+from .reporte import ReportQuery
+from .resumenes import resumenes_al_dia
 
 
 def _human_timedelta(td):
@@ -39,149 +41,173 @@ def _human_timedelta(td):
     return " ".join(parts)
 
 
+def _reporte(request, ahora=None):
+    """(form, filtros normalizados, ReportQuery) a partir de los ?filtros de la URL."""
+    form = FiltroReporteForm(request.GET or None)
+    filtros = form.filtros()
+    return form, filtros, ReportQuery(ahora=ahora, **filtros)
+
+
 @login_required
 def reportes_dashboard(request):
     """
     Reportes (ADMIN o staff):
     - SLA por banca (promedios, % cumplimiento)
-    - Reincidencias por banca/categoría (últimos 3 meses)
+    - Reincidencias por banca/categoría
+    - Filtros ?desde&hasta (por defecto los últimos 90 días) y ?local&categoria&tecnico
+
+    Lo histórico sale de los resúmenes diarios (ResumenDiario), no de los
+    tickets, y se cachea por filtros (ver ReportQuery.cargar_cache): el coste
+    no depende de cuántos tickets tenga la ventana.
+    Solo los abiertos "de hoy" se cuentan en vivo (índice estado + SLA).
+    Los totales se derivan de las filas por banca.
     """
     if not request.user.es_admin():
         return HttpResponseForbidden("No tienes permiso para ver reportes.")
 
     ahora = timezone.now()
-    # “Últimos 3 meses” -> usamos 90 días (simple y estable)
-    desde = ahora - timedelta(days=90)
-
-    estados_abiertos = ["PENDIENTE", "EN_PROCESO"]
-    estados_cerrados = ["RESUELTO", "CERRADO"]
-
-    # =========================
-    # 1) Tickets abiertos (hoy)
-    # =========================
-    abiertos_qs = (
-        Ticket.objects
-        .filter(estado__in=estados_abiertos)
-        .select_related("local", "categoria", "asignado_a", "creado_por")
-    )
-
-    abiertos_total = abiertos_qs.count()
-    abiertos_vencidos = abiertos_qs.filter(fecha_limite_sla__lt=ahora).count()
-
-    # =========================
-    # 2) SLA por banca (3 meses)
-    # =========================
-    cerrados_qs = (
-        Ticket.objects
-        .filter(fecha_creacion__gte=desde, estado__in=estados_cerrados)
-        .exclude(fecha_resolucion__isnull=True, fecha_cierre__isnull=True)
-        .select_related("local", "categoria")
-    )
-
-    duracion_solucion = ExpressionWrapper(
-        (Coalesce("fecha_resolucion", "fecha_cierre") - F("fecha_creacion")),
-        output_field=DurationField(),
-    )
-    duracion_respuesta = ExpressionWrapper(
-        (F("fecha_asignacion") - F("fecha_creacion")),
-        output_field=DurationField(),
-    )
-
-    cumple_sla = Case(
-        When(fecha_resolucion__isnull=False, fecha_resolucion__lte=F("fecha_limite_sla"), then=1),
-        When(fecha_resolucion__isnull=True, fecha_cierre__isnull=False, fecha_cierre__lte=F("fecha_limite_sla"), then=1),
-        default=0,
-        output_field=IntegerField(),
-    )
-
-    sla_por_local_raw = (
-        cerrados_qs
-        .values("local_id", "local__codigo", "local__nombre")
-        .annotate(
-            total=Count("id"),
-            on_time=Sum(cumple_sla),
-            avg_solucion=Avg(duracion_solucion),
-            avg_respuesta=Avg(duracion_respuesta),
-        )
-        .order_by("-total", "local__codigo")
-    )
-
-    # Abiertos agrupados por local para “estado actual”
-    abiertos_por_local = {
-        row["local_id"]: row
-        for row in (
-            abiertos_qs
-            .values("local_id")
-            .annotate(
-                abiertos=Count("id"),
-                vencidos=Count("id", filter=Q(fecha_limite_sla__lt=ahora)),
-            )
-        )
+    form, filtros, reporte = _reporte(request, ahora)
+    resumen_al = resumenes_al_dia()
+    reporte.cargar_cache()
+
+    # Drill-down: de cada banca a sus tickets con los mismos filtros
+    base_tickets = reverse("tickets_lista")
+    parametros = {
+        "desde": filtros["desde"].isoformat(),
+        "hasta": filtros["hasta"].isoformat(),
+        **{campo: filtros[f"{campo}_id"] for campo in ("categoria", "tecnico") if filtros[f"{campo}_id"]},
     }
 
-    sla_por_local = []
-    for row in sla_por_local_raw:
-        total = row["total"] or 0
-        on_time = row["on_time"] or 0
-        pct = round((on_time / total) * 100, 1) if total else 0.0
-
-        ab = abiertos_por_local.get(row["local_id"], {})
-        sla_por_local.append({
-            "codigo": row["local__codigo"],
-            "nombre": row["local__nombre"],
-            "total": total,
-            "on_time": on_time,
-            "pct_on_time": pct,
-            "avg_solucion": _human_timedelta(row["avg_solucion"]),
-            "avg_respuesta": _human_timedelta(row["avg_respuesta"]),
-            "abiertos": ab.get("abiertos", 0),
-            "abiertos_vencidos": ab.get("vencidos", 0),
-        })
-
-    # Totales generales del período
-    total_cerrados = cerrados_qs.count()
-    total_on_time = cerrados_qs.aggregate(s=Sum(cumple_sla)).get("s") or 0
-    pct_on_time = round((total_on_time / total_cerrados) * 100, 1) if total_cerrados else 0.0
-    avg_solucion_global = cerrados_qs.aggregate(a=Avg(duracion_solucion)).get("a")
-    avg_respuesta_global = cerrados_qs.aggregate(a=Avg(duracion_respuesta)).get("a")
-
-    # =========================
-    # 3) Reincidencias (3 meses)
-    # =========================
-    reincidencias = (
-        Ticket.objects
-        .filter(fecha_creacion__gte=desde)
-        .values("local__codigo", "local__nombre", "categoria__nombre")
-        .annotate(total=Count("id"))
-        .filter(total__gte=2)
-        .order_by("-total", "local__codigo", "categoria__nombre")[:50]
-    )
-
-    # =========================
-    # 4) Top técnicos cerrando
-    # =========================
-    tecnicos_top = (
-        Ticket.objects
-        .filter(estado__in=["CERRADO"], asignado_a__rol="TECNICO")
-        .values("asignado_a__id", "asignado_a__first_name", "asignado_a__last_name", "asignado_a__username")
-        .annotate(total_cerrados=Count("id"))
-        .order_by("-total_cerrados")[:10]
-    )
+    def _url_tickets(ver, local_id, **extra):
+        return f"{base_tickets}?{urlencode({'ver': ver, 'local': local_id, **extra})}"
+
+    sla_por_local = [
+        dict(
+            fila,
+            avg_solucion=_human_timedelta(fila["avg_solucion"]),
+            avg_respuesta=_human_timedelta(fila["avg_respuesta"]),
+            # Mismos estados que la columna (sin cancelados)
+            url_cerrados=_url_tickets("resueltos", fila["local_id"], **parametros),
+            # Los abiertos son el estado actual: sin ventana de fechas
+            url_abiertos=_url_tickets("abiertos", fila["local_id"]),
+        )
+        for fila in reporte.sla_por_local()
+    ]
+    totales = reporte.totales()
 
     contexto = {
-        "desde": desde,
-        "hoy": ahora,
+        "form": form,
+        # Los enlaces de exportación llevan los mismos filtros
+        "filtros_qs": request.GET.urlencode(),
+        "desde": filtros["desde"],
+        "hoy": filtros["hasta"],
+        "resumen_al": resumen_al,
 
-        "abiertos_total": abiertos_total,
-        "abiertos_vencidos": abiertos_vencidos,
+        "abiertos_total": totales["abiertos"],
+        "abiertos_vencidos": totales["abiertos_vencidos"],
 
-        "total_cerrados": total_cerrados,
-        "pct_on_time": pct_on_time,
-        "avg_solucion_global": _human_timedelta(avg_solucion_global),
-        "avg_respuesta_global": _human_timedelta(avg_respuesta_global),
+        "total_cerrados": totales["cerrados"],
+        "pct_on_time": totales["pct_on_time"],
+        "avg_solucion_global": _human_timedelta(totales["avg_solucion"]),
+        "avg_respuesta_global": _human_timedelta(totales["avg_respuesta"]),
 
         "sla_por_local": sla_por_local,
-        "reincidencias": reincidencias,
-        "tecnicos_top": tecnicos_top,
+        "reincidencias": reporte.reincidencias(),
+        "tecnicos_top": reporte.tecnicos_top(),
     }
     return render(request, "reportes/dashboard.html", contexto)
+
+
+@login_required
+@require_GET
+def reportes_exportar(request, tabla, formato):
+    """
+    Exporta una tabla del dashboard (sla_por_local, reincidencias,
+    tecnicos_top) a CSV/XLSX, o todas como hojas de un .xlsx (tabla=todas),
+    con los mismos ?filtros que el dashboard.
+    """
+    if not request.user.es_admin():
+        return HttpResponseForbidden("No tienes permiso para ver reportes.")
+    if formato not in FORMATOS or (tabla not in TABLAS and (tabla, formato) != ("todas", "xlsx")):
+        raise Http404("Exportación no soportada.")
+
+    _, _, reporte = _reporte(request)
+    resumenes_al_dia()
+    reporte.cargar_cache()
+    return exportar_reporte(formato, tabla, reporte)
+
+
+@login_required
+@require_GET
+def reportes_exportar_pdf(request):
+    """Resumen de SLA del período en PDF (totales + SLA por banca)."""
+    if not request.user.es_admin():
+        return HttpResponseForbidden("No tienes permiso para ver reportes.")
+
+    _, _, reporte = _reporte(request)
+    resumenes_al_dia()
+    reporte.cargar_cache()
+    return pdf_resumen_sla(reporte)
+
+
+# =========================
+# Exportaciones en segundo plano
+# =========================
+
+@login_required
+@require_POST
+def exportacion_solicitar(request):
+    """
+    Encola (o reutiliza, si los datos no han cambiado) la exportación de la
+    lista de tickets con los filtros enviados y lleva a su página de progreso.
+    """
+    if not request.user.es_admin():
+        return HttpResponseForbidden("No tienes permiso para exportar tickets.")
+    formato = request.POST.get("formato", "xlsx")
+    if formato not in FORMATOS:
+        raise Http404("Formato de exportación no soportado.")
+
+    trabajo, _ = solicitar_exportacion(request.user, formato, parametros_tickets(request.POST))
+    return redirect("exportacion_detalle", pk=trabajo.pk)
+
+
+def _datos_exportacion(trabajo):
+    return {
+        "id": trabajo.pk,
+        "estado": trabajo.estado,
+        "estado_display": trabajo.get_estado_display(),
+        "progreso": trabajo.progreso,
+        "total": trabajo.total,
+        "porcentaje": trabajo.porcentaje,
+        "error": trabajo.ultimo_error,
+        "url_descarga": reverse("exportacion_descargar", args=[trabajo.pk]) if trabajo.estado == "LISTO" else None,
+    }
+
+
+@login_required
+def exportacion_detalle(request, pk):
+    """Página de progreso: consulta exportacion_estado cada pocos segundos."""
+    if not request.user.es_admin():
+        return HttpResponseForbidden("No tienes permiso para exportar tickets.")
+    trabajo = get_object_or_404(ExportJob, pk=pk)
+    return render(request, "reportes/exportacion.html", {"trabajo": trabajo, "datos": _datos_exportacion(trabajo)})
+
+
+@login_required
+@require_GET
+def exportacion_estado(request, pk):
+    """Estado y progreso del trabajo en JSON (polling)."""
+    if not request.user.es_admin():
+        return HttpResponseForbidden("No tienes permiso para exportar tickets.")
+    return JsonResponse(_datos_exportacion(get_object_or_404(ExportJob, pk=pk)))
+
+
+@login_required
+@require_GET
+def exportacion_descargar(request, pk):
+    if not request.user.es_admin():
+        return HttpResponseForbidden("No tienes permiso para exportar tickets.")
+    trabajo = get_object_or_404(ExportJob, pk=pk, estado="LISTO")
+    if not trabajo.archivo:
+        raise Http404("La exportación ya no está disponible.")
+    return FileResponse(trabajo.archivo.open("rb"), as_attachment=True, filename=nombre_descarga(trabajo))
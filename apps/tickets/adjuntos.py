@@ -0,0 +1,265 @@
+# apps/tickets/adjuntos.py
+"""
+Adjuntos de tickets: subida por partes (reanudable) y deduplicación por contenido.
+
+Flujo de la API (tickets/api/adjuntos/):
+1. POST {nombre, tamano, sha256?} -> SubidaAdjunto EN_CURSO y su `token`. Si
+   el cliente manda el SHA-256 de un contenido que ÉL MISMO ya subió, la
+   subida nace COMPLETA sin transferir nada. Un hash no prueba que se tengan
+   los bytes: el contenido de otros usuarios hay que subirlo entero (y se
+   deduplica igual al completar, paso 3).
+2. PUT .../<token>/?offset=N con los bytes de la parte en el cuerpo. Se leen
+   del socket por bloques y se escriben en el fichero parcial (sin pasar por
+   los upload handlers ni por un temporal intermedio). Si `offset` no es lo
+   recibido hasta ahora se responde 409 con `recibido` para reanudar ahí.
+3. Con la última parte se calcula el SHA-256 y, o bien se reutilizan los
+   ficheros de una subida anterior igual, o se procesa la imagen
+   (imagenes.py); un fichero que no es imagen se mueve (rename) al almacén
+   por contenido (almacen.py), que a su vez deduplica los ficheros resultantes.
+4. El formulario del ticket envía los `token` y las filas de ImagenTicket se
+   crean con un solo bulk_create (`adjuntar`).
+
+Los ficheros del formulario clásico (request.FILES) pasan por el mismo
+`registrar_archivo`, con la misma deduplicación.
+"""
+import hashlib
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db.models import Q
+from django.utils import timezone
+
+from .almacen import ajustar_referencias
+from .imagenes import MINIATURA, MINIATURA_2X, procesar_subida
+from .models import ImagenTicket, SubidaAdjunto
+
+# Bytes por lectura al recibir una parte y al calcular el hash
+BLOQUE_LECTURA = 64 * 1024
+
+
+class OffsetIncorrecto(Exception):
+    """La parte no empieza donde termina lo ya recibido (el cliente debe reanudar)."""
+
+
+def tamano_max():
+    return getattr(settings, 'ADJUNTOS_TAMANO_MAX', 20 * 1024 * 1024)
+
+
+def tamano_parte():
+    """Tamaño de parte que se sugiere al cliente."""
+    return getattr(settings, 'ADJUNTOS_TAMANO_PARTE', 1024 * 1024)
+
+
+def _caducidad():
+    return timedelta(hours=getattr(settings, 'ADJUNTOS_CADUCIDAD_HORAS', 24))
+
+
+def _retencion():
+    return timedelta(days=getattr(settings, 'ADJUNTOS_RETENCION_DIAS', 30))
+
+
+def ruta_parcial(subida):
+    """Fichero con los bytes recibidos; bajo MEDIA_ROOT para que el rename final no copie."""
+    directorio = getattr(settings, 'ADJUNTOS_DIR_PARCIALES', None) or os.path.join(
+        settings.MEDIA_ROOT, 'adjuntos', 'parciales'
+    )
+    return os.path.join(directorio, f"{subida.token}.part")
+
+
+class _Parcial(File):
+    """Fichero ya en disco: FileSystemStorage lo mueve a su destino en vez de copiarlo."""
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def hash_archivo(archivo):
+    """SHA-256 (hex) de `archivo`, leído por bloques."""
+    sha = hashlib.sha256()
+    archivo.seek(0)
+    for bloque in iter(lambda: archivo.read(BLOQUE_LECTURA), b''):
+        sha.update(bloque)
+    archivo.seek(0)
+    return sha.hexdigest()
+
+
+def subida_con_contenido(sha256, usuario=None):
+    """
+    Subida completa anterior con ese contenido (sus ficheros se reutilizan) o
+    None. Con `usuario`, solo entre las suyas.
+    """
+    if not sha256:
+        return None
+    qs = SubidaAdjunto.objects.filter(sha256=sha256, estado='COMPLETA').exclude(imagen='')
+    if usuario is not None:
+        qs = qs.filter(usuario=usuario)
+    return qs.order_by('id').first()
+
+
+def _reutilizar(subida, anterior):
+    subida.imagen = anterior.imagen.name
+    subida.miniatura = anterior.miniatura.name
+    subida.miniatura_2x = anterior.miniatura_2x.name
+
+
+def _guardar_contenido(subida, archivo):
+    """Procesa `archivo` (o lo guarda tal cual si no es imagen) en los campos de `subida`."""
+    subida.imagen = archivo
+    procesar_subida(subida.imagen, [(subida.miniatura, MINIATURA), (subida.miniatura_2x, MINIATURA_2X)])
+    # save(): si no era imagen, FileField la guarda sin procesar
+    subida.estado = 'COMPLETA'
+    subida.save()
+
+
+def registrar_archivo(archivo, usuario):
+    """
+    Guarda un fichero recibido entero (request.FILES) como subida completa,
+    reutilizando los ficheros de otra con el mismo contenido.
+    """
+    sha256 = hash_archivo(archivo)
+    subida = SubidaAdjunto(
+        usuario=usuario,
+        nombre=os.path.basename(archivo.name or '')[:255] or 'adjunto',
+        tamano=archivo.size,
+        recibido=archivo.size,
+        sha256=sha256,
+    )
+    anterior = subida_con_contenido(sha256)
+    if anterior is not None:
+        _reutilizar(subida, anterior)
+        subida.estado = 'COMPLETA'
+        subida.save()
+        return subida
+    _guardar_contenido(subida, archivo)
+    return subida
+
+
+def iniciar_subida(usuario, nombre, tamano, sha256=''):
+    """
+    Crea la subida. Con el `sha256` de un contenido que `usuario` ya subió
+    nace COMPLETA, con el tamaño de aquella (el hash lo calculó el servidor
+    sobre esos bytes). Un hash de contenido ajeno no basta: sin los bytes
+    cualquiera que lo conociera podría adjuntar ese fichero, así que la
+    subida sigue por partes. Lanza ValueError si el tamaño no vale.
+    """
+    if tamano <= 0 or tamano > tamano_max():
+        raise ValueError(f"Tamaño no permitido (máximo {tamano_max() // (1024 * 1024)} MB).")
+
+    subida = SubidaAdjunto(usuario=usuario, nombre=os.path.basename(nombre)[:255] or 'adjunto', tamano=tamano)
+    anterior = subida_con_contenido(sha256.lower(), usuario=usuario)
+    if anterior is not None:
+        _reutilizar(subida, anterior)
+        subida.sha256 = anterior.sha256
+        subida.tamano = subida.recibido = anterior.tamano
+        subida.estado = 'COMPLETA'
+    subida.save()
+    return subida
+
+
+def escribir_parte(subida, offset, flujo):
+    """
+    Escribe en el parcial los bytes de `flujo` (el cuerpo de la petición, que se
+    lee por bloques) a partir de `offset`, y completa la subida con la última
+    parte. Lanza OffsetIncorrecto si `offset` no es lo recibido hasta ahora y
+    ValueError si se envían más bytes de los anunciados.
+    """
+    if subida.estado == 'COMPLETA':
+        return subida
+    if offset != subida.recibido:
+        raise OffsetIncorrecto(subida.recibido)
+
+    ruta = ruta_parcial(subida)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    pendientes = subida.tamano - offset
+    with open(ruta, 'r+b' if offset else 'wb') as parcial:
+        parcial.seek(offset)
+        parcial.truncate()
+        while True:
+            bloque = flujo.read(BLOQUE_LECTURA)
+            if not bloque:
+                break
+            if len(bloque) > pendientes:
+                raise ValueError("La parte excede el tamaño anunciado.")
+            parcial.write(bloque)
+            pendientes -= len(bloque)
+        recibido = parcial.tell()
+
+    # UPDATE condicional: un reintento duplicado de la misma parte no avanza dos veces
+    if not SubidaAdjunto.objects.filter(pk=subida.pk, recibido=offset, estado='EN_CURSO').update(recibido=recibido):
+        subida.refresh_from_db()
+        return subida
+    subida.recibido = recibido
+    if recibido == subida.tamano:
+        completar_subida(subida)
+    return subida
+
+
+def completar_subida(subida):
+    """Hash del parcial, deduplicación y procesado; el parcial desaparece."""
+    ruta = ruta_parcial(subida)
+    with open(ruta, 'rb') as parcial:
+        subida.sha256 = hash_archivo(parcial)
+        anterior = subida_con_contenido(subida.sha256)
+        if anterior is None:
+            _guardar_contenido(subida, _Parcial(parcial, name=subida.nombre))
+    if anterior is not None:
+        _reutilizar(subida, anterior)
+        subida.estado = 'COMPLETA'
+        subida.save()
+    if os.path.exists(ruta):
+        os.remove(ruta)
+    return subida
+
+
+def adjuntar(ticket, usuario, tokens=(), archivos=()):
+    """
+    Crea las ImagenTicket de `ticket`: subidas completas del usuario (`tokens`)
+    y ficheros recibidos con el formulario (`archivos`). Un solo INSERT; los
+    ficheros ya están procesados, así que no hace falta ImagenTicket.save().
+    """
+    subidas = list(
+        SubidaAdjunto.objects
+        .filter(token__in=[t for t in tokens if t], usuario=usuario, estado='COMPLETA')
+        .exclude(imagen='')
+        .order_by('id')
+    )
+    subidas += [registrar_archivo(archivo, usuario) for archivo in archivos]
+    imagenes = ImagenTicket.objects.bulk_create([
+        ImagenTicket(
+            ticket=ticket,
+            imagen=subida.imagen.name,
+            miniatura=subida.miniatura.name,
+            miniatura_2x=subida.miniatura_2x.name,
+            subida_por=usuario,
+        )
+        for subida in subidas
+    ])
+    # bulk_create no dispara post_save: referencias de los blobs a mano
+    ajustar_referencias(sumar=[
+        nombre for img in imagenes for nombre in (img.imagen.name, img.miniatura.name, img.miniatura_2x.name)
+    ])
+    return imagenes
+
+
+def purgar_subidas(ahora=None):
+    """
+    Borra las subidas EN_CURSO abandonadas (más de ADJUNTOS_CADUCIDAD_HORAS) y
+    sus parciales, y las completas de más de ADJUNTOS_RETENCION_DIAS: sus
+    ficheros siguen en el almacén mientras alguna ImagenTicket los use (y si
+    nadie los adjuntó, recoger_blobs los borra).
+    """
+    ahora = ahora or timezone.now()
+    viejas = SubidaAdjunto.objects.filter(
+        Q(estado='EN_CURSO', fecha_creacion__lt=ahora - _caducidad())
+        | Q(estado='COMPLETA', fecha_creacion__lt=ahora - _retencion())
+    )
+    borradas = 0
+    for subida in viejas.iterator():
+        ruta = ruta_parcial(subida)
+        if os.path.exists(ruta):
+            os.remove(ruta)
+        subida.delete()
+        borradas += 1
+    return borradas
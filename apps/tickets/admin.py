@@ -5,7 +5,13 @@ from django.urls import reverse
 from django.utils import timezone
 from unfold.admin import ModelAdmin
 from unfold.decorators import display
-from .models import Ticket, ComentarioTicket, CategoriaAveria, ImagenTicket
+from .models import Ticket, ComentarioTicket, CategoriaAveria, ImagenTicket, NivelAvisoSla
+
+
+class NivelAvisoSlaInline(admin.TabularInline):
+    model = NivelAvisoSla
+    extra = 0
+    fields = ('porcentaje',)
 
 
 @admin.register(CategoriaAveria)
@@ -15,6 +21,7 @@ class CategoriaAveriaAdmin(ModelAdmin):
     search_fields = ('nombre', 'descripcion')
     ordering = ('nombre',)
     list_per_page = 25
+    inlines = [NivelAvisoSlaInline]
     
     @display(description='SLA', ordering='tiempo_sla_horas')
     def tiempo_sla_display(self, obj):
@@ -137,16 +144,20 @@ class TicketAdmin(ModelAdmin):
             obj.get_prioridad_display()
         )
     
+    def get_queryset(self, request):
+        # vencido / segundos_restantes / pct_usado calculados en SQL (ver TicketQuerySet.with_sla)
+        return super().get_queryset(request).with_sla()
+    
     @display(description='SLA')
     def sla_status(self, obj):
-        if obj.esta_vencido():
+        vencido, segundos_restantes, _ = obj.estado_sla()
+        if vencido:
             return format_html('<span style="color:#dc3545; font-weight:bold;">⚠️ VENCIDO</span>')
         
-        tiempo_restante = obj.tiempo_restante_sla()
-        if tiempo_restante is None:
+        if segundos_restantes is None:
             return format_html('<span style="color:#28a745;">✓ Completado</span>')
         
-        if tiempo_restante.total_seconds() < 7200:  # menos de 2 horas
+        if segundos_restantes < 7200:  # menos de 2 horas
             return format_html('<span style="color:#ffc107; font-weight:bold;">⏰ Por vencer</span>')
         
         return format_html('<span style="color:#28a745;">✓ En tiempo</span>')
@@ -156,12 +167,9 @@ class TicketAdmin(ModelAdmin):
         if not obj.pk:
             return '-'
         
-        ahora = timezone.now()
-        tiempo_total = (obj.fecha_limite_sla - obj.fecha_creacion).total_seconds()
-        tiempo_transcurrido = (ahora - obj.fecha_creacion).total_seconds()
-        porcentaje = min(100, (tiempo_transcurrido / tiempo_total) * 100)
+        vencido, _, porcentaje = obj.estado_sla()
         
-        if obj.esta_vencido():
+        if vencido:
             color = '#dc3545'
             texto = 'VENCIDO'
         elif porcentaje > 80:
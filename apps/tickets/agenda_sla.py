@@ -0,0 +1,182 @@
+# apps/tickets/agenda_sla.py
+"""
+Agenda de vencimientos SLA para el comando `sla_daemon`.
+
+Mantiene en memoria un min-heap (fecha_limite_sla, ticket_id) de los tickets
+abiertos sin notificar y duerme justo hasta el siguiente vencimiento, en vez
+de lanzar `notificar_sla_vencido` cada 5 minutos en un proceso nuevo.
+
+- Al arrancar (y cada `resync` segundos) se carga el heap completo.
+- Entre medias solo se leen los tickets con `fecha_actualizacion` reciente
+  (TicketQuerySet.update() también la actualiza). La recarga completa cubre
+  lo que se escape, p. ej. cambios en los calendarios laborales.
+- En cada ciclo se envían también los avisos previos al vencimiento (50%,
+  80%...; ver escalamiento_sla.py) con una consulta por rango sobre la ventana
+  [ahora, ahora + intervalo], que de paso da la hora del siguiente aviso.
+- El heap es solo una pista de cuándo despertar: la notificación en sí reclama
+  en la BD todos los vencidos pendientes, así que una entrada obsoleta solo
+  provoca un despertar sin trabajo.
+"""
+import heapq
+import threading
+import time
+from datetime import timedelta
+
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .escalamiento_sla import procesar_avisos_sla
+from .models import Ticket
+from .notificaciones import notificar_sla_pendientes
+
+# Solape al leer cambios: cubre transacciones que confirman tarde con un auto_now anterior
+MARGEN_CAMBIOS = timedelta(seconds=5)
+
+
+def tickets_modificados(desde):
+    """(id, estado, fecha_limite_sla, notificacion_sla_enviada) de los tickets modificados desde `desde`."""
+    return (
+        Ticket.objects
+        .filter(fecha_actualizacion__gte=desde)
+        .order_by()
+        .values_list('id', 'estado', 'fecha_limite_sla', 'notificacion_sla_enviada')
+    )
+
+
+class AgendaSla:
+    def __init__(self, lote=500, intervalo=60, resync=900, log=print):
+        self.lote = lote
+        self.intervalo = intervalo
+        self.resync = resync
+        self.log = log
+        self._heap = []
+        self._plazos = {}
+        self._ultima_revision = None
+        self._proxima_recarga = 0
+        self._proximo_aviso = None
+        self._parar = threading.Event()
+        self._despertar = threading.Event()
+        self._recargar = False
+
+    # --- heap -------------------------------------------------------------
+
+    def programar(self, ticket_id, fecha_limite):
+        """Añade o mueve el vencimiento de un ticket (la entrada vieja queda obsoleta en el heap)."""
+        if self._plazos.get(ticket_id) != fecha_limite:
+            self._plazos[ticket_id] = fecha_limite
+            heapq.heappush(self._heap, (fecha_limite, ticket_id))
+
+    def descartar(self, ticket_id):
+        self._plazos.pop(ticket_id, None)
+
+    def _limpiar_cima(self):
+        while self._heap and self._plazos.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def proximo_vencimiento(self):
+        self._limpiar_cima()
+        return self._heap[0][0] if self._heap else None
+
+    def extraer_vencidos(self, ahora):
+        """Saca del heap los tickets con fecha_limite_sla < ahora y devuelve sus ids."""
+        ids = []
+        while self.proximo_vencimiento() is not None and self._heap[0][0] < ahora:
+            _, ticket_id = heapq.heappop(self._heap)
+            del self._plazos[ticket_id]
+            ids.append(ticket_id)
+        return ids
+
+    def __len__(self):
+        return len(self._plazos)
+
+    # --- sincronización con la BD -------------------------------------------
+
+    def cargar(self, ahora=None):
+        """Reconstruye el heap con todos los abiertos sin notificar (y sin el SLA en pausa)."""
+        ahora = ahora or timezone.now()
+        filas = (
+            Ticket.objects
+            .filter(estado__in=Ticket.ESTADOS_SLA_ACTIVO, notificacion_sla_enviada=False)
+            .order_by()
+            .values_list('fecha_limite_sla', 'id')
+        )
+        self._heap = list(filas.iterator())
+        heapq.heapify(self._heap)
+        self._plazos = {ticket_id: fecha for fecha, ticket_id in self._heap}
+        self._ultima_revision = ahora
+        self._proxima_recarga = time.monotonic() + self.resync
+
+    def refrescar(self, ahora=None):
+        """Aplica al heap los tickets modificados desde la última revisión."""
+        ahora = ahora or timezone.now()
+        cambios = tickets_modificados(self._ultima_revision - MARGEN_CAMBIOS)
+        n = 0
+        for ticket_id, estado, fecha_limite, notificado in cambios.iterator():
+            if estado in Ticket.ESTADOS_SLA_ACTIVO and not notificado:
+                self.programar(ticket_id, fecha_limite)
+            else:
+                self.descartar(ticket_id)
+            n += 1
+        self._ultima_revision = ahora
+        return n
+
+    # --- bucle ----------------------------------------------------------------
+
+    def segundos_hasta_despertar(self, ahora):
+        """Hasta el próximo vencimiento o aviso, sin pasar del intervalo de refresco."""
+        candidatos = [f for f in (self.proximo_vencimiento(), self._proximo_aviso) if f is not None]
+        if not candidatos:
+            return self.intervalo
+        return max(0, min((min(candidatos) - ahora).total_seconds(), self.intervalo))
+
+    def ciclo(self, ahora=None):
+        """Sincroniza el heap y notifica si hay vencimientos. Devuelve las estadísticas o None."""
+        ahora = ahora or timezone.now()
+        if self._recargar or time.monotonic() >= self._proxima_recarga:
+            self._recargar = False
+            self.cargar(ahora)
+        else:
+            self.refrescar(ahora)
+
+        avisos, self._proximo_aviso = procesar_avisos_sla(
+            ahora, hasta=ahora + timedelta(seconds=self.intervalo), lote=self.lote
+        )
+        if avisos:
+            self.log(f"[SLA] {len(avisos)} aviso(s) previo(s) al vencimiento enviados.")
+
+        if not self.extraer_vencidos(ahora):
+            return None
+
+        stats = notificar_sla_pendientes(self.lote)
+        if stats['tickets']:
+            self.log(
+                f"[SLA] {len(stats['tickets'])} ticket(s) vencido(s) notificados "
+                f"({stats['notificaciones']} notificaciones web, push resumen en envío {stats['resumen'].pk})"
+            )
+        return stats
+
+    def ejecutar(self):
+        """Bucle principal: hasta que se llame a detener()."""
+        self.cargar()
+        self.log(f"[SLA] Agenda cargada: {len(self)} ticket(s) abiertos pendientes de vencer.")
+        while not self._parar.is_set():
+            # Conexiones caídas o con CONN_MAX_AGE vencido en un proceso que no termina nunca
+            close_old_connections()
+            try:
+                self.ciclo()
+            except Exception as exc:
+                self.log(f"[SLA] Error en el ciclo: {exc}")
+                self._recargar = True
+            self._despertar.wait(self.segundos_hasta_despertar(timezone.now()))
+            self._despertar.clear()
+        close_old_connections()
+
+    def detener(self):
+        """Termina el bucle tras el ciclo en curso (llamado desde SIGTERM/SIGINT)."""
+        self._parar.set()
+        self._despertar.set()
+
+    def pedir_recarga(self):
+        """Fuerza una recarga completa del heap en el siguiente ciclo (SIGHUP)."""
+        self._recargar = True
+        self._despertar.set()
@@ -0,0 +1,308 @@
+# apps/tickets/almacen.py
+"""
+Almacén de ficheros por contenido para las fotos de tickets.
+
+Cada fichero se guarda una sola vez en MEDIA_ROOT/cas/ab/cd/<sha256><ext>:
+dos subidas con el mismo contenido (la misma captura de WhatsApp en dos
+tickets, la misma miniatura) comparten fichero. BlobContenido lleva la
+cuenta de cuántas filas apuntan a cada blob:
+
+- los signals (signals.py) la ajustan en save()/delete() de los modelos con
+  campos en este almacén, también en los borrados en CASCADE;
+- las operaciones en bloque (bulk_create, update) llaman a `ajustar_referencias`.
+
+La cuenta es un índice para encontrar candidatos, no la fuente de verdad:
+`recoger_blobs` vuelve a contar las referencias reales antes de borrar nada
+y solo borra blobs que llevan ALMACEN_GRACIA_HORAS sin referencias (una
+subida en curso que reutiliza un blob "lo toca" y reinicia ese plazo).
+Borrar un FieldFile de un blob no borra el fichero: puede estar compartido.
+"""
+import hashlib
+import os
+import uuid
+from collections import Counter
+from datetime import timedelta
+from functools import lru_cache
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import Case, Count, DateTimeField, F, FileField, Value, When
+from django.utils import timezone
+
+PREFIJO = 'cas/'
+
+# Blobs por consulta al recontar / recoger
+LOTE = 500
+
+
+def _gracia():
+    return timedelta(hours=getattr(settings, 'ALMACEN_GRACIA_HORAS', 24))
+
+
+def nombre_blob(sha256, extension=''):
+    return f"{PREFIJO}{sha256[:2]}/{sha256[2:4]}/{sha256}{extension.lower()}"
+
+
+def es_blob(nombre):
+    return bool(nombre) and nombre.startswith(PREFIJO)
+
+
+class AlmacenContenido(FileSystemStorage):
+    """FileSystemStorage direccionado por SHA-256 (ver el docstring del módulo)."""
+
+    def get_available_name(self, name, max_length=None):
+        # El nombre definitivo lo decide _save() a partir del contenido
+        return name
+
+    def _save(self, name, content):
+        sha = hashlib.sha256()
+        tamano = 0
+        for trozo in content.chunks():
+            sha.update(trozo)
+            tamano += len(trozo)
+        nombre = nombre_blob(sha.hexdigest(), os.path.splitext(name)[1])
+
+        # Primero la fila (reinicia la gracia si el blob estaba sin referencias),
+        # luego el fichero: si recoger_blobs lo acaba de borrar, se vuelve a escribir
+        registrar_blob(nombre, sha.hexdigest(), tamano)
+        ruta = self.path(nombre)
+        if not os.path.exists(ruta):
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            temporal = f"{ruta}.{uuid.uuid4().hex}.tmp"
+            if hasattr(content, 'temporary_file_path'):
+                # Subida ya en disco (TemporaryUploadedFile, parcial de adjuntos.py): rename
+                file_move_safe(content.temporary_file_path(), temporal)
+            else:
+                with open(temporal, 'wb') as destino:
+                    for trozo in content.chunks():
+                        destino.write(trozo)
+            # Atómico: nunca se sirve un blob a medio escribir
+            os.replace(temporal, ruta)
+            if self.file_permissions_mode is not None:
+                os.chmod(ruta, self.file_permissions_mode)
+        return nombre
+
+    def enlazar(self, ruta, extension=''):
+        """
+        Blob de un fichero que ya está en disco (migración del árbol antiguo):
+        hard link si se puede, copia si no. Devuelve el nombre del blob.
+        """
+        with open(ruta, 'rb') as original:
+            sha = _sha256(original)
+        nombre = nombre_blob(sha.hexdigest(), extension)
+        registrar_blob(nombre, sha.hexdigest(), os.path.getsize(ruta))
+        destino = self.path(nombre)
+        if not os.path.exists(destino):
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            temporal = f"{destino}.{uuid.uuid4().hex}.tmp"
+            try:
+                os.link(ruta, temporal)
+            except OSError:
+                with open(ruta, 'rb') as origen, open(temporal, 'wb') as copia:
+                    for trozo in iter(lambda: origen.read(64 * 1024), b''):
+                        copia.write(trozo)
+            os.replace(temporal, destino)
+        return nombre
+
+    def delete(self, name):
+        # Los blobs pueden estar compartidos: solo los borra recoger_blobs.
+        # Los ficheros anteriores al almacén (fotos_tickets/...) sí se borran.
+        if not es_blob(name):
+            super().delete(name)
+
+    def borrar_blob(self, nombre):
+        super().delete(nombre)
+
+
+def _sha256(fichero):
+    sha = hashlib.sha256()
+    for trozo in iter(lambda: fichero.read(64 * 1024), b''):
+        sha.update(trozo)
+    return sha
+
+
+_almacen = AlmacenContenido()
+
+
+def almacen_contenido():
+    """Storage de los campos de fotos (callable: las migraciones no fijan la ruta)."""
+    return _almacen
+
+
+# =====================================================================
+# Referencias
+# =====================================================================
+
+def campos_blob(modelo=None):
+    """[(modelo, nombre del campo)] de los FileField guardados en este almacén."""
+    if modelo is not None:
+        return _campos_modelo(modelo)
+    return [par for m in apps.get_models() for par in _campos_modelo(m)]
+
+
+@lru_cache(maxsize=None)
+def _campos_modelo(modelo):
+    # Se llama en cada post_init de los modelos con fotos: se calcula una vez
+    return [
+        (modelo, campo.name)
+        for campo in modelo._meta.concrete_fields
+        if isinstance(campo, FileField) and campo.storage is _almacen
+    ]
+
+
+def nombres_blob(instancia):
+    """
+    {campo: nombre} de los blobs de `instancia`. Los campos diferidos (.only())
+    no se cargan: quedan fuera y su referencia no se ajusta (el recuento
+    completo de recoger_blobs --recontar lo corrige).
+    """
+    nombres = {}
+    for _, campo in campos_blob(type(instancia)):
+        if campo in instancia.__dict__:
+            valor = instancia.__dict__[campo]
+            nombres[campo] = getattr(valor, 'name', valor) or ''
+    return nombres
+
+
+def registrar_blob(nombre, sha256, tamano):
+    """Crea la fila del blob o, si ya existe sin referencias, reinicia su gracia."""
+    from .models import BlobContenido
+
+    ahora = timezone.now()
+    with transaction.atomic():
+        tocados = BlobContenido.objects.filter(nombre=nombre).update(
+            fecha_sin_referencias=Case(
+                When(referencias__lte=0, then=Value(ahora)),
+                default=F('fecha_sin_referencias'),
+            ),
+        )
+        if not tocados:
+            BlobContenido.objects.get_or_create(
+                nombre=nombre,
+                defaults={'sha256': sha256, 'tamano': tamano, 'fecha_sin_referencias': ahora},
+            )
+
+
+def ajustar_referencias(sumar=(), restar=()):
+    """Suma / resta una referencia a cada blob nombrado (los nombres que no son blobs se ignoran)."""
+    from .models import BlobContenido
+
+    cambios = Counter(n for n in sumar if es_blob(n))
+    cambios.subtract(n for n in restar if es_blob(n))
+    ahora = timezone.now()
+    for nombre, delta in cambios.items():
+        if not delta:
+            continue
+        # En el UPDATE, `referencias` del CASE es el valor anterior
+        BlobContenido.objects.filter(nombre=nombre).update(
+            referencias=F('referencias') + delta,
+            fecha_sin_referencias=Case(
+                When(referencias__lte=-delta, then=Value(ahora)),
+                default=Value(None, output_field=DateTimeField()),
+            ),
+        )
+
+
+def contar_referencias(nombres=None):
+    """Counter {nombre: filas que lo referencian} contando en todos los campos del almacén."""
+    conteo = Counter()
+    for modelo, campo in campos_blob():
+        qs = modelo._base_manager.filter(**{f'{campo}__startswith': PREFIJO})
+        if nombres is not None:
+            qs = qs.filter(**{f'{campo}__in': list(nombres)})
+        filas = qs.order_by().values(campo).annotate(n=Count('pk')).values_list(campo, 'n')
+        for nombre, n in filas:
+            conteo[nombre] += n
+    return conteo
+
+
+def _fijar_referencias(blob, n, ahora):
+    from .models import BlobContenido
+
+    blob.referencias = n
+    blob.fecha_sin_referencias = None if n else (blob.fecha_sin_referencias or ahora)
+    BlobContenido.objects.filter(pk=blob.pk).update(
+        referencias=blob.referencias, fecha_sin_referencias=blob.fecha_sin_referencias,
+    )
+
+
+def recontar_referencias(ahora=None):
+    """Rehace todas las cuentas desde las tablas. Devuelve cuántas se corrigieron."""
+    from .models import BlobContenido
+
+    ahora = ahora or timezone.now()
+    conteo = contar_referencias()
+    corregidos = 0
+    for blob in BlobContenido.objects.only('id', 'nombre', 'referencias', 'fecha_sin_referencias').iterator():
+        n = conteo.get(blob.nombre, 0)
+        if n != blob.referencias:
+            _fijar_referencias(blob, n, ahora)
+            corregidos += 1
+    return corregidos
+
+
+def recoger_blobs(ahora=None, simular=False):
+    """
+    Borra los blobs sin referencias desde hace más de ALMACEN_GRACIA_HORAS,
+    tras comprobar en las tablas que de verdad nadie los usa, y los ficheros
+    de cas/ sin fila (p. ej. de una transacción que hizo rollback).
+    Devuelve (blobs borrados, bytes liberados, ficheros huérfanos borrados).
+    """
+    from .models import BlobContenido
+
+    ahora = ahora or timezone.now()
+    limite = ahora - _gracia()
+    libres = dict(referencias__lte=0, fecha_sin_referencias__lt=limite)
+
+    borrados = liberados = 0
+    ultimo_id = 0
+    while True:
+        lote = list(BlobContenido.objects.filter(id__gt=ultimo_id, **libres).order_by('id')[:LOTE])
+        if not lote:
+            break
+        ultimo_id = lote[-1].id
+        reales = contar_referencias([blob.nombre for blob in lote])
+        for blob in lote:
+            if reales.get(blob.nombre):
+                # La cuenta se había desviado: se corrige y el blob se queda
+                _fijar_referencias(blob, reales[blob.nombre], ahora)
+                continue
+            if not simular:
+                with transaction.atomic():
+                    # Condicional: si una subida lo ha tocado entre medias, no se borra
+                    if not BlobContenido.objects.filter(pk=blob.pk, **libres).delete()[0]:
+                        continue
+                    _almacen.borrar_blob(blob.nombre)
+            borrados += 1
+            liberados += blob.tamano
+
+    return borrados, liberados, _recoger_huerfanos(limite, simular)
+
+
+def _recoger_huerfanos(limite, simular):
+    from .models import BlobContenido
+
+    raiz = _almacen.path(PREFIJO)
+    if not os.path.isdir(raiz):
+        return 0
+    marca = limite.timestamp()
+    huerfanos = 0
+    for directorio, _, ficheros in os.walk(raiz):
+        candidatos = {}
+        for fichero in ficheros:
+            ruta = os.path.join(directorio, fichero)
+            if os.path.getmtime(ruta) < marca:
+                candidatos[os.path.relpath(ruta, _almacen.location).replace(os.sep, '/')] = ruta
+        if not candidatos:
+            continue
+        conocidos = set(BlobContenido.objects.filter(nombre__in=list(candidatos)).values_list('nombre', flat=True))
+        for nombre, ruta in candidatos.items():
+            if nombre in conocidos:
+                continue
+            huerfanos += 1
+            if not simular:
+                os.remove(ruta)
+    return huerfanos
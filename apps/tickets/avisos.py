@@ -0,0 +1,106 @@
+# apps/tickets/avisos.py
+"""
+Aviso de notificaciones nuevas para el long-poll de la campana.
+
+El navegador deja abierta una petición a `api_notificaciones_esperar` con el
+último id que conoce; la vista espera aquí hasta que aparezca una Notificacion
+más nueva para ese usuario o se agote el tiempo.
+
+Desactivado por defecto (NOTIF_LONGPOLL_SEGUNDOS = 0): con WSGI síncrono
+(PythonAnywhere) cada petición retenida ocupa un worker entero y unas pocas
+pestañas abiertas bloquean el sitio. Activarlo solo con un servidor con hilos
+o ASGI; si no, la campana usa el polling clásico cada 15 s.
+
+- Una consulta indexada al empezar (lo que ya había antes de esperar).
+- Dentro del mismo proceso, `avisar()` (llamado al confirmar cada Notificacion)
+  despierta al instante a las peticiones que esperan a ese usuario.
+- Para las creadas en otro proceso (comandos, otros workers) `avisar()` deja
+  también el último id en la caché; la espera lo mira cada
+  `NOTIF_LONGPOLL_INTERVALO` segundos sin tocar la BD. Con una caché
+  compartida (Redis, memcached, BD) el aviso es inmediato; con LocMem llega
+  en la siguiente petición.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Notificacion
+
+_condicion = threading.Condition()
+_ultimo_por_usuario = {}
+
+
+# Cuánto dura en la caché el último id avisado de cada usuario
+CACHE_SEGUNDOS = 24 * 3600
+
+
+def segundos_espera():
+    """Duración máxima de un long-poll; 0 (por defecto) lo desactiva y el JS usa el polling."""
+    return getattr(settings, 'NOTIF_LONGPOLL_SEGUNDOS', 0)
+
+
+def intervalo():
+    return getattr(settings, 'NOTIF_LONGPOLL_INTERVALO', 2)
+
+
+def clave_cache(usuario_id):
+    return f"notif_ultimo:{usuario_id}"
+
+
+def avisar(usuario_id, notificacion_id):
+    """Despierta a los long-polls de `usuario_id`: los de este proceso y, por la caché, los de otros."""
+    if notificacion_id > (cache.get(clave_cache(usuario_id)) or 0):
+        cache.set(clave_cache(usuario_id), notificacion_id, CACHE_SEGUNDOS)
+    with _condicion:
+        if notificacion_id > _ultimo_por_usuario.get(usuario_id, 0):
+            _ultimo_por_usuario[usuario_id] = notificacion_id
+        _condicion.notify_all()
+
+
+def ultimo_id(usuario_id, desde=0):
+    """Id de la notificación más reciente del usuario posterior a `desde` (o None)."""
+    return (
+        Notificacion.objects
+        .filter(usuario_id=usuario_id, id__gt=desde)
+        .order_by('-id')
+        .values_list('id', flat=True)
+        .first()
+    )
+
+
+def _hay_aviso(usuario_id, desde):
+    return (
+        _ultimo_por_usuario.get(usuario_id, 0) > desde
+        or (cache.get(clave_cache(usuario_id)) or 0) > desde
+    )
+
+
+def esperar_notificacion(usuario_id, desde, timeout=None, cada=None):
+    """
+    Bloquea hasta que el usuario tenga una notificación con id > `desde`.
+    Devuelve el id más reciente, o None si se agotó `timeout`. Consulta la BD
+    al empezar y cuando hay aviso; mientras tanto solo mira la caché.
+    """
+    timeout = segundos_espera() if timeout is None else timeout
+    cada = intervalo() if cada is None else cada
+    fin = time.monotonic() + timeout
+
+    nuevo = ultimo_id(usuario_id, desde)
+    while nuevo is None:
+        restante = fin - time.monotonic()
+        if restante <= 0:
+            return None
+
+        with _condicion:
+            _condicion.wait_for(
+                lambda: _ultimo_por_usuario.get(usuario_id, 0) > desde,
+                timeout=min(cada, restante),
+            )
+        if _hay_aviso(usuario_id, desde):
+            nuevo = ultimo_id(usuario_id, desde)
+            if nuevo is None:
+                # Aviso de una notificación ya borrada: no volver a consultar por él
+                desde = max(desde, _ultimo_por_usuario.get(usuario_id, 0), cache.get(clave_cache(usuario_id)) or 0)
+    return nuevo
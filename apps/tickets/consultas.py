@@ -0,0 +1,92 @@
+# apps/tickets/consultas.py
+"""
+Registro de las consultas "calientes" sobre Ticket y Notificacion.
+
+Cada entrada construye su queryset con la MISMA función que usa la
+vista/comando en producción (tickets_filtrados, tickets_dashboard,
+tickets_sla_pendientes...), sin copiar filtros aquí: si la vista cambia, el
+EXPLAIN de los tests ve el cambio. Los tests ejecutan EXPLAIN sobre todas
+ellas, para un admin y para un técnico, y fallan si alguna deja de usar
+índice (SCAN de la tabla completa), así que al añadir una consulta frecuente
+nueva hay que sacarla a una función, registrarla aquí y darle su índice.
+"""
+from datetime import timedelta
+
+from apps.reportes.reporte import ReportQuery
+
+from .agenda_sla import MARGEN_CAMBIOS, tickets_modificados
+from .contadores import tickets_abiertos
+from .escalamiento_sla import avisos_pendientes
+from .filtros import para_lista, tickets_dashboard, tickets_filtrados
+from .notificaciones import no_leidas, tickets_sla_pendientes
+from .paginacion import codificar_cursor, consulta_keyset
+
+
+def dashboard(usuario, ahora):
+    """Dashboard: abiertos visibles, lo más urgente arriba (usuarios.views.dashboard)."""
+    return tickets_dashboard(usuario, ahora)[:50]
+
+
+def contadores(usuario, ahora):
+    """Contadores del dashboard y badge del menú (el COUNT condicional filtra sobre esto)."""
+    return tickets_abiertos(usuario)
+
+
+def lista_tickets(usuario, ahora):
+    """tickets_lista con la pestaña por defecto: primera página."""
+    tickets, _, _ = tickets_filtrados(usuario, {})
+    return consulta_keyset(para_lista(tickets, ahora))
+
+
+def lista_tickets_pagina(usuario, ahora):
+    """tickets_lista, ?ver=todos, página siguiente por cursor."""
+    tickets, _, _ = tickets_filtrados(usuario, {'ver': 'todos'})
+    return consulta_keyset(para_lista(tickets, ahora), cursor=codificar_cursor(ahora, 1))
+
+
+def lista_drill_down(usuario, ahora):
+    """tickets_lista desde reportes: ?ver=resueltos&local=...&desde=...&hasta=..."""
+    hoy = ahora.date()
+    tickets, _, _ = tickets_filtrados(usuario, {
+        'ver': 'resueltos', 'local': '1', 'desde': str(hoy - timedelta(days=90)), 'hasta': str(hoy),
+    })
+    return consulta_keyset(para_lista(tickets, ahora))
+
+
+def sla_sin_notificar(usuario, ahora):
+    """Comando notificar_sla_vencido / sla_daemon: vencidos sin notificar."""
+    return tickets_sla_pendientes(ahora)
+
+
+def sla_daemon_cambios(usuario, ahora):
+    """sla_daemon: tickets modificados desde la última revisión."""
+    return tickets_modificados(ahora - timedelta(minutes=1) - MARGEN_CAMBIOS)
+
+
+def sla_avisos_pendientes(usuario, ahora):
+    """sla_daemon: avisos previos al vencimiento dentro de la ventana del ciclo."""
+    return avisos_pendientes(ahora + timedelta(minutes=1))
+
+
+def reportes_abiertos(usuario, ahora):
+    """Reportes: abiertos (estado actual) por banca."""
+    return ReportQuery(ahora.date() - timedelta(days=90), ahora=ahora).abiertos()
+
+
+def notificaciones_no_leidas(usuario, ahora):
+    """Polling / long-poll de la campana: no leídas del usuario, más recientes primero."""
+    return no_leidas(usuario)[:20]
+
+
+CONSULTAS_CRITICAS = {
+    'dashboard': dashboard,
+    'contadores': contadores,
+    'lista_tickets': lista_tickets,
+    'lista_tickets_pagina': lista_tickets_pagina,
+    'lista_drill_down': lista_drill_down,
+    'sla_sin_notificar': sla_sin_notificar,
+    'sla_daemon_cambios': sla_daemon_cambios,
+    'sla_avisos_pendientes': sla_avisos_pendientes,
+    'reportes_abiertos': reportes_abiertos,
+    'notificaciones_no_leidas': notificaciones_no_leidas,
+}
@@ -0,0 +1,86 @@
+# apps/tickets/contadores.py
+"""
+Contadores de tickets abiertos (dashboard, dashboard del admin y badge del sidebar).
+
+Los tres números salen de un único COUNT condicional y se guardan en caché
+unos segundos por "alcance" de visibilidad (todos / técnico N). Cualquier
+cambio en Ticket (save, delete o QuerySet.update) sube la versión y deja
+obsoletas todas las entradas de golpe, sin tener que conocer sus claves.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import Ticket
+
+CACHE_VERSION_KEY = "contadores:version"
+
+
+def _ttl():
+    # Los vencidos dependen de la hora: un TTL corto acota cuánto pueden quedarse atrás
+    return getattr(settings, 'CONTADORES_TTL', 30)
+
+
+def _version():
+    version = cache.get(CACHE_VERSION_KEY)
+    if version is None:
+        cache.add(CACHE_VERSION_KEY, 1, None)
+        version = cache.get(CACHE_VERSION_KEY, 1)
+    return version
+
+
+def invalidar_contadores():
+    """Deja obsoletos todos los contadores cacheados (se llama desde las señales)."""
+    try:
+        cache.incr(CACHE_VERSION_KEY)
+    except ValueError:
+        # La clave no existía (caché vacía o expulsada): cualquier valor nuevo sirve
+        cache.set(CACHE_VERSION_KEY, timezone.now().timestamp(), None)
+
+
+def _alcance(usuario):
+    """Clave de visibilidad: los que ven lo mismo comparten entrada de caché."""
+    if usuario is None or usuario.es_admin() or usuario.es_digitador():
+        return "todos"
+    if usuario.es_tecnico():
+        return f"tecnico:{usuario.pk}"
+    return f"usuario:{usuario.pk}"
+
+
+def tickets_abiertos(usuario=None):
+    """Abiertos visibles para `usuario` (None = todos): el WHERE de los contadores."""
+    qs = Ticket.objects.filter(estado__in=Ticket.ESTADOS_ABIERTOS)
+    return qs if usuario is None else qs.visible_para(usuario)
+
+
+def calcular_contadores(usuario=None, ahora=None):
+    """
+    Un solo SELECT con COUNT(...) FILTER para abiertos / vencidos / por vencer
+    en 2h. Los EN_ESPERA cuentan como abiertos pero no vencen (SLA en pausa).
+    """
+    ahora = ahora or timezone.now()
+    sla_activo = Q(estado__in=Ticket.ESTADOS_SLA_ACTIVO)
+    return tickets_abiertos(usuario).aggregate(
+        total_abiertos=Count('id'),
+        vencidos=Count('id', filter=sla_activo & Q(fecha_limite_sla__lt=ahora)),
+        por_vencer_2h=Count('id', filter=sla_activo & Q(
+            fecha_limite_sla__gte=ahora,
+            fecha_limite_sla__lte=ahora + timedelta(hours=2),
+        )),
+    )
+
+
+def contadores_abiertos(usuario=None):
+    """
+    Contadores de tickets abiertos visibles para `usuario` (None = todos),
+    servidos desde caché mientras no cambie ningún ticket y no venza el TTL.
+    """
+    clave = f"contadores:{_version()}:{_alcance(usuario)}"
+    datos = cache.get(clave)
+    if datos is None:
+        datos = calcular_contadores(usuario)
+        cache.set(clave, datos, _ttl())
+    return datos
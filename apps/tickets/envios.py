@@ -0,0 +1,247 @@
+# apps/tickets/envios.py
+"""
+Bandeja de salida (outbox) para push FCM y WhatsApp.
+
+Las vistas solo insertan filas EnvioPendiente dentro de su transacción;
+el comando `procesar_envios` las reclama por lotes y hace la entrega,
+reintentando con backoff exponencial si el proveedor falla.
+"""
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import EnvioPendiente, Ticket
+from .fcm import (
+    enviar_notificacion_nuevo_ticket,
+    enviar_notificacion_mencion,
+    enviar_notificacion_sla_vencido,
+    enviar_notificacion_aviso_sla,
+    enviar_resumen_sla_vencido,
+)
+from .utils import enviar_whatsapp_ticket_asignado
+
+# Cuánto tiempo reserva un worker un lote antes de que otro pueda reclamarlo.
+RESERVA_SEGUNDOS = 300
+
+# Backoff: 30s, 60s, 120s... con tope de 1 hora; tras MAX_INTENTOS queda en ERROR.
+BACKOFF_BASE_SEGUNDOS = 30
+BACKOFF_MAX_SEGUNDOS = 3600
+MAX_INTENTOS = 6
+
+
+class EnvioFallido(Exception):
+    """El proveedor no aceptó el envío; se reintentará más tarde."""
+
+
+# =====================================================================
+# Encolado (lado vista)
+# =====================================================================
+
+def encolar_nuevo_ticket(ticket):
+    """
+    Encola el WhatsApp y el push al técnico asignado de un ticket recién creado.
+    Un único INSERT (bulk_create). Llamar dentro de la transacción del ticket.
+    """
+    if not ticket.asignado_a_id:
+        return []
+
+    envios = [EnvioPendiente(tipo='PUSH_NUEVO_TICKET', ticket=ticket, usuario_id=ticket.asignado_a_id)]
+    if getattr(settings, 'WHATSAPP_ENABLED', False):
+        envios.append(EnvioPendiente(tipo='WHATSAPP_ASIGNADO', ticket=ticket, usuario_id=ticket.asignado_a_id))
+    return EnvioPendiente.objects.bulk_create(envios)
+
+
+def encolar_menciones(ticket, autor, usuarios_destino, texto):
+    """
+    Encola UN push de mención para todos los mencionados (mismo mensaje,
+    un solo multicast al entregarlo).
+    """
+    ids = [usuario.pk for usuario in usuarios_destino]
+    if not ids:
+        return []
+    return EnvioPendiente.objects.bulk_create([
+        EnvioPendiente(
+            tipo='PUSH_MENCION',
+            ticket=ticket,
+            autor=autor,
+            datos={'texto': texto, 'usuarios': ids},
+        )
+    ])
+
+
+def encolar_avisos_sla(avisos, destinatarios):
+    """
+    Encola un push "SLA por vencer" por aviso (`destinatarios`: aviso.pk → ids
+    de usuario). Un único INSERT para todo el ciclo del sla_daemon.
+    """
+    return EnvioPendiente.objects.bulk_create([
+        EnvioPendiente(
+            tipo='PUSH_AVISO_SLA',
+            ticket=aviso.ticket,
+            datos={'porcentaje': aviso.porcentaje, 'usuarios': destinatarios[aviso.pk]},
+        )
+        for aviso in avisos
+        if destinatarios.get(aviso.pk)
+    ])
+
+
+def encolar_resumen_sla(tickets, envio=None):
+    """
+    Encola el push resumen "SLA vencido" para staff con los `tickets` recién
+    marcados. `envio` es el resumen de un lote anterior de la misma ejecución:
+    si ningún worker lo ha reclamado aún se amplía (un solo push por
+    ejecución); si no, se crea otro. Llamar dentro de la transacción que marca
+    los tickets.
+    """
+    ids = [ticket.pk for ticket in tickets]
+    if envio is not None:
+        datos = {'tickets': envio.datos['tickets'] + ids}
+        if EnvioPendiente.objects.filter(pk=envio.pk, estado='PENDIENTE').update(datos=datos):
+            envio.datos = datos
+            return envio
+    # El FK es obligatorio: el primer ticket hace de referencia
+    return EnvioPendiente.objects.create(tipo='PUSH_SLA_RESUMEN', ticket=tickets[0], datos={'tickets': ids})
+
+
+# =====================================================================
+# Entrega (lado worker)
+# =====================================================================
+
+def _verificar_push(resultado):
+    # Los envíos se llaman con estricto=True: sin dispositivos devuelven un
+    # ResultadoEnvio vacío (entregado). None/False es que el envío no llegó
+    # a hacerse => reintentar, igual que si todo falló por causas distintas
+    # a tokens inválidos. Con al menos un envío OK => entregado.
+    if resultado is None or resultado is False:
+        raise EnvioFallido("FCM: el envío no devolvió resultado")
+    if not resultado.fallidos:
+        return
+    if resultado.enviados == 0 and len(resultado.tokens_invalidos) < resultado.fallidos:
+        raise EnvioFallido(f"FCM: {resultado}")
+
+
+def _entregar_push_nuevo_ticket(envio):
+    _verificar_push(enviar_notificacion_nuevo_ticket(envio.ticket, estricto=True))
+
+
+def _entregar_push_mencion(envio):
+    texto = envio.datos.get('texto', '')
+    # Filas antiguas: un envío por usuario (campo usuario) en vez de la lista
+    usuarios = envio.datos.get('usuarios') or [envio.usuario_id]
+    _verificar_push(enviar_notificacion_mencion(envio.ticket, envio.autor, usuarios, texto, estricto=True))
+
+
+def _entregar_push_sla_vencido(envio):
+    _verificar_push(enviar_notificacion_sla_vencido(envio.ticket, estricto=True))
+
+
+def _entregar_push_aviso_sla(envio):
+    _verificar_push(enviar_notificacion_aviso_sla(
+        envio.ticket, envio.datos.get('porcentaje'), envio.datos.get('usuarios', []), estricto=True,
+    ))
+
+
+def _entregar_push_sla_resumen(envio):
+    ids = envio.datos.get('tickets') or [envio.ticket_id]
+    tickets = list(
+        Ticket.objects.filter(pk__in=ids).select_related('local', 'categoria').order_by('fecha_limite_sla')
+    )
+    _verificar_push(enviar_resumen_sla_vencido(tickets, estricto=True))
+
+
+def _entregar_whatsapp_asignado(envio):
+    enviar_whatsapp_ticket_asignado(envio.ticket)
+
+
+ENTREGAS = {
+    'PUSH_NUEVO_TICKET': _entregar_push_nuevo_ticket,
+    'PUSH_MENCION': _entregar_push_mencion,
+    'PUSH_SLA_VENCIDO': _entregar_push_sla_vencido,
+    'PUSH_AVISO_SLA': _entregar_push_aviso_sla,
+    'PUSH_SLA_RESUMEN': _entregar_push_sla_resumen,
+    'WHATSAPP_ASIGNADO': _entregar_whatsapp_asignado,
+}
+
+
+def calcular_backoff(intentos):
+    """Segundos de espera antes del siguiente intento (intentos >= 1)."""
+    return min(BACKOFF_BASE_SEGUNDOS * (2 ** (intentos - 1)), BACKOFF_MAX_SEGUNDOS)
+
+
+def reclamar_lote(tamano=50, ahora=None):
+    """
+    Reserva hasta `tamano` envíos vencidos para este worker y los devuelve.
+
+    La reserva es un UPDATE condicional (funciona en SQLite sin SELECT FOR UPDATE):
+    solo se marcan las filas que siguen libres, así dos workers no toman la misma.
+    También recupera lotes PROCESANDO cuya reserva expiró (worker caído).
+    """
+    ahora = ahora or timezone.now()
+    libres = dict(
+        estado__in=['PENDIENTE', 'PROCESANDO'],
+        proximo_intento__lte=ahora,
+    )
+    ids = list(
+        EnvioPendiente.objects
+        .filter(**libres)
+        .order_by('proximo_intento', 'id')
+        .values_list('id', flat=True)[:tamano]
+    )
+    if not ids:
+        return []
+
+    lote = uuid.uuid4().hex
+    EnvioPendiente.objects.filter(id__in=ids, **libres).update(
+        estado='PROCESANDO',
+        lote=lote,
+        proximo_intento=ahora + timedelta(seconds=RESERVA_SEGUNDOS),
+    )
+    return list(
+        EnvioPendiente.objects
+        .filter(lote=lote, estado='PROCESANDO')
+        .select_related('ticket__local', 'ticket__categoria', 'ticket__asignado_a', 'usuario', 'autor')
+    )
+
+
+def procesar_lote(tamano=50, ahora=None):
+    """
+    Reclama y entrega un lote. Los éxitos se marcan con un solo UPDATE;
+    los fallos se reprograman con backoff. Devuelve (enviados, fallidos).
+    """
+    ahora = ahora or timezone.now()
+    envios = reclamar_lote(tamano, ahora)
+    if not envios:
+        return 0, 0
+
+    ok_ids = []
+    fallidos = 0
+    for envio in envios:
+        entrega = ENTREGAS.get(envio.tipo)
+        try:
+            if entrega is None:
+                raise EnvioFallido(f"Tipo de envío desconocido: {envio.tipo}")
+            entrega(envio)
+        except Exception as e:
+            fallidos += 1
+            intentos = envio.intentos + 1
+            print(f"[OUTBOX] Envío {envio.id} ({envio.tipo}) falló (intento {intentos}): {e}")
+            EnvioPendiente.objects.filter(pk=envio.pk).update(
+                estado='ERROR' if intentos >= MAX_INTENTOS else 'PENDIENTE',
+                intentos=intentos,
+                proximo_intento=ahora + timedelta(seconds=calcular_backoff(intentos)),
+                ultimo_error=str(e)[:2000],
+            )
+        else:
+            ok_ids.append(envio.pk)
+
+    if ok_ids:
+        EnvioPendiente.objects.filter(pk__in=ok_ids).update(
+            estado='ENVIADO',
+            intentos=F('intentos') + 1,
+            fecha_envio=timezone.now(),
+            ultimo_error='',
+        )
+    return len(ok_ids), fallidos
@@ -0,0 +1,113 @@
+# apps/tickets/escalamiento_sla.py
+"""
+Avisos previos al vencimiento del SLA (p. ej. al 50% y al 80% del plazo).
+
+Cada categoría define sus niveles (NivelAvisoSla); si no tiene ninguno se usan
+los de `SLA_NIVELES_AVISO`. Al abrir un ticket, o al cambiar su plazo, se crea
+una fila AvisoSla por nivel con la hora exacta del aviso. Así el sla_daemon no
+recalcula porcentajes sobre todos los abiertos: en cada ciclo hace un único
+SELECT por rango de fecha_programada sobre el índice parcial de pendientes.
+"""
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import AvisoSla, Ticket
+from .notificaciones import notificar_avisos_sla
+
+
+def porcentajes_aviso(categoria):
+    """Niveles de la categoría, o los de settings si no tiene."""
+    niveles = [nivel.porcentaje for nivel in categoria.niveles_aviso.all()]
+    return sorted(niveles or getattr(settings, 'SLA_NIVELES_AVISO', (50, 80)))
+
+
+def programar_avisos(ticket, creado=False):
+    """
+    (Re)programa los avisos pendientes de `ticket` según su plazo actual.
+    Los niveles ya enviados no se repiten aunque el plazo se amplíe.
+    """
+    pendientes = AvisoSla.objects.filter(ticket=ticket, fecha_envio__isnull=True)
+    # En pausa no hay avisos: al reanudar cambia el plazo y se reprograman
+    if ticket.estado not in Ticket.ESTADOS_SLA_ACTIVO or ticket.notificacion_sla_enviada:
+        if not creado:
+            pendientes.delete()
+        return []
+
+    enviados = set()
+    if not creado:
+        enviados = set(
+            AvisoSla.objects
+            .filter(ticket=ticket, fecha_envio__isnull=False)
+            .values_list('porcentaje', flat=True)
+        )
+
+    # Al p% le quedan (100 - p)% de las horas SLA, contadas en horario laboral
+    # hacia atrás desde el vencimiento (así también cuadra tras una pausa)
+    calendario = ticket.calendario_sla()
+    segundos_sla = ticket.categoria.tiempo_sla_horas * 3600
+    avisos = [
+        AvisoSla(
+            ticket=ticket,
+            porcentaje=porcentaje,
+            fecha_programada=calendario.restar(ticket.fecha_limite_sla, segundos_sla * (100 - porcentaje) / 100),
+        )
+        for porcentaje in porcentajes_aviso(ticket.categoria)
+        if porcentaje not in enviados
+    ]
+    with transaction.atomic():
+        if not creado:
+            pendientes.delete()
+        return AvisoSla.objects.bulk_create(avisos)
+
+
+def avisos_pendientes(hasta):
+    """Avisos sin enviar programados hasta `hasta`, por hora (rango sobre aviso_sla_pendiente_idx)."""
+    return (
+        AvisoSla.objects
+        .filter(fecha_envio__isnull=True, fecha_programada__lte=hasta)
+        .select_related('ticket__local', 'ticket__categoria')
+        .order_by('fecha_programada')
+    )
+
+
+def procesar_avisos_sla(ahora=None, hasta=None, lote=500):
+    """
+    Envía los avisos cuya hora ya llegó y devuelve (avisos_enviados, proximo),
+    donde `proximo` es la hora del siguiente aviso pendiente dentro de la
+    ventana [ahora, hasta] (None si no hay ninguno).
+
+    Una sola consulta trae lo vencido y lo próximo de la ventana. Cada ejecución
+    reclama sus avisos con un UPDATE condicional que marca un `lote` propio y
+    solo notifica los que reclamó: si dos procesos leen el mismo lote, el
+    aviso sale una vez. Los avisos de tickets ya cerrados o vencidos se marcan
+    sin notificar.
+    """
+    ahora = ahora or timezone.now()
+    hasta = max(hasta or ahora, ahora)
+    filas = list(avisos_pendientes(hasta)[:lote])
+    toca = [aviso for aviso in filas if aviso.fecha_programada <= ahora]
+    futuros = [aviso.fecha_programada for aviso in filas if aviso.fecha_programada > ahora]
+    # Lote lleno de avisos vencidos: quedan más, volver enseguida
+    proximo = ahora if len(toca) == lote else (futuros[0] if futuros else None)
+    if not toca:
+        return [], proximo
+
+    lote_id = uuid.uuid4().hex
+    with transaction.atomic():
+        AvisoSla.objects.filter(
+            pk__in=[aviso.pk for aviso in toca],
+            fecha_envio__isnull=True,
+        ).update(fecha_envio=ahora, lote=lote_id)
+        reclamados = set(AvisoSla.objects.filter(lote=lote_id).values_list('pk', flat=True))
+        vigentes = [
+            aviso for aviso in toca
+            if aviso.pk in reclamados
+            and aviso.ticket.estado in Ticket.ESTADOS_SLA_ACTIVO
+            and not aviso.ticket.notificacion_sla_enviada
+            and aviso.ticket.fecha_limite_sla > ahora
+        ]
+        notificar_avisos_sla(vigentes)
+    return vigentes, proximo
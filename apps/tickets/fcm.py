@@ -1,8 +1,19 @@
 # apps/tickets/fcm.py
 
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone as dt_timezone
+
 import requests
+from requests.adapters import HTTPAdapter
 from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
 from django.urls import reverse
+from django.utils import timezone
 
 from apps.usuarios.models import DispositivoNotificacion
 
@@ -11,212 +22,564 @@ from google.auth.transport.requests import Request
 
 SCOPES = ["https://www.googleapis.com/auth/firebase.messaging"]
 
+# Clave del token compartido en la caché de Django (visible para todos los workers
+# si la caché configurada es compartida: archivo, base de datos, redis...).
+TOKEN_CACHE_KEY = "fcm:access_token"
+
+FCM_SEND_URL = "https://fcm.googleapis.com/v1/projects/{project_id}/messages:send"
+
+# Renovamos el token este número de segundos antes de que expire realmente.
+TOKEN_MARGEN_SEGUNDOS = 300
+
+
+class ProveedorTokenFCM:
+    """
+    Proveedor de access tokens OAuth2 para FCM compartido por todo el proceso.
+
+    - Carga el JSON de servicio una sola vez y mantiene las credenciales en memoria.
+    - Reutiliza el token hasta TOKEN_MARGEN_SEGUNDOS antes de su expiración.
+    - Refresca bajo un lock para que peticiones concurrentes no disparen N refrescos.
+    - Publica el token en la caché de Django para que otros workers lo reutilicen.
+    """
+
+    def __init__(self, credenciales=None, transporte=None, reloj=time.time,
+                 margen=TOKEN_MARGEN_SEGUNDOS, cache_key=TOKEN_CACHE_KEY):
+        self._credenciales = credenciales
+        self._transporte = transporte
+        self._reloj = reloj
+        self._margen = margen
+        self._cache_key = cache_key
+        self._lock = threading.Lock()
+        self._token = None
+        self._expira = 0.0
+
+    def _vigente(self, expira):
+        return self._reloj() < expira - self._margen
+
+    def _get_credenciales(self):
+        if self._credenciales is None:
+            print("[FCM] Cargando credenciales de servicio...")
+            self._credenciales = service_account.Credentials.from_service_account_file(
+                str(settings.FIREBASE_CREDENTIALS_FILE),
+                scopes=SCOPES,
+            )
+        return self._credenciales
+
+    def _refrescar(self):
+        credenciales = self._get_credenciales()
+        credenciales.refresh(self._transporte or Request())
+
+        # google-auth expresa la expiración como datetime UTC naive; la convertimos
+        # a segundos restantes para poder usar nuestro propio reloj.
+        if credenciales.expiry is not None:
+            ahora_utc = datetime.now(dt_timezone.utc).replace(tzinfo=None)
+            restante = (credenciales.expiry - ahora_utc).total_seconds()
+        else:
+            restante = 3600
+        return credenciales.token, self._reloj() + restante
+
+    def get_token(self):
+        """Devuelve un access token válido, refrescándolo solo si hace falta."""
+        if self._token and self._vigente(self._expira):
+            return self._token
+
+        with self._lock:
+            # Otro hilo pudo haberlo refrescado mientras esperábamos el lock.
+            if self._token and self._vigente(self._expira):
+                return self._token
+
+            compartido = cache.get(self._cache_key)
+            if compartido and self._vigente(compartido["expira"]):
+                self._token = compartido["token"]
+                self._expira = compartido["expira"]
+                return self._token
+
+            print("[FCM] Obteniendo access token...")
+            token, expira = self._refrescar()
+            self._token = token
+            self._expira = expira
+
+            timeout = int(expira - self._margen - self._reloj())
+            if timeout > 0:
+                cache.set(self._cache_key, {"token": token, "expira": expira}, timeout)
+            print("[FCM] Access token obtenido OK.")
+            return token
+
+    def invalidar(self):
+        """Olvida el token actual (p.ej. tras un 401 de FCM)."""
+        with self._lock:
+            self._token = None
+            self._expira = 0.0
+            cache.delete(self._cache_key)
+
+
+proveedor_token = ProveedorTokenFCM()
+
 
 def _get_access_token():
     """
     Obtiene un token de acceso OAuth2 usando el JSON de servicio de Firebase.
+    El token se cachea y se comparte entre todos los envíos (ver ProveedorTokenFCM).
+    """
+    return proveedor_token.get_token()
+
+
+# =====================================================================
+# Cliente HTTP: sesión keep-alive + envío concurrente a varios tokens
+# =====================================================================
+
+# Códigos de error FCM v1 que indican que el token ya no sirve y hay que dejar de usarlo.
+# (INVALID_ARGUMENT solo cuenta cuando el error se refiere al token, ver parsear_error_fcm)
+CODIGOS_TOKEN_MUERTO = {"UNREGISTERED", "INVALID_ARGUMENT", "SENDER_ID_MISMATCH"}
+
+FCM_ERROR_TYPE = "type.googleapis.com/google.firebase.fcm.v1.FcmError"
+BAD_REQUEST_TYPE = "type.googleapis.com/google.rpc.BadRequest"
+
+
+def parsear_error_fcm(status, texto):
+    """
+    Interpreta una respuesta de error de FCM HTTP v1.
+
+    Devuelve (codigo, token_muerto):
+    - codigo: errorCode de FcmError (UNREGISTERED, QUOTA_EXCEEDED...), o el
+      status de google.rpc, o "HTTP_<status>" / "RED" si no hay payload.
+    - token_muerto: True si el token debe desactivarse.
     """
-    print("[FCM] Obteniendo access token...")
+    if status is None:
+        return "RED", False
 
-    credentials = service_account.Credentials.from_service_account_file(
-        str(settings.FIREBASE_CREDENTIALS_FILE),
-        scopes=SCOPES,
+    try:
+        error = json.loads(texto or "{}").get("error") or {}
+    except (ValueError, AttributeError):
+        error = {}
+
+    codigo = None
+    campo_token = False
+    for detalle in error.get("details") or []:
+        tipo = detalle.get("@type")
+        if tipo == FCM_ERROR_TYPE and detalle.get("errorCode"):
+            codigo = detalle["errorCode"]
+        elif tipo == BAD_REQUEST_TYPE:
+            campo_token = any(
+                (v.get("field") or "").endswith("token")
+                for v in detalle.get("fieldViolations") or []
+            )
+
+    codigo = codigo or error.get("status") or f"HTTP_{status}"
+    if codigo == "NOT_FOUND" and status == 404:
+        # Algunas respuestas solo traen el status genérico
+        codigo = "UNREGISTERED"
+
+    if codigo == "INVALID_ARGUMENT":
+        mensaje = (error.get("message") or "").lower()
+        return codigo, campo_token or "registration token" in mensaje
+    return codigo, codigo in CODIGOS_TOKEN_MUERTO
+
+
+@dataclass
+class ResultadoEnvio:
+    """Resumen de un envío multicast."""
+    enviados: int = 0
+    fallidos: int = 0
+    tokens_enviados: list = field(default_factory=list)
+    tokens_invalidos: list = field(default_factory=list)
+    # token -> (status HTTP o None, código de error, texto de la respuesta)
+    errores: dict = field(default_factory=dict)
+
+    @property
+    def total(self):
+        return self.enviados + self.fallidos
+
+    def __str__(self):
+        return (
+            f"{self.enviados} enviado(s), {self.fallidos} fallido(s), "
+            f"{len(self.tokens_invalidos)} token(s) inválido(s)"
+        )
+
+
+class ClienteFCM:
+    """
+    Cliente reutilizable de FCM HTTP v1.
+
+    Mantiene una única requests.Session con pool de conexiones keep-alive
+    (sin abrir un TLS nuevo por mensaje) y reparte los envíos a varios tokens
+    en un pool de hilos acotado. Cada mensaje tiene su propio timeout.
+    """
+
+    def __init__(self, url=None, proveedor=None, max_workers=None, timeout=None, session=None,
+                 registrar_salud=True):
+        self.url = url or FCM_SEND_URL.format(project_id=settings.FIREBASE_PROJECT_ID)
+        self.proveedor = proveedor or proveedor_token
+        self.max_workers = max_workers or getattr(settings, "FCM_MAX_WORKERS", 8)
+        self.timeout = timeout or getattr(settings, "FCM_TIMEOUT", (3, 10))
+        self.registrar_salud = registrar_salud
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers, max_retries=0)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        self.session = session
+
+    def _post(self, cuerpo):
+        headers = {
+            "Authorization": f"Bearer {self.proveedor.get_token()}",
+            "Content-Type": "application/json; charset=UTF-8",
+        }
+        return self.session.post(self.url, headers=headers, json=cuerpo, timeout=self.timeout)
+
+    def enviar(self, mensaje):
+        """
+        Envía un único mensaje ({"token": ..., "notification": ...}).
+        Si FCM responde 401 se descarta el access token y se reintenta una vez.
+        """
+        cuerpo = {"message": mensaje}
+        resp = self._post(cuerpo)
+        if resp.status_code == 401:
+            self.proveedor.invalidar()
+            resp = self._post(cuerpo)
+        return resp
+
+    def _enviar_a_token(self, token, mensaje):
+        try:
+            resp = self.enviar({**mensaje, "token": token})
+        except requests.RequestException as e:
+            return token, None, str(e)
+        return token, resp.status_code, resp.text
+
+    def enviar_multicast(self, tokens, mensaje):
+        """
+        Envía el mismo mensaje (sin "token") a todos los tokens de forma concurrente.
+        Al terminar el lote actualiza en bloque la salud de los dispositivos
+        (contadores de fallos y desactivación de tokens muertos).
+        Devuelve un ResultadoEnvio.
+        """
+        resultado = ResultadoEnvio()
+        tokens = list(tokens)
+        if not tokens:
+            return resultado
+
+        workers = min(self.max_workers, len(tokens))
+        if workers == 1:
+            respuestas = [self._enviar_a_token(tokens[0], mensaje)]
+        else:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fcm") as pool:
+                respuestas = list(pool.map(lambda t: self._enviar_a_token(t, mensaje), tokens))
+
+        for token, status, texto in respuestas:
+            if status is not None and 200 <= status < 300:
+                resultado.enviados += 1
+                resultado.tokens_enviados.append(token)
+                continue
+            resultado.fallidos += 1
+            codigo, muerto = parsear_error_fcm(status, texto)
+            resultado.errores[token] = (status, codigo, texto)
+            if muerto:
+                resultado.tokens_invalidos.append(token)
+
+        if self.registrar_salud:
+            registrar_salud_dispositivos(resultado)
+        return resultado
+
+
+def registrar_salud_dispositivos(resultado):
+    """
+    Aplica un ResultadoEnvio a DispositivoNotificacion con pocas consultas en bloque:
+    - tokens muertos => activo=False (dejan de recibir envíos)
+    - otros fallos => fallos_consecutivos + 1 (una UPDATE por código de error)
+    - envíos correctos => fallos_consecutivos = 0 (solo si tenían fallos)
+    """
+    ahora = timezone.now()
+    dispositivos = DispositivoNotificacion.objects
+
+    if resultado.tokens_enviados:
+        dispositivos.filter(
+            fcm_token__in=resultado.tokens_enviados,
+            fallos_consecutivos__gt=0,
+        ).update(fallos_consecutivos=0)
+
+    por_codigo = {}
+    for token, (status, codigo, texto) in resultado.errores.items():
+        por_codigo.setdefault(codigo, []).append(token)
+
+    muertos = set(resultado.tokens_invalidos)
+    for codigo, tokens in por_codigo.items():
+        cambios = {
+            "fallos_consecutivos": F("fallos_consecutivos") + 1,
+            "ultimo_error": codigo[:50],
+            "fecha_ultimo_error": ahora,
+        }
+        vivos = [t for t in tokens if t not in muertos]
+        if vivos:
+            dispositivos.filter(fcm_token__in=vivos).update(**cambios)
+        tokens_muertos = [t for t in tokens if t in muertos]
+        if tokens_muertos:
+            dispositivos.filter(fcm_token__in=tokens_muertos).update(activo=False, **cambios)
+
+    if muertos:
+        print(f"[FCM] {len(muertos)} token(s) muerto(s) desactivado(s).")
+
+
+_cliente = None
+_cliente_lock = threading.Lock()
+
+
+def get_cliente_fcm():
+    """Devuelve el ClienteFCM compartido por el proceso (se crea al primer uso)."""
+    global _cliente
+    if _cliente is None:
+        with _cliente_lock:
+            if _cliente is None:
+                _cliente = ClienteFCM()
+    return _cliente
+
+
+def _tokens_activos(**filtros):
+    return list(
+        DispositivoNotificacion.objects
+        .filter(activo=True, **filtros)
+        .exclude(fcm_token__isnull=True)
+        .exclude(fcm_token__exact="")
+        .values_list("fcm_token", flat=True)
     )
-    credentials.refresh(Request())
-    print("[FCM] Access token obtenido OK.")
-    return credentials.token
 
 
-def enviar_notificacion_nuevo_ticket(ticket):
+def _ticket_url(ticket):
+    relative_url = reverse("ticket_detalle", args=[ticket.pk])
+    return settings.BASE_URL.rstrip("/") + relative_url
+
+
+def enviar_notificacion_nuevo_ticket(ticket, estricto=False):
     """
     Envía una notificación push FCM al técnico asignado al ticket.
     Usa HTTP v1: https://fcm.googleapis.com/v1/projects/PROJECT_ID/messages:send
+
+    Con `estricto` (bandeja de salida) los errores se propagan y, si no hay a
+    quién enviar, devuelve un ResultadoEnvio vacío en vez de None.
     """
     try:
         if not ticket.asignado_a:
             print(f"[FCM] Ticket {ticket.id}: sin técnico asignado. No se envía push.")
-            return
+            return ResultadoEnvio() if estricto else None
 
         # 1) Buscar dispositivos activos del técnico
-        dispositivos = DispositivoNotificacion.objects.filter(
-            usuario=ticket.asignado_a,
-            activo=True,
-        ).exclude(fcm_token__isnull=True).exclude(fcm_token__exact="")
+        tokens = _tokens_activos(usuario=ticket.asignado_a)
 
-        if not dispositivos.exists():
+        if not tokens:
             print(f"[FCM] Ticket {ticket.id}: el técnico {ticket.asignado_a} no tiene dispositivos activos.")
-            return
-
-        print(f"[FCM] Ticket {ticket.id}: encontré {dispositivos.count()} dispositivo(s) para {ticket.asignado_a}.")
+            return ResultadoEnvio() if estricto else None
 
-        # 2) Access token
-        access_token = _get_access_token()
-
-        url = f"https://fcm.googleapis.com/v1/projects/{settings.FIREBASE_PROJECT_ID}/messages:send"
-        headers = {
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json; charset=UTF-8",
-        }
+        print(f"[FCM] Ticket {ticket.id}: encontré {len(tokens)} dispositivo(s) para {ticket.asignado_a}.")
 
-        # 3) Construir la URL correcta del ticket usando reverse
+        # 2) Construir la URL correcta del ticket usando reverse
         #    En urls.py: path('tickets/<int:pk>/', views.ticket_detalle, name='ticket_detalle')
-        relative_url = reverse("ticket_detalle", args=[ticket.pk])
-        ticket_url = settings.BASE_URL.rstrip("/") + relative_url
+        ticket_url = _ticket_url(ticket)
         print(f"[FCM] URL del ticket: {ticket_url}")
 
-        # 4) Enviar a cada dispositivo
-        for disp in dispositivos:
-            cuerpo = {
-                "message": {
-                    "token": disp.fcm_token,
-                    "notification": {
-                        "title": f"Nuevo ticket {ticket.numero_ticket}",
-                        "body": f"{ticket.local} - {ticket.categoria.nombre if ticket.categoria else ''}",
-                    },
-                    "data": {
-                        "ticket_id": str(ticket.id),
-                        "ticket_url": ticket_url,
-                        "estado": ticket.estado,
-                        # Esto ayuda a que Android dispare onMessageOpenedApp
-                        "click_action": "FLUTTER_NOTIFICATION_CLICK",
-                    },
-                }
-            }
-
-            print(f"[FCM] Enviando a token {disp.fcm_token[:20]}...")
-
-            resp = requests.post(url, headers=headers, json=cuerpo, timeout=10)
+        # 3) Enviar a todos los dispositivos
+        mensaje = {
+            "notification": {
+                "title": f"Nuevo ticket {ticket.numero_ticket}",
+                "body": f"{ticket.local} - {ticket.categoria.nombre if ticket.categoria else ''}",
+            },
+            "data": {
+                "ticket_id": str(ticket.id),
+                "ticket_url": ticket_url,
+                "estado": ticket.estado,
+                # Esto ayuda a que Android dispare onMessageOpenedApp
+                "click_action": "FLUTTER_NOTIFICATION_CLICK",
+            },
+        }
 
-            print(f"[FCM] Respuesta FCM: {resp.status_code} - {resp.text}")
+        resultado = get_cliente_fcm().enviar_multicast(tokens, mensaje)
+        print(f"[FCM] Ticket {ticket.id}: {resultado}")
+        return resultado
 
     except Exception as e:
+        if estricto:
+            raise
         # Cualquier error lo imprimimos para verlo en los logs de PythonAnywhere
         print(f"[FCM] ERROR enviando notificación: {e}")
 
 
-def enviar_notificacion_sla_vencido(ticket):
+def _mensaje_sla_vencido(ticket):
+    return {
+        "notification": {
+            "title": f"SLA vencido {ticket.numero_ticket}",
+            "body": f"{ticket.local} - {ticket.categoria.nombre if ticket.categoria else ''}",
+        },
+        "data": {
+            "ticket_id": str(ticket.id),
+            "ticket_url": _ticket_url(ticket),
+            "estado": ticket.estado,
+            "tipo": "sla_vencido",
+            "click_action": "FLUTTER_NOTIFICATION_CLICK",
+        },
+    }
+
+
+def enviar_notificacion_sla_vencido(ticket, estricto=False):
     """
     Envía una notificación push FCM a usuarios staff cuando un ticket vence el SLA.
+    Con `estricto` devuelve el ResultadoEnvio y los errores se propagan.
     """
     try:
-        dispositivos = DispositivoNotificacion.objects.filter(
-            usuario__is_staff=True,
-            activo=True,
-        ).exclude(fcm_token__isnull=True).exclude(fcm_token__exact="")
+        tokens = _tokens_activos(usuario__is_staff=True)
 
-        if not dispositivos.exists():
+        if not tokens:
             print("[FCM] No hay dispositivos activos para usuarios staff.")
-            return False
+            return ResultadoEnvio() if estricto else False
 
-        access_token = _get_access_token()
+        mensaje = _mensaje_sla_vencido(ticket)
 
-        url = f"https://fcm.googleapis.com/v1/projects/{settings.FIREBASE_PROJECT_ID}/messages:send"
-        headers = {
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json; charset=UTF-8",
-        }
+        resultado = get_cliente_fcm().enviar_multicast(tokens, mensaje)
+        for token, (status, codigo, texto) in resultado.errores.items():
+            print(f"[FCM] Error enviando a staff: {status} - {texto}")
 
-        relative_url = reverse("ticket_detalle", args=[ticket.pk])
-        ticket_url = settings.BASE_URL.rstrip("/") + relative_url
-
-        titulo = f"SLA vencido {ticket.numero_ticket}"
-        body = f"{ticket.local} - {ticket.categoria.nombre if ticket.categoria else ''}"
-
-        enviados = 0
-        for disp in dispositivos:
-            cuerpo = {
-                "message": {
-                    "token": disp.fcm_token,
-                    "notification": {
-                        "title": titulo,
-                        "body": body,
-                    },
-                    "data": {
-                        "ticket_id": str(ticket.id),
-                        "ticket_url": ticket_url,
-                        "estado": ticket.estado,
-                        "tipo": "sla_vencido",
-                        "click_action": "FLUTTER_NOTIFICATION_CLICK",
-                    },
-                }
-            }
-
-            resp = requests.post(url, headers=headers, json=cuerpo, timeout=10)
-            if resp.status_code >= 200 and resp.status_code < 300:
-                enviados += 1
-            else:
-                print(f"[FCM] Error enviando a staff: {resp.status_code} - {resp.text}")
-
-        return enviados > 0
+        return resultado if estricto else resultado.enviados > 0
 
     except Exception as e:
+        if estricto:
+            raise
         print(f"[FCM] ERROR enviando SLA vencido: {e}")
         return False
 
 
-def enviar_notificacion_mencion(ticket, autor, usuario_destino, texto_comentario):
+def enviar_resumen_sla_vencido(tickets, max_en_texto=5, estricto=False):
     """
-    Envía una notificación push FCM cuando alguien menciona a un usuario en un comentario.
-    Solo envía si el usuario destino tiene dispositivos activos.
+    Un único push a cada dispositivo staff resumiendo todos los tickets que
+    vencieron en esta ejecución (en vez de un push por ticket).
+    Devuelve el ResultadoEnvio, o None si no había a quién enviar.
+    `estricto` como en enviar_notificacion_nuevo_ticket.
     """
+    if not tickets:
+        return ResultadoEnvio() if estricto else None
     try:
-        dispositivos = DispositivoNotificacion.objects.filter(
-            usuario=usuario_destino,
-            activo=True,
-        ).exclude(fcm_token__isnull=True).exclude(fcm_token__exact="")
+        tokens = _tokens_activos(usuario__is_staff=True)
+        if not tokens:
+            print("[FCM] No hay dispositivos activos para usuarios staff.")
+            return ResultadoEnvio() if estricto else None
+
+        if len(tickets) == 1:
+            mensaje = _mensaje_sla_vencido(tickets[0])
+        else:
+            numeros = ", ".join(t.numero_ticket for t in tickets[:max_en_texto])
+            if len(tickets) > max_en_texto:
+                numeros += f" y {len(tickets) - max_en_texto} más"
+            mensaje = {
+                "notification": {
+                    "title": f"SLA vencido en {len(tickets)} tickets",
+                    "body": numeros,
+                },
+                "data": {
+                    "ticket_url": settings.BASE_URL.rstrip("/") + reverse("tickets_lista"),
+                    "tipo": "sla_vencido_resumen",
+                    "total": str(len(tickets)),
+                    "click_action": "FLUTTER_NOTIFICATION_CLICK",
+                },
+            }
 
-        if not dispositivos.exists():
-            print(f"[FCM] Mención: {usuario_destino} no tiene dispositivos activos.")
-            return
+        resultado = get_cliente_fcm().enviar_multicast(tokens, mensaje)
+        print(f"[FCM] Resumen SLA vencido ({len(tickets)} tickets) → staff: {resultado}")
+        return resultado
 
-        nombre_autor = autor.get_full_name() or autor.username
+    except Exception as e:
+        if estricto:
+            raise
+        print(f"[FCM] ERROR enviando resumen SLA vencido: {e}")
+        return None
 
-        access_token = _get_access_token()
-        url = f"https://fcm.googleapis.com/v1/projects/{settings.FIREBASE_PROJECT_ID}/messages:send"
-        headers = {
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json; charset=UTF-8",
+
+def enviar_notificacion_aviso_sla(ticket, porcentaje, usuarios_destino, estricto=False):
+    """
+    Push "SLA por vencer" (aviso previo al vencimiento) a staff y al técnico
+    asignado: un único multicast a sus dispositivos activos.
+    `estricto` como en enviar_notificacion_nuevo_ticket.
+    """
+    try:
+        tokens = _tokens_activos(usuario__in=usuarios_destino)
+        if not tokens:
+            print("[FCM] Aviso SLA: los destinatarios no tienen dispositivos activos.")
+            return ResultadoEnvio() if estricto else None
+
+        vence = timezone.localtime(ticket.fecha_limite_sla).strftime("%H:%M")
+        mensaje = {
+            "notification": {
+                "title": f"SLA al {porcentaje}% {ticket.numero_ticket}",
+                "body": f"{ticket.local} - vence a las {vence}",
+            },
+            "data": {
+                "ticket_id": str(ticket.id),
+                "ticket_url": _ticket_url(ticket),
+                "estado": ticket.estado,
+                "tipo": "sla_aviso",
+                "porcentaje": str(porcentaje),
+                "click_action": "FLUTTER_NOTIFICATION_CLICK",
+            },
         }
 
-        relative_url = reverse("ticket_detalle", args=[ticket.pk])
-        ticket_url = settings.BASE_URL.rstrip("/") + relative_url
+        resultado = get_cliente_fcm().enviar_multicast(tokens, mensaje)
+        print(f"[FCM] Aviso SLA {porcentaje}% {ticket.numero_ticket}: {resultado}")
+        return resultado
+
+    except Exception as e:
+        if estricto:
+            raise
+        print(f"[FCM] ERROR enviando aviso SLA: {e}")
+        return None
+
+
+def enviar_notificacion_mencion(ticket, autor, usuarios_destino, texto_comentario, estricto=False):
+    """
+    Envía una notificación push FCM cuando alguien menciona a usuarios en un comentario.
+    El mensaje es el mismo para todos: un único multicast a los dispositivos activos
+    de todos los mencionados (`usuarios_destino`: usuarios o ids).
+    `estricto` como en enviar_notificacion_nuevo_ticket.
+    """
+    try:
+        tokens = _tokens_activos(usuario__in=usuarios_destino)
+
+        if not tokens:
+            print("[FCM] Mención: los usuarios mencionados no tienen dispositivos activos.")
+            return ResultadoEnvio() if estricto else None
+
+        nombre_autor = autor.get_full_name() or autor.username
 
         resumen = texto_comentario[:100]
         if len(texto_comentario) > 100:
             resumen += "..."
 
-        for disp in dispositivos:
-            cuerpo = {
-                "message": {
-                    "token": disp.fcm_token,
-                    "notification": {
-                        "title": f"💬 {nombre_autor} te mencionó",
-                        "body": f"{ticket.numero_ticket}: {resumen}",
-                    },
-                    "data": {
-                        "ticket_id": str(ticket.id),
-                        "ticket_url": ticket_url,
-                        "tipo": "mencion",
-                        "click_action": "FLUTTER_NOTIFICATION_CLICK",
-                    },
-                    "android": {
-                        "notification": {
-                            "sound": "default",
-                            "channel_id": "mentions",
-                        }
-                    },
-                    "apns": {
-                        "payload": {
-                            "aps": {
-                                "sound": "default",
-                            }
-                        }
-                    },
+        mensaje = {
+            "notification": {
+                "title": f"💬 {nombre_autor} te mencionó",
+                "body": f"{ticket.numero_ticket}: {resumen}",
+            },
+            "data": {
+                "ticket_id": str(ticket.id),
+                "ticket_url": _ticket_url(ticket),
+                "tipo": "mencion",
+                "click_action": "FLUTTER_NOTIFICATION_CLICK",
+            },
+            "android": {
+                "notification": {
+                    "sound": "default",
+                    "channel_id": "mentions",
                 }
-            }
+            },
+            "apns": {
+                "payload": {
+                    "aps": {
+                        "sound": "default",
+                    }
+                }
+            },
+        }
 
-            resp = requests.post(url, headers=headers, json=cuerpo, timeout=10)
-            print(f"[FCM] Mención → {usuario_destino.username}: {resp.status_code}")
+        resultado = get_cliente_fcm().enviar_multicast(tokens, mensaje)
+        print(f"[FCM] Mención → {len(usuarios_destino)} usuario(s): {resultado}")
+        return resultado
 
     except Exception as e:
+        if estricto:
+            raise
         print(f"[FCM] ERROR enviando mención: {e}")
@@ -0,0 +1,105 @@
+# apps/tickets/filtros.py
+"""
+Filtros de la lista de tickets compartidos por la vista, la exportación en
+streaming y los trabajos de exportación en segundo plano (que guardan los
+parámetros normalizados y reconstruyen el queryset más tarde).
+
+También los querysets de la lista y del dashboard tal cual los ejecutan las
+vistas: el registro de consultas.py los usa para el EXPLAIN de los tests.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Ticket
+
+ESTADOS_TERMINADOS = ['RESUELTO', 'CERRADO', 'CANCELADO']
+# Los "cerrados" de ResumenDiario (reportes): resueltos o cerrados con fecha de fin
+ESTADOS_RESUELTOS = ['RESUELTO', 'CERRADO']
+
+VALORES_VER = ('abiertos', 'cerrados', 'resueltos', 'todos')
+
+
+def filtrar_por_ver(tickets, ver):
+    """
+    ?ver=abiertos / cerrados (terminados, también cancelados) / resueltos
+    (los mismos que cuentan los reportes) / todos.
+    """
+    if ver == 'abiertos':
+        return tickets.exclude(estado__in=ESTADOS_TERMINADOS)
+    if ver == 'cerrados':
+        return tickets.filter(estado__in=ESTADOS_TERMINADOS)
+    if ver == 'resueltos':
+        return tickets.filter(
+            Q(fecha_resolucion__isnull=False) | Q(fecha_cierre__isnull=False),
+            estado__in=ESTADOS_RESUELTOS,
+        )
+    # ver == 'todos' => sin filtro extra
+    return tickets
+
+
+def filtros_lista(params):
+    """
+    Filtros opcionales de la lista (drill-down desde reportes):
+    ?local=<id>&categoria=<id>&tecnico=<id>&desde=<AAAA-MM-DD>&hasta=<AAAA-MM-DD>.
+    Las fechas son días locales de creación, ambos incluidos. Devuelve
+    (kwargs para filter, dict de parámetros normalizados para enlaces y claves).
+    """
+    filtros, normalizados = {}, {}
+    for param, campo in (('local', 'local_id'), ('categoria', 'categoria_id'), ('tecnico', 'asignado_a_id')):
+        valor = str(params.get(param, ''))
+        if valor.isdigit():
+            filtros[campo] = int(valor)
+            normalizados[param] = valor
+
+    zona = timezone.get_current_timezone()
+    for param, lookup, dias in (('desde', 'fecha_creacion__gte', 0), ('hasta', 'fecha_creacion__lt', 1)):
+        try:
+            fecha = parse_date(params.get(param, ''))
+        except ValueError:
+            fecha = None
+        if fecha:
+            # Rango por límites de día (no __date) para usar el índice de fecha_creacion
+            filtros[lookup] = datetime.combine(fecha + timedelta(days=dias), time(0), tzinfo=zona)
+            normalizados[param] = fecha.isoformat()
+    return filtros, normalizados
+
+
+def tickets_filtrados(usuario, params):
+    """Tickets visibles para `usuario` con los filtros de la lista: (qs, ver, filtros normalizados)."""
+    ver = params.get('ver', 'abiertos')
+
+    # --- Filtro por rol (ver TicketQuerySet.visible_para) ---
+    tickets = Ticket.objects.visible_para(usuario)
+
+    if usuario.es_tecnico() and not usuario.es_admin():
+        # Para técnicos SIEMPRE solo abiertos, ignoramos ?ver
+        ver = 'abiertos'  # para marcar pestaña en plantilla si usas tabs
+
+    # --- Filtro por estado (abiertos / cerrados / resueltos / todos) ---
+    tickets = filtrar_por_ver(tickets, ver)
+
+    # --- Filtros del drill-down (local / categoría / técnico / fechas) ---
+    filtros, normalizados = filtros_lista(params)
+    if filtros:
+        tickets = tickets.filter(**filtros)
+    return tickets, ver, normalizados
+
+
+def para_lista(tickets, ahora=None):
+    """Relaciones y estado del SLA que pinta tickets_lista."""
+    return tickets.select_related('local', 'categoria', 'creado_por', 'asignado_a').with_sla(ahora)
+
+
+def tickets_dashboard(usuario, ahora=None):
+    """Abiertos visibles para `usuario`, lo más urgente arriba (dashboard)."""
+    return (
+        Ticket.objects
+        .visible_para(usuario)
+        .filter(estado__in=Ticket.ESTADOS_ABIERTOS)
+        .select_related('local', 'categoria', 'asignado_a', 'creado_por')
+        .with_sla(ahora)
+        .order_by('fecha_limite_sla', '-fecha_creacion')
+    )
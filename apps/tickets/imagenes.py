@@ -0,0 +1,142 @@
+# apps/tickets/imagenes.py
+"""
+Procesado de imágenes subidas (ImagenTicket.imagen, Ticket.foto_reparacion).
+
+Al guardar una subida nueva se:
+- rota según la orientación EXIF y se descartan los metadatos (EXIF, GPS...);
+- reduce el lado largo a IMAGENES_LADO_MAX (1600 px por defecto);
+- recodifica a WebP (o JPEG si Pillow no tiene WebP) con IMAGENES_CALIDAD;
+- generan miniaturas de tamaño fijo para las galerías (srcset 1x / 2x).
+
+Una foto de móvil de 4-5 MB queda en ~200-400 KB y la miniatura en ~15 KB.
+Si el fichero no es una imagen que Pillow entienda se guarda tal cual.
+"""
+import io
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+# Miniaturas de la galería del ticket (recorte 4:3) y de la foto de reparación
+MINIATURA = (320, 240)
+MINIATURA_2X = (640, 480)
+LADO_MINIATURA_FOTO = 500
+
+
+def lado_max():
+    return getattr(settings, 'IMAGENES_LADO_MAX', 1600)
+
+
+def calidad():
+    return getattr(settings, 'IMAGENES_CALIDAD', 80)
+
+
+def formato():
+    """'WEBP' si esta instalación de Pillow lo soporta; si no, 'JPEG'."""
+    from PIL import features
+
+    preferido = getattr(settings, 'IMAGENES_FORMATO', 'WEBP').upper()
+    if preferido == 'WEBP' and not features.check('webp'):
+        return 'JPEG'
+    return preferido
+
+
+def abrir(archivo, lado=None):
+    """
+    Abre `archivo` ya orientado (EXIF) y decodificado. Con `lado`, a los JPEG
+    se les pide al decodificador una versión reducida (draft): decodificar una
+    foto de 12 MP a 1/4 es varias veces más rápido y usa 1/16 de memoria.
+    """
+    from PIL import Image, ImageOps
+
+    archivo.seek(0)
+    imagen = Image.open(archivo)
+    if lado and imagen.format == 'JPEG':
+        imagen.draft('RGB', (lado, lado))
+    imagen = ImageOps.exif_transpose(imagen)
+    imagen.load()
+    return imagen
+
+
+def _modo_compatible(imagen, fmt):
+    from PIL import Image
+
+    if fmt == 'JPEG':
+        if imagen.mode in ('RGBA', 'LA', 'P'):
+            # JPEG no tiene transparencia: fondo blanco (como se ve en la web)
+            imagen = imagen.convert('RGBA')
+            fondo = Image.new('RGB', imagen.size, (255, 255, 255))
+            fondo.paste(imagen, mask=imagen.split()[-1])
+            return fondo
+        return imagen.convert('RGB') if imagen.mode != 'RGB' else imagen
+    if imagen.mode not in ('RGB', 'RGBA'):
+        return imagen.convert('RGBA' if 'A' in imagen.getbands() or imagen.mode == 'P' else 'RGB')
+    return imagen
+
+
+def codificar(imagen, fmt=None, q=None):
+    """Bytes de `imagen` en `fmt`, sin metadatos."""
+    fmt = fmt or formato()
+    salida = io.BytesIO()
+    opciones = {'quality': q or calidad()}
+    if fmt == 'WEBP':
+        opciones['method'] = 4
+    elif fmt == 'JPEG':
+        opciones.update(optimize=True, progressive=True)
+    # Sin exif= ni icc_profile=: Pillow no copia los metadatos del original
+    _modo_compatible(imagen, fmt).save(salida, fmt, **opciones)
+    return salida.getvalue()
+
+
+def reducir(imagen, lado):
+    """Copia con el lado largo como mucho `lado` (no amplía)."""
+    from PIL import Image
+
+    copia = imagen.copy()
+    copia.thumbnail((lado, lado), Image.Resampling.LANCZOS)
+    return copia
+
+
+def recortar(imagen, tamano):
+    """Miniatura de tamaño fijo `tamano` recortada al centro."""
+    from PIL import Image, ImageOps
+
+    return ImageOps.fit(imagen, tamano, Image.Resampling.LANCZOS)
+
+
+def _extension(fmt):
+    return '.webp' if fmt == 'WEBP' else '.jpg'
+
+
+def procesar_subida(campo, miniaturas=()):
+    """
+    Procesa la subida pendiente de `campo` (FieldFile aún sin guardar) y la
+    sustituye por la versión reducida; `miniaturas` es [(FieldFile destino,
+    tamaño)], con tamaño (ancho, alto) para recorte fijo o un int para lado
+    largo. Los ficheros se escriben en el storage; el modelo lo guarda quien llama.
+    Devuelve False si el fichero no era una imagen (se deja tal cual).
+    """
+    from PIL import UnidentifiedImageError
+
+    try:
+        imagen = abrir(campo.file, lado_max() * 2)
+    except (UnidentifiedImageError, OSError, ValueError) as e:
+        print(f"[IMG] {campo.name}: no es una imagen procesable ({e}); se guarda sin procesar")
+        return False
+
+    fmt = formato()
+    base = os.path.splitext(os.path.basename(campo.name))[0]
+    extension = _extension(fmt)
+
+    for destino, tamano in miniaturas:
+        miniatura = recortar(imagen, tamano) if isinstance(tamano, tuple) else reducir(imagen, tamano)
+        sufijo = f"{tamano[0]}x{tamano[1]}" if isinstance(tamano, tuple) else str(tamano)
+        destino.save(f"{base}_{sufijo}{extension}", ContentFile(codificar(miniatura, fmt)), save=False)
+
+    campo.save(f"{base}{extension}", ContentFile(codificar(reducir(imagen, lado_max()), fmt)), save=False)
+    return True
+
+
+def pendiente(campo):
+    """True si `campo` tiene una subida nueva sin guardar todavía."""
+    return bool(campo) and not getattr(campo, '_committed', True)
@@ -0,0 +1,69 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from apps.tickets.almacen import PREFIJO, almacen_contenido, campos_blob, recontar_referencias
+
+
+class Command(BaseCommand):
+    help = (
+        "Migración única al almacén por contenido: rehashea los ficheros ya "
+        "subidos (fotos_tickets/, fotos_reparaciones/), los enlaza (hard link) "
+        "en cas/ y apunta las filas al blob."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Solo cuenta los ficheros que se migrarían.",
+        )
+        parser.add_argument(
+            "--borrar-originales",
+            action="store_true",
+            help="Borra las rutas antiguas tras enlazarlas (sin esto quedan como segundo enlace).",
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        almacen = almacen_contenido()
+
+        ficheros = filas = faltan = 0
+        originales = set()
+        for modelo, campo in campos_blob():
+            # _base_manager: UPDATE sin la fecha_actualizacion de TicketQuerySet.update
+            nombres = list(
+                modelo._base_manager
+                .exclude(**{campo: ''})
+                .exclude(**{f"{campo}__isnull": True})
+                .exclude(**{f"{campo}__startswith": PREFIJO})
+                .order_by()
+                .values_list(campo, flat=True)
+                .distinct()
+            )
+            for viejo in nombres:
+                ruta = almacen.path(viejo)
+                if not os.path.isfile(ruta):
+                    faltan += 1
+                    self.stdout.write(self.style.WARNING(f"{modelo.__name__}.{campo}: no existe {viejo}"))
+                    continue
+                ficheros += 1
+                if dry_run:
+                    continue
+                nuevo = almacen.enlazar(ruta, os.path.splitext(viejo)[1])
+                filas += modelo._base_manager.filter(**{campo: viejo}).update(**{campo: nuevo})
+                originales.add(ruta)
+
+        if dry_run:
+            self.stdout.write(f"Ficheros a migrar: {ficheros}. No encontrados: {faltan}.")
+            return
+
+        recontar_referencias()
+        if options["borrar_originales"]:
+            for ruta in originales:
+                if os.path.exists(ruta):
+                    os.remove(ruta)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Ficheros migrados: {ficheros} ({filas} fila(s) actualizadas). No encontrados: {faltan}."
+        ))
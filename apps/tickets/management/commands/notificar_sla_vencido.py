@@ -1,9 +1,6 @@
 from django.core.management.base import BaseCommand
-from django.utils import timezone
 
-from apps.tickets.models import Ticket, Notificacion
-from apps.tickets.fcm import enviar_notificacion_sla_vencido
-from apps.usuarios.models import Usuario
+from apps.tickets.notificaciones import notificar_sla_pendientes, tickets_sla_pendientes
 
 
 class Command(BaseCommand):
@@ -15,54 +12,38 @@ class Command(BaseCommand):
             action="store_true",
             help="Solo muestra los tickets a notificar sin enviar.",
         )
+        parser.add_argument(
+            "--lote",
+            type=int,
+            default=500,
+            help="Tickets reclamados y notificados por lote.",
+        )
 
     def handle(self, *args, **options):
-        ahora = timezone.now()
-        dry_run = options["dry_run"]
-
-        qs = (
-            Ticket.objects
-            .filter(fecha_limite_sla__lt=ahora)
-            .exclude(estado__in=["RESUELTO", "CERRADO", "CANCELADO"])
-            .filter(notificacion_sla_enviada=False)
-            .select_related("local", "categoria")
-        )
+        if options["dry_run"]:
+            total = 0
+            qs = tickets_sla_pendientes().select_related("local")
+            for ticket in qs.iterator():
+                self.stdout.write(f"[DRY] {ticket.numero_ticket} - {ticket.local}")
+                total += 1
+            self.stdout.write(f"Tickets a notificar: {total}")
+            self.stdout.write(self.style.WARNING("Dry run completado. No se enviaron notificaciones."))
+            return
 
-        total = qs.count()
-        if total == 0:
+        stats = notificar_sla_pendientes(options["lote"])
+        tickets = stats["tickets"]
+        if not tickets:
             self.stdout.write(self.style.SUCCESS("No hay tickets vencidos pendientes de notificación."))
             return
 
-        self.stdout.write(f"Tickets a notificar: {total}")
-
-        enviados = 0
-        admin_users = list(Usuario.objects.filter(is_staff=True, activo=True))
-
-        for ticket in qs:
-            if dry_run:
-                self.stdout.write(f"[DRY] {ticket.numero_ticket} - {ticket.local}")
-                continue
-
-            # Primero creamos la notificación web en la BD para cada admin
-            for admin in admin_users:
-                Notificacion.objects.create(
-                    usuario=admin,
-                    ticket=ticket,
-                    tipo='SLA_VENCIDO',
-                    mensaje=f'SLA Vencido: {ticket.numero_ticket} ({ticket.local})',
-                    # autor=None porque es el sistema
-                )
-
-            # Luego enviamos push FCM a los dispositivos
-            if enviar_notificacion_sla_vencido(ticket):
-                Ticket.objects.filter(pk=ticket.pk).update(notificacion_sla_enviada=True)
-                enviados += 1
-            else:
-                # Incluso si falló FCM, marcamos como enviada porque ya creamos las notifs web
-                Ticket.objects.filter(pk=ticket.pk).update(notificacion_sla_enviada=True)
-                enviados += 1
-
-        if dry_run:
-            self.stdout.write(self.style.WARNING("Dry run completado. No se enviaron notificaciones."))
-        else:
-            self.stdout.write(self.style.SUCCESS(f"Notificaciones procesadas para {enviados} ticket(s) vencido(s)."))
+        duracion = stats["segundos"]
+        self.stdout.write(
+            f"Lotes: {stats['lotes']} | Tickets: {len(tickets)} | "
+            f"Notificaciones web: {stats['notificaciones']} | "
+            f"Push resumen: encolado (envío {stats['resumen'].pk}, lo entrega procesar_envios)"
+        )
+        self.stdout.write(
+            f"Tiempo: {duracion:.2f}s | "
+            f"{len(tickets) / duracion if duracion else 0:.0f} tickets/s"
+        )
+        self.stdout.write(self.style.SUCCESS(f"Notificaciones procesadas para {len(tickets)} ticket(s) vencido(s)."))
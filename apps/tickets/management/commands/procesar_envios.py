@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.tickets.envios import procesar_lote
+
+
+class Command(BaseCommand):
+    help = "Procesa la bandeja de salida (push FCM / WhatsApp) por lotes, con reintentos."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Vacía la cola una vez y termina (útil para cron / tareas programadas).",
+        )
+        parser.add_argument(
+            "--lote",
+            type=int,
+            default=50,
+            help="Número máximo de envíos por lote.",
+        )
+        parser.add_argument(
+            "--intervalo",
+            type=float,
+            default=2.0,
+            help="Segundos de espera cuando la cola está vacía.",
+        )
+
+    def handle(self, *args, **options):
+        once = options["once"]
+        tamano = options["lote"]
+        intervalo = options["intervalo"]
+
+        total_ok = total_error = 0
+        try:
+            while True:
+                enviados, fallidos = procesar_lote(tamano)
+                total_ok += enviados
+                total_error += fallidos
+
+                if enviados or fallidos:
+                    self.stdout.write(f"Lote procesado: {enviados} enviado(s), {fallidos} con error.")
+                    continue
+
+                if once:
+                    break
+                time.sleep(intervalo)
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Envíos completados: {total_ok}. Con error (reprogramados): {total_error}."
+        ))
@@ -0,0 +1,90 @@
+from django.core.management.base import BaseCommand
+
+from apps.tickets.almacen import ajustar_referencias
+from apps.tickets.imagenes import LADO_MINIATURA_FOTO, MINIATURA, MINIATURA_2X, procesar_subida
+from apps.tickets.models import ImagenTicket, Ticket
+
+
+class Command(BaseCommand):
+    help = (
+        "Procesa las imágenes subidas antes del pipeline de imágenes: las rota "
+        "según EXIF, quita metadatos, las reduce/recomprime y genera sus miniaturas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Solo cuenta las imágenes pendientes, sin modificar nada.",
+        )
+        parser.add_argument(
+            "--lote",
+            type=int,
+            default=200,
+            help="Imágenes por consulta.",
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        lote = options["lote"]
+
+        pendientes = [
+            (
+                ImagenTicket.objects.filter(miniatura='').exclude(imagen=''),
+                "imagen",
+                lambda obj: [(obj.miniatura, MINIATURA), (obj.miniatura_2x, MINIATURA_2X)],
+                ["imagen", "miniatura", "miniatura_2x"],
+            ),
+            (
+                Ticket.objects.filter(foto_reparacion_miniatura__isnull=True)
+                .exclude(foto_reparacion__isnull=True).exclude(foto_reparacion=''),
+                "foto_reparacion",
+                lambda obj: [(obj.foto_reparacion_miniatura, LADO_MINIATURA_FOTO)],
+                ["foto_reparacion", "foto_reparacion_miniatura"],
+            ),
+        ]
+
+        procesadas = omitidas = 0
+        for qs, nombre_campo, miniaturas, campos in pendientes:
+            modelo = qs.model._meta.verbose_name_plural
+            if dry_run:
+                self.stdout.write(f"{modelo}: {qs.count()} pendiente(s).")
+                continue
+
+            ultimo_id = 0
+            while True:
+                objetos = list(qs.filter(id__gt=ultimo_id).order_by("id")[:lote])
+                if not objetos:
+                    break
+                ultimo_id = objetos[-1].id
+                for obj in objetos:
+                    campo = getattr(obj, nombre_campo)
+                    anterior = campo.name
+                    antes = [getattr(obj, nombre).name for nombre in campos]
+                    try:
+                        ok = procesar_subida(campo, miniaturas(obj))
+                    except FileNotFoundError:
+                        ok = False
+                        print(f"[IMG] {anterior}: no existe en el storage")
+                    finally:
+                        campo.close()
+                    if not ok:
+                        omitidas += 1
+                        continue
+                    # UPDATE directo: sin save() completo (Ticket.save recalcula SLA y fechas)
+                    qs.model.objects.filter(pk=obj.pk).update(
+                        **{nombre: getattr(obj, nombre).name for nombre in campos}
+                    )
+                    # Sin post_save: referencias de los blobs a mano (y el
+                    # original solo se borra si no es un blob compartido)
+                    ajustar_referencias(
+                        sumar=[getattr(obj, nombre).name for nombre in campos], restar=antes,
+                    )
+                    if campo.name != anterior:
+                        campo.storage.delete(anterior)
+                    procesadas += 1
+
+        if not dry_run:
+            self.stdout.write(self.style.SUCCESS(
+                f"Imágenes procesadas: {procesadas}. Omitidas: {omitidas}."
+            ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.tickets.adjuntos import purgar_subidas
+
+
+class Command(BaseCommand):
+    help = "Borra las subidas de adjuntos por partes abandonadas y sus ficheros parciales."
+
+    def handle(self, *args, **options):
+        borradas = purgar_subidas()
+        self.stdout.write(self.style.SUCCESS(f"Subidas abandonadas borradas: {borradas}."))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from apps.tickets.almacen import recoger_blobs, recontar_referencias
+
+
+class Command(BaseCommand):
+    help = (
+        "Borra del almacén por contenido los blobs que nadie referencia desde "
+        "hace más de ALMACEN_GRACIA_HORAS (comprobándolo en las tablas) y los "
+        "ficheros de cas/ sin fila."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Solo informa de lo que se borraría.",
+        )
+        parser.add_argument(
+            "--recontar",
+            action="store_true",
+            help="Rehace antes todas las cuentas de referencias desde las tablas.",
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+
+        if options["recontar"]:
+            corregidos = recontar_referencias()
+            self.stdout.write(f"Cuentas de referencias corregidas: {corregidos}.")
+
+        borrados, liberados, huerfanos = recoger_blobs(simular=dry_run)
+        verbo = "Se borrarían" if dry_run else "Borrados"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verbo}: {borrados} blob(s) ({liberados / (1024 * 1024):.1f} MB) "
+            f"y {huerfanos} fichero(s) huérfano(s)."
+        ))
@@ -0,0 +1,83 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from apps.tickets.fcm import CODIGOS_TOKEN_MUERTO
+from apps.usuarios.models import DispositivoNotificacion
+
+
+class Command(BaseCommand):
+    help = "Informe de salud de los tokens FCM registrados (activos, muertos, con fallos)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--min-fallos",
+            type=int,
+            default=3,
+            help="Lista los dispositivos activos con al menos este número de fallos seguidos.",
+        )
+        parser.add_argument(
+            "--dias-sin-uso",
+            type=int,
+            default=90,
+            help="Días sin actividad para considerar un dispositivo abandonado.",
+        )
+        parser.add_argument(
+            "--purgar",
+            action="store_true",
+            help="Elimina los dispositivos desactivados por token muerto.",
+        )
+
+    def handle(self, *args, **options):
+        min_fallos = options["min_fallos"]
+        limite_uso = timezone.now() - timedelta(days=options["dias_sin_uso"])
+
+        muerto = Q(activo=False, ultimo_error__in=CODIGOS_TOKEN_MUERTO)
+        resumen = DispositivoNotificacion.objects.aggregate(
+            total=Count("id"),
+            activos=Count("id", filter=Q(activo=True)),
+            pendientes=Count("id", filter=Q(activo=False) & ~Q(ultimo_error__in=CODIGOS_TOKEN_MUERTO)),
+            muertos=Count("id", filter=muerto),
+            con_fallos=Count("id", filter=Q(activo=True, fallos_consecutivos__gt=0)),
+            sin_uso=Count("id", filter=Q(activo=True, fecha_ultimo_uso__lt=limite_uso)),
+        )
+
+        self.stdout.write("Salud de tokens FCM")
+        self.stdout.write(f"  Total registrados:        {resumen['total']}")
+        self.stdout.write(f"  Activos:                  {resumen['activos']}")
+        self.stdout.write(f"  Pendientes de aprobación: {resumen['pendientes']}")
+        self.stdout.write(f"  Muertos (desactivados):   {resumen['muertos']}")
+        self.stdout.write(f"  Activos con fallos:       {resumen['con_fallos']}")
+        self.stdout.write(f"  Activos sin uso ({options['dias_sin_uso']}d):   {resumen['sin_uso']}")
+
+        errores = (
+            DispositivoNotificacion.objects
+            .exclude(ultimo_error="")
+            .values("ultimo_error")
+            .annotate(total=Count("id"))
+            .order_by("-total")
+        )
+        if errores:
+            self.stdout.write("Últimos errores por código:")
+            for row in errores:
+                self.stdout.write(f"  {row['ultimo_error']}: {row['total']}")
+
+        problematicos = (
+            DispositivoNotificacion.objects
+            .filter(activo=True, fallos_consecutivos__gte=min_fallos)
+            .select_related("usuario")
+            .order_by("-fallos_consecutivos")[:50]
+        )
+        if problematicos:
+            self.stdout.write(self.style.WARNING(f"Dispositivos activos con {min_fallos}+ fallos seguidos:"))
+            for disp in problematicos:
+                self.stdout.write(
+                    f"  {disp.usuario.username} {disp.fcm_token[:20]}... "
+                    f"fallos={disp.fallos_consecutivos} error={disp.ultimo_error or '-'}"
+                )
+
+        if options["purgar"]:
+            eliminados, _ = DispositivoNotificacion.objects.filter(muerto).delete()
+            self.stdout.write(self.style.SUCCESS(f"Dispositivos con token muerto eliminados: {eliminados}"))
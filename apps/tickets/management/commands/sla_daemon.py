@@ -0,0 +1,52 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from apps.tickets.agenda_sla import AgendaSla
+
+
+class Command(BaseCommand):
+    help = (
+        "Proceso residente que notifica los SLA vencidos en cuanto vencen: "
+        "duerme hasta el próximo fecha_limite_sla en vez de sondear cada 5 minutos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lote",
+            type=int,
+            default=500,
+            help="Tickets reclamados y notificados por lote.",
+        )
+        parser.add_argument(
+            "--intervalo",
+            type=float,
+            default=60.0,
+            help="Segundos máximos entre lecturas de tickets modificados.",
+        )
+        parser.add_argument(
+            "--resync",
+            type=float,
+            default=900.0,
+            help="Segundos entre recargas completas de la agenda.",
+        )
+
+    def handle(self, *args, **options):
+        agenda = AgendaSla(
+            lote=options["lote"],
+            intervalo=options["intervalo"],
+            resync=options["resync"],
+            log=self.stdout.write,
+        )
+
+        def _detener(signum, frame):
+            self.stdout.write(f"[SLA] Señal {signum} recibida, terminando...")
+            agenda.detener()
+
+        signal.signal(signal.SIGTERM, _detener)
+        signal.signal(signal.SIGINT, _detener)
+        if hasattr(signal, "SIGHUP"):  # no existe en Windows
+            signal.signal(signal.SIGHUP, lambda signum, frame: agenda.pedir_recarga())
+
+        agenda.ejecutar()
+        self.stdout.write(self.style.SUCCESS("sla_daemon detenido."))
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:55
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0005_notificacion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notificacion',
+            name='tipo',
+            field=models.CharField(choices=[('MENCION', 'Mención en comentario'), ('ASIGNACION', 'Ticket asignado'), ('ESTADO', 'Cambio de estado'), ('SLA_VENCIDO', 'SLA Vencido')], default='MENCION', max_length=20, verbose_name='Tipo'),
+        ),
+        migrations.CreateModel(
+            name='EnvioPendiente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('PUSH_NUEVO_TICKET', 'Push: nuevo ticket'), ('PUSH_MENCION', 'Push: mención'), ('PUSH_SLA_VENCIDO', 'Push: SLA vencido'), ('WHATSAPP_ASIGNADO', 'WhatsApp: ticket asignado')], max_length=30, verbose_name='Tipo')),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('PROCESANDO', 'Procesando'), ('ENVIADO', 'Enviado'), ('ERROR', 'Error')], default='PENDIENTE', max_length=20, verbose_name='Estado')),
+                ('datos', models.JSONField(blank=True, default=dict, verbose_name='Datos adicionales')),
+                ('intentos', models.PositiveIntegerField(default=0, verbose_name='Intentos')),
+                ('proximo_intento', models.DateTimeField(default=django.utils.timezone.now, help_text='Mientras está PROCESANDO indica cuándo expira la reserva del worker.', verbose_name='Próximo intento')),
+                ('lote', models.CharField(blank=True, max_length=32, verbose_name='Lote')),
+                ('ultimo_error', models.TextField(blank=True, verbose_name='Último error')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('fecha_envio', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de envío')),
+                ('autor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Autor')),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='envios_pendientes', to='tickets.ticket', verbose_name='Ticket')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Usuario destino')),
+            ],
+            options={
+                'verbose_name': 'Envío pendiente',
+                'verbose_name_plural': 'Envíos pendientes',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['estado', 'proximo_intento'], name='envio_estado_prox_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:00
+
+from django.db import migrations, models
+
+
+def inicializar_secuencia(apps, schema_editor):
+    """Arranca la secuencia en el último número usado por los tickets existentes."""
+    Ticket = apps.get_model('tickets', 'Ticket')
+    SecuenciaTicket = apps.get_model('tickets', 'SecuenciaTicket')
+
+    ultimo = 0
+    for numero in Ticket.objects.values_list('numero_ticket', flat=True).iterator():
+        sufijo = numero[4:]
+        if numero.startswith('TKT-') and sufijo.isdigit():
+            ultimo = max(ultimo, int(sufijo))
+    ultimo = max(ultimo, Ticket.objects.aggregate(m=models.Max('id'))['m'] or 0)
+
+    SecuenciaTicket.objects.update_or_create(nombre='ticket', defaults={'valor': ultimo})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0006_enviopendiente'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SecuenciaTicket',
+            fields=[
+                ('nombre', models.CharField(max_length=50, primary_key=True, serialize=False, verbose_name='Nombre')),
+                ('valor', models.BigIntegerField(default=0, verbose_name='Último valor asignado')),
+            ],
+            options={
+                'verbose_name': 'Secuencia de tickets',
+                'verbose_name_plural': 'Secuencias de tickets',
+            },
+        ),
+        migrations.RunPython(inicializar_secuencia, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0007_secuenciaticket'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['-fecha_creacion', '-id'], name='ticket_fecha_id_idx'),
+        ),
+    ]
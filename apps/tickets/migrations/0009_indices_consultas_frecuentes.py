@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0008_ticket_fecha_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(fields=['usuario', 'leida', '-fecha'], name='notif_usuario_leida_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['estado', 'fecha_limite_sla'], name='ticket_estado_sla_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['asignado_a', 'estado'], name='ticket_asignado_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(('asignado_a__isnull', True)), fields=['categoria', 'estado'], name='ticket_sin_asignar_cat_idx'),
+        ),
+    ]
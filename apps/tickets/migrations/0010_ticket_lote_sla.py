@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0009_indices_consultas_frecuentes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='lote_sla',
+            field=models.CharField(blank=True, editable=False, max_length=32, verbose_name='Lote de notificación SLA'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0010_ticket_lote_sla'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['fecha_actualizacion'], name='ticket_actualizacion_idx'),
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:32
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+from django.conf import settings
+from django.utils import timezone
+
+
+def programar_avisos_abiertos(apps, schema_editor):
+    """Avisos de los tickets ya abiertos (solo los niveles que aún no han pasado)."""
+    Ticket = apps.get_model('tickets', 'Ticket')
+    AvisoSla = apps.get_model('tickets', 'AvisoSla')
+    porcentajes = sorted(getattr(settings, 'SLA_NIVELES_AVISO', (50, 80)))
+    ahora = timezone.now()
+
+    avisos = []
+    abiertos = Ticket.objects.filter(
+        estado__in=['PENDIENTE', 'EN_PROCESO'],
+        notificacion_sla_enviada=False,
+        fecha_limite_sla__gt=ahora,
+    ).values_list('id', 'fecha_creacion', 'fecha_limite_sla')
+    for ticket_id, creacion, limite in abiertos.iterator():
+        for porcentaje in porcentajes:
+            programada = creacion + (limite - creacion) * porcentaje / 100
+            if programada > ahora:
+                avisos.append(AvisoSla(ticket_id=ticket_id, porcentaje=porcentaje, fecha_programada=programada))
+    AvisoSla.objects.bulk_create(avisos, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0011_indice_fecha_actualizacion'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='enviopendiente',
+            name='tipo',
+            field=models.CharField(choices=[('PUSH_NUEVO_TICKET', 'Push: nuevo ticket'), ('PUSH_MENCION', 'Push: mención'), ('PUSH_SLA_VENCIDO', 'Push: SLA vencido'), ('PUSH_AVISO_SLA', 'Push: SLA por vencer'), ('WHATSAPP_ASIGNADO', 'WhatsApp: ticket asignado')], max_length=30, verbose_name='Tipo'),
+        ),
+        migrations.AlterField(
+            model_name='notificacion',
+            name='tipo',
+            field=models.CharField(choices=[('MENCION', 'Mención en comentario'), ('ASIGNACION', 'Ticket asignado'), ('ESTADO', 'Cambio de estado'), ('SLA_VENCIDO', 'SLA Vencido'), ('SLA_AVISO', 'SLA por vencer')], default='MENCION', max_length=20, verbose_name='Tipo'),
+        ),
+        migrations.CreateModel(
+            name='NivelAvisoSla',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('porcentaje', models.PositiveSmallIntegerField(help_text='Se avisa al consumirse este % del tiempo SLA (1-99)', validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(99)], verbose_name='Porcentaje del SLA')),
+                ('categoria', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='niveles_aviso', to='tickets.categoriaaveria', verbose_name='Categoría')),
+            ],
+            options={
+                'verbose_name': 'Nivel de aviso SLA',
+                'verbose_name_plural': 'Niveles de aviso SLA',
+                'ordering': ['categoria', 'porcentaje'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AvisoSla',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('porcentaje', models.PositiveSmallIntegerField(verbose_name='Porcentaje del SLA')),
+                ('fecha_programada', models.DateTimeField(verbose_name='Fecha programada')),
+                ('fecha_envio', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de envío')),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='avisos_sla', to='tickets.ticket', verbose_name='Ticket')),
+            ],
+            options={
+                'verbose_name': 'Aviso SLA',
+                'verbose_name_plural': 'Avisos SLA',
+                'ordering': ['fecha_programada'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='nivelavisosla',
+            constraint=models.UniqueConstraint(fields=('categoria', 'porcentaje'), name='nivel_aviso_unico'),
+        ),
+        migrations.AddIndex(
+            model_name='avisosla',
+            index=models.Index(condition=models.Q(('fecha_envio__isnull', True)), fields=['fecha_programada'], name='aviso_sla_pendiente_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='avisosla',
+            constraint=models.UniqueConstraint(fields=('ticket', 'porcentaje'), name='aviso_sla_ticket_nivel_unico'),
+        ),
+        migrations.RunPython(programar_avisos_abiertos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0012_avisos_sla'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='sla_pausado_desde',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='SLA en pausa desde'),
+        ),
+        migrations.AlterField(
+            model_name='ticket',
+            name='estado',
+            field=models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('EN_PROCESO', 'En Proceso'), ('EN_ESPERA', 'Esperando al local'), ('RESUELTO', 'Resuelto'), ('CERRADO', 'Cerrado'), ('CANCELADO', 'Cancelado')], default='PENDIENTE', max_length=20, verbose_name='Estado'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0013_pausa_sla'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagenticket',
+            name='miniatura',
+            field=models.ImageField(blank=True, editable=False, upload_to='fotos_tickets/miniaturas/%Y/%m/', verbose_name='Miniatura'),
+        ),
+        migrations.AddField(
+            model_name='imagenticket',
+            name='miniatura_2x',
+            field=models.ImageField(blank=True, editable=False, upload_to='fotos_tickets/miniaturas/%Y/%m/', verbose_name='Miniatura 2x'),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='foto_reparacion_miniatura',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='fotos_reparaciones/miniaturas/%Y/%m/', verbose_name='Miniatura de la foto de la reparación'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:20
+
+import apps.tickets.models
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tickets', '0014_miniaturas_imagenes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubidaAdjunto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(default=apps.tickets.models._token_subida, editable=False, max_length=32, unique=True, verbose_name='Token')),
+                ('nombre', models.CharField(max_length=255, verbose_name='Nombre original')),
+                ('tamano', models.PositiveBigIntegerField(verbose_name='Tamaño (bytes)')),
+                ('recibido', models.PositiveBigIntegerField(default=0, verbose_name='Bytes recibidos')),
+                ('estado', models.CharField(choices=[('EN_CURSO', 'En curso'), ('COMPLETA', 'Completa')], default='EN_CURSO', max_length=20, verbose_name='Estado')),
+                ('sha256', models.CharField(blank=True, db_index=True, max_length=64, verbose_name='SHA-256')),
+                ('imagen', models.ImageField(blank=True, upload_to='fotos_tickets/%Y/%m/', verbose_name='Imagen')),
+                ('miniatura', models.ImageField(blank=True, upload_to='fotos_tickets/miniaturas/%Y/%m/', verbose_name='Miniatura')),
+                ('miniatura_2x', models.ImageField(blank=True, upload_to='fotos_tickets/miniaturas/%Y/%m/', verbose_name='Miniatura 2x')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Subida de adjunto',
+                'verbose_name_plural': 'Subidas de adjuntos',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['estado', 'fecha_creacion'], name='subida_estado_fecha_idx')],
+            },
+        ),
+    ]
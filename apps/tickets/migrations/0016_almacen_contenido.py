@@ -0,0 +1,73 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:26
+
+import apps.tickets.almacen
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0015_subidas_adjuntos'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='imagenticket',
+            name='imagen',
+            field=models.ImageField(storage=apps.tickets.almacen.almacen_contenido, upload_to='fotos_tickets/%Y/%m/', verbose_name='Imagen'),
+        ),
+        migrations.AlterField(
+            model_name='imagenticket',
+            name='miniatura',
+            field=models.ImageField(blank=True, editable=False, storage=apps.tickets.almacen.almacen_contenido, upload_to='fotos_tickets/miniaturas/%Y/%m/', verbose_name='Miniatura'),
+        ),
+        migrations.AlterField(
+            model_name='imagenticket',
+            name='miniatura_2x',
+            field=models.ImageField(blank=True, editable=False, storage=apps.tickets.almacen.almacen_contenido, upload_to='fotos_tickets/miniaturas/%Y/%m/', verbose_name='Miniatura 2x'),
+        ),
+        migrations.AlterField(
+            model_name='subidaadjunto',
+            name='imagen',
+            field=models.ImageField(blank=True, storage=apps.tickets.almacen.almacen_contenido, upload_to='fotos_tickets/%Y/%m/', verbose_name='Imagen'),
+        ),
+        migrations.AlterField(
+            model_name='subidaadjunto',
+            name='miniatura',
+            field=models.ImageField(blank=True, storage=apps.tickets.almacen.almacen_contenido, upload_to='fotos_tickets/miniaturas/%Y/%m/', verbose_name='Miniatura'),
+        ),
+        migrations.AlterField(
+            model_name='subidaadjunto',
+            name='miniatura_2x',
+            field=models.ImageField(blank=True, storage=apps.tickets.almacen.almacen_contenido, upload_to='fotos_tickets/miniaturas/%Y/%m/', verbose_name='Miniatura 2x'),
+        ),
+        migrations.AlterField(
+            model_name='ticket',
+            name='foto_reparacion',
+            field=models.ImageField(blank=True, null=True, storage=apps.tickets.almacen.almacen_contenido, upload_to='fotos_reparaciones/%Y/%m/', verbose_name='Foto de la reparación'),
+        ),
+        migrations.AlterField(
+            model_name='ticket',
+            name='foto_reparacion_miniatura',
+            field=models.ImageField(blank=True, editable=False, null=True, storage=apps.tickets.almacen.almacen_contenido, upload_to='fotos_reparaciones/miniaturas/%Y/%m/', verbose_name='Miniatura de la foto de la reparación'),
+        ),
+        migrations.CreateModel(
+            name='BlobContenido',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=255, unique=True, verbose_name='Nombre en el almacén')),
+                ('sha256', models.CharField(db_index=True, max_length=64, verbose_name='SHA-256')),
+                ('tamano', models.PositiveBigIntegerField(verbose_name='Tamaño (bytes)')),
+                ('referencias', models.IntegerField(default=0, verbose_name='Referencias')),
+                ('fecha_sin_referencias', models.DateTimeField(blank=True, default=django.utils.timezone.now, help_text='Vacío mientras alguna fila lo use. Al guardar de nuevo el mismo contenido se reinicia.', null=True, verbose_name='Sin referencias desde')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+            ],
+            options={
+                'verbose_name': 'Blob del almacén',
+                'verbose_name_plural': 'Blobs del almacén',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['referencias', 'fecha_sin_referencias'], name='blob_gc_idx')],
+            },
+        ),
+    ]
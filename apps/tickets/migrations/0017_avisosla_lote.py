@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0016_almacen_contenido'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='avisosla',
+            name='lote',
+            field=models.CharField(blank=True, editable=False, max_length=32, verbose_name='Lote de envío'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0017_avisosla_lote'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='enviopendiente',
+            name='tipo',
+            field=models.CharField(choices=[('PUSH_NUEVO_TICKET', 'Push: nuevo ticket'), ('PUSH_MENCION', 'Push: mención'), ('PUSH_SLA_VENCIDO', 'Push: SLA vencido'), ('PUSH_AVISO_SLA', 'Push: SLA por vencer'), ('PUSH_SLA_RESUMEN', 'Push: resumen SLA vencido'), ('WHATSAPP_ASIGNADO', 'WhatsApp: ticket asignado')], max_length=30, verbose_name='Tipo'),
+        ),
+    ]
@@ -1,14 +1,23 @@
 """
 Modelos para el sistema de tickets de averías
 """
+import uuid
 from datetime import timedelta
 
-from django.db import models
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, F, FloatField, Max, Q, Value, When
+from django.db.models.functions import Least
+from django.dispatch import Signal
 from django.utils import timezone
 
 from apps.usuarios.models import Usuario
+from apps.locales.calendario import calendario_para_local
 from apps.locales.models import Local
 
+from .almacen import almacen_contenido
+from .imagenes import LADO_MINIATURA_FOTO, MINIATURA, MINIATURA_2X, pendiente, procesar_subida
+
 
 class CategoriaAveria(models.Model):
     """
@@ -53,6 +62,215 @@ class CategoriaAveria(models.Model):
         return self.nombre
 
 
+class NivelAvisoSla(models.Model):
+    """
+    Aviso previo al vencimiento: al consumirse `porcentaje`% del SLA de un
+    ticket de la categoría se notifica a staff y al técnico asignado.
+    El vencimiento (100%) sigue siendo notificar_sla_vencido.
+    """
+    categoria = models.ForeignKey(
+        CategoriaAveria,
+        on_delete=models.CASCADE,
+        related_name='niveles_aviso',
+        verbose_name='Categoría',
+    )
+
+    porcentaje = models.PositiveSmallIntegerField(
+        validators=[MinValueValidator(1), MaxValueValidator(99)],
+        verbose_name='Porcentaje del SLA',
+        help_text='Se avisa al consumirse este % del tiempo SLA (1-99)',
+    )
+
+    class Meta:
+        verbose_name = 'Nivel de aviso SLA'
+        verbose_name_plural = 'Niveles de aviso SLA'
+        ordering = ['categoria', 'porcentaje']
+        constraints = [
+            models.UniqueConstraint(fields=['categoria', 'porcentaje'], name='nivel_aviso_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.categoria} - {self.porcentaje}%"
+
+
+class SecuenciaTicket(models.Model):
+    """
+    Contador atómico para numerar tickets (TKT-000001, TKT-000002...).
+
+    Sustituye al antiguo Max('id') + 1: el UPDATE valor = valor + 1 bloquea la fila
+    (Postgres) o la base (SQLite) hasta el final de la transacción, así dos
+    inserciones simultáneas nunca reciben el mismo número. Coste O(1).
+    """
+    nombre = models.CharField(
+        max_length=50,
+        primary_key=True,
+        verbose_name='Nombre'
+    )
+
+    valor = models.BigIntegerField(
+        default=0,
+        verbose_name='Último valor asignado'
+    )
+
+    class Meta:
+        verbose_name = 'Secuencia de tickets'
+        verbose_name_plural = 'Secuencias de tickets'
+
+    def __str__(self):
+        return f"{self.nombre}: {self.valor}"
+
+    @classmethod
+    def valor_inicial(cls):
+        """Último número usado por los tickets existentes (solo al crear la secuencia)."""
+        ultimo = 0
+        for numero in Ticket.objects.filter(numero_ticket__startswith='TKT-').values_list('numero_ticket', flat=True).iterator():
+            sufijo = numero[4:]
+            if sufijo.isdigit():
+                ultimo = max(ultimo, int(sufijo))
+        return max(ultimo, Ticket.objects.aggregate(m=Max('id'))['m'] or 0)
+
+    @classmethod
+    def siguiente(cls, nombre='ticket'):
+        """Reserva y devuelve el siguiente número de la secuencia."""
+        with transaction.atomic():
+            if not cls.objects.filter(pk=nombre).update(valor=F('valor') + 1):
+                # Primera vez: creamos la secuencia a partir de los tickets existentes.
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(nombre=nombre, valor=cls.valor_inicial() + 1)
+                except IntegrityError:
+                    # Otro proceso la creó a la vez: usamos la suya
+                    cls.objects.filter(pk=nombre).update(valor=F('valor') + 1)
+            return cls.objects.filter(pk=nombre).values_list('valor', flat=True).get()
+
+
+class SegundosDuracion(models.Func):
+    """
+    Convierte una resta de fechas (DurationField) a segundos (float).
+
+    En SQLite/MySQL la duración llega como microsegundos enteros, así que la
+    división da exactamente lo mismo que timedelta.total_seconds().
+    """
+    template = '(%(expressions)s / 1000000.0)'
+    output_field = FloatField()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='EXTRACT(EPOCH FROM %(expressions)s)', **extra_context)
+
+
+# QuerySet.update() no emite post_save: TicketQuerySet.update lo anuncia con esta
+# señal (kwargs: campos) para que se invaliden las cachés que dependen de tickets.
+tickets_actualizados = Signal()
+
+
+class TicketQuerySet(models.QuerySet):
+
+    def update(self, **kwargs):
+        # Como auto_now en save(): los procesos incrementales (sla_daemon,
+        # resúmenes de reportes) detectan así también los cambios en bloque
+        kwargs.setdefault('fecha_actualizacion', timezone.now())
+        filas = super().update(**kwargs)
+        if filas:
+            tickets_actualizados.send(sender=self.model, campos=set(kwargs))
+        return filas
+
+    @staticmethod
+    def _q_visible_para(usuario):
+        """
+        Regla de visibilidad por rol (None = ve todo):
+
+        - ADMIN / DIGITADOR: todos los tickets.
+        - TÉCNICO: los asignados a él + los sin asignar de sus especialidades
+          (si no tiene especialidades configuradas, todos los sin asignar).
+        - Cualquier otro: ninguno.
+        """
+        if usuario.es_admin() or usuario.es_digitador():
+            return None
+        if not usuario.es_tecnico():
+            return Q(pk__in=[])
+
+        sin_asignar = Q(asignado_a__isnull=True)
+        if usuario.especialidades_ids:
+            sin_asignar &= Q(categoria_id__in=usuario.especialidades_ids)
+        return Q(asignado_a=usuario) | sin_asignar
+
+    def visible_para(self, usuario):
+        """Tickets que `usuario` puede ver según su rol."""
+        condicion = self._q_visible_para(usuario)
+        return self if condicion is None else self.filter(condicion)
+
+    def con_visibilidad(self, usuario):
+        """
+        Anota `visible` (bool) en vez de filtrar, para las vistas de detalle que
+        deben responder 403 (y no 404) cuando el ticket existe pero no es suyo.
+        """
+        condicion = self._q_visible_para(usuario)
+        if condicion is None:
+            return self.annotate(visible=Value(True, output_field=models.BooleanField()))
+        return self.annotate(visible=Case(
+            When(condicion, then=Value(True)),
+            default=Value(False),
+            output_field=models.BooleanField(),
+        ))
+
+    def with_sla(self, ahora=None):
+        """
+        Anota el estado del SLA calculado en la base de datos con un único `ahora`:
+
+        - vencido: igual que Ticket.esta_vencido()
+        - segundos_restantes: Ticket.tiempo_restante_sla() en segundos (None si está cerrado)
+        - pct_usado: Ticket.porcentaje_tiempo_usado()
+        - color_sla: Ticket.get_color_sla()
+        """
+        ahora = ahora or timezone.now()
+        ahora_sql = Value(ahora, output_field=models.DateTimeField())
+        finalizado = Q(estado__in=['RESUELTO', 'CERRADO', 'CANCELADO'])
+
+        total = SegundosDuracion(F('fecha_limite_sla') - F('fecha_creacion'))
+        usado = SegundosDuracion(ahora_sql - F('fecha_creacion'))
+        usado_en_pausa = SegundosDuracion(F('sla_pausado_desde') - F('fecha_creacion'))
+        restante = SegundosDuracion(F('fecha_limite_sla') - ahora_sql)
+        pausado = Q(estado='EN_ESPERA', sla_pausado_desde__isnull=False)
+
+        qs = self.annotate(
+            vencido=Case(
+                When(finalizado, then=Value(False)),
+                When(pausado, then=Value(False)),
+                When(fecha_limite_sla__lt=ahora, then=Value(True)),
+                default=Value(False),
+                output_field=models.BooleanField(),
+            ),
+            segundos_restantes=Case(
+                When(finalizado, then=Value(None)),
+                # En pausa: lo que quedaba al pausar (congelado)
+                When(
+                    pausado & Q(fecha_limite_sla__gt=F('sla_pausado_desde')),
+                    then=SegundosDuracion(F('fecha_limite_sla') - F('sla_pausado_desde')),
+                ),
+                When(pausado, then=Value(0.0)),
+                When(fecha_limite_sla__lte=ahora, then=Value(0.0)),
+                default=restante,
+                output_field=FloatField(),
+            ),
+            pct_usado=Case(
+                When(fecha_limite_sla=F('fecha_creacion'), then=Value(100.0)),
+                # En pausa el consumo se queda donde estaba al pausar
+                When(pausado, then=Least(usado_en_pausa / total * Value(100.0), Value(100.0))),
+                default=Least(usado / total * Value(100.0), Value(100.0)),
+                output_field=FloatField(),
+            ),
+        )
+        return qs.annotate(
+            color_sla=Case(
+                When(estado__in=['RESUELTO', 'CERRADO'], then=Value('success')),
+                When(pct_usado__lt=50, then=Value('success')),
+                When(pct_usado__lt=75, then=Value('warning')),
+                default=Value('danger'),
+                output_field=models.CharField(),
+            ),
+        )
+
+
 class Ticket(models.Model):
     """
     Modelo principal para los tickets de averías
@@ -67,11 +285,19 @@ class Ticket(models.Model):
     ESTADOS = [
         ('PENDIENTE', 'Pendiente'),
         ('EN_PROCESO', 'En Proceso'),
+        ('EN_ESPERA', 'Esperando al local'),
         ('RESUELTO', 'Resuelto'),
         ('CERRADO', 'Cerrado'),
         ('CANCELADO', 'Cancelado'),
     ]
 
+    # Abiertos = todo lo que no está terminado, también EN_ESPERA (el ticket
+    # sigue pendiente de trabajo aunque su SLA esté en pausa). Contadores,
+    # badge, reportes y ?ver=abiertos usan este conjunto.
+    ESTADOS_ABIERTOS = ['PENDIENTE', 'EN_PROCESO', 'EN_ESPERA']
+    # Abiertos con el SLA corriendo: los únicos que pueden vencer o recibir avisos
+    ESTADOS_SLA_ACTIVO = ['PENDIENTE', 'EN_PROCESO']
+
     # Información básica
     numero_ticket = models.CharField(
         max_length=20,
@@ -171,6 +397,14 @@ class Ticket(models.Model):
         editable=False
     )
 
+    # Mientras el ticket espera al local (EN_ESPERA) el SLA no corre
+    sla_pausado_desde = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='SLA en pausa desde'
+    )
+
     # Resolución
     solucion = models.TextField(
         blank=True,
@@ -180,11 +414,21 @@ class Ticket(models.Model):
 
     foto_reparacion = models.ImageField(
         upload_to='fotos_reparaciones/%Y/%m/',
+        storage=almacen_contenido,
         blank=True,
         null=True,
         verbose_name='Foto de la reparación'
     )
 
+    foto_reparacion_miniatura = models.ImageField(
+        upload_to='fotos_reparaciones/miniaturas/%Y/%m/',
+        storage=almacen_contenido,
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name='Miniatura de la foto de la reparación'
+    )
+
     # Control
     notificacion_enviada = models.BooleanField(
         default=False,
@@ -196,36 +440,105 @@ class Ticket(models.Model):
         verbose_name='Notificación SLA enviada'
     )
 
+    # Ejecución de notificar_sla_vencido que reclamó el ticket (evita envíos dobles)
+    lote_sla = models.CharField(
+        max_length=32,
+        blank=True,
+        editable=False,
+        verbose_name='Lote de notificación SLA'
+    )
+
     fecha_actualizacion = models.DateTimeField(
         auto_now=True,
         verbose_name='Fecha de actualización'
     )
 
+    objects = TicketQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Ticket'
         verbose_name_plural = 'Tickets'
         ordering = ['-fecha_creacion']
+        indexes = [
+            # Paginación por cursor de tickets_lista: ORDER BY -fecha_creacion, -id
+            models.Index(fields=['-fecha_creacion', '-id'], name='ticket_fecha_id_idx'),
+            # Abiertos / vencidos: dashboard, badge del admin, comando SLA, reportes
+            models.Index(fields=['estado', 'fecha_limite_sla'], name='ticket_estado_sla_idx'),
+            # Tickets del técnico (asignado_a = yo) por estado
+            models.Index(fields=['asignado_a', 'estado'], name='ticket_asignado_estado_idx'),
+            # Tickets sin asignar de las especialidades del técnico
+            models.Index(
+                fields=['categoria', 'estado'],
+                condition=models.Q(asignado_a__isnull=True),
+                name='ticket_sin_asignar_cat_idx',
+            ),
+            # Tickets modificados desde la última revisión (sla_daemon)
+            models.Index(fields=['fecha_actualizacion'], name='ticket_actualizacion_idx'),
+        ]
         permissions = [
             ('puede_asignar_tickets', 'Puede asignar tickets'),
             ('puede_cerrar_tickets', 'Puede cerrar tickets'),
         ]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        ticket = super().from_db(db, field_names, values)
+        # Para saber en post_save si hay que reprogramar los avisos SLA
+        ticket._plazo_cargado = ticket.plazo_sla()
+        return ticket
+
+    def sla_en_pausa(self):
+        return self.estado == 'EN_ESPERA' and self.sla_pausado_desde is not None
+
+    def calendario_sla(self):
+        """Calendario laboral con el que corre el SLA de este ticket."""
+        return calendario_para_local(self.local)
+
+    def plazo_sla(self):
+        """(estado, fecha_limite_sla, categoria_id): lo que determina los avisos SLA."""
+        return (
+            self.__dict__.get('estado'),
+            self.__dict__.get('fecha_limite_sla'),
+            self.__dict__.get('categoria_id'),
+        )
+
     def save(self, *args, **kwargs):
         """
         Sobrescribe el método save para:
         1. Generar número de ticket automático
-        2. Calcular fecha límite SLA
-        3. Actualizar fechas según cambios de estado
+        2. Calcular fecha límite SLA (en horas laborables del calendario del local)
+        3. Pausar / reanudar el SLA al entrar / salir de EN_ESPERA
+        4. Actualizar fechas según cambios de estado
+        5. Reducir / recomprimir una foto de reparación nueva y su miniatura
         """
+        if pendiente(self.foto_reparacion):
+            procesar_subida(
+                self.foto_reparacion,
+                [(self.foto_reparacion_miniatura, LADO_MINIATURA_FOTO)],
+            )
+        elif not self.foto_reparacion and self.foto_reparacion_miniatura:
+            self.foto_reparacion_miniatura = None
+
         # Generar número de ticket si es nuevo
         if not self.numero_ticket:
-            from django.db.models import Max
-            ultimo = Ticket.objects.aggregate(Max('id'))['id__max'] or 0
-            self.numero_ticket = f"TKT-{(ultimo + 1):06d}"
+            self.numero_ticket = f"TKT-{SecuenciaTicket.siguiente():06d}"
 
         # Calcular fecha límite SLA si es nuevo
         if not self.pk and not self.fecha_limite_sla:
-            self.fecha_limite_sla = timezone.now() + timedelta(hours=self.categoria.tiempo_sla_horas)
+            self.fecha_limite_sla = self.calendario_sla().sumar(
+                timezone.now(), self.categoria.tiempo_sla_horas * 3600
+            )
+
+        estado_anterior = getattr(self, '_plazo_cargado', (None,))[0]
+        if self.pk and estado_anterior != self.estado:
+            if self.estado == 'EN_ESPERA' and not self.sla_pausado_desde:
+                self.sla_pausado_desde = timezone.now()
+            elif self.estado != 'EN_ESPERA' and self.sla_pausado_desde:
+                # Al reanudar queda el mismo tiempo laborable que quedaba al pausar
+                calendario = self.calendario_sla()
+                restante = calendario.laborables(self.sla_pausado_desde, self.fecha_limite_sla)
+                self.fecha_limite_sla = calendario.sumar(timezone.now(), restante)
+                self.sla_pausado_desde = None
 
         # Fecha de asignación
         if self.asignado_a and not self.fecha_asignacion:
@@ -248,6 +561,8 @@ class Ticket(models.Model):
         """Verifica si el ticket está vencido según el SLA"""
         if self.estado in ['RESUELTO', 'CERRADO', 'CANCELADO']:
             return False
+        if self.sla_en_pausa():
+            return False
         return timezone.now() > self.fecha_limite_sla
 
     def tiempo_transcurrido(self):
@@ -260,13 +575,16 @@ class Ticket(models.Model):
         """Tiempo restante para cumplir el SLA"""
         if self.estado in ['RESUELTO', 'CERRADO', 'CANCELADO']:
             return None
-        diferencia = self.fecha_limite_sla - timezone.now()
+        # En pausa el reloj está parado en el momento de pausar
+        desde = self.sla_pausado_desde if self.sla_en_pausa() else timezone.now()
+        diferencia = self.fecha_limite_sla - desde
         return diferencia if diferencia.total_seconds() > 0 else timedelta(0)
 
     def porcentaje_tiempo_usado(self):
         """Porcentaje de tiempo usado del SLA"""
         tiempo_total = self.fecha_limite_sla - self.fecha_creacion
-        tiempo_usado = timezone.now() - self.fecha_creacion
+        hasta = self.sla_pausado_desde if self.sla_en_pausa() else timezone.now()
+        tiempo_usado = hasta - self.fecha_creacion
 
         if tiempo_total.total_seconds() == 0:
             return 100
@@ -274,6 +592,20 @@ class Ticket(models.Model):
         porcentaje = (tiempo_usado.total_seconds() / tiempo_total.total_seconds()) * 100
         return min(porcentaje, 100)
 
+    def estado_sla(self):
+        """
+        (vencido, segundos_restantes, pct_usado). Usa las anotaciones de
+        Ticket.objects.with_sla() si el ticket viene de ahí; si no, los métodos Python.
+        """
+        if hasattr(self, 'vencido'):
+            return self.vencido, self.segundos_restantes, self.pct_usado
+        restante = self.tiempo_restante_sla()
+        return (
+            self.esta_vencido(),
+            None if restante is None else restante.total_seconds(),
+            self.porcentaje_tiempo_usado(),
+        )
+
     def get_color_sla(self):
         """Color según el estado del SLA"""
         if self.estado in ['RESUELTO', 'CERRADO']:
@@ -344,9 +676,27 @@ class ImagenTicket(models.Model):
 
     imagen = models.ImageField(
         upload_to='fotos_tickets/%Y/%m/',
+        storage=almacen_contenido,
         verbose_name='Imagen'
     )
 
+    # Miniaturas de tamaño fijo para la galería (srcset 1x / 2x), ver imagenes.py
+    miniatura = models.ImageField(
+        upload_to='fotos_tickets/miniaturas/%Y/%m/',
+        storage=almacen_contenido,
+        blank=True,
+        editable=False,
+        verbose_name='Miniatura'
+    )
+
+    miniatura_2x = models.ImageField(
+        upload_to='fotos_tickets/miniaturas/%Y/%m/',
+        storage=almacen_contenido,
+        blank=True,
+        editable=False,
+        verbose_name='Miniatura 2x'
+    )
+
     descripcion = models.CharField(
         max_length=200,
         blank=True,
@@ -373,6 +723,172 @@ class ImagenTicket(models.Model):
     def __str__(self):
         return f"Imagen de {self.ticket.numero_ticket} por {self.subida_por}"
 
+    def save(self, *args, **kwargs):
+        # Subida nueva: EXIF-rotar, quitar metadatos, reducir, recomprimir y miniaturas
+        if pendiente(self.imagen):
+            procesar_subida(
+                self.imagen,
+                [(self.miniatura, MINIATURA), (self.miniatura_2x, MINIATURA_2X)],
+            )
+        super().save(*args, **kwargs)
+
+    @property
+    def miniatura_url(self):
+        """Miniatura si existe (imágenes antiguas sin procesar: la original)."""
+        return (self.miniatura or self.imagen).url
+
+
+def _token_subida():
+    return uuid.uuid4().hex
+
+
+class SubidaAdjunto(models.Model):
+    """
+    Subida por partes (reanudable) de un adjunto, antes de asociarlo a un ticket.
+
+    La app sube las fotos en segundo plano mientras se rellena el formulario
+    (ver adjuntos.py) y el formulario envía solo los `token`. Al completarse
+    guarda el SHA-256 del contenido: otra subida con el mismo contenido
+    reutiliza los ficheros ya procesados en vez de guardarlos otra vez.
+    """
+    ESTADOS = [
+        ('EN_CURSO', 'En curso'),
+        ('COMPLETA', 'Completa'),
+    ]
+
+    token = models.CharField(
+        max_length=32,
+        unique=True,
+        default=_token_subida,
+        editable=False,
+        verbose_name='Token',
+    )
+
+    usuario = models.ForeignKey(
+        Usuario,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Usuario',
+    )
+
+    nombre = models.CharField(
+        max_length=255,
+        verbose_name='Nombre original',
+    )
+
+    tamano = models.PositiveBigIntegerField(
+        verbose_name='Tamaño (bytes)',
+    )
+
+    recibido = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name='Bytes recibidos',
+    )
+
+    estado = models.CharField(
+        max_length=20,
+        choices=ESTADOS,
+        default='EN_CURSO',
+        verbose_name='Estado',
+    )
+
+    sha256 = models.CharField(
+        max_length=64,
+        blank=True,
+        db_index=True,
+        verbose_name='SHA-256',
+    )
+
+    # Ficheros ya procesados (mismos destinos que ImagenTicket)
+    imagen = models.ImageField(
+        upload_to='fotos_tickets/%Y/%m/',
+        storage=almacen_contenido,
+        blank=True,
+        verbose_name='Imagen'
+    )
+
+    miniatura = models.ImageField(
+        upload_to='fotos_tickets/miniaturas/%Y/%m/',
+        storage=almacen_contenido,
+        blank=True,
+        verbose_name='Miniatura'
+    )
+
+    miniatura_2x = models.ImageField(
+        upload_to='fotos_tickets/miniaturas/%Y/%m/',
+        storage=almacen_contenido,
+        blank=True,
+        verbose_name='Miniatura 2x'
+    )
+
+    fecha_creacion = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Fecha de creación',
+    )
+
+    class Meta:
+        verbose_name = 'Subida de adjunto'
+        verbose_name_plural = 'Subidas de adjuntos'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['estado', 'fecha_creacion'], name='subida_estado_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.nombre} ({self.recibido}/{self.tamano}) - {self.usuario_id}"
+
+
+class BlobContenido(models.Model):
+    """
+    Fichero del almacén por contenido (ver almacen.py): uno por SHA-256 y
+    extensión, con cuántas filas lo referencian. `recoger_blobs` borra los que
+    llevan más de ALMACEN_GRACIA_HORAS sin referencias.
+    """
+    nombre = models.CharField(
+        max_length=255,
+        unique=True,
+        verbose_name='Nombre en el almacén',
+    )
+
+    sha256 = models.CharField(
+        max_length=64,
+        db_index=True,
+        verbose_name='SHA-256',
+    )
+
+    tamano = models.PositiveBigIntegerField(
+        verbose_name='Tamaño (bytes)',
+    )
+
+    referencias = models.IntegerField(
+        default=0,
+        verbose_name='Referencias',
+    )
+
+    fecha_sin_referencias = models.DateTimeField(
+        null=True,
+        blank=True,
+        default=timezone.now,
+        verbose_name='Sin referencias desde',
+        help_text='Vacío mientras alguna fila lo use. Al guardar de nuevo el mismo contenido se reinicia.',
+    )
+
+    fecha_creacion = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Fecha de creación',
+    )
+
+    class Meta:
+        verbose_name = 'Blob del almacén'
+        verbose_name_plural = 'Blobs del almacén'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['referencias', 'fecha_sin_referencias'], name='blob_gc_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.nombre} ({self.referencias} ref.)"
+
 
 class Notificacion(models.Model):
     """
@@ -383,6 +899,7 @@ class Notificacion(models.Model):
         ('ASIGNACION', 'Ticket asignado'),
         ('ESTADO', 'Cambio de estado'),
         ('SLA_VENCIDO', 'SLA Vencido'),
+        ('SLA_AVISO', 'SLA por vencer'),
     ]
 
     usuario = models.ForeignKey(
@@ -434,6 +951,179 @@ class Notificacion(models.Model):
         verbose_name = 'Notificación'
         verbose_name_plural = 'Notificaciones'
         ordering = ['-fecha']
+        indexes = [
+            # Campana: no leídas del usuario, más recientes primero
+            models.Index(fields=['usuario', 'leida', '-fecha'], name='notif_usuario_leida_idx'),
+        ]
 
     def __str__(self):
         return f"Notif → {self.usuario.username}: {self.mensaje[:50]}"
+
+
+class AvisoSla(models.Model):
+    """
+    Aviso previo al vencimiento programado para un ticket (uno por nivel).
+
+    Se crea al abrir el ticket con la hora exacta en que toca (`fecha_programada`);
+    `fecha_envio` marca que ya se envió y `lote` qué ejecución lo reclamó. El
+    sla_daemon solo lee los pendientes con fecha_programada dentro de su
+    ventana (rango sobre un índice parcial).
+    """
+    ticket = models.ForeignKey(
+        'Ticket',
+        on_delete=models.CASCADE,
+        related_name='avisos_sla',
+        verbose_name='Ticket',
+    )
+
+    porcentaje = models.PositiveSmallIntegerField(
+        verbose_name='Porcentaje del SLA',
+    )
+
+    fecha_programada = models.DateTimeField(
+        verbose_name='Fecha programada',
+    )
+
+    fecha_envio = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Fecha de envío',
+    )
+
+    lote = models.CharField(
+        max_length=32,
+        blank=True,
+        editable=False,
+        verbose_name='Lote de envío',
+    )
+
+    class Meta:
+        verbose_name = 'Aviso SLA'
+        verbose_name_plural = 'Avisos SLA'
+        ordering = ['fecha_programada']
+        constraints = [
+            models.UniqueConstraint(fields=['ticket', 'porcentaje'], name='aviso_sla_ticket_nivel_unico'),
+        ]
+        indexes = [
+            # sla_daemon: pendientes por hora programada
+            models.Index(
+                fields=['fecha_programada'],
+                condition=models.Q(fecha_envio__isnull=True),
+                name='aviso_sla_pendiente_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.ticket.numero_ticket} al {self.porcentaje}%"
+
+
+class EnvioPendiente(models.Model):
+    """
+    Bandeja de salida (outbox) para notificaciones externas: push FCM y WhatsApp.
+
+    Se inserta en la misma transacción que el ticket/comentario que la origina
+    y la procesa el comando `procesar_envios`, fuera del ciclo petición/respuesta.
+    """
+    TIPOS = [
+        ('PUSH_NUEVO_TICKET', 'Push: nuevo ticket'),
+        ('PUSH_MENCION', 'Push: mención'),
+        ('PUSH_SLA_VENCIDO', 'Push: SLA vencido'),
+        ('PUSH_AVISO_SLA', 'Push: SLA por vencer'),
+        ('PUSH_SLA_RESUMEN', 'Push: resumen SLA vencido'),
+        ('WHATSAPP_ASIGNADO', 'WhatsApp: ticket asignado'),
+    ]
+
+    ESTADOS = [
+        ('PENDIENTE', 'Pendiente'),
+        ('PROCESANDO', 'Procesando'),
+        ('ENVIADO', 'Enviado'),
+        ('ERROR', 'Error'),
+    ]
+
+    tipo = models.CharField(
+        max_length=30,
+        choices=TIPOS,
+        verbose_name='Tipo',
+    )
+
+    estado = models.CharField(
+        max_length=20,
+        choices=ESTADOS,
+        default='PENDIENTE',
+        verbose_name='Estado',
+    )
+
+    ticket = models.ForeignKey(
+        Ticket,
+        on_delete=models.CASCADE,
+        related_name='envios_pendientes',
+        verbose_name='Ticket',
+    )
+
+    usuario = models.ForeignKey(
+        Usuario,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Usuario destino',
+    )
+
+    autor = models.ForeignKey(
+        Usuario,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Autor',
+    )
+
+    datos = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name='Datos adicionales',
+    )
+
+    intentos = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Intentos',
+    )
+
+    proximo_intento = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Próximo intento',
+        help_text='Mientras está PROCESANDO indica cuándo expira la reserva del worker.',
+    )
+
+    lote = models.CharField(
+        max_length=32,
+        blank=True,
+        verbose_name='Lote',
+    )
+
+    ultimo_error = models.TextField(
+        blank=True,
+        verbose_name='Último error',
+    )
+
+    fecha_creacion = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Fecha de creación',
+    )
+
+    fecha_envio = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Fecha de envío',
+    )
+
+    class Meta:
+        verbose_name = 'Envío pendiente'
+        verbose_name_plural = 'Envíos pendientes'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['estado', 'proximo_intento'], name='envio_estado_prox_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} ({self.get_estado_display()}) - {self.ticket_id}"
@@ -0,0 +1,194 @@
+# apps/tickets/notificaciones.py
+"""
+Difusión (fan-out) de notificaciones in-app + push.
+
+Un evento (mención, SLA vencido...) llega a N destinatarios. Aquí se resuelven
+una sola vez, todas las Notificacion se insertan con un bulk_create dentro de
+una transacción y el push sale como un único envío para todos. Coste: O(1) idas
+y vueltas a la base de datos por evento en vez de O(destinatarios).
+"""
+import re
+import time
+import uuid
+
+from django.db import transaction
+from django.utils import timezone
+
+from apps.usuarios.models import Usuario
+
+from .avisos import avisar
+from .envios import encolar_avisos_sla, encolar_menciones, encolar_resumen_sla
+from .models import Notificacion, Ticket
+
+PATRON_MENCION = re.compile(r'@(\w+)')
+
+
+def crear_notificaciones(notificaciones):
+    """
+    Inserta las notificaciones en bloque y avisa a los long-polls de la campana
+    al confirmar (bulk_create no emite post_save).
+    """
+    if not notificaciones:
+        return []
+
+    with transaction.atomic():
+        creadas = Notificacion.objects.bulk_create(notificaciones)
+
+        ultimas = {}
+        for notif in creadas:
+            if notif.pk and notif.pk > ultimas.get(notif.usuario_id, 0):
+                ultimas[notif.usuario_id] = notif.pk
+
+        def _avisar():
+            for usuario_id, notif_id in ultimas.items():
+                avisar(usuario_id, notif_id)
+
+        transaction.on_commit(_avisar)
+    return creadas
+
+
+def no_leidas(usuario, desde=None):
+    """No leídas de `usuario` (posteriores al id `desde`), más recientes primero: la campana."""
+    notifs = Notificacion.objects.filter(usuario=usuario, leida=False)
+    if desde is not None:
+        notifs = notifs.filter(id__gt=desde)
+    return notifs.select_related('ticket', 'autor').order_by('-fecha')
+
+
+def notificar_menciones(comentario, autor, ticket):
+    """
+    Parsea @username en el comentario y notifica a los mencionados:
+    1 SELECT de destinatarios + 1 INSERT de notificaciones + 1 INSERT en la bandeja de salida.
+    Devuelve la lista de usuarios notificados.
+    """
+    usernames = set(PATRON_MENCION.findall(comentario.comentario))
+    if not usernames:
+        return []
+
+    # Usuarios que existen con esos usernames (sin incluir al autor)
+    destinatarios = list(
+        Usuario.objects
+        .filter(username__in=usernames, activo=True)
+        .exclude(pk=autor.pk)
+    )
+    if not destinatarios:
+        return []
+
+    nombre_autor = autor.get_full_name() or autor.username
+    mensaje = f'{nombre_autor} te mencionó en {ticket.numero_ticket}: "{comentario.comentario[:80]}"'
+
+    with transaction.atomic():
+        crear_notificaciones([
+            Notificacion(usuario=usuario, ticket=ticket, tipo='MENCION', mensaje=mensaje, autor=autor)
+            for usuario in destinatarios
+        ])
+        # Push FCM (mobile): un único envío en la bandeja de salida para todos
+        encolar_menciones(ticket, autor, destinatarios, comentario.comentario)
+    return destinatarios
+
+
+def notificar_sla_vencido(tickets, destinatarios):
+    """
+    Notificación web "SLA vencido" de cada ticket para cada destinatario,
+    en un solo bulk_create (T×A filas, no T×A INSERTs).
+    """
+    return crear_notificaciones([
+        Notificacion(
+            usuario=usuario,
+            ticket=ticket,
+            tipo='SLA_VENCIDO',
+            mensaje=f'SLA Vencido: {ticket.numero_ticket} ({ticket.local})',
+            # autor=None porque es el sistema
+        )
+        for ticket in tickets
+        for usuario in destinatarios
+    ])
+
+
+def notificar_avisos_sla(avisos):
+    """
+    Aviso "SLA por vencer" de cada AvisoSla a staff y al técnico asignado:
+    1 SELECT de staff + 1 INSERT de notificaciones + 1 INSERT en la bandeja de salida.
+    """
+    if not avisos:
+        return []
+    staff_ids = list(Usuario.objects.filter(is_staff=True, activo=True).values_list('id', flat=True))
+
+    notificaciones = []
+    destinatarios = {}
+    for aviso in avisos:
+        ticket = aviso.ticket
+        usuarios = list(dict.fromkeys(staff_ids + ([ticket.asignado_a_id] if ticket.asignado_a_id else [])))
+        destinatarios[aviso.pk] = usuarios
+        vence = timezone.localtime(ticket.fecha_limite_sla).strftime('%H:%M')
+        mensaje = f'SLA al {aviso.porcentaje}%: {ticket.numero_ticket} ({ticket.local}) vence a las {vence}'
+        notificaciones.extend(
+            Notificacion(usuario_id=usuario_id, ticket=ticket, tipo='SLA_AVISO', mensaje=mensaje)
+            for usuario_id in usuarios
+        )
+
+    with transaction.atomic():
+        creadas = crear_notificaciones(notificaciones)
+        encolar_avisos_sla(avisos, destinatarios)
+    return creadas
+
+
+def tickets_sla_pendientes(ahora=None):
+    """Abiertos con el SLA vencido y sin notificar, los más antiguos primero (índice estado + fecha_limite_sla)."""
+    ahora = ahora or timezone.now()
+    return Ticket.objects.filter(
+        estado__in=Ticket.ESTADOS_SLA_ACTIVO,
+        fecha_limite_sla__lt=ahora,
+        notificacion_sla_enviada=False,
+    ).order_by('fecha_limite_sla')
+
+
+def notificar_sla_pendientes(tamano=500, ahora=None):
+    """
+    Reclama por lotes los tickets vencidos sin notificar y avisa a staff.
+
+    Cada lote se reclama con un UPDATE condicional que marca el ticket con el id
+    de esta ejecución: si otro proceso ya lo marcó, no se toca (nunca se notifica
+    dos veces). Las notificaciones web de cada lote salen en un solo INSERT y el
+    push resumen se encola en la bandeja de salida en esa misma transacción
+    (lo entrega `procesar_envios`, con reintentos): si el push falla no se
+    pierde. Devuelve un dict con las estadísticas.
+    """
+    inicio = time.monotonic()
+    qs = tickets_sla_pendientes(ahora)
+    lote_id = uuid.uuid4().hex
+    admin_users = list(Usuario.objects.filter(is_staff=True, activo=True))
+
+    reclamados = []
+    resumen = None
+    lotes = notificaciones = 0
+    while True:
+        ids = list(qs.values_list('id', flat=True)[:tamano])
+        if not ids:
+            break
+
+        with transaction.atomic():
+            Ticket.objects.filter(id__in=ids, notificacion_sla_enviada=False).update(
+                notificacion_sla_enviada=True,
+                lote_sla=lote_id,
+            )
+            tickets = list(
+                Ticket.objects
+                .filter(id__in=ids, lote_sla=lote_id)
+                .select_related('local', 'categoria')
+            )
+            notificaciones += len(notificar_sla_vencido(tickets, admin_users))
+            if tickets:
+                # Un único push resumen por dispositivo staff (no uno por ticket)
+                resumen = encolar_resumen_sla(tickets, resumen)
+
+        reclamados.extend(tickets)
+        lotes += 1
+
+    return {
+        'tickets': reclamados,
+        'lotes': lotes,
+        'notificaciones': notificaciones,
+        'resumen': resumen,
+        'segundos': time.monotonic() - inicio,
+    }
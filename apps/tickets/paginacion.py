@@ -0,0 +1,115 @@
+# apps/tickets/paginacion.py
+"""
+Paginación por cursor (keyset) para listados grandes.
+
+En vez de OFFSET + COUNT (que recorren la tabla entera a medida que crece),
+cada página se pide "a partir de" la última fila vista usando el índice
+(campo, id). El coste por página es constante y no depende del total de filas.
+"""
+import base64
+from dataclasses import dataclass, field
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+POR_PAGINA = 30
+
+
+@dataclass
+class PaginaKeyset:
+    """Una página de resultados con los cursores para moverse."""
+    items: list = field(default_factory=list)
+    cursor_siguiente: str = None
+    cursor_anterior: str = None
+
+    @property
+    def hay_siguiente(self):
+        return self.cursor_siguiente is not None
+
+    @property
+    def hay_anterior(self):
+        return self.cursor_anterior is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def codificar_cursor(valor, pk):
+    """Cursor opaco para la URL a partir de (valor del campo, id)."""
+    crudo = f"{valor.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor):
+    """Devuelve (datetime, id) o None si el cursor no es válido."""
+    if not cursor:
+        return None
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        crudo = base64.urlsafe_b64decode(cursor + relleno).decode()
+        valor, pk = crudo.rsplit("|", 1)
+        fecha = parse_datetime(valor)
+        if fecha is None:
+            return None
+        return fecha, int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def consulta_keyset(qs, cursor=None, direccion="sig", por_pagina=POR_PAGINA, campo="fecha_creacion"):
+    """
+    La consulta de una página: por_pagina + 1 filas a partir del cursor, para
+    saber si hay más sin hacer COUNT. "ant" va en orden (campo, id) ascendente.
+    """
+    posicion = decodificar_cursor(cursor)
+    if posicion and direccion == "ant":
+        valor, pk = posicion
+        return (
+            qs.filter(**{f"{campo}__gte": valor})
+            .filter(Q(**{f"{campo}__gt": valor}) | Q(id__gt=pk))
+            .order_by(campo, "id")[:por_pagina + 1]
+        )
+
+    if posicion:
+        valor, pk = posicion
+        # campo <= valor permite al motor buscar directamente en el índice;
+        # el OR solo desempata las filas con el mismo valor.
+        qs = (
+            qs.filter(**{f"{campo}__lte": valor})
+            .filter(Q(**{f"{campo}__lt": valor}) | Q(id__lt=pk))
+        )
+    return qs.order_by(f"-{campo}", "-id")[:por_pagina + 1]
+
+
+def paginar_keyset(qs, cursor=None, direccion="sig", por_pagina=POR_PAGINA, campo="fecha_creacion"):
+    """
+    Pagina `qs` en orden (-campo, -id).
+
+    - direccion="sig": filas posteriores (más antiguas) al cursor.
+    - direccion="ant": filas anteriores (más recientes) al cursor.
+    """
+    posicion = decodificar_cursor(cursor)
+    filas = list(consulta_keyset(qs, cursor, direccion, por_pagina, campo))
+
+    def _cursor(obj):
+        return codificar_cursor(getattr(obj, campo), obj.pk)
+
+    if posicion and direccion == "ant":
+        hay_mas = len(filas) > por_pagina
+        filas = filas[:por_pagina][::-1]
+        return PaginaKeyset(
+            items=filas,
+            cursor_siguiente=_cursor(filas[-1]) if filas else None,
+            cursor_anterior=_cursor(filas[0]) if hay_mas else None,
+        )
+
+    hay_mas = len(filas) > por_pagina
+    filas = filas[:por_pagina]
+    return PaginaKeyset(
+        items=filas,
+        cursor_siguiente=_cursor(filas[-1]) if hay_mas else None,
+        cursor_anterior=_cursor(filas[0]) if posicion and filas else None,
+    )
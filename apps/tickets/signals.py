@@ -0,0 +1,100 @@
+# apps/tickets/signals.py
+"""
+- Invalidación de los contadores cacheados (ver contadores.py) cuando cambian tickets.
+- Aviso a los long-polls de la campana (ver avisos.py) cuando llega una notificación.
+- Programación de los avisos previos al vencimiento del SLA (ver escalamiento_sla.py).
+- Cuenta de referencias de los blobs del almacén por contenido (ver almacen.py).
+- Días de los tickets borrados, para los resúmenes de reportes (ver reportes/resumenes.py).
+"""
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from apps.reportes.resumenes import marcar_dia_borrado
+from apps.usuarios.models import Usuario
+
+from .almacen import ajustar_referencias, nombres_blob
+from .avisos import avisar
+from .contadores import invalidar_contadores
+from .escalamiento_sla import programar_avisos
+from .models import ImagenTicket, Notificacion, SubidaAdjunto, Ticket, tickets_actualizados
+
+# Solo estos campos cambian los contadores (abiertos / vencidos / visibilidad)
+CAMPOS_CONTADORES = {'estado', 'fecha_limite_sla', 'asignado_a', 'asignado_a_id', 'categoria', 'categoria_id'}
+
+
+def _invalidar():
+    # Ahora, y otra vez al confirmar: una lectura concurrente entre medias
+    # podría haber cacheado el valor anterior a la transacción.
+    invalidar_contadores()
+    transaction.on_commit(invalidar_contadores)
+
+
+@receiver(post_save, sender=Ticket)
+def ticket_guardado(sender, instance, created, update_fields=None, **kwargs):
+    if created or update_fields is None or CAMPOS_CONTADORES & set(update_fields):
+        _invalidar()
+
+    # Solo si cambió estado / plazo / categoría desde que se cargó (from_db)
+    plazo = instance.plazo_sla()
+    if created or plazo != getattr(instance, '_plazo_cargado', None):
+        programar_avisos(instance, creado=created)
+        instance._plazo_cargado = plazo
+
+
+@receiver(post_delete, sender=Ticket)
+def ticket_eliminado(sender, instance, **kwargs):
+    _invalidar()
+    # Sin la fila, actualizar_resumenes no vería que su día cambió
+    marcar_dia_borrado(instance.fecha_creacion)
+
+
+@receiver(tickets_actualizados, sender=Ticket)
+def tickets_actualizados_en_bloque(sender, campos, **kwargs):
+    if CAMPOS_CONTADORES & set(campos):
+        _invalidar()
+
+
+@receiver(m2m_changed, sender=Usuario.especialidades.through)
+def especialidades_cambiadas(sender, action, **kwargs):
+    # Cambia lo que ve el técnico
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        _invalidar()
+
+
+@receiver(post_save, sender=Notificacion)
+def notificacion_creada(sender, instance, created, **kwargs):
+    if created:
+        # Tras el commit: el long-poll despertado la tiene que poder leer
+        transaction.on_commit(lambda: avisar(instance.usuario_id, instance.pk))
+
+
+# Modelos con campos en el almacén por contenido
+MODELOS_CON_BLOBS = (Ticket, ImagenTicket, SubidaAdjunto)
+
+
+def blobs_cargados(sender, instance, **kwargs):
+    instance._blobs_cargados = nombres_blob(instance)
+
+
+def blobs_guardados(sender, instance, created, **kwargs):
+    anteriores = {} if created else getattr(instance, '_blobs_cargados', {})
+    actuales = nombres_blob(instance)
+    cambiados = [campo for campo, nombre in actuales.items() if nombre != anteriores.get(campo)]
+    if cambiados:
+        ajustar_referencias(
+            sumar=[actuales[campo] for campo in cambiados],
+            restar=[anteriores.get(campo, '') for campo in cambiados],
+        )
+    instance._blobs_cargados = actuales
+
+
+def blobs_borrados(sender, instance, **kwargs):
+    # También en CASCADE (el borrado de un ticket se lleva sus imágenes)
+    ajustar_referencias(restar=nombres_blob(instance).values())
+
+
+for _modelo in MODELOS_CON_BLOBS:
+    post_init.connect(blobs_cargados, sender=_modelo)
+    post_save.connect(blobs_guardados, sender=_modelo)
+    post_delete.connect(blobs_borrados, sender=_modelo)
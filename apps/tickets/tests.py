@@ -1,8 +1,8 @@
 """
 Tests para el módulo de tickets
 """
-from datetime import timedelta
-from django.test import TestCase
+from datetime import datetime, timedelta
+from django.test import TestCase, TransactionTestCase
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 
@@ -184,6 +184,86 @@ class TicketModelTest(TestCase):
         self.assertIsNotNone(ticket.fecha_cierre)
 
 
+class TicketWithSlaTest(TestCase):
+    """with_sla() debe dar exactamente lo mismo que los métodos Python del modelo."""
+
+    ESTADOS = ["PENDIENTE", "EN_PROCESO", "EN_ESPERA", "RESUELTO", "CERRADO", "CANCELADO"]
+
+    def setUp(self):
+        import random
+
+        self.rnd = random.Random(20240817)
+        usuario = User.objects.create_user(username="sla_prop", password="x", rol="ADMIN")
+        local = Local.objects.create(codigo="SLA01", nombre="Local SLA", activo=True)
+        categoria = CategoriaAveria.objects.create(nombre="SLA prop", tiempo_sla_horas=4)
+
+        self.base = timezone.now().replace(microsecond=0) - timedelta(days=30)
+        for i in range(200):
+            ticket = Ticket.objects.create(
+                local=local, categoria=categoria, titulo=f"T{i}",
+                descripcion="x", creado_por=usuario,
+            )
+            creacion = self.base + timedelta(microseconds=self.rnd.randrange(0, 20 * 86400 * 10**6))
+            # ~5% con SLA de duración cero (caso límite del porcentaje)
+            duracion = 0 if self.rnd.random() < 0.05 else self.rnd.randrange(1, 72 * 3600 * 10**6)
+            estado = self.rnd.choice(self.ESTADOS)
+            # EN_ESPERA: casi siempre con la pausa marcada (antes o después del límite)
+            pausado = None
+            if estado == "EN_ESPERA" and self.rnd.random() < 0.8:
+                pausado = creacion + timedelta(microseconds=self.rnd.randrange(0, 96 * 3600 * 10**6))
+            Ticket.objects.filter(pk=ticket.pk).update(
+                estado=estado,
+                fecha_creacion=creacion,
+                fecha_limite_sla=creacion + timedelta(microseconds=duracion),
+                sla_pausado_desde=pausado,
+            )
+
+    def test_with_sla_igual_a_metodos_python(self):
+        from unittest import mock
+
+        for _ in range(25):
+            ahora = self.base + timedelta(microseconds=self.rnd.randrange(-86400 * 10**6, 25 * 86400 * 10**6))
+            tickets = list(Ticket.objects.with_sla(ahora))
+            self.assertEqual(len(tickets), 200)
+
+            with mock.patch("django.utils.timezone.now", return_value=ahora):
+                for t in tickets:
+                    restante = t.tiempo_restante_sla()
+                    with self.subTest(ticket=t.pk, ahora=ahora):
+                        self.assertEqual(t.vencido, t.esta_vencido())
+                        self.assertEqual(
+                            t.segundos_restantes,
+                            None if restante is None else restante.total_seconds(),
+                        )
+                        self.assertEqual(t.pct_usado, t.porcentaje_tiempo_usado())
+                        self.assertEqual(t.color_sla, t.get_color_sla())
+
+    def test_pausado_congela_el_porcentaje(self):
+        ticket = Ticket.objects.filter(estado="PENDIENTE").first()
+        creacion = timezone.now() - timedelta(hours=10)
+        Ticket.objects.filter(pk=ticket.pk).update(
+            estado="EN_ESPERA",
+            fecha_creacion=creacion,
+            fecha_limite_sla=creacion + timedelta(hours=4),
+            sla_pausado_desde=creacion + timedelta(hours=1),
+        )
+        ticket = Ticket.objects.get(pk=ticket.pk)
+        anotado = Ticket.objects.with_sla().get(pk=ticket.pk)
+
+        self.assertAlmostEqual(ticket.porcentaje_tiempo_usado(), 25.0)
+        self.assertAlmostEqual(anotado.pct_usado, 25.0)
+        self.assertEqual(ticket.get_color_sla(), "success")
+        self.assertEqual(anotado.color_sla, "success")
+
+    def test_with_sla_usa_un_solo_ahora(self):
+        ahora = self.base + timedelta(days=10)
+        with self.assertNumQueries(1):
+            tickets = list(Ticket.objects.with_sla(ahora))
+        for t in tickets:
+            if t.vencido:
+                self.assertLess(t.fecha_limite_sla, ahora)
+
+
 class ComentarioTicketTest(TestCase):
     """Tests para el modelo ComentarioTicket"""
     
@@ -237,3 +317,1881 @@ class ComentarioTicketTest(TestCase):
         str_comentario = str(comentario)
         self.assertIn(self.ticket.numero_ticket, str_comentario)
         self.assertIn(self.usuario.username, str_comentario)
+
+
+class _RelojCongelado:
+    """Reloj controlable para los tests del proveedor de tokens."""
+
+    def __init__(self, inicio=1_000_000.0):
+        self.ahora = inicio
+
+    def __call__(self):
+        return self.ahora
+
+    def avanzar(self, segundos):
+        self.ahora += segundos
+
+
+class _FakeTokenEndpoint:
+    """
+    Transporte google-auth falso: responde como el endpoint OAuth de Google
+    y cuenta cuántas veces se pidió un token.
+    """
+
+    def __init__(self, expires_in=3600):
+        self.expires_in = expires_in
+        self.llamadas = 0
+
+    def __call__(self, url, method="GET", body=None, headers=None, timeout=None, **kwargs):
+        import json
+        from types import SimpleNamespace
+
+        self.llamadas += 1
+        data = json.dumps({
+            "access_token": f"token-{self.llamadas}",
+            "expires_in": self.expires_in,
+            "token_type": "Bearer",
+        }).encode()
+        return SimpleNamespace(status=200, headers={}, data=data)
+
+
+def _credenciales_de_prueba():
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from google.oauth2 import service_account
+
+    clave = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = clave.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode()
+    return service_account.Credentials.from_service_account_info(
+        {
+            "type": "service_account",
+            "client_email": "fcm@test.iam.gserviceaccount.com",
+            "private_key": pem,
+            "private_key_id": "test",
+            "token_uri": "https://oauth2.test/token",
+        },
+        scopes=["https://www.googleapis.com/auth/firebase.messaging"],
+    )
+
+
+class ProveedorTokenFCMTest(TestCase):
+    """Tests para el proveedor compartido de access tokens FCM"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.credenciales = _credenciales_de_prueba()
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.reloj = _RelojCongelado()
+        self.endpoint = _FakeTokenEndpoint(expires_in=3600)
+
+    def _proveedor(self, **kwargs):
+        from apps.tickets.fcm import ProveedorTokenFCM
+        kwargs.setdefault("credenciales", self.credenciales)
+        kwargs.setdefault("transporte", self.endpoint)
+        kwargs.setdefault("reloj", self.reloj)
+        kwargs.setdefault("margen", 300)
+        return ProveedorTokenFCM(**kwargs)
+
+    def test_reutiliza_token_hasta_el_margen(self):
+        """El token se pide una vez y se reutiliza mientras esté vigente"""
+        proveedor = self._proveedor()
+
+        self.assertEqual(proveedor.get_token(), "token-1")
+        self.reloj.avanzar(3000)
+        self.assertEqual(proveedor.get_token(), "token-1")
+        self.assertEqual(self.endpoint.llamadas, 1)
+
+    def test_refresca_antes_de_expirar(self):
+        """Dentro del margen de expiración se pide un token nuevo"""
+        proveedor = self._proveedor()
+        proveedor.get_token()
+
+        self.reloj.avanzar(3600 - 300 + 1)
+        self.assertEqual(proveedor.get_token(), "token-2")
+        self.assertEqual(self.endpoint.llamadas, 2)
+
+    def test_token_compartido_via_cache(self):
+        """Un segundo proveedor (otro worker) reutiliza el token de la caché"""
+        self._proveedor().get_token()
+        otro = self._proveedor()
+
+        self.assertEqual(otro.get_token(), "token-1")
+        self.assertEqual(self.endpoint.llamadas, 1)
+
+    def test_invalidar_fuerza_refresco(self):
+        """invalidar() descarta el token local y el compartido"""
+        proveedor = self._proveedor()
+        proveedor.get_token()
+        proveedor.invalidar()
+
+        self.assertEqual(proveedor.get_token(), "token-2")
+
+    def test_refresco_concurrente_sin_estampida(self):
+        """Varios hilos pidiendo token a la vez provocan un único refresco"""
+        import threading
+
+        proveedor = self._proveedor()
+        barrera = threading.Barrier(8)
+        resultados = []
+
+        def pedir():
+            barrera.wait()
+            resultados.append(proveedor.get_token())
+
+        hilos = [threading.Thread(target=pedir) for _ in range(8)]
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+
+        self.assertEqual(resultados, ["token-1"] * 8)
+        self.assertEqual(self.endpoint.llamadas, 1)
+
+
+class _StubFCMServer:
+    """
+    Servidor HTTP local que imita FCM HTTP v1.
+    Tokens que empiezan por "dead" responden 404 UNREGISTERED,
+    "bad" 400 INVALID_ARGUMENT sobre message.token y "busy" 503 UNAVAILABLE.
+    """
+
+    def __init__(self):
+        import json
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        stub = self
+        self.recibidos = []
+        self.conexiones = set()
+        self._lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                largo = int(self.headers.get("Content-Length", 0))
+                cuerpo = json.loads(self.rfile.read(largo))
+                token = cuerpo["message"]["token"]
+                with stub._lock:
+                    stub.recibidos.append(cuerpo)
+                    stub.conexiones.add(self.client_address)
+
+                if token.startswith("dead"):
+                    status, data = 404, {"error": {
+                        "code": 404,
+                        "status": "NOT_FOUND",
+                        "message": "Requested entity was not found.",
+                        "details": [{
+                            "@type": "type.googleapis.com/google.firebase.fcm.v1.FcmError",
+                            "errorCode": "UNREGISTERED",
+                        }],
+                    }}
+                elif token.startswith("bad"):
+                    status, data = 400, {"error": {
+                        "code": 400,
+                        "status": "INVALID_ARGUMENT",
+                        "message": "The registration token is not a valid FCM registration token",
+                        "details": [
+                            {
+                                "@type": "type.googleapis.com/google.firebase.fcm.v1.FcmError",
+                                "errorCode": "INVALID_ARGUMENT",
+                            },
+                            {
+                                "@type": "type.googleapis.com/google.rpc.BadRequest",
+                                "fieldViolations": [{"field": "message.token"}],
+                            },
+                        ],
+                    }}
+                elif token.startswith("busy"):
+                    status, data = 503, {"error": {
+                        "code": 503,
+                        "status": "UNAVAILABLE",
+                        "message": "The service is currently unavailable.",
+                        "details": [{
+                            "@type": "type.googleapis.com/google.firebase.fcm.v1.FcmError",
+                            "errorCode": "UNAVAILABLE",
+                        }],
+                    }}
+                else:
+                    status, data = 200, {"name": f"projects/test/messages/{token}"}
+
+                payload = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v1/projects/test/messages:send"
+        self._hilo = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._hilo.start()
+
+    def cerrar(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class _ProveedorFijo:
+    """Proveedor de tokens de prueba (sin OAuth)."""
+
+    def get_token(self):
+        return "token-fijo"
+
+    def invalidar(self):
+        pass
+
+
+class ClienteFCMTest(TestCase):
+    """Tests para el cliente FCM con sesión keep-alive y envío concurrente"""
+
+    def setUp(self):
+        self.stub = _StubFCMServer()
+        self.addCleanup(self.stub.cerrar)
+
+    def _cliente(self, **kwargs):
+        from apps.tickets.fcm import ClienteFCM
+        return ClienteFCM(url=self.stub.url, proveedor=_ProveedorFijo(), **kwargs)
+
+    def test_multicast_resumen(self):
+        """El resultado resume enviados, fallidos y tokens inválidos"""
+        cliente = self._cliente(max_workers=4)
+        tokens = [f"ok-{i}" for i in range(10)] + ["dead-1", "dead-2"]
+
+        resultado = cliente.enviar_multicast(tokens, {"notification": {"title": "x"}})
+
+        self.assertEqual(resultado.enviados, 10)
+        self.assertEqual(resultado.fallidos, 2)
+        self.assertEqual(sorted(resultado.tokens_invalidos), ["dead-1", "dead-2"])
+        self.assertEqual(len(self.stub.recibidos), 12)
+        self.assertEqual(
+            {c["message"]["token"] for c in self.stub.recibidos},
+            set(tokens),
+        )
+
+    def test_reutiliza_conexiones(self):
+        """Las conexiones keep-alive se reutilizan (no una por mensaje)"""
+        cliente = self._cliente(max_workers=3)
+        cliente.enviar_multicast([f"ok-{i}" for i in range(30)], {"data": {}})
+
+        self.assertEqual(len(self.stub.recibidos), 30)
+        self.assertLessEqual(len(self.stub.conexiones), 3)
+
+    def test_error_de_red_cuenta_como_fallido(self):
+        """Un servidor inaccesible no lanza excepción, solo cuenta fallidos"""
+        from apps.tickets.fcm import ClienteFCM
+
+        self.stub.cerrar()
+        cliente = ClienteFCM(url=self.stub.url, proveedor=_ProveedorFijo(), timeout=(0.5, 0.5))
+        resultado = cliente.enviar_multicast(["ok-1", "ok-2"], {"data": {}})
+
+        self.assertEqual(resultado.enviados, 0)
+        self.assertEqual(resultado.fallidos, 2)
+        self.assertEqual(resultado.tokens_invalidos, [])
+
+    def test_sin_tokens(self):
+        """Sin tokens no se hace ninguna petición"""
+        resultado = self._cliente().enviar_multicast([], {"data": {}})
+        self.assertEqual(resultado.total, 0)
+        self.assertEqual(self.stub.recibidos, [])
+
+    def test_sla_vencido_usa_cliente_compartido(self):
+        """enviar_notificacion_sla_vencido envía a todos los dispositivos staff"""
+        from unittest import mock
+        from apps.tickets import fcm
+        from apps.usuarios.models import DispositivoNotificacion
+
+        staff = User.objects.create_user(username="jefe", password="x", is_staff=True)
+        for i in range(3):
+            DispositivoNotificacion.objects.create(usuario=staff, fcm_token=f"ok-staff-{i}")
+        ticket = Ticket.objects.create(
+            local=Local.objects.create(codigo="FCM01", nombre="Local FCM"),
+            categoria=CategoriaAveria.objects.create(nombre="Red", tiempo_sla_horas=2),
+            titulo="SLA",
+            descripcion="SLA",
+            creado_por=staff,
+        )
+
+        with mock.patch.object(fcm, "_cliente", self._cliente()):
+            self.assertTrue(fcm.enviar_notificacion_sla_vencido(ticket))
+
+        self.assertEqual(len(self.stub.recibidos), 3)
+        self.assertEqual(self.stub.recibidos[0]["message"]["data"]["tipo"], "sla_vencido")
+
+    def test_resumen_sla_vencido_un_push_por_dispositivo(self):
+        """Varios tickets vencidos => un solo mensaje resumen por dispositivo staff"""
+        from unittest import mock
+        from apps.tickets import fcm
+        from apps.usuarios.models import DispositivoNotificacion
+
+        staff = User.objects.create_user(username="jefe", password="x", is_staff=True)
+        for i in range(3):
+            DispositivoNotificacion.objects.create(usuario=staff, fcm_token=f"ok-staff-{i}")
+        local = Local.objects.create(codigo="FCM02", nombre="Local FCM")
+        categoria = CategoriaAveria.objects.create(nombre="Red", tiempo_sla_horas=2)
+        tickets = [
+            Ticket.objects.create(local=local, categoria=categoria, titulo="SLA", descripcion="SLA", creado_por=staff)
+            for _ in range(7)
+        ]
+
+        with mock.patch.object(fcm, "_cliente", self._cliente()):
+            resultado = fcm.enviar_resumen_sla_vencido(tickets)
+
+        self.assertEqual(resultado.enviados, 3)
+        self.assertEqual(len(self.stub.recibidos), 3)
+        mensaje = self.stub.recibidos[0]["message"]
+        self.assertEqual(mensaje["data"]["tipo"], "sla_vencido_resumen")
+        self.assertIn("7 tickets", mensaje["notification"]["title"])
+        self.assertIn("y 2 más", mensaje["notification"]["body"])
+
+
+class BandejaSalidaTest(TestCase):
+    """Tests para la bandeja de salida (outbox) de push/WhatsApp"""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username="admin", password="x", rol="ADMIN")
+        self.tecnico = User.objects.create_user(username="tecnico", password="x", rol="TECNICO")
+        self.local = Local.objects.create(codigo="OUT01", nombre="Local Outbox")
+        self.categoria = CategoriaAveria.objects.create(nombre="Red", tiempo_sla_horas=4)
+        self.ticket = Ticket.objects.create(
+            local=self.local,
+            categoria=self.categoria,
+            titulo="Outbox",
+            descripcion="Outbox",
+            creado_por=self.admin,
+            asignado_a=self.tecnico,
+        )
+
+    def test_encolar_nuevo_ticket_un_insert(self):
+        """Encolar push + WhatsApp es un único INSERT"""
+        from apps.tickets.envios import encolar_nuevo_ticket
+        from apps.tickets.models import EnvioPendiente
+
+        with self.settings(WHATSAPP_ENABLED=True), self.assertNumQueries(1):
+            encolar_nuevo_ticket(self.ticket)
+
+        self.assertEqual(
+            sorted(EnvioPendiente.objects.values_list("tipo", flat=True)),
+            ["PUSH_NUEVO_TICKET", "WHATSAPP_ASIGNADO"],
+        )
+
+    def test_procesar_lote_entrega_y_marca_enviado(self):
+        """El worker entrega los envíos y los marca ENVIADO"""
+        from unittest import mock
+        from apps.tickets import envios
+        from apps.tickets.models import EnvioPendiente
+
+        envios.encolar_nuevo_ticket(self.ticket)
+        with mock.patch.dict(envios.ENTREGAS, {"PUSH_NUEVO_TICKET": mock.Mock()}) as entregas:
+            ok, error = envios.procesar_lote()
+            entregas["PUSH_NUEVO_TICKET"].assert_called_once()
+
+        self.assertEqual((ok, error), (1, 0))
+        envio = EnvioPendiente.objects.get()
+        self.assertEqual(envio.estado, "ENVIADO")
+        self.assertIsNotNone(envio.fecha_envio)
+
+    def test_fallo_reprograma_con_backoff(self):
+        """Un fallo incrementa intentos y reprograma con backoff exponencial"""
+        from unittest import mock
+        from apps.tickets import envios
+        from apps.tickets.models import EnvioPendiente
+
+        envios.encolar_nuevo_ticket(self.ticket)
+        ahora = timezone.now()
+        falla = mock.Mock(side_effect=envios.EnvioFallido("FCM caído"))
+
+        with mock.patch.dict(envios.ENTREGAS, {"PUSH_NUEVO_TICKET": falla}):
+            self.assertEqual(envios.procesar_lote(ahora=ahora), (0, 1))
+            envio = EnvioPendiente.objects.get()
+            self.assertEqual(envio.estado, "PENDIENTE")
+            self.assertEqual(envio.intentos, 1)
+            self.assertEqual(envio.proximo_intento, ahora + timedelta(seconds=envios.BACKOFF_BASE_SEGUNDOS))
+
+            # Antes del próximo intento no se vuelve a tomar
+            self.assertEqual(envios.procesar_lote(ahora=ahora + timedelta(seconds=1)), (0, 0))
+
+            ahora2 = envio.proximo_intento
+            envios.procesar_lote(ahora=ahora2)
+            envio.refresh_from_db()
+            self.assertEqual(envio.intentos, 2)
+            self.assertEqual(envio.proximo_intento, ahora2 + timedelta(seconds=2 * envios.BACKOFF_BASE_SEGUNDOS))
+
+    def test_agota_intentos_queda_en_error(self):
+        """Tras MAX_INTENTOS el envío queda en ERROR"""
+        from unittest import mock
+        from apps.tickets import envios
+        from apps.tickets.models import EnvioPendiente
+
+        envios.encolar_nuevo_ticket(self.ticket)
+        EnvioPendiente.objects.update(intentos=envios.MAX_INTENTOS - 1)
+        falla = mock.Mock(side_effect=RuntimeError("boom"))
+
+        with mock.patch.dict(envios.ENTREGAS, {"PUSH_NUEVO_TICKET": falla}):
+            envios.procesar_lote()
+
+        self.assertEqual(EnvioPendiente.objects.get().estado, "ERROR")
+
+    def test_error_del_cliente_fcm_se_reintenta(self):
+        """Una excepción del cliente FCM no se traga: el envío sigue PENDIENTE"""
+        from unittest import mock
+        from apps.tickets import envios, fcm
+        from apps.tickets.models import EnvioPendiente
+        from apps.usuarios.models import DispositivoNotificacion
+
+        DispositivoNotificacion.objects.create(usuario=self.tecnico, fcm_token="tok-outbox")
+        envios.encolar_nuevo_ticket(self.ticket)
+        cliente = mock.Mock()
+        cliente.enviar_multicast.side_effect = RuntimeError("sin credenciales")
+
+        with mock.patch.object(fcm, "get_cliente_fcm", return_value=cliente):
+            self.assertEqual(envios.procesar_lote(), (0, 1))
+
+        envio = EnvioPendiente.objects.get()
+        self.assertEqual(envio.estado, "PENDIENTE")
+        self.assertEqual(envio.intentos, 1)
+
+    def test_envio_sin_resultado_se_reintenta(self):
+        """None/False del envío es un fallo reintentable, no una entrega"""
+        from unittest import mock
+        from apps.tickets import envios
+        from apps.tickets.models import EnvioPendiente
+
+        EnvioPendiente.objects.create(tipo="PUSH_SLA_VENCIDO", ticket=self.ticket)
+        envios.encolar_nuevo_ticket(self.ticket)
+
+        with mock.patch.object(envios, "enviar_notificacion_nuevo_ticket", return_value=None), \
+                mock.patch.object(envios, "enviar_notificacion_sla_vencido", return_value=False):
+            self.assertEqual(envios.procesar_lote(), (0, 2))
+
+        self.assertEqual(
+            sorted(EnvioPendiente.objects.values_list("estado", "intentos")),
+            [("PENDIENTE", 1), ("PENDIENTE", 1)],
+        )
+
+    def test_sin_dispositivos_cuenta_como_entregado(self):
+        """Sin dispositivos activos no hay nada que reintentar"""
+        from apps.tickets import envios
+        from apps.tickets.models import EnvioPendiente
+
+        envios.encolar_nuevo_ticket(self.ticket)
+
+        self.assertEqual(envios.procesar_lote(), (1, 0))
+        self.assertEqual(EnvioPendiente.objects.get().estado, "ENVIADO")
+
+    def test_reserva_impide_doble_proceso(self):
+        """Un lote reservado no lo puede reclamar otro worker hasta que expire"""
+        from apps.tickets import envios
+
+        envios.encolar_nuevo_ticket(self.ticket)
+        ahora = timezone.now()
+
+        self.assertEqual(len(envios.reclamar_lote(ahora=ahora)), 1)
+        self.assertEqual(envios.reclamar_lote(ahora=ahora), [])
+
+        # Worker caído: al expirar la reserva otro worker lo recupera
+        expira = ahora + timedelta(seconds=envios.RESERVA_SEGUNDOS)
+        self.assertEqual(len(envios.reclamar_lote(ahora=expira)), 1)
+
+    def test_comando_procesar_envios_once(self):
+        """procesar_envios --once vacía la cola y termina"""
+        from io import StringIO
+        from unittest import mock
+        from django.core.management import call_command
+        from apps.tickets import envios
+        from apps.tickets.models import EnvioPendiente
+
+        envios.encolar_nuevo_ticket(self.ticket)
+        out = StringIO()
+        with mock.patch.dict(envios.ENTREGAS, {"PUSH_NUEVO_TICKET": mock.Mock()}):
+            call_command("procesar_envios", "--once", stdout=out)
+
+        self.assertEqual(EnvioPendiente.objects.get().estado, "ENVIADO")
+        self.assertIn("Envíos completados: 1", out.getvalue())
+
+
+class SaludTokensFCMTest(TestCase):
+    """Tests para la poda automática de tokens FCM muertos"""
+
+    def setUp(self):
+        from apps.usuarios.models import DispositivoNotificacion
+
+        self.stub = _StubFCMServer()
+        self.addCleanup(self.stub.cerrar)
+        self.usuario = User.objects.create_user(username="movil", password="x")
+        for token in ["ok-1", "dead-1", "bad-1", "busy-1"]:
+            DispositivoNotificacion.objects.create(usuario=self.usuario, fcm_token=token)
+
+    def _enviar(self, tokens):
+        from apps.tickets.fcm import ClienteFCM
+        cliente = ClienteFCM(url=self.stub.url, proveedor=_ProveedorFijo(), max_workers=4)
+        return cliente.enviar_multicast(tokens, {"data": {}})
+
+    def test_parsear_error_fcm(self):
+        """Se interpretan los payloads de error v1"""
+        import json
+        from apps.tickets.fcm import parsear_error_fcm
+
+        self.assertEqual(parsear_error_fcm(None, ""), ("RED", False))
+        self.assertEqual(parsear_error_fcm(500, "<html>"), ("HTTP_500", False))
+        self.assertEqual(
+            parsear_error_fcm(404, json.dumps({"error": {"status": "NOT_FOUND"}})),
+            ("UNREGISTERED", True),
+        )
+        # INVALID_ARGUMENT que no es del token (payload mal formado) no mata el token
+        payload = json.dumps({"error": {"status": "INVALID_ARGUMENT", "message": "Invalid JSON payload"}})
+        self.assertEqual(parsear_error_fcm(400, payload), ("INVALID_ARGUMENT", False))
+
+    def test_desactiva_tokens_muertos_y_cuenta_fallos(self):
+        """Tokens UNREGISTERED/INVALID_ARGUMENT se desactivan; los transitorios suman fallos"""
+        from apps.usuarios.models import DispositivoNotificacion
+
+        resultado = self._enviar(["ok-1", "dead-1", "bad-1", "busy-1"])
+
+        self.assertEqual(sorted(resultado.tokens_invalidos), ["bad-1", "dead-1"])
+        disp = {d.fcm_token: d for d in DispositivoNotificacion.objects.all()}
+        self.assertFalse(disp["dead-1"].activo)
+        self.assertEqual(disp["dead-1"].ultimo_error, "UNREGISTERED")
+        self.assertTrue(disp["dead-1"].token_muerto)
+        self.assertFalse(disp["bad-1"].activo)
+        self.assertEqual(disp["bad-1"].ultimo_error, "INVALID_ARGUMENT")
+        self.assertTrue(disp["busy-1"].activo)
+        self.assertEqual(disp["busy-1"].fallos_consecutivos, 1)
+        self.assertEqual(disp["busy-1"].ultimo_error, "UNAVAILABLE")
+        self.assertTrue(disp["ok-1"].activo)
+        self.assertEqual(disp["ok-1"].fallos_consecutivos, 0)
+
+    def test_envio_correcto_reinicia_contador(self):
+        """Un envío correcto pone a cero los fallos consecutivos"""
+        from apps.usuarios.models import DispositivoNotificacion
+
+        DispositivoNotificacion.objects.filter(fcm_token="ok-1").update(fallos_consecutivos=4)
+        self._enviar(["ok-1"])
+
+        self.assertEqual(DispositivoNotificacion.objects.get(fcm_token="ok-1").fallos_consecutivos, 0)
+
+    def test_salud_en_bloque_pocas_consultas(self):
+        """La actualización de salud no depende del número de tokens"""
+        from apps.usuarios.models import DispositivoNotificacion
+
+        for i in range(20):
+            DispositivoNotificacion.objects.create(usuario=self.usuario, fcm_token=f"dead-x{i}")
+
+        # 1 UPDATE de tokens muertos por código de error (solo UNREGISTERED aquí)
+        with self.assertNumQueries(1):
+            self._enviar([f"dead-x{i}" for i in range(20)])
+
+        self.assertEqual(DispositivoNotificacion.objects.filter(activo=False).count(), 20)
+
+    def test_comando_salud_tokens(self):
+        """salud_tokens_fcm informa y purga tokens muertos"""
+        from io import StringIO
+        from django.core.management import call_command
+        from apps.usuarios.models import DispositivoNotificacion
+
+        self._enviar(["ok-1", "dead-1", "bad-1", "busy-1"])
+        out = StringIO()
+        call_command("salud_tokens_fcm", "--min-fallos", "1", "--purgar", stdout=out)
+
+        salida = out.getvalue()
+        self.assertIn("Muertos (desactivados):   2", salida)
+        self.assertIn("UNAVAILABLE", salida)
+        self.assertIn("eliminados: 2", salida)
+        self.assertFalse(DispositivoNotificacion.objects.filter(fcm_token__in=["dead-1", "bad-1"]).exists())
+
+
+class SecuenciaTicketTest(TestCase):
+    """Tests para la numeración atómica de tickets"""
+
+    def setUp(self):
+        self.usuario = User.objects.create_user(username="numerador", password="x", rol="ADMIN")
+        self.local = Local.objects.create(codigo="SEQ01", nombre="Local Secuencia")
+        self.categoria = CategoriaAveria.objects.create(nombre="Red", tiempo_sla_horas=4)
+
+    def _crear(self):
+        return Ticket.objects.create(
+            local=self.local,
+            categoria=self.categoria,
+            titulo="Seq",
+            descripcion="Seq",
+            creado_por=self.usuario,
+        )
+
+    def test_numeros_consecutivos(self):
+        """Los números son consecutivos y con el formato TKT-000000"""
+        from apps.tickets.models import SecuenciaTicket
+
+        inicial = SecuenciaTicket.objects.get(pk="ticket").valor
+        t1, t2 = self._crear(), self._crear()
+        self.assertEqual(t1.numero_ticket, f"TKT-{inicial + 1:06d}")
+        self.assertEqual(t2.numero_ticket, f"TKT-{inicial + 2:06d}")
+
+    def test_coste_constante(self):
+        """Reservar un número no depende del tamaño de la tabla de tickets"""
+        from apps.tickets.models import SecuenciaTicket
+
+        for _ in range(5):
+            self._crear()
+        # SAVEPOINT + UPDATE + SELECT + RELEASE
+        with self.assertNumQueries(4):
+            SecuenciaTicket.siguiente()
+
+    def test_arranca_desde_tickets_existentes(self):
+        """Si la secuencia no existe se inicializa con el último número usado"""
+        from apps.tickets.models import SecuenciaTicket
+
+        ticket = self._crear()
+        Ticket.objects.filter(pk=ticket.pk).update(numero_ticket="TKT-000500")
+        SecuenciaTicket.objects.all().delete()
+
+        self.assertEqual(self._crear().numero_ticket, "TKT-000501")
+
+
+class SecuenciaTicketConcurrenciaTest(TransactionTestCase):
+    """Stress test: inserciones concurrentes desde varios hilos"""
+
+    HILOS = 8
+    POR_HILO = 15
+
+    def test_inserciones_concurrentes_sin_duplicados(self):
+        """Varios hilos creando tickets a la vez obtienen números únicos"""
+        import threading
+        from django.db import connection
+
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            # La base en memoria compartida bloquea tablas entre conexiones
+            self.skipTest("Necesita una base en archivo (TEST_DB_NAME) o PostgreSQL")
+
+        usuario = User.objects.create_user(username="stress", password="x", rol="ADMIN")
+        local = Local.objects.create(codigo="STRESS", nombre="Stress")
+        categoria = CategoriaAveria.objects.create(nombre="Stress", tiempo_sla_horas=4)
+
+        barrera = threading.Barrier(self.HILOS)
+        errores = []
+
+        def trabajador():
+            try:
+                barrera.wait()
+                for _ in range(self.POR_HILO):
+                    Ticket.objects.create(
+                        local=local,
+                        categoria=categoria,
+                        titulo="Stress",
+                        descripcion="Stress",
+                        creado_por=usuario,
+                    )
+            except Exception as e:  # pragma: no cover - se reporta abajo
+                errores.append(e)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=trabajador) for _ in range(self.HILOS)]
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+
+        self.assertEqual(errores, [])
+        numeros = list(Ticket.objects.values_list("numero_ticket", flat=True))
+        self.assertEqual(len(numeros), self.HILOS * self.POR_HILO)
+        self.assertEqual(len(set(numeros)), len(numeros))
+
+
+class ConsultasCriticasIndicesTest(TestCase):
+    """EXPLAIN de las consultas calientes: ninguna debe recorrer la tabla entera."""
+
+    def setUp(self):
+        self.categoria = CategoriaAveria.objects.create(nombre="Red", tiempo_sla_horas=4)
+        self.tecnico = User.objects.create_user(
+            username="tecnico_idx", email="idx@test.com", password="x", rol="TECNICO"
+        )
+        self.tecnico.especialidades.add(self.categoria)
+        self.admin = User.objects.create_user(username="admin_idx", password="x", rol="ADMIN")
+
+    def _escaneos_completos(self, plan):
+        # "SCAN tabla" sin "USING INDEX" = full table scan. Las subconsultas
+        # de la M2M de especialidades son tablas pequeñas y no cuentan.
+        return [
+            linea for linea in plan.splitlines()
+            if " SCAN " in f" {linea} " and "USING" not in linea
+        ]
+
+    def test_consultas_criticas_usan_indice(self):
+        from django.db import connection
+        from apps.tickets.consultas import CONSULTAS_CRITICAS
+
+        if connection.vendor != "sqlite":
+            self.skipTest("El análisis del plan está escrito para SQLite")
+
+        ahora = timezone.now()
+        for nombre, consulta in CONSULTAS_CRITICAS.items():
+            for usuario in (self.admin, self.tecnico):
+                with self.subTest(consulta=nombre, rol=usuario.rol):
+                    plan = consulta(usuario, ahora).explain()
+                    self.assertEqual(self._escaneos_completos(plan), [], f"{nombre} ({usuario.rol}):\n{plan}")
+
+    def test_registro_usa_los_filtros_de_la_vista(self):
+        """Las entradas salen de las funciones de las vistas: un cambio allí se ve aquí"""
+        from apps.tickets.consultas import CONSULTAS_CRITICAS
+        from apps.tickets.filtros import filtrar_por_ver
+
+        ahora = timezone.now()
+        lista = str(CONSULTAS_CRITICAS["lista_tickets"](self.admin, ahora).query)
+        self.assertEqual(
+            lista.split(" WHERE ")[1].split(" ORDER BY ")[0],
+            str(filtrar_por_ver(Ticket.objects.order_by(), "abiertos").query).split(" WHERE ")[1],
+        )
+
+    def test_detecta_escaneo_completo(self):
+        # Control: una consulta sin índice debe marcarse como escaneo completo
+        plan = Ticket.objects.filter(descripcion__icontains="x").order_by().explain()
+        self.assertTrue(self._escaneos_completos(plan))
+
+
+class ContadoresAbiertosTest(TestCase):
+    """Contadores del dashboard / badge: un solo COUNT, cacheado e invalidado por señales."""
+
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        self.admin = User.objects.create_user(username="cont_admin", password="x", rol="ADMIN")
+        self.tecnico = User.objects.create_user(username="cont_tec", password="x", rol="TECNICO")
+        self.local = Local.objects.create(codigo="CNT01", nombre="Local contadores")
+        self.categoria = CategoriaAveria.objects.create(nombre="Contadores", tiempo_sla_horas=4)
+        self.otra = CategoriaAveria.objects.create(nombre="Contadores 2", tiempo_sla_horas=4)
+        self.tecnico.especialidades.add(self.categoria)
+
+        ahora = timezone.now()
+        self.vencido = self._crear(self.categoria)
+        Ticket.objects.filter(pk=self.vencido.pk).update(fecha_limite_sla=ahora - timedelta(hours=1))
+        self.por_vencer = self._crear(self.otra)
+        Ticket.objects.filter(pk=self.por_vencer.pk).update(fecha_limite_sla=ahora + timedelta(hours=1))
+        self._crear(self.otra)
+        cerrado = self._crear(self.categoria)
+        Ticket.objects.filter(pk=cerrado.pk).update(estado="CERRADO")
+
+    def _crear(self, categoria):
+        return Ticket.objects.create(
+            local=self.local, categoria=categoria, titulo="T", descripcion="D", creado_por=self.admin
+        )
+
+    def test_un_solo_count_y_valores(self):
+        from apps.tickets.contadores import contadores_abiertos
+
+        with self.assertNumQueries(1):
+            datos = contadores_abiertos()
+        self.assertEqual(datos, {"total_abiertos": 3, "vencidos": 1, "por_vencer_2h": 1})
+
+        # Técnico: solo lo sin asignar de su especialidad
+        self.assertEqual(contadores_abiertos(User.objects.get(pk=self.tecnico.pk))["total_abiertos"], 1)
+
+    def test_cacheado_hasta_que_cambia_un_ticket(self):
+        from apps.tickets.contadores import contadores_abiertos
+
+        contadores_abiertos()
+        with self.assertNumQueries(0):
+            contadores_abiertos()
+
+        self._crear(self.categoria)
+        self.assertEqual(contadores_abiertos()["total_abiertos"], 4)
+
+    def test_update_invalida_solo_si_afecta(self):
+        from apps.tickets.contadores import contadores_abiertos
+
+        contadores_abiertos()
+        Ticket.objects.filter(pk=self.vencido.pk).update(notificacion_sla_enviada=True)
+        with self.assertNumQueries(0):
+            contadores_abiertos()
+
+        Ticket.objects.filter(pk=self.vencido.pk).update(estado="RESUELTO")
+        datos = contadores_abiertos()
+        self.assertEqual((datos["total_abiertos"], datos["vencidos"]), (2, 0))
+
+    def test_cambio_de_especialidades_invalida(self):
+        from apps.tickets.contadores import contadores_abiertos
+
+        self.assertEqual(contadores_abiertos(User.objects.get(pk=self.tecnico.pk))["total_abiertos"], 1)
+        self.tecnico.especialidades.add(self.otra)
+        self.assertEqual(contadores_abiertos(User.objects.get(pk=self.tecnico.pk))["total_abiertos"], 3)
+
+    def test_en_espera_cuenta_como_abierto_pero_no_vence(self):
+        """EN_ESPERA es abierto (contadores, badge, ?ver=abiertos) y con el SLA en pausa no vence"""
+        from apps.tickets.contadores import contadores_abiertos
+        from apps.tickets.filtros import filtrar_por_ver
+        from apps.tickets.notificaciones import tickets_sla_pendientes
+
+        self.vencido.estado = "EN_ESPERA"
+        self.vencido.save()
+        self.assertTrue(Ticket.objects.get(pk=self.vencido.pk).sla_en_pausa())
+
+        datos = contadores_abiertos()
+        self.assertEqual((datos["total_abiertos"], datos["vencidos"]), (3, 0))
+        self.assertEqual(filtrar_por_ver(Ticket.objects.all(), "abiertos").count(), datos["total_abiertos"])
+        self.assertEqual(self.local.tickets_abiertos(), 3)
+        self.assertFalse(tickets_sla_pendientes().filter(pk=self.vencido.pk).exists())
+
+    def test_abiertos_y_terminados_cubren_todos_los_estados(self):
+        from apps.tickets.filtros import ESTADOS_TERMINADOS
+
+        self.assertEqual(
+            sorted(Ticket.ESTADOS_ABIERTOS + ESTADOS_TERMINADOS),
+            sorted(codigo for codigo, _ in Ticket.ESTADOS),
+        )
+        self.assertTrue(set(Ticket.ESTADOS_SLA_ACTIVO) < set(Ticket.ESTADOS_ABIERTOS))
+
+
+class AvisosLongPollTest(TransactionTestCase):
+    """El long-poll despierta en cuanto se confirma una notificación nueva."""
+
+    def setUp(self):
+        self.usuario = User.objects.create_user(username="lp_user", password="x", rol="ADMIN")
+        local = Local.objects.create(codigo="LP01", nombre="Long-poll")
+        categoria = CategoriaAveria.objects.create(nombre="Long-poll", tiempo_sla_horas=4)
+        self.ticket = Ticket.objects.create(
+            local=local, categoria=categoria, titulo="LP", descripcion="LP", creado_por=self.usuario
+        )
+
+    def _crear_notificacion(self):
+        from apps.tickets.models import Notificacion
+
+        return Notificacion.objects.create(usuario=self.usuario, ticket=self.ticket, mensaje="Hola")
+
+    def test_despierta_al_crear_notificacion_en_otro_hilo(self):
+        import threading
+        import time
+        from django.db import connection
+        from apps.tickets.avisos import esperar_notificacion
+
+        def crear():
+            try:
+                self._crear_notificacion()
+            finally:
+                connection.close()
+
+        temporizador = threading.Timer(0.3, crear)
+        inicio = time.monotonic()
+        temporizador.start()
+        # Intervalo de consulta a la BD muy largo: solo el aviso en proceso puede despertarlo a tiempo
+        nuevo = esperar_notificacion(self.usuario.pk, 0, timeout=10, cada=10)
+        temporizador.join()
+
+        self.assertIsNotNone(nuevo)
+        self.assertLess(time.monotonic() - inicio, 5)
+
+    def test_encuentra_en_bd_lo_anterior_a_la_espera(self):
+        from unittest import mock
+        from apps.tickets.avisos import esperar_notificacion
+
+        # Sin ningún aviso: la consulta inicial la encuentra
+        with mock.patch("apps.tickets.signals.avisar"):
+            notif = self._crear_notificacion()
+        self.assertEqual(esperar_notificacion(self.usuario.pk, 0, timeout=1, cada=0.1), notif.pk)
+
+    def test_detecta_notificaciones_de_otro_proceso_por_cache(self):
+        import threading
+        from unittest import mock
+        from django.core.cache import cache
+        from django.db import connection
+        from apps.tickets.avisos import clave_cache, esperar_notificacion
+
+        def otro_proceso():
+            # Crea la notificación sin aviso en este proceso y publica el id como
+            # lo haría avisar() en otro worker (misma caché)
+            try:
+                with mock.patch("apps.tickets.signals.avisar"):
+                    notif = self._crear_notificacion()
+                cache.set(clave_cache(self.usuario.pk), notif.pk)
+            finally:
+                connection.close()
+
+        cache.delete(clave_cache(self.usuario.pk))
+        temporizador = threading.Timer(0.3, otro_proceso)
+        temporizador.start()
+        nuevo = esperar_notificacion(self.usuario.pk, 0, timeout=5, cada=0.1)
+        temporizador.join()
+        self.assertIsNotNone(nuevo)
+
+    def test_timeout_sin_novedades_sin_consultar_la_bd(self):
+        from apps.tickets.avisos import esperar_notificacion
+
+        notif = self._crear_notificacion()
+        # Una sola consulta al empezar; durante la espera solo se mira la caché
+        with self.assertNumQueries(1):
+            self.assertIsNone(esperar_notificacion(self.usuario.pk, notif.pk, timeout=0.5, cada=0.1))
+
+
+class NotificacionesFanoutTest(TestCase):
+    """Fan-out de notificaciones: coste constante en consultas sea cual sea el nº de destinatarios."""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Sin contraseña: 9 hashes por test harían el test lento sin aportar nada
+        cls.autor = User.objects.create(username="autor", rol="ADMIN")
+        cls.local = Local.objects.create(codigo="FAN01", nombre="Local Fanout")
+        cls.categoria = CategoriaAveria.objects.create(nombre="Fanout", tiempo_sla_horas=4)
+        cls.ticket = cls._ticket()
+        cls.usuarios = [User.objects.create(username=f"dest{i}", rol="TECNICO") for i in range(8)]
+
+    @classmethod
+    def _ticket(cls):
+        return Ticket.objects.create(
+            local=cls.local, categoria=cls.categoria, titulo="F", descripcion="F", creado_por=cls.autor
+        )
+
+    def _comentario(self, usuarios):
+        texto = "Revisad esto " + " ".join(f"@{u.username}" for u in usuarios) + " @autor @noexiste"
+        return ComentarioTicket.objects.create(ticket=self.ticket, usuario=self.autor, comentario=texto)
+
+    def _inserts(self, usuarios):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from apps.tickets.notificaciones import notificar_menciones
+
+        comentario = self._comentario(usuarios)
+        with CaptureQueriesContext(connection) as ctx:
+            notificar_menciones(comentario, self.autor, self.ticket)
+        return len(ctx), [q["sql"] for q in ctx.captured_queries if q["sql"].startswith("INSERT")]
+
+    def test_menciones_consultas_constantes(self):
+        pocas, inserts_pocas = self._inserts(self.usuarios[:2])
+        muchas, inserts_muchas = self._inserts(self.usuarios)
+
+        self.assertEqual(pocas, muchas)
+        # Un INSERT de notificaciones + uno en la bandeja de salida
+        self.assertEqual(len(inserts_muchas), 2)
+
+    def test_menciones_un_solo_envio_push(self):
+        from unittest import mock
+        from apps.tickets import envios
+        from apps.tickets.models import EnvioPendiente, Notificacion
+        from apps.tickets.notificaciones import notificar_menciones
+
+        notificados = notificar_menciones(self._comentario(self.usuarios[:3]), self.autor, self.ticket)
+
+        self.assertEqual({u.pk for u in notificados}, {u.pk for u in self.usuarios[:3]})
+        self.assertEqual(Notificacion.objects.filter(tipo="MENCION").count(), 3)
+        envio = EnvioPendiente.objects.get()
+        self.assertEqual(sorted(envio.datos["usuarios"]), sorted(u.pk for u in self.usuarios[:3]))
+
+        with mock.patch.object(envios, "enviar_notificacion_mencion") as enviar:
+            envios.procesar_lote()
+        enviar.assert_called_once()
+        self.assertEqual(sorted(enviar.call_args.args[2]), sorted(u.pk for u in self.usuarios[:3]))
+
+    def test_avisa_long_poll_al_confirmar(self):
+        from unittest import mock
+        from apps.tickets.notificaciones import notificar_menciones
+
+        with mock.patch("apps.tickets.notificaciones.avisar") as avisar:
+            with self.captureOnCommitCallbacks(execute=True):
+                notificar_menciones(self._comentario(self.usuarios[:2]), self.autor, self.ticket)
+        self.assertEqual({c.args[0] for c in avisar.call_args_list}, {u.pk for u in self.usuarios[:2]})
+
+    def test_sla_vencido_un_insert(self):
+        from apps.tickets.models import Notificacion
+        from apps.tickets.notificaciones import notificar_sla_vencido
+
+        tickets = [self.ticket, self._ticket(), self._ticket()]
+        with self.assertNumQueries(3):  # SAVEPOINT + INSERT + RELEASE
+            notificar_sla_vencido(tickets, self.usuarios[:4])
+        self.assertEqual(Notificacion.objects.filter(tipo="SLA_VENCIDO").count(), 12)
+
+
+class NotificarSlaVencidoCommandTest(TestCase):
+    """Comando notificar_sla_vencido por lotes: reclamo, INSERT en bloque y push resumen encolado."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admins = [User.objects.create(username=f"jefe{i}", rol="ADMIN", is_staff=True) for i in range(2)]
+        local = Local.objects.create(codigo="SLAC1", nombre="Local SLA")
+        categoria = CategoriaAveria.objects.create(nombre="SLA cmd", tiempo_sla_horas=4)
+        ahora = timezone.now()
+
+        def crear(estado="PENDIENTE", vencido=True):
+            ticket = Ticket.objects.create(
+                local=local, categoria=categoria, titulo="S", descripcion="S", creado_por=cls.admins[0]
+            )
+            Ticket.objects.filter(pk=ticket.pk).update(
+                estado=estado,
+                fecha_limite_sla=ahora + timedelta(hours=-1 if vencido else 1),
+            )
+            return ticket
+
+        cls.vencidos = [crear() for _ in range(5)]
+        cls.en_plazo = crear(vencido=False)
+        cls.cerrado = crear(estado="CERRADO")
+
+    def _ejecutar(self, *args):
+        from io import StringIO
+        from django.core.management import call_command
+
+        out = StringIO()
+        call_command("notificar_sla_vencido", *args, stdout=out)
+        return out.getvalue()
+
+    def _resumenes(self):
+        from apps.tickets.models import EnvioPendiente
+
+        return [set(e.datos["tickets"]) for e in EnvioPendiente.objects.filter(tipo="PUSH_SLA_RESUMEN").order_by("id")]
+
+    def test_notifica_por_lotes_con_un_push(self):
+        from apps.tickets.models import Notificacion
+
+        salida = self._ejecutar("--lote", "2")
+
+        self.assertEqual(self._resumenes(), [{t.pk for t in self.vencidos}])
+        self.assertEqual(Notificacion.objects.filter(tipo="SLA_VENCIDO").count(), 10)
+        self.assertEqual(
+            set(Ticket.objects.filter(notificacion_sla_enviada=True).values_list("pk", flat=True)),
+            {t.pk for t in self.vencidos},
+        )
+        self.assertIn("Lotes: 3", salida)
+        self.assertIn("tickets/s", salida)
+
+    def test_segunda_ejecucion_no_reenvia(self):
+        self._ejecutar()
+        salida = self._ejecutar()
+        self.assertEqual(len(self._resumenes()), 1)
+        self.assertIn("No hay tickets vencidos", salida)
+
+    def test_no_toca_tickets_reclamados_por_otro(self):
+        otro = self.vencidos[0]
+        Ticket.objects.filter(pk=otro.pk).update(notificacion_sla_enviada=True, lote_sla="otro-runner")
+
+        self._ejecutar()
+
+        self.assertNotIn(otro.pk, self._resumenes()[0])
+        otro.refresh_from_db()
+        self.assertEqual(otro.lote_sla, "otro-runner")
+
+    def test_resumen_ya_reclamado_no_se_amplia(self):
+        from apps.tickets.envios import encolar_resumen_sla
+        from apps.tickets.models import EnvioPendiente
+
+        primero = encolar_resumen_sla(self.vencidos[:2])
+        self.assertIs(encolar_resumen_sla(self.vencidos[2:3], primero), primero)
+        EnvioPendiente.objects.filter(pk=primero.pk).update(estado="PROCESANDO")
+
+        segundo = encolar_resumen_sla(self.vencidos[3:], primero)
+
+        self.assertNotEqual(segundo.pk, primero.pk)
+        self.assertEqual(
+            self._resumenes(), [{t.pk for t in self.vencidos[:3]}, {t.pk for t in self.vencidos[3:]}]
+        )
+
+    def test_fallo_del_push_se_reintenta(self):
+        from unittest import mock
+
+        from apps.tickets import envios
+        from apps.tickets.fcm import ResultadoEnvio
+        from apps.tickets.models import EnvioPendiente
+
+        self._ejecutar()
+        with mock.patch.object(envios, "enviar_resumen_sla_vencido", side_effect=RuntimeError("FCM caído")):
+            self.assertEqual(envios.procesar_lote(), (0, 1))
+        envio = EnvioPendiente.objects.get(tipo="PUSH_SLA_RESUMEN")
+        self.assertEqual((envio.estado, envio.intentos), ("PENDIENTE", 1))
+        self.assertIn("FCM caído", envio.ultimo_error)
+
+        with mock.patch.object(envios, "enviar_resumen_sla_vencido", return_value=ResultadoEnvio()) as resumen:
+            self.assertEqual(envios.procesar_lote(ahora=envio.proximo_intento), (1, 0))
+        self.assertEqual({t.pk for t in resumen.call_args.args[0]}, {t.pk for t in self.vencidos})
+        self.assertTrue(resumen.call_args.kwargs["estricto"])
+
+    def test_dry_run_no_modifica(self):
+        salida = self._ejecutar("--dry-run")
+        self.assertEqual(self._resumenes(), [])
+        self.assertIn("Tickets a notificar: 5", salida)
+        self.assertFalse(Ticket.objects.filter(notificacion_sla_enviada=True).exists())
+
+
+class AgendaSlaTest(TestCase):
+    """Agenda del sla_daemon: min-heap de vencimientos con refresco incremental."""
+
+    def setUp(self):
+        from apps.tickets.agenda_sla import AgendaSla
+
+        self.ahora = timezone.now()
+        self.admin = User.objects.create(username="jefe_sla", rol="ADMIN", is_staff=True)
+        self.local = Local.objects.create(codigo="AGD1", nombre="Local agenda")
+        self.categoria = CategoriaAveria.objects.create(nombre="Agenda", tiempo_sla_horas=4)
+        self.t1 = self._crear(minutos=10)
+        self.t2 = self._crear(minutos=30)
+        self.t3 = self._crear(minutos=90)
+        self._crear(minutos=5, estado="CERRADO")
+        notificado = self._crear(minutos=1)
+        Ticket.objects.filter(pk=notificado.pk).update(notificacion_sla_enviada=True)
+        self.agenda = AgendaSla(intervalo=3600, log=lambda *a: None)
+
+    def _crear(self, minutos, estado="PENDIENTE"):
+        ticket = Ticket.objects.create(
+            local=self.local, categoria=self.categoria, titulo="A", descripcion="A", creado_por=self.admin
+        )
+        Ticket.objects.filter(pk=ticket.pk).update(
+            estado=estado, fecha_limite_sla=self.ahora + timedelta(minutes=minutos)
+        )
+        ticket.refresh_from_db()
+        return ticket
+
+    def test_carga_solo_abiertos_sin_notificar(self):
+        self.agenda.cargar(self.ahora)
+        self.assertEqual(len(self.agenda), 3)
+        self.assertEqual(self.agenda.proximo_vencimiento(), self.t1.fecha_limite_sla)
+
+    def test_duerme_hasta_el_proximo_vencimiento(self):
+        self.agenda.cargar(self.ahora)
+        self.assertAlmostEqual(self.agenda.segundos_hasta_despertar(self.ahora), 600, delta=1)
+        self.agenda.intervalo = 60
+        self.assertEqual(self.agenda.segundos_hasta_despertar(self.ahora), 60)
+
+    def test_refresco_incremental(self):
+        self.agenda.cargar(self.ahora)
+
+        self.t1.estado = "RESUELTO"
+        self.t1.save()
+        self.t3.fecha_limite_sla = self.ahora + timedelta(minutes=2)
+        self.t3.save()
+        nuevo = self._crear(minutos=1)
+        Ticket.objects.filter(pk=nuevo.pk).update(fecha_actualizacion=timezone.now())
+
+        self.agenda.refrescar()
+
+        self.assertEqual(len(self.agenda), 3)
+        self.assertEqual(self.agenda.proximo_vencimiento(), nuevo.fecha_limite_sla)
+        vencidos = self.agenda.extraer_vencidos(self.ahora + timedelta(minutes=5))
+        self.assertEqual(vencidos, [nuevo.pk, self.t3.pk])
+        self.assertEqual(self.agenda.proximo_vencimiento(), self.t2.fecha_limite_sla)
+
+    def test_ciclo_notifica_solo_al_vencer(self):
+        from unittest import mock
+
+        self.agenda.cargar(self.ahora)
+        with mock.patch("apps.tickets.agenda_sla.notificar_sla_pendientes") as notificar:
+            notificar.return_value = {"tickets": [], "notificaciones": 0, "push": None}
+            self.assertIsNone(self.agenda.ciclo(self.ahora))
+            notificar.assert_not_called()
+
+            self.agenda.ciclo(self.ahora + timedelta(minutes=15))
+            notificar.assert_called_once_with(500)
+        self.assertEqual(len(self.agenda), 2)
+
+    def test_detener_termina_el_bucle(self):
+        from unittest import mock
+
+        ciclos = []
+
+        def ciclo():
+            ciclos.append(1)
+            self.agenda.detener()
+
+        with mock.patch("apps.tickets.agenda_sla.close_old_connections"), \
+                mock.patch.object(self.agenda, "ciclo", side_effect=ciclo):
+            self.agenda.ejecutar()
+        self.assertEqual(len(ciclos), 1)
+
+
+class EscalamientoSlaTest(TestCase):
+    """Avisos previos al vencimiento: programación por nivel y envío por rango de fecha."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username="jefe_aviso", rol="ADMIN", is_staff=True)
+        cls.tecnico = User.objects.create(username="tec_aviso", rol="TECNICO")
+        cls.local = Local.objects.create(codigo="AVS1", nombre="Local avisos")
+        cls.categoria = CategoriaAveria.objects.create(nombre="Avisos", tiempo_sla_horas=10)
+
+    def _crear(self, categoria=None, **kwargs):
+        return Ticket.objects.create(
+            local=self.local, categoria=categoria or self.categoria, titulo="A", descripcion="A",
+            creado_por=self.admin, **kwargs
+        )
+
+    def _porcentajes(self, ticket, **filtros):
+        from apps.tickets.models import AvisoSla
+
+        return list(
+            AvisoSla.objects.filter(ticket=ticket, **filtros).order_by("porcentaje").values_list("porcentaje", flat=True)
+        )
+
+    def test_programa_niveles_por_defecto(self):
+        from apps.tickets.models import AvisoSla
+
+        ticket = self._crear()
+        avisos = {a.porcentaje: a.fecha_programada for a in AvisoSla.objects.filter(ticket=ticket)}
+        self.assertEqual(sorted(avisos), [50, 80])
+        self.assertAlmostEqual(avisos[50], ticket.fecha_creacion + timedelta(hours=5), delta=timedelta(seconds=1))
+        self.assertAlmostEqual(avisos[80], ticket.fecha_creacion + timedelta(hours=8), delta=timedelta(seconds=1))
+
+    def test_niveles_de_la_categoria(self):
+        from apps.tickets.models import NivelAvisoSla
+
+        categoria = CategoriaAveria.objects.create(nombre="Con niveles", tiempo_sla_horas=4)
+        NivelAvisoSla.objects.create(categoria=categoria, porcentaje=90)
+        NivelAvisoSla.objects.create(categoria=categoria, porcentaje=25)
+        self.assertEqual(self._porcentajes(self._crear(categoria=categoria)), [25, 90])
+
+    def test_cerrar_borra_pendientes_y_ampliar_plazo_no_repite_enviados(self):
+        from apps.tickets.models import AvisoSla
+
+        ticket = Ticket.objects.get(pk=self._crear().pk)
+        AvisoSla.objects.filter(ticket=ticket, porcentaje=50).update(fecha_envio=timezone.now())
+
+        ticket.fecha_limite_sla += timedelta(hours=10)
+        ticket.save()
+        self.assertEqual(self._porcentajes(ticket), [50, 80])
+        ochenta = AvisoSla.objects.get(ticket=ticket, porcentaje=80)
+        # Al 80% quedan 2h (20% de las 10h de SLA) hasta el nuevo vencimiento
+        self.assertAlmostEqual(
+            ochenta.fecha_programada, ticket.fecha_limite_sla - timedelta(hours=2), delta=timedelta(seconds=1)
+        )
+
+        ticket.estado = "RESUELTO"
+        ticket.save()
+        self.assertEqual(self._porcentajes(ticket), [50])
+
+    def test_guardar_sin_cambiar_plazo_no_reprograma(self):
+        ticket = Ticket.objects.get(pk=self._crear().pk)
+        ticket.titulo = "Otro"
+        with self.assertNumQueries(1):
+            ticket.save()
+
+    def test_procesar_envia_los_que_tocan(self):
+        from apps.tickets.escalamiento_sla import procesar_avisos_sla
+        from apps.tickets.models import AvisoSla, EnvioPendiente, Notificacion
+
+        ticket = self._crear(asignado_a=self.tecnico)
+        ahora = ticket.fecha_creacion + timedelta(hours=6)
+
+        enviados, proximo = procesar_avisos_sla(ahora, hasta=ahora + timedelta(hours=3))
+
+        self.assertEqual([a.porcentaje for a in enviados], [50])
+        self.assertAlmostEqual(proximo, ticket.fecha_creacion + timedelta(hours=8), delta=timedelta(seconds=1))
+        self.assertEqual(self._porcentajes(ticket, fecha_envio__isnull=False), [50])
+        self.assertEqual(
+            set(Notificacion.objects.filter(tipo="SLA_AVISO").values_list("usuario_id", flat=True)),
+            {self.admin.pk, self.tecnico.pk},
+        )
+        envio = EnvioPendiente.objects.get(tipo="PUSH_AVISO_SLA")
+        self.assertEqual(envio.datos["porcentaje"], 50)
+
+        # Ya enviado: no se repite
+        enviados, _ = procesar_avisos_sla(ahora)
+        self.assertEqual(enviados, [])
+        self.assertEqual(AvisoSla.objects.filter(fecha_envio__isnull=True).count(), 1)
+
+    def test_consultas_constantes(self):
+        from apps.tickets.escalamiento_sla import procesar_avisos_sla
+        from apps.tickets.models import AvisoSla
+
+        for _ in range(3):
+            self._crear()
+        ahora = timezone.now() + timedelta(hours=6)
+        # SELECT avisos + UPDATE + SELECT reclamados + SELECT staff + 2 INSERT (más savepoints)
+        with self.assertNumQueries(12):
+            enviados, _ = procesar_avisos_sla(ahora)
+        self.assertEqual(len(enviados), 3)
+
+        for _ in range(12):
+            self._crear()
+        AvisoSla.objects.update(fecha_envio=None)
+        with self.assertNumQueries(12):
+            enviados, _ = procesar_avisos_sla(ahora)
+        self.assertEqual(len(enviados), 15)
+
+    def test_aviso_reclamado_por_otro_proceso_no_se_repite(self):
+        from unittest import mock
+
+        from apps.tickets.escalamiento_sla import avisos_pendientes, procesar_avisos_sla
+        from apps.tickets.models import AvisoSla, EnvioPendiente, Notificacion
+
+        ticket = self._crear(asignado_a=self.tecnico)
+        ahora = ticket.fecha_creacion + timedelta(hours=6)
+        # El segundo proceso leyó el lote antes de que el primero lo reclamara
+        leidos = list(avisos_pendientes(ahora))
+        enviados, _ = procesar_avisos_sla(ahora)
+        self.assertEqual([a.porcentaje for a in enviados], [50])
+
+        with mock.patch("apps.tickets.escalamiento_sla.avisos_pendientes", return_value=leidos):
+            enviados, _ = procesar_avisos_sla(ahora)
+
+        self.assertEqual(enviados, [])
+        self.assertEqual(EnvioPendiente.objects.filter(tipo="PUSH_AVISO_SLA").count(), 1)
+        self.assertEqual(Notificacion.objects.filter(tipo="SLA_AVISO", usuario=self.tecnico).count(), 1)
+        self.assertEqual(AvisoSla.objects.filter(fecha_envio__isnull=False).values("lote").distinct().count(), 1)
+
+    def test_ticket_vencido_o_cerrado_se_marca_sin_notificar(self):
+        from apps.tickets.escalamiento_sla import procesar_avisos_sla
+        from apps.tickets.models import AvisoSla, Notificacion
+
+        ticket = self._crear()
+        Ticket.objects.filter(pk=ticket.pk).update(estado="CERRADO")
+        enviados, _ = procesar_avisos_sla(ticket.fecha_creacion + timedelta(hours=9))
+
+        self.assertEqual(enviados, [])
+        self.assertFalse(AvisoSla.objects.filter(fecha_envio__isnull=True).exists())
+        self.assertFalse(Notificacion.objects.filter(tipo="SLA_AVISO").exists())
+
+
+class CalendarioSlaTicketTest(TestCase):
+    """fecha_limite_sla en horas laborables del calendario del local, con pausa EN_ESPERA."""
+
+    def setUp(self):
+        from datetime import time
+        from zoneinfo import ZoneInfo
+        from apps.locales.models import CalendarioLaboral, HorarioLaboral
+
+        self.tz = ZoneInfo("America/Santo_Domingo")
+        general = CalendarioLaboral.objects.create(nombre="General", por_defecto=True)
+        for dia in range(5):
+            HorarioLaboral.objects.create(calendario=general, dia_semana=dia, hora_inicio=time(8), hora_fin=time(18))
+        self.admin = User.objects.create(username="jefe_cal", rol="ADMIN", is_staff=True)
+        self.local = Local.objects.create(codigo="CALT", nombre="Local calendario")
+        self.categoria = CategoriaAveria.objects.create(nombre="Cal", tiempo_sla_horas=4)
+
+    def _en(self, *args):
+        from unittest import mock
+
+        return mock.patch("django.utils.timezone.now", return_value=datetime(*args, tzinfo=self.tz))
+
+    def _crear(self):
+        return Ticket.objects.create(
+            local=self.local, categoria=self.categoria, titulo="C", descripcion="C", creado_por=self.admin
+        )
+
+    def test_viernes_noche_vence_el_lunes(self):
+        with self._en(2026, 10, 16, 20, 0):
+            ticket = self._crear()
+        self.assertEqual(ticket.fecha_limite_sla, datetime(2026, 10, 19, 12, 0, tzinfo=self.tz))
+
+    def test_en_espera_pausa_el_sla(self):
+        with self._en(2026, 10, 19, 9, 0):
+            ticket = self._crear()
+        ticket = Ticket.objects.get(pk=ticket.pk)
+
+        with self._en(2026, 10, 19, 10, 0):
+            ticket.estado = "EN_ESPERA"
+            ticket.save()
+        self.assertEqual(ticket.sla_pausado_desde, datetime(2026, 10, 19, 10, 0, tzinfo=self.tz))
+
+        with self._en(2026, 10, 21, 9, 0):
+            self.assertFalse(ticket.esta_vencido())
+            anotado = Ticket.objects.with_sla().get(pk=ticket.pk)
+            self.assertFalse(anotado.vencido)
+            self.assertEqual(anotado.segundos_restantes, 3 * 3600)
+            self.assertFalse(Ticket.objects.filter(pk=ticket.pk).filter(
+                estado__in=["PENDIENTE", "EN_PROCESO"], fecha_limite_sla__lt=timezone.now()
+            ).exists())
+
+            ticket.estado = "EN_PROCESO"
+            ticket.save()
+
+        # Quedaban 3h laborables al pausar: miércoles 9:00 + 3h
+        self.assertEqual(ticket.fecha_limite_sla, datetime(2026, 10, 21, 12, 0, tzinfo=self.tz))
+        self.assertIsNone(ticket.sla_pausado_desde)
+
+
+class ImagenesTicketTest(TestCase):
+    """Pipeline de imágenes: EXIF, metadatos, reducción, WebP y miniaturas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create(username="fotos", rol="ADMIN")
+        local = Local.objects.create(codigo="IMG1", nombre="Local fotos")
+        categoria = CategoriaAveria.objects.create(nombre="Fotos", tiempo_sla_horas=4)
+        cls.ticket = Ticket.objects.create(
+            local=local, categoria=categoria, titulo="F", descripcion="F", creado_por=cls.usuario
+        )
+
+    def setUp(self):
+        import shutil
+        import tempfile
+        from django.test import override_settings
+
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=self.media, IMAGENES_FORMATO='WEBP')
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def _jpeg(self, tamano=(4000, 3000), orientacion=6, nombre="foto.jpg"):
+        """JPEG de móvil: apaisado con orientación EXIF 6 (girar 90º) y GPS."""
+        import io
+        from PIL import Image
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        imagen = Image.new("RGB", tamano, (200, 30, 30))
+        exif = Image.Exif()
+        exif[0x0112] = orientacion
+        exif[0x010F] = "Fabricante"
+        buffer = io.BytesIO()
+        imagen.save(buffer, "JPEG", exif=exif.tobytes(), quality=95)
+        return SimpleUploadedFile(nombre, buffer.getvalue(), content_type="image/jpeg")
+
+    def _abrir(self, campo):
+        from PIL import Image
+
+        campo.open("rb")
+        try:
+            imagen = Image.open(campo)
+            imagen.load()
+        finally:
+            campo.close()
+        return imagen
+
+    def test_subida_rotada_sin_exif_reducida(self):
+        from apps.tickets.models import ImagenTicket
+
+        subida = self._jpeg()
+        original = subida.size
+        img = ImagenTicket.objects.create(ticket=self.ticket, imagen=subida, subida_por=self.usuario)
+
+        self.assertTrue(img.imagen.name.endswith(".webp"))
+        imagen = self._abrir(img.imagen)
+        self.assertEqual(imagen.format, "WEBP")
+        # Orientación 6 aplicada: pasa a vertical; lado largo limitado a 1600
+        self.assertEqual(imagen.size, (1200, 1600))
+        self.assertFalse(imagen.getexif())
+        self.assertLess(img.imagen.size, original)
+
+    def test_miniaturas_de_tamano_fijo(self):
+        from apps.tickets.imagenes import MINIATURA, MINIATURA_2X
+        from apps.tickets.models import ImagenTicket
+
+        img = ImagenTicket.objects.create(ticket=self.ticket, imagen=self._jpeg(), subida_por=self.usuario)
+        img.refresh_from_db()
+
+        self.assertEqual(self._abrir(img.miniatura).size, MINIATURA)
+        self.assertEqual(self._abrir(img.miniatura_2x).size, MINIATURA_2X)
+        self.assertEqual(img.miniatura_url, img.miniatura.url)
+
+    def test_foto_reparacion_y_miniatura(self):
+        from apps.tickets.imagenes import LADO_MINIATURA_FOTO
+
+        self.ticket.foto_reparacion = self._jpeg(tamano=(1000, 800), orientacion=1)
+        self.ticket.save()
+        self.ticket.refresh_from_db()
+
+        self.assertEqual(self._abrir(self.ticket.foto_reparacion).size, (1000, 800))
+        self.assertEqual(self._abrir(self.ticket.foto_reparacion_miniatura).size, (LADO_MINIATURA_FOTO, 400))
+
+    def test_no_imagen_se_guarda_tal_cual(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from apps.tickets.models import ImagenTicket
+
+        subida = SimpleUploadedFile("informe.jpg", b"no soy una imagen", content_type="image/jpeg")
+        img = ImagenTicket.objects.create(ticket=self.ticket, imagen=subida, subida_por=self.usuario)
+
+        self.assertTrue(img.imagen.name.endswith(".jpg"))
+        self.assertFalse(img.miniatura)
+        img.imagen.open("rb")
+        try:
+            self.assertEqual(img.imagen.read(), b"no soy una imagen")
+        finally:
+            img.imagen.close()
+
+    def test_comando_procesa_imagenes_antiguas(self):
+        import os
+        from io import StringIO
+        from django.core.files.storage import default_storage
+        from django.core.management import call_command
+        from apps.tickets.models import ImagenTicket
+
+        # Imagen subida antes del pipeline: guardada sin procesar y sin miniaturas
+        nombre = default_storage.save("fotos_tickets/antigua.jpg", self._jpeg())
+        img = ImagenTicket.objects.create(ticket=self.ticket, imagen=nombre, subida_por=self.usuario)
+        self.assertFalse(img.miniatura)
+
+        out = StringIO()
+        call_command("procesar_imagenes", "--dry-run", stdout=out)
+        self.assertIn("1 pendiente", out.getvalue())
+
+        call_command("procesar_imagenes", stdout=out)
+        img.refresh_from_db()
+        self.assertTrue(img.imagen.name.endswith(".webp"))
+        self.assertEqual(self._abrir(img.imagen).size, (1200, 1600))
+        self.assertTrue(img.miniatura and img.miniatura_2x)
+        self.assertFalse(os.path.exists(os.path.join(self.media, nombre)))
+        self.assertIn("procesadas: 1", out.getvalue())
+
+        # Una segunda pasada no encuentra nada pendiente
+        out = StringIO()
+        call_command("procesar_imagenes", stdout=out)
+        self.assertIn("procesadas: 0", out.getvalue())
+
+
+class AdjuntosPorPartesTest(TestCase):
+    """API de subida por partes: reanudación, deduplicación por hash y bulk_create."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user(username="digi", password="x", rol="DIGITADOR")
+        cls.local = Local.objects.create(codigo="ADJ1", nombre="Local adjuntos")
+        cls.categoria = CategoriaAveria.objects.create(nombre="Adjuntos", tiempo_sla_horas=4)
+
+    def setUp(self):
+        import shutil
+        import tempfile
+        from django.test import override_settings
+
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=self.media, ADJUNTOS_TAMANO_PARTE=4096)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.client.force_login(self.usuario)
+
+    def _jpeg(self):
+        import io
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        # Ruido para que el JPEG ocupe varias partes de 4 KB
+        Image.effect_noise((200, 150), 60).convert("RGB").save(buffer, "JPEG", quality=95)
+        return buffer.getvalue()
+
+    def _iniciar(self, datos, **extra):
+        import json
+        from django.urls import reverse
+
+        return self.client.post(
+            reverse("api_adjuntos_iniciar"), json.dumps(datos), content_type="application/json", **extra
+        )
+
+    def _parte(self, url, offset, datos):
+        return self.client.put(f"{url}?offset={offset}", datos, content_type="application/octet-stream")
+
+    def _subir(self, datos, nombre="foto.jpg"):
+        estado = self._iniciar({"nombre": nombre, "tamano": len(datos)}).json()
+        while not estado["completa"]:
+            inicio = estado["recibido"]
+            estado = self._parte(estado["url"], inicio, datos[inicio:inicio + estado["parte"]]).json()
+        return estado
+
+    def test_subida_por_partes_reanudable(self):
+        import os
+        from apps.tickets.adjuntos import ruta_parcial
+        from apps.tickets.models import SubidaAdjunto
+
+        datos = self._jpeg()
+        self.assertGreater(len(datos), 3 * 4096)
+        respuesta = self._iniciar({"nombre": "foto.jpg", "tamano": len(datos)})
+        self.assertEqual(respuesta.status_code, 201)
+        estado = respuesta.json()
+        url = estado["url"]
+
+        self.assertEqual(self._parte(url, 0, datos[:4096]).json()["recibido"], 4096)
+        # Reintento de una parte ya recibida: 409 con el offset desde el que seguir
+        respuesta = self._parte(url, 0, datos[:4096])
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertEqual(respuesta.json()["recibido"], 4096)
+        # Tras un corte, GET dice dónde reanudar
+        self.assertEqual(self.client.get(url).json()["recibido"], 4096)
+
+        subida = SubidaAdjunto.objects.get(token=estado["token"])
+        self.assertTrue(os.path.exists(ruta_parcial(subida)))
+
+        respuesta = self._parte(url, 4096, datos[4096:])
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta.json()["completa"])
+        self.assertTrue(respuesta.json()["miniatura"])
+
+        subida.refresh_from_db()
+        self.assertEqual(subida.estado, "COMPLETA")
+        self.assertTrue(subida.imagen.name.endswith(".webp"))
+        self.assertEqual(len(subida.sha256), 64)
+        self.assertFalse(os.path.exists(ruta_parcial(subida)))
+
+    def test_no_imagen_se_mueve_sin_procesar(self):
+        from apps.tickets.models import SubidaAdjunto
+
+        datos = b"%PDF-1.4 " + b"x" * 10000
+        estado = self._subir(datos, nombre="factura.pdf")
+
+        subida = SubidaAdjunto.objects.get(token=estado["token"])
+        self.assertTrue(subida.imagen.name.startswith("cas/"))
+        self.assertTrue(subida.imagen.name.endswith(".pdf"))
+        self.assertFalse(subida.miniatura)
+        with subida.imagen.open("rb") as f:
+            self.assertEqual(f.read(), datos)
+
+    def test_parte_mayor_que_lo_anunciado(self):
+        estado = self._iniciar({"nombre": "x.jpg", "tamano": 10}).json()
+        respuesta = self._parte(estado["url"], 0, b"0123456789ABC")
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(respuesta.json()["recibido"], 0)
+
+        self.assertEqual(self._iniciar({"nombre": "x.jpg", "tamano": 0}).status_code, 400)
+
+    def test_subida_de_otro_usuario_no_accesible(self):
+        estado = self._iniciar({"nombre": "x.jpg", "tamano": 10}).json()
+        otro = User.objects.create_user(username="otro", password="x", rol="DIGITADOR")
+        self.client.force_login(otro)
+        self.assertEqual(self.client.get(estado["url"]).status_code, 404)
+
+    def test_mismo_contenido_se_guarda_una_vez(self):
+        import hashlib
+        from apps.tickets.models import SubidaAdjunto
+
+        datos = self._jpeg()
+        primera = self._subir(datos)
+        segunda = self._subir(datos, nombre="reenviada.jpg")
+
+        a = SubidaAdjunto.objects.get(token=primera["token"])
+        b = SubidaAdjunto.objects.get(token=segunda["token"])
+        self.assertEqual(a.imagen.name, b.imagen.name)
+        self.assertEqual(a.miniatura.name, b.miniatura.name)
+
+        # Con el hash de algo que ya subió el mismo usuario ni se transfieren los bytes
+        estado = self._iniciar({
+            "nombre": "otra.jpg", "tamano": len(datos) + 1, "sha256": hashlib.sha256(datos).hexdigest(),
+        }).json()
+        self.assertTrue(estado["completa"])
+        c = SubidaAdjunto.objects.get(token=estado["token"])
+        self.assertEqual(c.imagen.name, a.imagen.name)
+        self.assertEqual((c.tamano, c.recibido), (a.tamano, a.tamano))
+
+    def test_hash_de_otro_usuario_exige_los_bytes(self):
+        """Conocer el hash de una foto ajena no basta para adjuntarla"""
+        import hashlib
+        from apps.tickets.models import SubidaAdjunto
+
+        datos = self._jpeg()
+        ajena = SubidaAdjunto.objects.get(token=self._subir(datos)["token"])
+
+        otro = User.objects.create_user(username="curioso", password="x", rol="DIGITADOR")
+        self.client.force_login(otro)
+        estado = self._iniciar({
+            "nombre": "robada.jpg", "tamano": len(datos), "sha256": hashlib.sha256(datos).hexdigest(),
+        }).json()
+        self.assertFalse(estado["completa"])
+        self.assertEqual(estado["recibido"], 0)
+
+        # Subiendo los bytes sí se deduplica contra la suya
+        while not estado["completa"]:
+            inicio = estado["recibido"]
+            estado = self._parte(estado["url"], inicio, datos[inicio:inicio + estado["parte"]]).json()
+        self.assertEqual(SubidaAdjunto.objects.get(token=estado["token"]).imagen.name, ajena.imagen.name)
+
+    def test_crear_ticket_con_tokens_y_ficheros(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.urls import reverse
+        from apps.tickets.models import ImagenTicket, SubidaAdjunto
+
+        datos = self._jpeg()
+        estado = self._subir(datos)
+        respuesta = self.client.post(reverse("ticket_crear"), {
+            "local": self.local.nombre,
+            "categoria": self.categoria.pk,
+            "descripcion": "Pantalla rota",
+            "prioridad": "MEDIA",
+            "adjuntos": [estado["token"]],
+            # La misma foto también por el formulario clásico: se deduplica
+            "imagenes": [SimpleUploadedFile("foto.jpg", datos, content_type="image/jpeg")],
+        })
+        self.assertEqual(respuesta.status_code, 302)
+
+        ticket = Ticket.objects.get(descripcion="Pantalla rota")
+        imagenes = list(ImagenTicket.objects.filter(ticket=ticket))
+        self.assertEqual(len(imagenes), 2)
+        subida = SubidaAdjunto.objects.get(token=estado["token"])
+        self.assertEqual({img.imagen.name for img in imagenes}, {subida.imagen.name})
+        self.assertTrue(all(img.miniatura for img in imagenes))
+
+    def test_purgar_subidas_abandonadas(self):
+        import os
+        from datetime import timedelta
+        from apps.tickets.adjuntos import purgar_subidas, ruta_parcial
+        from apps.tickets.models import SubidaAdjunto
+
+        estado = self._iniciar({"nombre": "x.jpg", "tamano": 10}).json()
+        self._parte(estado["url"], 0, b"01234")
+        subida = SubidaAdjunto.objects.get(token=estado["token"])
+        self.assertTrue(os.path.exists(ruta_parcial(subida)))
+
+        self.assertEqual(purgar_subidas(), 0)
+        self.assertEqual(purgar_subidas(ahora=timezone.now() + timedelta(days=2)), 1)
+        self.assertFalse(SubidaAdjunto.objects.exists())
+        self.assertFalse(os.path.exists(ruta_parcial(subida)))
+
+
+class AlmacenContenidoTest(TestCase):
+    """Almacén por contenido: deduplicación, cuenta de referencias, GC y migración."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create(username="blobs", rol="ADMIN")
+        cls.local = Local.objects.create(codigo="CAS1", nombre="Local blobs")
+        cls.categoria = CategoriaAveria.objects.create(nombre="Blobs", tiempo_sla_horas=4)
+
+    def setUp(self):
+        import shutil
+        import tempfile
+        from django.test import override_settings
+
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=self.media, ALMACEN_GRACIA_HORAS=24)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def _ticket(self):
+        return Ticket.objects.create(
+            local=self.local, categoria=self.categoria, titulo="B", descripcion="B", creado_por=self.usuario
+        )
+
+    def _foto(self, nombre="foto.jpg"):
+        import io
+        from PIL import Image
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        buffer = io.BytesIO()
+        Image.new("RGB", (800, 600), (30, 160, 90)).save(buffer, "JPEG")
+        return SimpleUploadedFile(nombre, buffer.getvalue(), content_type="image/jpeg")
+
+    def _imagen(self, ticket, nombre="foto.jpg"):
+        from apps.tickets.models import ImagenTicket
+
+        return ImagenTicket.objects.create(ticket=ticket, imagen=self._foto(nombre), subida_por=self.usuario)
+
+    def _blob(self, nombre):
+        from apps.tickets.models import BlobContenido
+
+        return BlobContenido.objects.get(nombre=nombre)
+
+    def _existe(self, nombre):
+        import os
+
+        return os.path.exists(os.path.join(self.media, nombre))
+
+    def test_mismo_contenido_un_fichero_y_dos_referencias(self):
+        a = self._imagen(self._ticket(), "a.jpg")
+        b = self._imagen(self._ticket(), "b.jpg")
+
+        self.assertTrue(a.imagen.name.startswith("cas/"))
+        self.assertEqual(a.imagen.name, b.imagen.name)
+        self.assertEqual(a.miniatura.name, b.miniatura.name)
+        self.assertEqual(self._blob(a.imagen.name).referencias, 2)
+        self.assertIsNone(self._blob(a.imagen.name).fecha_sin_referencias)
+
+    def test_borrado_en_cascada_y_recogida_tras_la_gracia(self):
+        from datetime import timedelta
+        from apps.tickets.almacen import recoger_blobs
+        from apps.tickets.models import BlobContenido
+
+        ticket = self._ticket()
+        img = self._imagen(ticket)
+        nombres = [img.imagen.name, img.miniatura.name, img.miniatura_2x.name]
+
+        ticket.delete()
+        self.assertEqual({self._blob(n).referencias for n in nombres}, {0})
+        self.assertTrue(all(self._existe(n) for n in nombres))
+
+        # Dentro de la gracia no se toca nada
+        self.assertEqual(recoger_blobs()[0], 0)
+        borrados, liberados, _ = recoger_blobs(ahora=timezone.now() + timedelta(days=2))
+        self.assertEqual(borrados, 3)
+        self.assertGreater(liberados, 0)
+        self.assertFalse(any(self._existe(n) for n in nombres))
+        self.assertFalse(BlobContenido.objects.filter(nombre__in=nombres).exists())
+
+    def test_recogida_comprueba_referencias_reales(self):
+        from datetime import timedelta
+        from apps.tickets.almacen import recoger_blobs
+        from apps.tickets.models import BlobContenido
+
+        img = self._imagen(self._ticket())
+        # Cuenta desviada (p. ej. un UPDATE en bloque sin ajustar)
+        BlobContenido.objects.update(referencias=0, fecha_sin_referencias=timezone.now())
+
+        self.assertEqual(recoger_blobs(ahora=timezone.now() + timedelta(days=2))[0], 0)
+        self.assertTrue(self._existe(img.imagen.name))
+        self.assertEqual(self._blob(img.imagen.name).referencias, 1)
+
+    def test_volver_a_subir_reinicia_la_gracia(self):
+        from datetime import timedelta
+        from apps.tickets.almacen import recoger_blobs
+        from apps.tickets.models import BlobContenido
+
+        ticket = self._ticket()
+        nombre = self._imagen(ticket).imagen.name
+        ticket.delete()
+        BlobContenido.objects.update(fecha_sin_referencias=timezone.now() - timedelta(days=3))
+
+        # Mismo contenido guardado otra vez (aún sin fila que lo use)
+        from apps.tickets.almacen import almacen_contenido
+        from django.core.files.base import ContentFile
+
+        with open(f"{self.media}/{nombre}", "rb") as f:
+            self.assertEqual(almacen_contenido().save("x.webp", ContentFile(f.read())), nombre)
+        recoger_blobs()
+        self.assertTrue(self._existe(nombre))
+
+    def test_ficheros_huerfanos(self):
+        import os
+        import time
+        from datetime import timedelta
+        from apps.tickets.almacen import recoger_blobs
+
+        ruta = os.path.join(self.media, "cas", "ab", "cd", "abcd.webp")
+        os.makedirs(os.path.dirname(ruta))
+        with open(ruta, "wb") as f:
+            f.write(b"huerfano")
+
+        self.assertEqual(recoger_blobs()[2], 0)
+        viejo = time.time() - timedelta(days=2).total_seconds()
+        os.utime(ruta, (viejo, viejo))
+        self.assertEqual(recoger_blobs(simular=True)[2], 1)
+        self.assertTrue(os.path.exists(ruta))
+        self.assertEqual(recoger_blobs()[2], 1)
+        self.assertFalse(os.path.exists(ruta))
+
+    def test_adjuntar_en_bloque_cuenta_referencias(self):
+        from apps.tickets.adjuntos import adjuntar
+
+        ticket = self._ticket()
+        imagenes = adjuntar(ticket, self.usuario, archivos=[self._foto("a.jpg"), self._foto("b.jpg")])
+
+        self.assertEqual(len(imagenes), 2)
+        # Dos ImagenTicket + sus dos SubidaAdjunto (la segunda reutiliza la primera)
+        self.assertEqual(imagenes[0].imagen.name, imagenes[1].imagen.name)
+        self.assertEqual(self._blob(imagenes[0].imagen.name).referencias, 4)
+
+    def test_migrar_almacen(self):
+        import os
+        from io import StringIO
+        from django.core.files.storage import default_storage
+        from django.core.management import call_command
+        from apps.tickets.models import ImagenTicket
+
+        ticket = self._ticket()
+        viejo = default_storage.save("fotos_tickets/2024/01/vieja.jpg", self._foto())
+        a = ImagenTicket.objects.create(ticket=ticket, imagen=viejo, subida_por=self.usuario)
+        b = ImagenTicket.objects.create(ticket=ticket, imagen=viejo, subida_por=self.usuario)
+        fecha = Ticket.objects.get(pk=ticket.pk).fecha_actualizacion
+
+        out = StringIO()
+        call_command("migrar_almacen", "--dry-run", stdout=out)
+        self.assertIn("Ficheros a migrar: 1", out.getvalue())
+        call_command("migrar_almacen", "--borrar-originales", stdout=out)
+
+        a.refresh_from_db()
+        b.refresh_from_db()
+        self.assertTrue(a.imagen.name.startswith("cas/"))
+        self.assertEqual(a.imagen.name, b.imagen.name)
+        self.assertTrue(self._existe(a.imagen.name))
+        self.assertFalse(os.path.exists(os.path.join(self.media, viejo)))
+        self.assertEqual(self._blob(a.imagen.name).referencias, 2)
+        self.assertEqual(Ticket.objects.get(pk=ticket.pk).fecha_actualizacion, fecha)
@@ -4,13 +4,19 @@ from . import views
 urlpatterns = [
     path('', views.tickets_lista, name='tickets_lista'),
     path('nuevo/', views.ticket_crear, name='ticket_crear'),
+    path('exportar/<str:formato>/', views.tickets_exportar, name='tickets_exportar'),
     path('<int:pk>/', views.ticket_detalle, name='ticket_detalle'),
     path('<int:pk>/estado/', views.ticket_actualizar_estado, name='ticket_actualizar_estado'),
     path('<int:pk>/tomar/', views.ticket_tomar, name='ticket_tomar'),
 
     # API: Notificaciones y menciones
     path('api/notificaciones/', views.api_notificaciones, name='api_notificaciones'),
+    path('api/notificaciones/esperar/', views.api_notificaciones_esperar, name='api_notificaciones_esperar'),
     path('api/notificaciones/leer/', views.api_notificaciones_leer, name='api_notificaciones_leer'),
     path('api/notificaciones/leer/<int:ticket_id>/', views.api_notificaciones_leer_ticket, name='api_notificaciones_leer_ticket'),
     path('api/usuarios/', views.api_usuarios_buscar, name='api_usuarios_buscar'),
+
+    # API: Adjuntos (subida por partes, reanudable)
+    path('api/adjuntos/', views.api_adjuntos_iniciar, name='api_adjuntos_iniciar'),
+    path('api/adjuntos/<str:token>/', views.api_adjunto, name='api_adjunto'),
 ]
@@ -4,8 +4,8 @@ from twilio.rest import Client
 
 def get_tickets_abiertos_count(request):
     """Retorna el conteo de tickets abiertos para el badge del sidebar"""
-    from .models import Ticket
-    return Ticket.objects.filter(estado__in=['PENDIENTE', 'EN_PROCESO']).count()
+    from .contadores import contadores_abiertos
+    return contadores_abiertos()["total_abiertos"]
 
 
 def enviar_whatsapp_ticket_asignado(ticket):
@@ -1,31 +1,41 @@
-import re
+import json
 import logging
+from urllib.parse import urlencode
 
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Count, Max, Q
 from django.shortcuts import render, redirect, get_object_or_404
+from django.utils import timezone
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponseForbidden, JsonResponse
-from django.views.decorators.http import require_GET, require_POST
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse
+from django.urls import reverse
+from django.views.decorators.http import require_GET, require_http_methods, require_POST
 
-from .utils import enviar_whatsapp_ticket_asignado
-from apps.tickets.models import Ticket, ComentarioTicket, ImagenTicket, Notificacion
+from apps.tickets.models import Ticket, ComentarioTicket, Notificacion, SubidaAdjunto
 from apps.tickets.forms import TicketForm, ComentarioTicketForm, TicketEstadoForm
-from .fcm import enviar_notificacion_nuevo_ticket, enviar_notificacion_mencion
+from .adjuntos import OffsetIncorrecto, adjuntar, escribir_parte, iniciar_subida, tamano_parte
+from .avisos import esperar_notificacion, segundos_espera
+from .envios import encolar_nuevo_ticket
+from .filtros import para_lista, tickets_filtrados
+from .notificaciones import no_leidas, notificar_menciones
+from .paginacion import paginar_keyset
 from apps.locales.models import Local
+from apps.reportes.exportar import FORMATOS, exportar_tickets
 from apps.usuarios.models import Usuario
 
 logger = logging.getLogger(__name__)
 
 
-
 @login_required
 def tickets_lista(request):
     """
-    Lista de tickets filtrada por rol y por estado.
+    Lista de tickets filtrada por rol y por estado (y opcionalmente por
+    local / categoría / técnico / fechas, ver filtros.filtros_lista).
 
     - ADMIN:
-        puede ver abiertos / cerrados / todos (filtro ?ver=...)
+        puede ver abiertos / cerrados / resueltos / todos (filtro ?ver=...,
+        ver filtros.filtrar_por_ver)
     - DIGITADOR:
         ve TODOS los tickets (propios y de otros digitadores)
         con filtro por estado (abiertos / cerrados / todos)
@@ -34,71 +44,45 @@ def tickets_lista(request):
           * los que tiene asignados
           * + los sin asignar de sus categorías de especialidad
     """
-    usuario = request.user
-    ver = request.GET.get('ver', 'abiertos')
-
-    tickets = Ticket.objects.select_related(
-        'local', 'categoria', 'creado_por', 'asignado_a'
+    tickets, ver, filtros = tickets_filtrados(request.user, request.GET)
+    tickets = para_lista(tickets)
+
+    # Paginación por cursor sobre (-fecha_creacion, id): coste constante por
+    # página aunque ?ver=todos abarque todo el histórico.
+    pagina = paginar_keyset(
+        tickets,
+        cursor=request.GET.get('cursor'),
+        direccion=request.GET.get('dir', 'sig'),
     )
 
-    # --- Filtro por rol ---
-    if usuario.es_digitador():
-        # Digitador ve TODOS los tickets (propios y de otros digitadores)
-        # para poder consultar cualquier ticket si le preguntan.
-        # Filtra solo por estado (abiertos / cerrados / todos)
-        if ver == 'abiertos':
-            tickets = tickets.exclude(
-                estado__in=['RESUELTO', 'CERRADO', 'CANCELADO']
-            )
-        elif ver == 'cerrados':
-            tickets = tickets.filter(
-                estado__in=['RESUELTO', 'CERRADO', 'CANCELADO']
-            )
-        # ver == 'todos' => sin filtro extra
-
-    elif usuario.es_tecnico():
-        cats = usuario.especialidades.all()
-
-        if cats.exists():
-            tickets = tickets.filter(
-                Q(asignado_a=usuario) |
-                Q(asignado_a__isnull=True, categoria__in=cats)
-            )
-        else:
-            # Técnico sin especialidades configuradas => ve solo
-            # tickets abiertos asignados a él o sin asignar
-            tickets = tickets.filter(
-                Q(asignado_a=usuario) |
-                Q(asignado_a__isnull=True)
-            )
-
-        # Para técnicos SIEMPRE solo abiertos, ignoramos ?ver
-        tickets = tickets.exclude(
-            estado__in=['RESUELTO', 'CERRADO', 'CANCELADO']
-        )
-        ver = 'abiertos'  # para marcar pestaña en plantilla si usas tabs
-
-    else:
-        # ADMIN normal
-        if ver == 'abiertos':
-            tickets = tickets.exclude(
-                estado__in=['RESUELTO', 'CERRADO', 'CANCELADO']
-            )
-        elif ver == 'cerrados':
-            tickets = tickets.filter(
-                estado__in=['RESUELTO', 'CERRADO', 'CANCELADO']
-            )
-        # ver == 'todos' => sin filtro extra
-
-    tickets = tickets.order_by('-fecha_creacion')
-
     contexto = {
-        'tickets': tickets,
+        'tickets': pagina.items,
+        'pagina': pagina,
         'ver': ver,
+        'filtros': filtros,
+        'filtros_qs': urlencode(filtros),
     }
     return render(request, 'tickets/tickets_lista.html', contexto)
 
 
+@login_required
+@require_GET
+def tickets_exportar(request, formato):
+    """
+    Exporta la lista filtrada (mismos ?ver y filtros que tickets_lista) a
+    CSV o XLSX. Se genera en streaming: memoria constante con cualquier volumen.
+    Solo ADMIN.
+    """
+    if not request.user.es_admin():
+        return HttpResponseForbidden("No tienes permiso para exportar tickets.")
+    if formato not in FORMATOS:
+        raise Http404("Formato de exportación no soportado.")
+
+    tickets, ver, _ = tickets_filtrados(request.user, request.GET)
+    nombre = f"tickets_{ver}_{timezone.localdate():%Y%m%d}"
+    return exportar_tickets(formato, tickets, nombre)
+
+
 @login_required
 def ticket_crear(request):
     """
@@ -133,29 +117,20 @@ def ticket_crear(request):
             ticket.titulo = f'{base} - {resumen}' if resumen else base
             # ==========================
 
-            ticket.save()
-            form.save_m2m()  # por si el form tiene ManyToMany
+            with transaction.atomic():
+                ticket.save()
+                form.save_m2m()  # por si el form tiene ManyToMany
 
-            # Guardar imágenes adjuntas
-            for archivo in request.FILES.getlist('imagenes'):
-                ImagenTicket.objects.create(
-                    ticket=ticket,
-                    imagen=archivo,
-                    subida_por=usuario,
+                # Imágenes adjuntas: subidas en segundo plano (tokens) + las del formulario
+                adjuntar(
+                    ticket, usuario,
+                    tokens=request.POST.getlist('adjuntos'),
+                    archivos=request.FILES.getlist('imagenes'),
                 )
 
-            # 👉 WhatsApp al técnico asignado (como ya tenías)
-            enviar_whatsapp_ticket_asignado(ticket)
-
-            # 👉 NUEVO: notificación push al técnico asignado (FCM)
-            try:
-                enviar_notificacion_nuevo_ticket(ticket)
-            except Exception:
-                import logging
-                logging.getLogger(__name__).exception(
-                    "Error enviando notificación FCM para el ticket %s",
-                    ticket.id,
-                )
+                # WhatsApp + push FCM al técnico asignado: se encolan en la
+                # misma transacción y los entrega `procesar_envios`.
+                encolar_nuevo_ticket(ticket)
 
             messages.success(request, f'Ticket {ticket.numero_ticket} creado correctamente.')
             return redirect('ticket_detalle', pk=ticket.pk)
@@ -175,32 +150,18 @@ def ticket_crear(request):
 
 @login_required
 def ticket_detalle(request, pk):
-    ticket = get_object_or_404(Ticket, pk=pk)
     usuario = request.user
+    ticket = get_object_or_404(
+        Ticket.objects
+        .con_visibilidad(usuario)
+        .select_related('local', 'categoria', 'creado_por', 'asignado_a'),
+        pk=pk,
+    )
 
     # ---------- PERMISOS DE VISUALIZACIÓN ----------
-    if usuario.es_admin():
-        # Admin ve todo
-        pass
-
-    elif usuario.es_digitador():
-        # Digitador ve todos los tickets (propios y de otros)
-        pass
-
-    elif usuario.es_tecnico():
-        # Técnico: siempre puede ver los que están asignados a él
-        if ticket.asignado_a == usuario:
-            pass
-        else:
-            # Si está asignado a otro → no
-            if ticket.asignado_a is not None:
-                return HttpResponseForbidden("No tienes permiso para ver este ticket.")
-
-            # Si está sin asignar: solo si la categoría está en sus especialidades
-            cats = usuario.especialidades.all()
-            if cats.exists() and ticket.categoria not in cats:
-                return HttpResponseForbidden("No tienes permiso para ver este ticket.")
-    else:
+    # Admin y digitador ven todo; el técnico, lo suyo y lo sin asignar de sus
+    # especialidades (ver TicketQuerySet.visible_para).
+    if not ticket.visible:
         return HttpResponseForbidden("No tienes permiso para ver este ticket.")
     # ---------- FIN PERMISOS DE VISTA ----------
 
@@ -245,13 +206,12 @@ def ticket_detalle(request, pk):
 
                 ticket_obj.save()
 
-                # Guardar imágenes adjuntas del técnico
-                for archivo in request.FILES.getlist('imagenes_estado'):
-                    ImagenTicket.objects.create(
-                        ticket=ticket_obj,
-                        imagen=archivo,
-                        subida_por=usuario,
-                    )
+                # Imágenes adjuntas del técnico
+                adjuntar(
+                    ticket_obj, usuario,
+                    tokens=request.POST.getlist('adjuntos'),
+                    archivos=request.FILES.getlist('imagenes_estado'),
+                )
 
                 messages.success(request, "Ticket actualizado correctamente.")
                 return redirect("ticket_detalle", pk=ticket_obj.pk)
@@ -265,10 +225,12 @@ def ticket_detalle(request, pk):
                 comentario = comentario_form.save(commit=False)
                 comentario.ticket = ticket
                 comentario.usuario = usuario
-                comentario.save()
 
-                # Procesar @menciones y crear notificaciones
-                _procesar_menciones(comentario, usuario, ticket)
+                with transaction.atomic():
+                    comentario.save()
+
+                    # Procesar @menciones: notificaciones en bloque + un push para todos
+                    notificar_menciones(comentario, usuario, ticket)
 
                 messages.success(request, "Comentario agregado.")
                 return redirect("ticket_detalle", pk=ticket.pk)
@@ -301,19 +263,18 @@ def ticket_tomar(request, pk):
     Solo si la categoría está dentro de sus especialidades.
     """
     usuario = request.user
-    ticket = get_object_or_404(Ticket, pk=pk)
+    ticket = get_object_or_404(Ticket.objects.con_visibilidad(usuario), pk=pk)
 
     if not usuario.es_tecnico():
         return HttpResponseForbidden("Solo los técnicos pueden tomar tickets.")
 
     # Ya tiene técnico asignado → no se puede tomar
-    if ticket.asignado_a and ticket.asignado_a != usuario:
+    if ticket.asignado_a_id and ticket.asignado_a_id != usuario.pk:
         messages.error(request, "Este ticket ya tiene un técnico asignado.")
         return redirect('ticket_detalle', pk=ticket.pk)
 
-    # Comprobar especialidades
-    cats = usuario.especialidades.all()
-    if cats.exists() and ticket.categoria not in cats:
+    # Comprobar especialidades: sin asignar y no visible => fuera de sus categorías
+    if not ticket.visible:
         messages.error(request, "Este ticket no corresponde a tus tipos de avería.")
         return redirect('ticket_detalle', pk=ticket.pk)
 
@@ -362,62 +323,88 @@ def ticket_actualizar_estado(request, pk):
 
 
 # =====================================================================
-# HELPERS: Menciones y Notificaciones
+# API: Notificaciones
 # =====================================================================
 
-def _procesar_menciones(comentario, autor, ticket):
+@login_required
+@require_GET
+def api_notificaciones(request):
     """
-    Parsea @username en el texto del comentario.
-    Por cada mención válida crea una Notificacion in-app y envía FCM push.
+    Devuelve las notificaciones no leídas del usuario logueado.
+    Usado por el polling JS del frontend para mostrar la campana.
+
+    - ETag = (última notificación, no leídas). Con If-None-Match igual responde
+      304 tras una sola consulta indexada, sin serializar nada.
+    - ?since=<id>: solo devuelve en `items` las notificaciones con id > since.
     """
-    # Buscar todas las @menciones en el texto
-    mencionados_usernames = re.findall(r'@(\w+)', comentario.comentario)
-    if not mencionados_usernames:
-        return
-
-    # Buscar usuarios que existen con esos usernames (sin incluir al autor)
-    usuarios_mencionados = Usuario.objects.filter(
-        username__in=mencionados_usernames,
-        activo=True,
-    ).exclude(pk=autor.pk)
-
-    nombre_autor = autor.get_full_name() or autor.username
-
-    for user_dest in usuarios_mencionados:
-        # Crear notificación in-app
-        Notificacion.objects.create(
-            usuario=user_dest,
-            ticket=ticket,
-            tipo='MENCION',
-            mensaje=f'{nombre_autor} te mencionó en {ticket.numero_ticket}: "{comentario.comentario[:80]}"',
-            autor=autor,
-        )
+    marca = _marca_notificaciones(request.user)
+    etag = f'"n{marca["ultimo_id"]}-{marca["count"]}"'
 
-        # Enviar FCM push (mobile)
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponse(status=304)
+    else:
         try:
-            enviar_notificacion_mencion(ticket, autor, user_dest, comentario.comentario)
-        except Exception:
-            logger.exception("Error FCM mención a %s", user_dest.username)
+            desde = int(request.GET['since'])
+        except (KeyError, ValueError):
+            desde = None
+        data = _datos_notificaciones(request.user, marca['count'], desde=desde)
+        data['ultimo_id'] = marca['ultimo_id']
+        response = JsonResponse(data)
 
+    response['ETag'] = etag
+    # El navegador revalida siempre (If-None-Match) en vez de usar la copia sin preguntar
+    response['Cache-Control'] = 'private, no-cache'
+    return response
 
-# =====================================================================
-# API: Notificaciones
-# =====================================================================
 
 @login_required
 @require_GET
-def api_notificaciones(request):
+def api_notificaciones_esperar(request):
     """
-    Devuelve las notificaciones no leídas del usuario logueado.
-    Usado por el polling JS del frontend para mostrar la campana.
+    Long-poll de la campana: responde en cuanto el usuario tiene una notificación
+    con id > since, o con cambios=false al agotar NOTIF_LONGPOLL_SEGUNDOS.
+    Sin ?since devuelve el estado actual y el cursor (ultimo_id) para empezar.
+
+    GET /tickets/api/notificaciones/esperar/?since=123
     """
-    notifs = Notificacion.objects.filter(
-        usuario=request.user,
-        leida=False,
-    ).select_related('ticket', 'autor').order_by('-fecha')[:20]
+    espera = segundos_espera()
+    if not espera:
+        # Desactivado: el JS vuelve al polling clásico
+        return JsonResponse({'longpoll': False}, status=503)
+
+    try:
+        desde = int(request.GET['since'])
+    except (KeyError, ValueError):
+        desde = None
+
+    if desde is not None and esperar_notificacion(request.user.pk, desde, timeout=espera) is None:
+        return JsonResponse({'cambios': False, 'ultimo_id': desde})
+
+    marca = _marca_notificaciones(request.user)
+    data = _datos_notificaciones(request.user, count=marca['count'])
+    data.update(cambios=True, ultimo_id=marca['ultimo_id'])
+    return JsonResponse(data)
 
-    data = {
-        'count': notifs.count(),
+
+def _marca_notificaciones(usuario):
+    """Marca de agua del usuario: id más reciente y nº de no leídas (una consulta)."""
+    marca = Notificacion.objects.filter(usuario=usuario).aggregate(
+        ultimo_id=Max('id'),
+        count=Count('id', filter=Q(leida=False)),
+    )
+    marca['ultimo_id'] = marca['ultimo_id'] or 0
+    return marca
+
+
+def _datos_notificaciones(usuario, count, desde=None):
+    """
+    Últimas 20 notificaciones no leídas (posteriores a `desde`), listo para JSON.
+    `count` viene de _marca_notificaciones para no repetir el COUNT.
+    """
+    notifs = no_leidas(usuario, desde)[:20]
+
+    return {
+        'count': count,
         'items': [
             {
                 'id': n.id,
@@ -431,7 +418,6 @@ def api_notificaciones(request):
             for n in notifs
         ],
     }
-    return JsonResponse(data)
 
 
 @login_required
@@ -490,3 +476,62 @@ def api_usuarios_buscar(request):
         ],
     }
     return JsonResponse(data)
+
+
+def _datos_subida(subida):
+    return {
+        'token': subida.token,
+        'url': reverse('api_adjunto', args=[subida.token]),
+        'tamano': subida.tamano,
+        'recibido': subida.recibido,
+        'parte': tamano_parte(),
+        'completa': subida.estado == 'COMPLETA',
+        'miniatura': subida.miniatura.url if subida.miniatura else '',
+    }
+
+
+@login_required
+@require_POST
+def api_adjuntos_iniciar(request):
+    """
+    Inicia una subida por partes de un adjunto (ver adjuntos.py).
+    POST /tickets/api/adjuntos/ {"nombre": "foto.jpg", "tamano": 4123456, "sha256": "..."}
+    """
+    datos = request.POST
+    if request.content_type == 'application/json':
+        try:
+            datos = json.loads(request.body or b'{}')
+        except ValueError:
+            return JsonResponse({'error': 'JSON no válido.'}, status=400)
+    try:
+        subida = iniciar_subida(
+            request.user,
+            str(datos.get('nombre', '')),
+            int(datos.get('tamano', 0)),
+            str(datos.get('sha256', '')),
+        )
+    except (TypeError, ValueError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(_datos_subida(subida), status=201)
+
+
+@login_required
+@require_http_methods(['GET', 'PUT'])
+def api_adjunto(request, token):
+    """
+    GET: estado de la subida (cuánto se ha recibido, para reanudar).
+    PUT ?offset=N: bytes de la parte en el cuerpo (application/octet-stream).
+    """
+    subida = get_object_or_404(SubidaAdjunto, token=token, usuario=request.user)
+    if request.method == 'PUT':
+        try:
+            offset = int(request.GET.get('offset', ''))
+        except ValueError:
+            return JsonResponse({'error': 'Falta offset.'}, status=400)
+        try:
+            escribir_parte(subida, offset, request)
+        except OffsetIncorrecto:
+            return JsonResponse(_datos_subida(subida), status=409)
+        except ValueError as e:
+            return JsonResponse({'error': str(e), **_datos_subida(subida)}, status=400)
+    return JsonResponse(_datos_subida(subida))
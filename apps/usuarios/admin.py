@@ -7,6 +7,7 @@ from django import forms
 from unfold.admin import ModelAdmin
 from unfold.decorators import display
 
+from apps.tickets.models import Ticket
 from .models import Usuario, DispositivoNotificacion
 
 
@@ -115,7 +116,7 @@ class UsuarioAdmin(BaseUserAdmin, ModelAdmin):
     
     @display(description='Tickets Asignados')
     def tickets_asignados(self, obj):
-        count = obj.tickets_asignados.filter(estado__in=['PENDIENTE', 'EN_PROCESO']).count()
+        count = obj.tickets_asignados.filter(estado__in=Ticket.ESTADOS_ABIERTOS).count()
         if count > 0:
             return format_html('<strong style="color:#dc3545;">{}</strong>', count)
         return format_html('<span style="color:#999;">0</span>')
@@ -1,27 +1,14 @@
-import json
-import requests
 from django.conf import settings
 from apps.usuarios.models import DispositivoNotificacion
-
-from google.oauth2 import service_account
-from google.auth.transport.requests import Request
-
-SCOPES = ["https://www.googleapis.com/auth/firebase.messaging"]
+from apps.tickets.fcm import get_cliente_fcm, proveedor_token
 
 
 def _get_access_token():
     """
     Obtiene un token de acceso OAuth2 usando el JSON de servicio de Firebase.
+    Reutiliza el proveedor compartido de apps.tickets.fcm para no refrescar por envío.
     """
-    print("[FCM] Obteniendo access token...")
-
-    credentials = service_account.Credentials.from_service_account_file(
-        str(settings.FIREBASE_CREDENTIALS_FILE),
-        scopes=SCOPES,
-    )
-    credentials.refresh(Request())
-    print("[FCM] Access token obtenido OK.")
-    return credentials.token
+    return proveedor_token.get_token()
 
 
 def enviar_notificacion_nuevo_ticket(ticket):
@@ -35,56 +22,44 @@ def enviar_notificacion_nuevo_ticket(ticket):
             return
 
         # 1) Buscar dispositivos activos del técnico
-        dispositivos = DispositivoNotificacion.objects.filter(
-            usuario=ticket.asignado_a,
-            activo=True,
-        ).exclude(fcm_token__isnull=True).exclude(fcm_token__exact="")
-
-        if not dispositivos.exists():
+        tokens = list(
+            DispositivoNotificacion.objects.filter(
+                usuario=ticket.asignado_a,
+                activo=True,
+            ).exclude(fcm_token__isnull=True).exclude(fcm_token__exact="")
+            .values_list("fcm_token", flat=True)
+        )
+
+        if not tokens:
             print(f"[FCM] Ticket {ticket.id}: el técnico {ticket.asignado_a} no tiene dispositivos activos.")
             return
 
-        print(f"[FCM] Ticket {ticket.id}: encontré {dispositivos.count()} dispositivo(s) para {ticket.asignado_a}.")
-
-        # 2) Access token
-        access_token = _get_access_token()
-
-        url = f"https://fcm.googleapis.com/v1/projects/{settings.FIREBASE_PROJECT_ID}/messages:send"
-        headers = {
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json; charset=UTF-8",
-        }
+        print(f"[FCM] Ticket {ticket.id}: encontré {len(tokens)} dispositivo(s) para {ticket.asignado_a}.")
 
         # URL completa al detalle del ticket en tu web
         ticket_url = f"{settings.BASE_URL}/tickets/{ticket.id}/"
 
-        # 3) Enviar a cada dispositivo
-        for disp in dispositivos:
-            cuerpo = {
-                "message": {
-                    "token": disp.fcm_token,
-                    "notification": {
-                        "title": f"Nuevo ticket {ticket.numero_ticket}",
-                        "body": f"{ticket.local} - {ticket.categoria.nombre if ticket.categoria else ''}",
-                    },
-                    "data": {
-                        "ticket_id": str(ticket.id),
-                        "ticket_url": ticket_url,
-                        "estado": ticket.estado,
-                    },
-                    "android": {
-                        "notification": {
-                            "click_action": "FLUTTER_NOTIFICATION_CLICK",
-                        }
-                    },
+        # 2) Enviar a todos los dispositivos con el cliente compartido
+        mensaje = {
+            "notification": {
+                "title": f"Nuevo ticket {ticket.numero_ticket}",
+                "body": f"{ticket.local} - {ticket.categoria.nombre if ticket.categoria else ''}",
+            },
+            "data": {
+                "ticket_id": str(ticket.id),
+                "ticket_url": ticket_url,
+                "estado": ticket.estado,
+            },
+            "android": {
+                "notification": {
+                    "click_action": "FLUTTER_NOTIFICATION_CLICK",
                 }
-            }
-
-            print(f"[FCM] Enviando a token {disp.fcm_token[:20]}...")
-
-            resp = requests.post(url, headers=headers, json=cuerpo, timeout=10)
+            },
+        }
 
-            print(f"[FCM] Respuesta FCM: {resp.status_code} - {resp.text}")
+        resultado = get_cliente_fcm().enviar_multicast(tokens, mensaje)
+        print(f"[FCM] Respuesta FCM: {resultado}")
+        return resultado
 
     except Exception as e:
         print(f"[FCM] ERROR enviando notificación: {e}")
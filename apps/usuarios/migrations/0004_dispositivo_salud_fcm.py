@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0003_dispositivonotificacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dispositivonotificacion',
+            name='fallos_consecutivos',
+            field=models.PositiveIntegerField(default=0, help_text='Envíos FCM fallidos seguidos; se reinicia con un envío correcto.', verbose_name='Fallos consecutivos'),
+        ),
+        migrations.AddField(
+            model_name='dispositivonotificacion',
+            name='fecha_ultimo_error',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Fecha del último error'),
+        ),
+        migrations.AddField(
+            model_name='dispositivonotificacion',
+            name='ultimo_error',
+            field=models.CharField(blank=True, max_length=50, verbose_name='Último error FCM'),
+        ),
+    ]
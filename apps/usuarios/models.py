@@ -4,6 +4,7 @@ Modelos para el sistema de usuarios
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.conf import settings
+from django.utils.functional import cached_property
 
 
 class Usuario(AbstractUser):
@@ -81,6 +82,14 @@ class Usuario(AbstractUser):
         """Verifica si el usuario es técnico"""
         return self.rol == 'TECNICO'
 
+    @cached_property
+    def especialidades_ids(self):
+        """
+        IDs de las categorías de especialidad. request.user es la misma instancia
+        durante toda la petición, así que se consultan una sola vez por request.
+        """
+        return list(self.especialidades.order_by().values_list('id', flat=True))
+
     def puede_crear_tickets(self):
         """Verifica si el usuario puede crear tickets"""
         return self.rol in ['ADMIN', 'DIGITADOR']
@@ -118,6 +127,21 @@ class DispositivoNotificacion(models.Model):
         auto_now=True,
         verbose_name='Último uso',
     )
+    fallos_consecutivos = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Fallos consecutivos',
+        help_text='Envíos FCM fallidos seguidos; se reinicia con un envío correcto.',
+    )
+    ultimo_error = models.CharField(
+        max_length=50,
+        blank=True,
+        verbose_name='Último error FCM',
+    )
+    fecha_ultimo_error = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Fecha del último error',
+    )
 
     class Meta:
         verbose_name = 'Dispositivo de notificación'
@@ -126,3 +150,9 @@ class DispositivoNotificacion(models.Model):
 
     def __str__(self):
         return f"{self.usuario} - {self.fcm_token[:12]}..."
+
+    @property
+    def token_muerto(self):
+        """True si FCM reportó que el token ya no es válido (fue desactivado por eso)."""
+        from apps.tickets.fcm import CODIGOS_TOKEN_MUERTO
+        return not self.activo and self.ultimo_error in CODIGOS_TOKEN_MUERTO
@@ -52,54 +52,25 @@ def dashboard(request):
     - DIGITADOR: ve todos los tickets abiertos (propios y de otros).
     - TÉCNICO: ve sus tickets asignados abiertos + (si aplica) tickets sin asignar de sus especialidades.
     """
-    from apps.tickets.models import Ticket  # import local para evitar ciclos raros
-    from django.db.models import Q
+    from apps.tickets.contadores import contadores_abiertos  # import local para evitar ciclos raros
+    from apps.tickets.filtros import tickets_dashboard
     from django.utils import timezone
-    from datetime import timedelta
 
     usuario = request.user
     ahora = timezone.now()
 
-    estados_abiertos = ['PENDIENTE', 'EN_PROCESO']
+    # Resumen: un solo COUNT condicional, cacheado por alcance de visibilidad
+    resumen = contadores_abiertos(usuario)
 
-    qs = (
-        Ticket.objects
-        .filter(estado__in=estados_abiertos)
-        .select_related('local', 'categoria', 'asignado_a', 'creado_por')
-    )
-
-    if not usuario.es_admin():
-        if usuario.rol == 'DIGITADOR':
-            # Digitador ve TODOS los tickets abiertos (propios y de otros)
-            pass
-
-        elif usuario.rol == 'TECNICO':
-            cats = usuario.especialidades.all()
-            if cats.exists():
-                qs = qs.filter(
-                    Q(asignado_a=usuario) |
-                    Q(asignado_a__isnull=True, categoria__in=cats)
-                )
-            else:
-                qs = qs.filter(asignado_a=usuario)
-
-    # Resumen
-    total_abiertos = qs.count()
-    vencidos = qs.filter(fecha_limite_sla__lt=ahora).count()
-    por_vencer_2h = qs.filter(
-        fecha_limite_sla__gte=ahora,
-        fecha_limite_sla__lte=ahora + timedelta(hours=2),
-    ).count()
-
-    # Orden: lo más urgente arriba
-    tickets_abiertos = qs.order_by('fecha_limite_sla', '-fecha_creacion')[:50]
+    # Visibilidad por rol (TicketQuerySet.visible_para); lo más urgente arriba
+    tickets_abiertos = tickets_dashboard(usuario, ahora)[:50]
 
     contexto = {
         "user": usuario,
         "tickets_abiertos": tickets_abiertos,
-        "total_abiertos": total_abiertos,
-        "vencidos": vencidos,
-        "por_vencer_2h": por_vencer_2h,
+        "total_abiertos": resumen["total_abiertos"],
+        "vencidos": resumen["vencidos"],
+        "por_vencer_2h": resumen["por_vencer_2h"],
         "ahora": ahora,
     }
     return render(request, "dashboard.html", contexto)
@@ -6,7 +6,6 @@ from pathlib import Path
 from decouple import config
 from django.urls import reverse_lazy
 from django.templatetags.static import static
-from django.utils import timezone
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -93,6 +92,12 @@ else:
         }
     }
 
+# Base de los tests: por defecto SQLite en memoria. Con TEST_DB_NAME (p. ej.
+# /tmp/test_tickets.sqlite3) se usa un archivo, con conexiones reales
+# independientes para los tests de concurrencia.
+TEST_DB_NAME = config('TEST_DB_NAME', default='')
+if TEST_DB_NAME:
+    DATABASES['default']['TEST'] = {'NAME': TEST_DB_NAME}
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -125,6 +130,23 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Caché
+# En desarrollo basta la caché en memoria. Con varios workers (PythonAnywhere)
+# conviene una caché compartida, p.ej.:
+#   CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+#   CACHE_LOCATION=/home/usuario/tickets_cache
+# para que el token FCM y demás valores cacheados se reutilicen entre procesos.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='tickets-averias'),
+    }
+}
+
+# Segundos que cada proceso reutiliza los calendarios laborales precalculados
+# antes de releerlos de la BD (con caché compartida los cambios llegan antes)
+CALENDARIO_CACHE_SEGUNDOS = config('CALENDARIO_CACHE_SEGUNDOS', default=60, cast=int)
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -157,6 +179,26 @@ FIREBASE_CREDENTIALS_FILE = config(
 FILE_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
 
+# Long-poll de la campana (apps/tickets/avisos.py). 0 = desactivado: con WSGI
+# síncrono cada petición retenida ocupa un worker. Activar (p. ej. 25) solo con
+# un servidor con hilos / ASGI y, para avisos entre procesos, una caché compartida.
+NOTIF_LONGPOLL_SEGUNDOS = config('NOTIF_LONGPOLL_SEGUNDOS', default=0, cast=int)
+
+# Imágenes subidas (apps/tickets/imagenes.py): lado largo máximo, calidad y formato
+IMAGENES_LADO_MAX = 1600
+IMAGENES_CALIDAD = 80
+IMAGENES_FORMATO = 'WEBP'
+
+# Adjuntos por partes (apps/tickets/adjuntos.py): tamaño máximo, parte sugerida y caducidad
+ADJUNTOS_TAMANO_MAX = 20 * 1024 * 1024  # 20MB
+ADJUNTOS_TAMANO_PARTE = 1024 * 1024  # 1MB
+ADJUNTOS_CADUCIDAD_HORAS = 24
+ADJUNTOS_RETENCION_DIAS = 30
+
+# Almacén por contenido de las fotos (apps/tickets/almacen.py): horas sin
+# referencias antes de que recoger_blobs borre un blob
+ALMACEN_GRACIA_HORAS = 24
+
 FIREBASE_PROJECT_ID = "mjk-tickets"  # 👈 el ID de tu proyecto (lo ves en Firebase)
 FIREBASE_CREDENTIALS_FILE = BASE_DIR / "config" / "firebase_admin_key.json"
 
@@ -267,6 +309,11 @@ UNFOLD = {
                         "icon": "store",
                         "link": lambda request: reverse_lazy("admin:locales_local_changelist"),
                     },
+                    {
+                        "title": "Calendarios laborales",
+                        "icon": "calendar_month",
+                        "link": lambda request: reverse_lazy("admin:locales_calendariolaboral_changelist"),
+                    },
                     {
                         "title": "Dispositivos FCM",
                         "icon": "notifications",
@@ -286,9 +333,10 @@ def environment_callback(request):
 
 def dashboard_callback(request, context):
     """Personaliza el dashboard del admin"""
-    from apps.tickets.models import Ticket
-    from django.db.models import Count, Q
+    from apps.tickets.contadores import contadores_abiertos
     
+    # Mismos contadores (y misma entrada de caché) que el badge del sidebar
+    resumen = contadores_abiertos()
     context.update({
         "navigation": [
             {
@@ -296,15 +344,12 @@ def dashboard_callback(request, context):
                 "items": [
                     {
                         "title": "Tickets Abiertos",
-                        "description": Ticket.objects.filter(estado__in=['PENDIENTE', 'EN_PROCESO']).count(),
+                        "description": resumen["total_abiertos"],
                         "icon": "confirmation_number",
                     },
                     {
                         "title": "Tickets Vencidos",
-                        "description": Ticket.objects.filter(
-                            Q(estado__in=['PENDIENTE', 'EN_PROCESO']) & 
-                            Q(fecha_limite_sla__lt=timezone.now())
-                        ).count(),
+                        "description": resumen["vencidos"],
                         "icon": "warning",
                     },
                 ],
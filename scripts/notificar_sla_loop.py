@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
-import subprocess
-import time
+"""
+Compatibilidad: antes lanzaba `notificar_sla_vencido` en un proceso nuevo cada
+300 s. Ahora reemplaza este proceso por `manage.py sla_daemon`, que arranca
+Django una sola vez y notifica cada ticket en cuanto vence su SLA.
+"""
 import os
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -8,17 +11,5 @@ MANAGE_PY = os.path.join(BASE_DIR, "manage.py")
 PYTHON = os.environ.get("PYTHON_EXECUTABLE", "python")
 
 
-def run_command():
-    try:
-        subprocess.run(
-            [PYTHON, MANAGE_PY, "notificar_sla_vencido"],
-            check=True,
-        )
-    except subprocess.CalledProcessError:
-        pass
-
-
 if __name__ == "__main__":
-    while True:
-        run_command()
-        time.sleep(300)
+    os.execvp(PYTHON, [PYTHON, MANAGE_PY, "sla_daemon"])
@@ -0,0 +1,68 @@
+// Subida de adjuntos por partes y reanudable (ver apps/tickets/adjuntos.py).
+// subirAdjunto(file) -> Promise con el token de la subida completa.
+(function () {
+    const URL_INICIAR = '/tickets/api/adjuntos/';
+    const MAX_REINTENTOS = 5;
+
+    function csrf() {
+        const cookie = document.cookie.split(';').find(c => c.trim().startsWith('csrftoken='));
+        return cookie ? cookie.split('=')[1] : '';
+    }
+
+    function esperar(ms) {
+        return new Promise(resolve => setTimeout(resolve, ms));
+    }
+
+    async function sha256(file) {
+        // Solo en contexto seguro (https); sin hash se sube igual y se deduplica al final
+        if (!window.crypto || !crypto.subtle) return '';
+        try {
+            const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+            return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+        } catch (e) {
+            return '';
+        }
+    }
+
+    async function subirAdjunto(file, alProgreso) {
+        const inicio = await fetch(URL_INICIAR, {
+            method: 'POST',
+            headers: { 'X-CSRFToken': csrf(), 'Content-Type': 'application/json' },
+            body: JSON.stringify({ nombre: file.name, tamano: file.size, sha256: await sha256(file) }),
+        });
+        if (!inicio.ok) throw new Error('No se pudo iniciar la subida');
+        let estado = await inicio.json();
+        let fallos = 0;
+
+        while (!estado.completa) {
+            if (alProgreso) alProgreso(estado.recibido / estado.tamano);
+            const fin = Math.min(estado.recibido + estado.parte, file.size);
+            let resp = null;
+            try {
+                resp = await fetch(`${estado.url}?offset=${estado.recibido}`, {
+                    method: 'PUT',
+                    headers: { 'X-CSRFToken': csrf(), 'Content-Type': 'application/octet-stream' },
+                    body: file.slice(estado.recibido, fin),
+                });
+            } catch (e) { /* sin red: se reanuda abajo */ }
+
+            if (resp && (resp.ok || resp.status === 409)) {
+                // 409: el servidor tiene otro offset; seguimos desde `recibido`
+                estado = await resp.json();
+                fallos = 0;
+                continue;
+            }
+            if (resp && resp.status < 500) throw new Error(`HTTP ${resp.status}`);
+            if (++fallos > MAX_REINTENTOS) throw new Error('Demasiados reintentos');
+            await esperar(1000 * fallos);
+            try {
+                const r = await fetch(estado.url);
+                if (r.ok) estado = await r.json();
+            } catch (e) { /* se reintenta */ }
+        }
+        if (alProgreso) alProgreso(1);
+        return estado.token;
+    }
+
+    window.subirAdjunto = subirAdjunto;
+})();
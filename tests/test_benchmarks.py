@@ -0,0 +1,305 @@
+"""
+Benchmarks de rendimiento.
+
+Siembran volúmenes grandes de datos, así que no corren por defecto:
+    RUN_BENCHMARKS=1 python manage.py test tests.test_benchmarks
+"""
+import os
+import random
+import time
+import unittest
+from datetime import datetime, time as hora, timedelta
+from unittest import mock
+from zoneinfo import ZoneInfo
+
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.locales.models import Local
+from apps.tickets.models import Ticket, CategoriaAveria
+
+User = get_user_model()
+
+RUN_BENCHMARKS = os.environ.get("RUN_BENCHMARKS") == "1"
+
+
+def sembrar_tickets(total, usuario, locales, categorias, lote=5000, inicio=None):
+    """Inserta `total` tickets con fechas de creación distintas (bulk_create)."""
+    inicio = inicio or timezone.now() - timedelta(days=365)
+    paso = timedelta(days=365) / total
+    estados = ["PENDIENTE", "EN_PROCESO", "RESUELTO", "CERRADO", "CANCELADO"]
+    campo = Ticket._meta.get_field("fecha_creacion")
+
+    # bulk_create no llama a save() y auto_now_add pisaría las fechas sembradas
+    with mock.patch.object(campo, "auto_now_add", False):
+        for base in range(0, total, lote):
+            filas = []
+            for i in range(base, min(base + lote, total)):
+                creado = inicio + paso * i
+                categoria = categorias[i % len(categorias)]
+                filas.append(Ticket(
+                    numero_ticket=f"BEN-{i:07d}",
+                    local=locales[i % len(locales)],
+                    categoria=categoria,
+                    titulo="Benchmark",
+                    descripcion="Benchmark",
+                    estado=estados[i % len(estados)],
+                    creado_por=usuario,
+                    fecha_creacion=creado,
+                    fecha_limite_sla=creado + timedelta(hours=categoria.tiempo_sla_horas),
+                ))
+            Ticket.objects.bulk_create(filas)
+
+
+def medir(funcion, repeticiones=5):
+    """Mejor tiempo (segundos) de varias ejecuciones."""
+    mejor = None
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        funcion()
+        dt = time.perf_counter() - t0
+        mejor = dt if mejor is None else min(mejor, dt)
+    return mejor
+
+
+@unittest.skipUnless(RUN_BENCHMARKS, "Benchmarks desactivados (RUN_BENCHMARKS=1 para ejecutarlos)")
+class TicketsListaBenchmark(TestCase):
+    """Paginación por cursor de tickets_lista con 100k tickets"""
+
+    TOTAL = 100_000
+    MAX_SEGUNDOS_POR_PAGINA = 0.05
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user(username="bench", password="x", rol="ADMIN")
+        locales = [Local.objects.create(codigo=f"B{i:03d}", nombre=f"Banca {i}") for i in range(50)]
+        categorias = [CategoriaAveria.objects.create(nombre=f"Cat {i}", tiempo_sla_horas=4 + i) for i in range(5)]
+        sembrar_tickets(cls.TOTAL, cls.usuario, locales, categorias)
+
+    def test_tiempo_por_pagina_constante(self):
+        """Primera página y una página profunda cuestan lo mismo"""
+        from apps.tickets.paginacion import paginar_keyset, codificar_cursor
+
+        qs = Ticket.objects.select_related("local", "categoria", "creado_por", "asignado_a")
+        profundo = Ticket.objects.order_by("fecha_creacion", "id")[50]
+        cursor = codificar_cursor(profundo.fecha_creacion, profundo.pk)
+
+        primera = medir(lambda: paginar_keyset(qs))
+        profunda = medir(lambda: paginar_keyset(qs, cursor=cursor))
+
+        print(f"\n[BENCH] tickets_lista 100k: primera={primera * 1000:.1f}ms profunda={profunda * 1000:.1f}ms")
+        self.assertLess(primera, self.MAX_SEGUNDOS_POR_PAGINA)
+        self.assertLess(profunda, self.MAX_SEGUNDOS_POR_PAGINA)
+
+
+@unittest.skipUnless(RUN_BENCHMARKS, "Benchmarks desactivados (RUN_BENCHMARKS=1 para ejecutarlos)")
+class CalendarioSlaBenchmark(SimpleTestCase):
+    """fecha_limite_sla en horas laborables para 100k tickets"""
+
+    TOTAL = 100_000
+    MAX_SEGUNDOS = 2.0
+
+    def setUp(self):
+        from apps.locales.calendario import Calendario
+
+        self.zona = ZoneInfo("America/Santo_Domingo")
+        self.horario = {dia: [(hora(8), hora(12)), (hora(14), hora(18))] for dia in range(5)}
+        self.horario[5] = [(hora(8), hora(12))]
+        inicio = datetime(2026, 1, 1, tzinfo=self.zona)
+        self.feriados = {(inicio + timedelta(days=d)).date() for d in (0, 45, 100, 180, 250, 358)}
+        self.calendario = Calendario(self.horario, self.feriados, zona=self.zona, hoy=inicio.date())
+
+        rnd = random.Random(42)
+        self.casos = [
+            (inicio + timedelta(seconds=rnd.randrange(365 * 86400)), rnd.choice((2, 4, 8, 24, 48, 72)) * 3600)
+            for _ in range(self.TOTAL)
+        ]
+
+    def _sumar_dia_a_dia(self, inicio, segundos):
+        """Referencia ingenua: recorre los tramos día a día desde el inicio."""
+        local = inicio.astimezone(self.zona)
+        dia = local.date()
+        while True:
+            if dia not in self.feriados:
+                for desde, hasta in self.horario.get(dia.weekday(), ()):
+                    a = max(datetime.combine(dia, desde, tzinfo=self.zona), local)
+                    b = datetime.combine(dia, hasta, tzinfo=self.zona)
+                    if b <= a:
+                        continue
+                    tramo = (b - a).total_seconds()
+                    if segundos <= tramo:
+                        return a + timedelta(seconds=segundos)
+                    segundos -= tramo
+            dia += timedelta(days=1)
+
+    def test_100k_vencimientos(self):
+        calendario = self.calendario
+        tiempo = medir(lambda: [calendario.sumar(inicio, s) for inicio, s in self.casos], repeticiones=3)
+
+        muestra = self.casos[:2000]
+        t0 = time.perf_counter()
+        esperados = [self._sumar_dia_a_dia(inicio, s) for inicio, s in muestra]
+        ingenuo = (time.perf_counter() - t0) * self.TOTAL / len(muestra)
+
+        self.assertEqual([calendario.sumar(inicio, s) for inicio, s in muestra], esperados)
+        print(
+            f"\n[BENCH] calendario SLA 100k: indice={tiempo:.2f}s "
+            f"dia a dia~{ingenuo:.2f}s ({ingenuo / tiempo:.0f}x)"
+        )
+        self.assertLess(tiempo, self.MAX_SEGUNDOS)
+
+
+@unittest.skipUnless(RUN_BENCHMARKS, "Benchmarks desactivados (RUN_BENCHMARKS=1 para ejecutarlos)")
+class ReportesResumenBenchmark(TestCase):
+    """Dashboard de reportes sobre ResumenDiario con 100k tickets"""
+
+    TOTAL = 100_000
+    MAX_SEGUNDOS_RESUMEN = 0.02
+    MAX_SEGUNDOS_PAGINA = 0.2
+
+    @classmethod
+    def setUpTestData(cls):
+        from apps.reportes.resumenes import actualizar_resumenes
+
+        cls.usuario = User.objects.create_user(username="bench", password="x", rol="ADMIN")
+        locales = [Local.objects.create(codigo=f"B{i:03d}", nombre=f"Banca {i}") for i in range(50)]
+        categorias = [CategoriaAveria.objects.create(nombre=f"Cat {i}", tiempo_sla_horas=4 + i) for i in range(5)]
+        sembrar_tickets(cls.TOTAL, cls.usuario, locales, categorias)
+        Ticket.objects.filter(estado__in=["RESUELTO", "CERRADO"]).update(fecha_resolucion=F("fecha_limite_sla"))
+
+        t0 = time.perf_counter()
+        cls.dias, cls.filas = actualizar_resumenes()
+        cls.segundos_resumen = time.perf_counter() - t0
+
+    def test_dashboard_desde_resumenes(self):
+        from django.db.models import Sum
+        from apps.reportes.models import ResumenDiario
+
+        def por_local(dias):
+            desde = timezone.localdate() - timedelta(days=dias)
+            return list(
+                ResumenDiario.objects.filter(dia__gte=desde)
+                .values("local_id")
+                .annotate(total=Sum("cerrados"), on_time=Sum("a_tiempo"), s=Sum("segundos_solucion"))
+            )
+
+        t90 = medir(lambda: por_local(90))
+        t365 = medir(lambda: por_local(365))
+
+        self.client.force_login(self.usuario)
+        url = reverse("reportes_dashboard")
+        self.client.get(url)
+        pagina = medir(lambda: self.client.get(url))
+
+        print(
+            f"\n[BENCH] reportes 100k: resumen inicial={self.segundos_resumen:.1f}s "
+            f"({len(self.dias)} días, {self.filas} filas), por local 90d={t90 * 1000:.1f}ms "
+            f"365d={t365 * 1000:.1f}ms, página completa={pagina * 1000:.1f}ms"
+        )
+        self.assertLess(t90, self.MAX_SEGUNDOS_RESUMEN)
+        self.assertLess(t365, self.MAX_SEGUNDOS_RESUMEN)
+        self.assertLess(pagina, self.MAX_SEGUNDOS_PAGINA)
+
+    def test_anio_completo_con_filtros(self):
+        from django.core.cache import cache
+
+        self.client.force_login(self.usuario)
+        hoy = timezone.localdate()
+        url = reverse("reportes_dashboard")
+        anio = {"desde": str(hoy - timedelta(days=365)), "hasta": str(hoy)}
+        self.client.get(url, anio)
+
+        def en_frio(params):
+            cache.clear()
+            t0 = time.perf_counter()
+            respuesta = self.client.get(url, params)
+            self.assertEqual(respuesta.status_code, 200)
+            return time.perf_counter() - t0
+
+        frio = en_frio(anio)
+        filtrado = en_frio({**anio, "local": Local.objects.first().pk, "categoria": CategoriaAveria.objects.first().pk})
+        self.client.get(url, anio)
+        caliente = medir(lambda: self.client.get(url, anio))
+
+        print(
+            f"\n[BENCH] reportes 100k, 1 año: sin caché={frio * 1000:.1f}ms, "
+            f"filtrado={filtrado * 1000:.1f}ms, con caché={caliente * 1000:.1f}ms"
+        )
+        self.assertLess(frio, 1.0)
+        self.assertLess(filtrado, 1.0)
+        self.assertLess(caliente, frio)
+
+
+def _reiniciar_pico_rss():
+    """Pone el pico de RSS (VmHWM) al RSS actual. Solo Linux; en otros sistemas no hace nada."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _rss_mb(campo):
+    """VmRSS (actual) o VmHWM (pico) del proceso en MB, de /proc/self/status."""
+    try:
+        with open("/proc/self/status") as f:
+            for linea in f:
+                if linea.startswith(campo + ":"):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+@unittest.skipUnless(RUN_BENCHMARKS, "Benchmarks desactivados (RUN_BENCHMARKS=1 para ejecutarlos)")
+class ExportarBenchmark(TestCase):
+    """Pico de RSS exportando 500k tickets a CSV y XLSX (debe ser constante, no proporcional)"""
+
+    TOTAL = 500_000
+    MAX_MB_STREAMING = 60
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user(username="bench", password="x", rol="ADMIN")
+        locales = [Local.objects.create(codigo=f"B{i:03d}", nombre=f"Banca {i}") for i in range(50)]
+        categorias = [CategoriaAveria.objects.create(nombre=f"Cat {i}", tiempo_sla_horas=4 + i) for i in range(5)]
+        sembrar_tickets(cls.TOTAL, cls.usuario, locales, categorias, lote=10000)
+
+    def _exportar(self, formato):
+        """Descarga completa; devuelve (segundos, MB descargados, MB de pico de RSS sobre el inicial)."""
+        self.client.force_login(self.usuario)
+        url = reverse("tickets_exportar", args=[formato])
+        _reiniciar_pico_rss()
+        base = _rss_mb("VmRSS")
+        t0 = time.perf_counter()
+        respuesta = self.client.get(url, {"ver": "todos"})
+        # Al agotar el contenido el cliente de test cierra la respuesta (y el temporal del XLSX)
+        total = sum(len(bloque) for bloque in respuesta.streaming_content)
+        segundos = time.perf_counter() - t0
+        return segundos, total / 1e6, _rss_mb("VmHWM") - base
+
+    def test_rss_constante(self):
+        csv_s, csv_mb, csv_rss = self._exportar("csv")
+        xlsx_s, xlsx_mb, xlsx_rss = self._exportar("xlsx")
+
+        # Referencia: lo mismo cargando todas las filas en una lista
+        from apps.reportes.exportar import COLUMNAS_TICKETS
+
+        _reiniciar_pico_rss()
+        base = _rss_mb("VmRSS")
+        filas = list(Ticket.objects.values_list(*(campo for _, campo in COLUMNAS_TICKETS)))
+        lista_rss = _rss_mb("VmHWM") - base
+        del filas
+
+        print(
+            f"\n[BENCH] exportar {self.TOTAL} tickets: CSV {csv_mb:.0f}MB en {csv_s:.1f}s (+{csv_rss:.0f}MB RSS), "
+            f"XLSX {xlsx_mb:.0f}MB en {xlsx_s:.1f}s (+{xlsx_rss:.0f}MB RSS), "
+            f"lista en memoria +{lista_rss:.0f}MB RSS"
+        )
+        self.assertLess(csv_rss, self.MAX_MB_STREAMING)
+        self.assertLess(xlsx_rss, self.MAX_MB_STREAMING)
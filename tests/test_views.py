@@ -1,7 +1,9 @@
 """
 Tests para las vistas de la aplicación
 """
-from django.test import TestCase, Client
+import json
+
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 
@@ -86,6 +88,84 @@ class TicketListViewTest(TestCase):
         self.assertContains(response, ticket.numero_ticket)
 
 
+class TicketListPaginacionTest(TestCase):
+    """Tests para la paginación por cursor de la lista de tickets"""
+
+    def setUp(self):
+        from apps.tickets.paginacion import POR_PAGINA
+
+        self.client = Client()
+        self.usuario = User.objects.create_user(
+            username="testuser",
+            password="testpass123",
+            rol="ADMIN"
+        )
+        local = Local.objects.create(codigo="TEST01", nombre="Local Test")
+        categoria = CategoriaAveria.objects.create(nombre="Electricidad", tiempo_sla_horas=4)
+        self.por_pagina = POR_PAGINA
+        self.tickets = [
+            Ticket.objects.create(
+                local=local,
+                categoria=categoria,
+                titulo=f"Ticket {i}",
+                descripcion="Descripción",
+                creado_por=self.usuario,
+            )
+            for i in range(POR_PAGINA + 5)
+        ]
+        self.client.login(username="testuser", password="testpass123")
+
+    def test_primera_pagina_tamano_fijo(self):
+        """La primera página trae POR_PAGINA tickets, los más recientes"""
+        response = self.client.get(reverse('tickets_lista'), {'ver': 'todos'})
+        pagina = response.context['pagina']
+
+        self.assertEqual(len(pagina.items), self.por_pagina)
+        self.assertEqual(pagina.items[0], self.tickets[-1])
+        self.assertTrue(pagina.hay_siguiente)
+        self.assertFalse(pagina.hay_anterior)
+
+    def test_siguiente_y_anterior(self):
+        """Con el cursor se recorren todas las filas sin duplicados y se puede volver"""
+        primera = self.client.get(reverse('tickets_lista'), {'ver': 'todos'}).context['pagina']
+        segunda = self.client.get(reverse('tickets_lista'), {
+            'ver': 'todos', 'cursor': primera.cursor_siguiente,
+        }).context['pagina']
+
+        self.assertEqual(len(segunda.items), 5)
+        self.assertFalse(segunda.hay_siguiente)
+        vistos = [t.pk for t in primera.items] + [t.pk for t in segunda.items]
+        self.assertEqual(sorted(vistos), sorted(t.pk for t in self.tickets))
+
+        vuelta = self.client.get(reverse('tickets_lista'), {
+            'ver': 'todos', 'cursor': segunda.cursor_anterior, 'dir': 'ant',
+        }).context['pagina']
+        self.assertEqual([t.pk for t in vuelta.items], [t.pk for t in primera.items])
+        self.assertFalse(vuelta.hay_anterior)
+
+    def test_enlaces_conservan_filtro(self):
+        """Los enlaces de paginación mantienen el filtro ?ver"""
+        response = self.client.get(reverse('tickets_lista'), {'ver': 'todos'})
+        cursor = response.context['pagina'].cursor_siguiente
+        self.assertContains(response, f'?ver=todos&cursor={cursor}')
+
+    def test_sin_count(self):
+        """La página no ejecuta COUNT(*) sobre los tickets"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('tickets_lista'), {'ver': 'todos'})
+
+        self.assertFalse(any('COUNT(' in q['sql'].upper() for q in ctx.captured_queries))
+
+    def test_cursor_invalido_vuelve_al_inicio(self):
+        """Un cursor manipulado no rompe la vista"""
+        response = self.client.get(reverse('tickets_lista'), {'ver': 'todos', 'cursor': 'basura!!'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['pagina'].items), self.por_pagina)
+
+
 class TicketCreateViewTest(TestCase):
     """Tests para la vista de creación de tickets"""
     
@@ -138,6 +218,53 @@ class TicketCreateViewTest(TestCase):
         self.assertIn(response.status_code, [200, 302])  # 200 si error, 302 si éxito
 
 
+class TicketCreateOutboxTest(TestCase):
+    """Tests para el encolado de notificaciones al crear tickets"""
+
+    def setUp(self):
+        self.client = Client()
+        self.usuario = User.objects.create_user(
+            username="testuser",
+            password="testpass123",
+            rol="ADMIN"
+        )
+        self.categoria = CategoriaAveria.objects.create(
+            nombre="Electricidad",
+            tiempo_sla_horas=4
+        )
+        self.tecnico = User.objects.create_user(
+            username="tecnico",
+            password="testpass123",
+            rol="TECNICO"
+        )
+        self.tecnico.especialidades.add(self.categoria)
+
+    def test_crear_ticket_encola_sin_enviar(self):
+        """Crear ticket encola el push y no llama a FCM/Twilio en la petición"""
+        from unittest import mock
+        from apps.tickets.models import EnvioPendiente
+
+        self.client.login(username="testuser", password="testpass123")
+        data = {
+            'local': 'TEST01',
+            'categoria': self.categoria.id,
+            'descripcion': 'No enciende',
+            'prioridad': 'MEDIA',
+            'asignado_a': self.tecnico.id,
+        }
+
+        with mock.patch('apps.tickets.envios.enviar_notificacion_nuevo_ticket') as push, \
+                mock.patch('apps.tickets.envios.enviar_whatsapp_ticket_asignado') as whatsapp:
+            response = self.client.post(reverse('ticket_crear'), data)
+
+        self.assertEqual(response.status_code, 302)
+        push.assert_not_called()
+        whatsapp.assert_not_called()
+        envio = EnvioPendiente.objects.get()
+        self.assertEqual(envio.tipo, 'PUSH_NUEVO_TICKET')
+        self.assertEqual(envio.usuario, self.tecnico)
+
+
 class TicketDetailViewTest(TestCase):
     """Tests para la vista de detalle de ticket"""
     
@@ -185,6 +312,237 @@ class TicketDetailViewTest(TestCase):
         self.assertEqual(response.status_code, 200)
 
 
+class VisibilidadTicketsTest(TestCase):
+    """Visibilidad por rol (Ticket.objects.visible_para) y número de consultas por vista"""
+
+    def setUp(self):
+        self.client = Client()
+        self.admin = User.objects.create_user(username="admin_vis", password="testpass123", rol="ADMIN")
+        self.tecnico = User.objects.create_user(username="tec_vis", password="testpass123", rol="TECNICO")
+        self.otro = User.objects.create_user(username="tec_otro", password="testpass123", rol="TECNICO")
+
+        local = Local.objects.create(codigo="VIS01", nombre="Local Vis")
+        self.cat_propia = CategoriaAveria.objects.create(nombre="Redes", tiempo_sla_horas=4)
+        self.cat_ajena = CategoriaAveria.objects.create(nombre="Eléctrica", tiempo_sla_horas=4)
+        self.tecnico.especialidades.add(self.cat_propia)
+
+        def crear(categoria, asignado_a=None):
+            return Ticket.objects.create(
+                local=local, categoria=categoria, titulo="T", descripcion="D",
+                creado_por=self.admin, asignado_a=asignado_a,
+            )
+
+        self.asignado = crear(self.cat_ajena, self.tecnico)
+        self.libre_propia = crear(self.cat_propia)
+        self.libre_ajena = crear(self.cat_ajena)
+        self.de_otro = crear(self.cat_propia, self.otro)
+        # Relleno para que el número de consultas no dependa del número de filas
+        for _ in range(10):
+            crear(self.cat_propia)
+            crear(self.cat_ajena, self.tecnico)
+
+    def _recargar(self, usuario):
+        # Instancia nueva, como request.user en cada petición
+        return User.objects.get(pk=usuario.pk)
+
+    def test_visible_para_tecnico(self):
+        visibles = set(Ticket.objects.visible_para(self._recargar(self.tecnico)))
+        self.assertIn(self.asignado, visibles)
+        self.assertIn(self.libre_propia, visibles)
+        self.assertNotIn(self.libre_ajena, visibles)
+        self.assertNotIn(self.de_otro, visibles)
+
+    def test_visible_para_tecnico_sin_especialidades(self):
+        visibles = set(Ticket.objects.visible_para(self._recargar(self.otro)))
+        self.assertIn(self.de_otro, visibles)
+        self.assertIn(self.libre_ajena, visibles)
+        self.assertNotIn(self.asignado, visibles)
+
+    def test_visible_para_admin_ve_todo(self):
+        self.assertEqual(Ticket.objects.visible_para(self.admin).count(), Ticket.objects.count())
+
+    def test_especialidades_se_consultan_una_vez(self):
+        tecnico = self._recargar(self.tecnico)
+        # 1 especialidades + 2 listados
+        with self.assertNumQueries(3):
+            list(Ticket.objects.visible_para(tecnico))
+            list(Ticket.objects.visible_para(tecnico))
+
+    def test_detalle_tecnico_prohibido_fuera_de_especialidad(self):
+        self.client.login(username="tec_vis", password="testpass123")
+        response = self.client.get(reverse('ticket_detalle', args=[self.libre_ajena.pk]))
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get(reverse('ticket_detalle', args=[self.de_otro.pk]))
+        self.assertEqual(response.status_code, 403)
+
+    def test_tomar_fuera_de_especialidad(self):
+        self.client.login(username="tec_vis", password="testpass123")
+        self.client.post(reverse('ticket_tomar', args=[self.libre_ajena.pk]))
+        self.libre_ajena.refresh_from_db()
+        self.assertIsNone(self.libre_ajena.asignado_a)
+
+        self.client.post(reverse('ticket_tomar', args=[self.libre_propia.pk]))
+        self.libre_propia.refresh_from_db()
+        self.assertEqual(self.libre_propia.asignado_a, self.tecnico)
+
+    # --- Número de consultas por vista (técnico: usuario + especialidades + datos) ---
+
+    def test_consultas_dashboard_tecnico(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        self.client.login(username="tec_vis", password="testpass123")
+        # usuario, especialidades, contadores (1 COUNT condicional), listado
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_abiertos'], 22)
+
+        # Segunda carga: contadores desde caché
+        with self.assertNumQueries(3):
+            self.client.get(reverse('dashboard'))
+
+    def test_consultas_lista_tecnico(self):
+        self.client.login(username="tec_vis", password="testpass123")
+        # usuario, especialidades, página
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('tickets_lista'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_consultas_detalle_tecnico(self):
+        self.client.login(username="tec_vis", password="testpass123")
+        # usuario, especialidades, ticket (+visible), imágenes, comentarios (count + filas)
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('ticket_detalle', args=[self.libre_propia.pk]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_consultas_lista_admin(self):
+        self.client.login(username="admin_vis", password="testpass123")
+        # usuario, página (sin consulta de especialidades)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('tickets_lista'))
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(NOTIF_LONGPOLL_SEGUNDOS=25)
+class NotificacionesLongPollViewTest(TestCase):
+    """Tests para el endpoint de long-poll de la campana (activado: por defecto está apagado)"""
+
+    def setUp(self):
+        from apps.tickets.models import Notificacion
+
+        self.client = Client()
+        self.usuario = User.objects.create_user(username="testuser", password="testpass123", rol="ADMIN")
+        local = Local.objects.create(codigo="TEST01", nombre="Local Test")
+        categoria = CategoriaAveria.objects.create(nombre="Electricidad", tiempo_sla_horas=4)
+        ticket = Ticket.objects.create(
+            local=local, categoria=categoria, titulo="T", descripcion="D", creado_por=self.usuario
+        )
+        self.notif = Notificacion.objects.create(usuario=self.usuario, ticket=ticket, mensaje="Hola")
+        self.client.login(username="testuser", password="testpass123")
+        self.url = reverse('api_notificaciones_esperar')
+
+    def test_sin_since_devuelve_estado_y_cursor(self):
+        data = self.client.get(self.url).json()
+        self.assertTrue(data['cambios'])
+        self.assertEqual(data['ultimo_id'], self.notif.pk)
+        self.assertEqual(data['count'], 1)
+
+    def test_since_anterior_responde_inmediatamente(self):
+        data = self.client.get(self.url, {'since': self.notif.pk - 1}).json()
+        self.assertTrue(data['cambios'])
+        self.assertEqual(data['items'][0]['id'], self.notif.pk)
+
+    def test_sin_novedades_agota_espera(self):
+        from django.test import override_settings
+
+        with override_settings(NOTIF_LONGPOLL_SEGUNDOS=0.2, NOTIF_LONGPOLL_INTERVALO=0.05):
+            data = self.client.get(self.url, {'since': self.notif.pk}).json()
+        self.assertEqual(data, {'cambios': False, 'ultimo_id': self.notif.pk})
+
+    def test_desactivado_responde_503(self):
+        from django.test import override_settings
+
+        with override_settings(NOTIF_LONGPOLL_SEGUNDOS=0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 503)
+
+    @override_settings()
+    def test_desactivado_por_defecto(self):
+        from django.conf import settings
+
+        del settings.NOTIF_LONGPOLL_SEGUNDOS
+        self.assertEqual(self.client.get(self.url).status_code, 503)
+
+
+class NotificacionesETagTest(TestCase):
+    """ETag / 304 y cursor ?since en el API de notificaciones"""
+
+    def setUp(self):
+        from django.test import RequestFactory
+        from apps.tickets.models import Notificacion
+
+        self.factory = RequestFactory()
+        self.usuario = User.objects.create_user(username="testuser", password="testpass123", rol="ADMIN")
+        local = Local.objects.create(codigo="TEST01", nombre="Local Test")
+        categoria = CategoriaAveria.objects.create(nombre="Electricidad", tiempo_sla_horas=4)
+        self.ticket = Ticket.objects.create(
+            local=local, categoria=categoria, titulo="T", descripcion="D", creado_por=self.usuario
+        )
+        self.notifs = [
+            Notificacion.objects.create(usuario=self.usuario, ticket=self.ticket, mensaje=f"N{i}")
+            for i in range(3)
+        ]
+
+    def _get(self, **extra):
+        from apps.tickets.views import api_notificaciones
+
+        params = extra.pop('params', {})
+        request = self.factory.get(reverse('api_notificaciones'), params, **extra)
+        request.user = self.usuario
+        return api_notificaciones(request)
+
+    def test_respuesta_con_etag_y_contador(self):
+        response = self._get()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'])
+        data = json.loads(response.content)
+        self.assertEqual(data['count'], 3)
+        self.assertEqual(data['ultimo_id'], self.notifs[-1].pk)
+
+    def test_poll_sin_cambios_304_con_una_consulta(self):
+        etag = self._get()['ETag']
+        with self.assertNumQueries(1):
+            response = self._get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_etag_cambia_con_nueva_o_leida(self):
+        from apps.tickets.models import Notificacion
+
+        etag = self._get()['ETag']
+        Notificacion.objects.filter(pk=self.notifs[0].pk).update(leida=True)
+        etag_leida = self._get()['ETag']
+        self.assertNotEqual(etag, etag_leida)
+
+        Notificacion.objects.create(usuario=self.usuario, ticket=self.ticket, mensaje="Nueva")
+        response = self._get(HTTP_IF_NONE_MATCH=etag_leida)
+        self.assertEqual(response.status_code, 200)
+
+    def test_since_solo_devuelve_nuevas(self):
+        data = json.loads(self._get(params={'since': self.notifs[0].pk}).content)
+        self.assertEqual({n['id'] for n in data['items']}, {self.notifs[1].pk, self.notifs[2].pk})
+        self.assertEqual(data['count'], 3)
+
+        data = json.loads(self._get(params={'since': self.notifs[-1].pk}).content)
+        self.assertEqual(data['items'], [])
+
+    def test_respuesta_completa_dos_consultas(self):
+        # marca (MAX + COUNT en una consulta) + listado
+        with self.assertNumQueries(2):
+            self._get()
+
+
 class LoginViewTest(TestCase):
     """Tests para la vista de login"""
     